@@ -0,0 +1,39 @@
+import numpy as np
+import sys
+from feeds.OrderBookDepth import DepthIndex
+
+class ExchangeOrderBookClients(object):
+	"""
+	Average fill price computation over order books, shared by all exchange clients.
+	"""
+
+	def _compute_average_margin_purchase_price(self, price_qty_pairs_ordered: [float, float], size: float):
+		"""
+		We will read pricing - qty data from the first entry of the list. 
+
+		This logic will differ, depending on whether we want to go long / short on the asset. 
+		As such, the ordering of the price-qty pairs in the list has to be handled properly by the user. 
+		"""
+		depth_index = DepthIndex(levels = price_qty_pairs_ordered, descending = True, assume_sorted = True)
+		return depth_index.average_price(size = size)
+
+	def _compute_average_bid_price(self, bids: [[float, float]], size: float):
+		# Sell into bids starting from the highest to the lowest.
+		if len(bids) > 0:
+			return DepthIndex(levels = bids, descending = True).average_price(size = size)
+		return 0
+
+	def _compute_average_ask_price(self, asks: [[float, float]], size: float):
+		# Buy into asks starting from the lowest to the highest.
+		if len(asks) > 0:
+			return DepthIndex(levels = asks, descending = False).average_price(size = size)
+		return sys.maxsize
+
+	def _compute_average_bid_ask_prices(self, bids: [[float, float]], asks: [[float, float]], sizes: [float]):
+		"""
+		Returns arrays of average bid / ask prices, one for each size in sizes.
+		"""
+		_sizes 				= np.asarray(sizes, dtype = np.float64)
+		average_bid_prices 	= DepthIndex(levels = bids, descending = True).average_price(size = _sizes) if len(bids) > 0 else np.full(_sizes.shape, 0)
+		average_ask_prices 	= DepthIndex(levels = asks, descending = False).average_price(size = _sizes) if len(asks) > 0 else np.full(_sizes.shape, sys.maxsize)
+		return (average_bid_prices, average_ask_prices)
\ No newline at end of file
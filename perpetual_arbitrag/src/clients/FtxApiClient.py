@@ -2,13 +2,13 @@ import asyncio
 import datetime
 import ftx
 import logging
-import sys
 from datetime import timedelta
+from clients.ExchangeOrderBookClients import ExchangeOrderBookClients
 from clients.ExchangeSpotClients import ExchangeSpotClients
 from clients.ExchangePerpetualClients import ExchangePerpetualClients
 from clients.ExchangeMarginClients import ExchangeMarginClients
 
-class FtxApiClient(ExchangeMarginClients, ExchangePerpetualClients):
+class FtxApiClient(ExchangeOrderBookClients, ExchangeMarginClients, ExchangePerpetualClients):
 	client 	= None
 	logger 	= logging.getLogger('FtxApiClient')
 
@@ -23,41 +23,6 @@ class FtxApiClient(ExchangeMarginClients, ExchangePerpetualClients):
 		self.logger.info(f"Enable for funding rate computation set to {funding_rate_enable}")
 		return
 
-	def _compute_average_margin_purchase_price(self, price_qty_pairs_ordered: [float, float], size: float):
-		"""
-		We will read pricing - qty data from the first entry of the list. 
-
-		This logic will differ, depending on whether we want to go long / short on the asset. 
-		As such, the ordering of the price-qty pairs in the list has to be handled properly by the user. 
-		"""
-		all_trade_qty 		= size
-		trade_amt 			= 0
-		executed_trade_qty 	= 0
-		for each_price_qty_pairs in price_qty_pairs_ordered:
-			if all_trade_qty < 0:
-				break
-			else:
-				[price, qty] 	=  each_price_qty_pairs
-				trade_qty 		=  min(all_trade_qty, qty)
-				trade_amt 	 	+= price * trade_qty
-				all_trade_qty 	-= trade_qty
-				executed_trade_qty += trade_qty
-		return trade_amt / executed_trade_qty
-
-	def _compute_average_bid_price(self, bids: [[float, float]], size: float):
-		# Sell into bids starting from the highest to the lowest.
-		_bids 	= sorted(bids, key = lambda x: x[0], reverse = True)
-		if len(_bids) > 0:
-			return self._compute_average_margin_purchase_price(price_qty_pairs_ordered = _bids, size = size)
-		return 0
-
-	def _compute_average_ask_price(self, asks: [[float, float]], size: float):
-		# Buy into asks starting from the lowest to the highest.
-		_asks 	= sorted(asks, key = lambda x: x[0], reverse = False)
-		if len(_asks) > 0:
-			return self._compute_average_margin_purchase_price(price_qty_pairs_ordered = _asks, size = size)
-		return sys.maxsize
-
 	def set_account_leverage(self, leverage: int):
 		self.logger.debug(f"Set account leverage: {leverage}")
 		self.client.set_leverage(leverage = leverage)
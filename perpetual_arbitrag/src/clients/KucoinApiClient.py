@@ -1,14 +1,14 @@
 import datetime
 import deprecation
 import logging
-import sys
 from datetime import timedelta
 from kucoin.client import Market as Market_C, Trade as Trade_C, User as User_C
 from kucoin_futures.client import Market as Market_F, Trade as Trade_F, User as User_F
+from clients.ExchangeOrderBookClients import ExchangeOrderBookClients
 from clients.ExchangeSpotClients import ExchangeSpotClients
 from clients.ExchangeFutureClients import ExchangeFutureClients
 
-class KucoinApiClient(ExchangeSpotClients, ExchangeFutureClients):
+class KucoinApiClient(ExchangeOrderBookClients, ExchangeSpotClients, ExchangeFutureClients):
 	default_page_size 			= 50
 	spot_client 				= None
 	futures_client 				= None
@@ -116,54 +116,32 @@ class KucoinApiClient(ExchangeSpotClients, ExchangeFutureClients):
 		futures_info = self.futures_client.get_contract_detail(symbol = symbol)
 		return int(futures_info["lotSize"])
 
-	def _compute_average_margin_purchase_price(self, price_qty_pairs_ordered: [float, float], size: float):
-		"""
-		We will read pricing - qty data from the first entry of the list. 
-
-		This logic will differ, depending on whether we want to go long / short on the asset. 
-		As such, the ordering of the price-qty pairs in the list has to be handled properly by the user. 
-		"""
-		all_trade_qty 		= size
-		trade_amt 			= 0
-		executed_trade_qty 	= 0
-		for each_price_qty_pairs in price_qty_pairs_ordered:
-			if all_trade_qty < 0:
-				break
-			else:
-				[price, qty] 	=  each_price_qty_pairs
-				trade_qty 		=  min(all_trade_qty, qty)
-				trade_amt 	 	+= price * trade_qty
-				all_trade_qty 	-= trade_qty
-				executed_trade_qty += trade_qty
-		return trade_amt / executed_trade_qty
-
-	def _compute_average_bid_price(self, bids: [[float, float]], size: float):
-		# Sell into bids starting from the highest to the lowest.
-		_bids 	= sorted(bids, key = lambda x: x[0], reverse = True)
-		if len(_bids) > 0:
-			return self._compute_average_margin_purchase_price(price_qty_pairs_ordered = _bids, size = size)
-		return 0
-
-	def _compute_average_ask_price(self, asks: [[float, float]], size: float):
-		# Buy into asks starting from the lowest to the highest.
-		_asks 	= sorted(asks, key = lambda x: x[0], reverse = False)
-		if len(_asks) > 0:
-			return self._compute_average_margin_purchase_price(price_qty_pairs_ordered = _asks, size = size)
-		return sys.maxsize
+	def _parse_order_book(self, bid_ask_orders):
+		return 	{
+					"bids" : list(map(lambda x: [float(x[0]), float(x[1])], bid_ask_orders["bids"])),
+					"asks" : list(map(lambda x: [float(x[0]), float(x[1])], bid_ask_orders["asks"])),
+				}
+
+	def get_spot_order_book(self, symbol: str, *args, **kwargs):
+		"""
+		Top 100 bids / asks of the spot asset, as [price, size] from the best price
+		"""
+		return self._parse_order_book(bid_ask_orders = self.spot_client.get_part_order(symbol = symbol, pieces = 100))
+
+	def get_futures_order_book(self, symbol: str, *args, **kwargs):
+		"""
+		Top 100 bids / asks of the futures asset, as [price, lot size] from the best price
+		"""
+		return self._parse_order_book(bid_ask_orders = self.futures_client.l2_part_order_book(symbol = symbol, depth = 100))
 
 	def get_spot_average_bid_ask_price(self, symbol: str, size: float):
 		"""
 		Returns the average bid / ask price of the spot asset.
 		Assuming that we buy / sell all the asset at the given volume. 
 		"""
-		bid_ask_orders 		= self.spot_client.get_part_order(symbol = symbol, pieces = 100)
-		bids 				= bid_ask_orders["bids"]
-		bids 				= list(map(lambda x: [float(x[0]), float(x[1])], bids))
-		average_bid_price 	= self._compute_average_bid_price(bids = bids, size = size)
-
-		asks 				= bid_ask_orders["asks"]
-		asks 				= list(map(lambda x: [float(x[0]), float(x[1])], asks))
-		average_sell_price 	= self._compute_average_ask_price(asks = asks, size = size)
+		order_book 			= self.get_spot_order_book(symbol = symbol)
+		average_bid_price 	= self._compute_average_bid_price(bids = order_book["bids"], size = size)
+		average_sell_price 	= self._compute_average_ask_price(asks = order_book["asks"], size = size)
 		return (average_bid_price, average_sell_price)
 
 	def get_futures_average_bid_ask_price(self, symbol: str, size: float):
@@ -171,15 +149,9 @@ class KucoinApiClient(ExchangeSpotClients, ExchangeFutureClients):
 		Returns the average bid / ask price of the futures asset.
 		Assuming that we buy / sell all the asset at the given lot size. 
 		"""
-		# bid_ask_orders 		= self.futures_client.l2_order_book(symbol = symbol)
-		bid_ask_orders 		= self.futures_client.l2_part_order_book(symbol = symbol, depth = 100)
-		bids 				= bid_ask_orders["bids"]
-		bids 				= list(map(lambda x: [float(x[0]), float(x[1])], bids))
-		average_bid_price 	= self._compute_average_bid_price(bids = bids, size = size)
-
-		asks 				= bid_ask_orders["asks"]
-		asks 				= list(map(lambda x: [float(x[0]), float(x[1])], asks))
-		average_sell_price 	= self._compute_average_ask_price(asks = asks, size = size)
+		order_book 			= self.get_futures_order_book(symbol = symbol)
+		average_bid_price 	= self._compute_average_bid_price(bids = order_book["bids"], size = size)
+		average_sell_price 	= self._compute_average_ask_price(asks = order_book["asks"], size = size)
 		return (average_bid_price, average_sell_price)
 
 	def get_spot_open_orders(self, symbol: str):
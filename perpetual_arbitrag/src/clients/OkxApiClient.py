@@ -1,16 +1,17 @@
 import datetime
 import logging
-import sys
+import okx.consts as okx_consts
 from datetime import timedelta
 from okx.Account_api import AccountAPI
 from okx.Market_api import MarketAPI
 from okx.Public_api import PublicAPI
 from okx.Trade_api import TradeAPI
+from clients.ExchangeOrderBookClients import ExchangeOrderBookClients
 from clients.ExchangeSpotClients import ExchangeSpotClients
 from clients.ExchangePerpetualClients import ExchangePerpetualClients
 from clients.ExchangeMarginClients import ExchangeMarginClients
 
-class OkxApiClient(ExchangeSpotClients, ExchangePerpetualClients):
+class OkxApiClient(ExchangeOrderBookClients, ExchangeSpotClients, ExchangePerpetualClients):
 	account_client 	= None
 	trade_client 	= None
 	market_client 	= None
@@ -23,8 +24,13 @@ class OkxApiClient(ExchangeSpotClients, ExchangePerpetualClients):
 						passphrase: str,
 						funding_rate_enable: bool,
 						is_simulated: bool = False,
+						rest_url: str = None,
 				):
 		
+		if rest_url is not None:
+			# The okx sdk reads its base url from a module constant, shared by every client in the process
+			okx_consts.API_URL = rest_url
+
 		self.account_client = AccountAPI(api_key = api_key, 
 										 api_secret_key = api_secret_key, 
 										 passphrase = passphrase,
@@ -56,41 +62,6 @@ class OkxApiClient(ExchangeSpotClients, ExchangePerpetualClients):
 		self.logger.info(f"Enable for funding rate computation set to {funding_rate_enable}")
 		return
 
-	def _compute_average_margin_purchase_price(self, price_qty_pairs_ordered: [float, float], size: float):
-		"""
-		We will read pricing - qty data from the first entry of the list. 
-
-		This logic will differ, depending on whether we want to go long / short on the asset. 
-		As such, the ordering of the price-qty pairs in the list has to be handled properly by the user. 
-		"""
-		all_trade_qty 		= size
-		trade_amt 			= 0
-		executed_trade_qty 	= 0
-		for each_price_qty_pairs in price_qty_pairs_ordered:
-			if all_trade_qty < 0:
-				break
-			else:
-				[price, qty] 	=  each_price_qty_pairs
-				trade_qty 		=  min(all_trade_qty, qty)
-				trade_amt 	 	+= price * trade_qty
-				all_trade_qty 	-= trade_qty
-				executed_trade_qty += trade_qty
-		return trade_amt / executed_trade_qty
-
-	def _compute_average_bid_price(self, bids: [[float, float]], size: float):
-		# Sell into bids starting from the highest to the lowest.
-		_bids 	= sorted(bids, key = lambda x: x[0], reverse = True)
-		if len(_bids) > 0:
-			return self._compute_average_margin_purchase_price(price_qty_pairs_ordered = _bids, size = size)
-		return 0
-
-	def _compute_average_ask_price(self, asks: [[float, float]], size: float):
-		# Buy into asks starting from the lowest to the highest.
-		_asks 	= sorted(asks, key = lambda x: x[0], reverse = False)
-		if len(_asks) > 0:
-			return self._compute_average_margin_purchase_price(price_qty_pairs_ordered = _asks, size = size)
-		return sys.maxsize
-
 	def get_spot_symbols(self):
 		asset_resp = self.public_client.get_instruments(instType = "SPOT")
 		asset_info = asset_resp["data"]
@@ -336,6 +307,26 @@ class OkxApiClient(ExchangeSpotClients, ExchangePerpetualClients):
 		most_recent_fulfilled_order = sorted_orders[0] if len(sorted_orders) > 0 else sorted_orders
 		return most_recent_fulfilled_order
 
+	def get_order_state(self, symbol: str, order_id: str):
+		"""
+		Gets the state of an order, which is one of live, partially_filled, filled or canceled
+
+		Ref: https://www.okx.com/docs-v5/en/#rest-api-trade-get-order-details
+		"""
+		resp = self.trade_client.get_orders(instId = symbol, ordId = order_id)
+		return resp["data"][0]["state"]
+
+	def get_order_details(self, symbol: str, order_id: str = "", client_order_id: str = ""):
+		"""
+		Gets the details of an order by its order id or client order id, or None if the exchange has no such order
+
+		Ref: https://www.okx.com/docs-v5/en/#rest-api-trade-get-order-details
+		"""
+		resp = self.trade_client.get_orders(instId = symbol, ordId = order_id, clOrdId = client_order_id)
+		if resp["code"] == "51603":
+			return None
+		return resp["data"][0]
+
 	def get_perpetual_funding_rate(self, symbol: str):
 		"""
 		Gets the immediate and predicted funding rate for futures contract
@@ -1,30 +1,189 @@
 import asyncio
 import base64
+import functools
 import json
 import hashlib
 import hmac
+import itertools
 import logging
 import websockets
 from datetime import datetime
 from clients.OkxApiClient import OkxApiClient
+from clients.OkxOrderTemplates import OkxOrderTemplate, frame_request
+from feeds.OrderBook import OrderBook
+from feeds.TickTracer import NULL_TRACER
 
 class OkxApiClientWS(OkxApiClient):
+	"""
+	Places orders through the OKX private websocket.
+
+	Every request carries a unique `id`. After login, a single reader task owns the socket and resolves the future 
+	registered for each `id` with the raw reply, so any number of orders can be in flight on one connection.
+
+	If ws_standby is set, a second logged in connection is kept warm in the background. It is swapped in as soon 
+	as the primary drops, so that orders do not wait on a TLS handshake and login.
+
+	Orders are framed from pre-encoded templates cached per combination of fixed order fields. Use 
+	prepare_order_templates at startup so that no template is built on the trade path.
+	"""
 	ws_private_client 	= None
 	ws_private_url 		= "wss://ws.okx.com:8443/ws/v5/private"
+	ping_timeout_s 		= 5
+	reader_task 		= None
+	standby_task 		= None
+	tracer 				= NULL_TRACER
 	logger 				= logging.getLogger('OkxApiClientV2')
 
-	def __init__(self, feed_client, *args, **kwargs):
+	def __init__(self, feed_client, ws_standby: bool = False, ws_private_url: str = None, *args, **kwargs):
 		super(OkxApiClientWS, self).__init__(*args, **kwargs)
 		self.feed_client = feed_client
+		self.ws_standby = ws_standby
+		self.ws_private_url = ws_private_url if ws_private_url is not None else self.ws_private_url
+		# Prevents concurrent tasks from reconnecting at the same time. Created on first use, see _ws_lock
+		self.ws_lock = None
+		self.order_ids = itertools.count()
+		self.pending_replies = {}
+		self.pending_pongs = []
+		self.order_templates = {}
+		self.frame_args_fns = {
+			"spot" 		: self._frame_spot_order_args,
+			"perpetual" : self._frame_perpetual_order_args,
+			"margin" 	: self._frame_margin_order_args,
+		}
 		return
 
+	def _ws_lock(self):
+		# asyncio.Lock binds to the event loop current at construction on python 3.7, so it is created in the running loop
+		if self.ws_lock is None:
+			self.ws_lock = asyncio.Lock()
+		return self.ws_lock
+
 	async def _connect(self):
-		self.ws_private_client = await self._login(api_key = self.api_key, api_secret_key = self.api_secret_key, passphrase = self.passphrase)
+		ws_private_client = await self._take_standby()
+		if ws_private_client is None:
+			ws_private_client = await self._login(api_key = self.api_key, api_secret_key = self.api_secret_key, passphrase = self.passphrase)
+
+		(previous_client, self.ws_private_client) = (self.ws_private_client, ws_private_client)
+		# Replies in flight on the previous connection are failed by its own reader
+		self.pending_replies = {}
+		self.pending_pongs = []
+		self.reader_task = asyncio.ensure_future(self._read_replies(ws_client = self.ws_private_client, pending_replies = self.pending_replies, pending_pongs = self.pending_pongs))
+
+		if previous_client is not None:
+			asyncio.ensure_future(previous_client.close())
+		if self.ws_standby:
+			self._refresh_standby()
+		return
+
+	def _refresh_standby(self):
+		# The next standby logs in off the order path
+		self.standby_task = asyncio.ensure_future(self._login(api_key = self.api_key, api_secret_key = self.api_secret_key, passphrase = self.passphrase))
+		return
+
+	async def _take_standby(self):
+		"""
+		Returns the standby connection, waiting on its login if still in flight, or None if there is no usable standby.
+		"""
+		(standby_task, self.standby_task) = (self.standby_task, None)
+		if standby_task is None:
+			return None
+		try:
+			return await standby_task
+		except Exception as ex:
+			self.logger.error(f"Standby connection unavailable: {ex}")
+			return None
+
+	async def _maintain_standby(self):
+		# OKX drops connections that are silent for 30s, so the standby is pinged along with the primary
+		if self.standby_task is None or not self.standby_task.done():
+			return
+		try:
+			standby_client = self.standby_task.result()
+			await standby_client.send("ping")
+			await asyncio.wait_for(standby_client.recv(), timeout = self.ping_timeout_s)
+		except Exception as ex:
+			self.logger.error(f"Replacing standby connection: {ex}")
+			if self.standby_task.exception() is None:
+				asyncio.ensure_future(self.standby_task.result().close())
+			self._refresh_standby()
 		return
 
+	async def _failover(self, ws_client):
+		async with self._ws_lock():
+			if self.ws_private_client is not ws_client:
+				# Already replaced or closed on purpose
+				return
+			self.logger.error("Private websocket dropped, failing over")
+			try:
+				await self._connect()
+			except Exception as ex:
+				self.logger.error(f"Failover failed, retrying on the next heartbeat: {ex}")
+		return
+
+	async def _read_replies(self, ws_client, pending_replies: dict, pending_pongs: list):
+		"""
+		Demultiplexes replies on the socket into the futures registered by `id`. Pushes without a pending id are dropped.
+		"""
+		try:
+			async for message in ws_client:
+				if message == "pong":
+					if len(pending_pongs) > 0:
+						pending_pongs.pop(0).set_result(message)
+					continue
+
+				reply_id = json.loads(message).get("id")
+				if reply_id in pending_replies:
+					reply = pending_replies.pop(reply_id)
+					reply.set_result(message) if not reply.done() else None
+				else:
+					self.logger.debug(f"Unsolicited message: {message}")
+		except Exception as ex:
+			self.logger.error(f"Private websocket reader stopped: {ex}")
+		finally:
+			for each_reply in list(pending_replies.values()) + pending_pongs:
+				each_reply.set_exception(ConnectionError("Private websocket closed before a reply was received")) if not each_reply.done() else None
+			pending_replies.clear()
+			pending_pongs.clear()
+			if ws_client is self.ws_private_client:
+				asyncio.ensure_future(self._failover(ws_client = ws_client))
+		return
+
+	def _next_order_id(self, prefix: str):
+		# OKX ids are alphanumeric, up to 32 characters
+		return f"{prefix}{next(self.order_ids)}"
+
+	def _assert_reader_alive(self):
+		if self.reader_task is None or self.reader_task.done():
+			raise ConnectionError("Private websocket is not connected")
+		return
+
+	async def _send_frame(self, request_id: str, frame: str):
+		"""
+		Sends an encoded request and returns a future resolved with the raw reply carrying the same `id`.
+
+		Raises only if nothing was written. Once the write has started the request may have reached the exchange, 
+		so a failed write fails the reply instead, as a lost reply.
+		"""
+		self._assert_reader_alive()
+		reply = asyncio.get_event_loop().create_future()
+		self.pending_replies[request_id] = reply
+		try:
+			with self.tracer.span("send"):
+				await self.ws_private_client.send(frame)
+		except Exception as ex:
+			self.pending_replies.pop(request_id, None)
+			reply.set_exception(ConnectionError(f"Reply to {request_id} lost: {ex}")) if not reply.done() else None
+		return reply
+
+	async def _send_request(self, request: dict):
+		return await self._send_frame(request_id = request["id"], frame = json.dumps(request))
+
 	async def _maintain(self):
+		self._assert_reader_alive()
+		pong = asyncio.get_event_loop().create_future()
+		self.pending_pongs.append(pong)
 		await self.ws_private_client.send("ping")
-		resp = await self.ws_private_client.recv()
+		resp = await asyncio.wait_for(pong, timeout = self.ping_timeout_s)
 		self.logger.debug(f"Ping server with resp: {resp}")
 		return
 					
@@ -51,9 +210,8 @@ class OkxApiClientWS(OkxApiClient):
 		else:
 			return ws_private_client
 
-	async def _place_order_async(self, order: dict):
-		await self.ws_private_client.send(json.dumps(order))
-		signed_resp = await self.ws_private_client.recv()
+	async def _place_order_async(self, request_id: str, frame: str):
+		signed_resp = await (await self._send_frame(request_id = request_id, frame = frame))
 		return json.loads(signed_resp)
 
 	def _create_sign(self, timestamp: int, key_secret: str):
@@ -71,42 +229,86 @@ class OkxApiClientWS(OkxApiClient):
 		asyncio.get_event_loop().run_until_complete(self._maintain())
 		return
 
+	async def make_connection_async(self):
+		async with self._ws_lock():
+			await self._connect()
+		return
+
+	async def maintain_connection_async(self):
+		await self._maintain()
+		async with self._ws_lock():
+			await self._maintain_standby()
+		return
+
+	async def close_async(self):
+		(ws_private_client, self.ws_private_client) = (self.ws_private_client, None)
+		standby_client = await self._take_standby()
+		for each_client in [ws_private_client, standby_client]:
+			if each_client is not None:
+				await each_client.close()
+		if self.reader_task is not None:
+			await self.reader_task
+		return
+
+	def _average_bid_ask_price(self, order_book, size: float):
+		# Reuses the depth index cached on the book when the feed hands out OrderBook instances
+		_order_book 		= order_book if isinstance(order_book, OrderBook) else OrderBook(order_book)
+		with self.tracer.span("vwap"):
+			average_bid_price 	= _order_book.average_bid_price(size = size)
+			average_ask_price 	= _order_book.average_ask_price(size = size)
+		updated_ts 			= _order_book["updated"]
+		return (average_bid_price, average_ask_price, updated_ts)
+
 	def get_spot_average_bid_ask_price(self, symbol: str, size: float):
 		"""
 		Returns the average bid / ask price of the spot asset, assuming that we intend to trade at a given volume. 
 		"""
-		order_book 			= self.feed_client.sorted_order_book(exchange = "OKX", symbol = symbol)
-		bids 				= order_book["bids"]
-		average_bid_price 	= self._compute_average_bid_price(bids = bids, size = size)
-		asks 				= order_book["asks"]
-		average_ask_price 	= self._compute_average_ask_price(asks = asks, size = size)
-		updated_ts 			= order_book["updated"]
-		return (average_bid_price, average_ask_price, updated_ts)
+		order_book 			= self.feed_client.sorted_order_book(exchange = "OKX", symbol = symbol, max_size = size)
+		return self._average_bid_ask_price(order_book = order_book, size = size)
 
-	def _frame_spot_order(self, symbol: str, 
-								order_type: str, 
-								order_side: str, 
-								price: float,
-								size: float,
-								target_currency: str):
-		args = {
-			"instId" 	: symbol,
-			"tdMode" 	: "cash",
-			"side" 		: order_side,
-			"ordType" 	: order_type,
-			"sz" 		: size,
-			"tgtCcy" 	: target_currency
-		}
-
-		args["px"] = price if order_type == "limit" else None
-
-		order = {
-			"id" 	: f"SPOT{order_side}",
-			"op" 	: "order",
-			"args" 	: [args]
-		}
+	def get_spot_perpetual_average_bid_ask_price(self, spot_symbol: str, spot_size: float, perpetual_symbol: str, perpetual_size: float):
+		"""
+		Returns the average bid / ask price of the spot and perpetual assets, with both books fetched from the feed in one round trip.
+		"""
+		(spot_order_book, perpetual_order_book) = self.feed_client.sorted_order_books(exchange = "OKX", symbols = [spot_symbol, perpetual_symbol], max_sizes = [spot_size, perpetual_size])
+		return 	(
+					self._average_bid_ask_price(order_book = spot_order_book, size = spot_size),
+					self._average_bid_ask_price(order_book = perpetual_order_book, size = perpetual_size)
+				)
+
+	def _spot_order_template(self, symbol: str, order_type: str, order_side: str, target_currency: str):
+		template_key 	= ("spot", symbol, order_type, order_side, target_currency)
+		template 		= self.order_templates.get(template_key)
+		if template is None:
+			args = {
+				"instId" 	: symbol,
+				"tdMode" 	: "cash",
+				"side" 		: order_side,
+				"ordType" 	: order_type,
+				"tgtCcy" 	: target_currency
+			}
+			if order_type != "limit":
+				args["px"] = None
+			template = self.order_templates[template_key] = OkxOrderTemplate(fixed_args = args, price_format = "number" if order_type == "limit" else None)
+		return template
+
+	def _frame_spot_order_args(self, symbol: str, 
+									 order_type: str, 
+									 order_side: str, 
+									 price: float,
+									 size: float,
+									 target_currency: str,
+									 client_order_id: str = None):
+		template = self._spot_order_template(symbol = symbol, order_type = order_type, order_side = order_side, target_currency = target_currency)
+		return template.frame_args(price = price, size = size, client_order_id = client_order_id)
 
-		return order
+	def _frame_spot_order(self, *args, **kwargs):
+		"""
+		Returns the request id and the encoded order frame.
+		"""
+		request_id = self._next_order_id(prefix = "SPOT")
+		with self.tracer.span("order_framing"):
+			return (request_id, frame_request(request_id = request_id, op = "order", args = [self._frame_spot_order_args(*args, **kwargs)]))
 
 	async def place_spot_order_async(self, 	symbol: str, 
 											order_type: str, 
@@ -114,18 +316,18 @@ class OkxApiClientWS(OkxApiClient):
 											price: float,
 											size: float,
 											target_currency: str,
+											client_order_id: str = None,
 											*args, **kwargs):
 
-		order = self._frame_spot_order(	symbol = symbol,
-										order_type = order_type,
-										order_side = order_side,
-										price = price,
-										size = size,
-										target_currency = target_currency
-									)
-		await self.ws_private_client.send(json.dumps(order))
-		return self.ws_private_client.recv()
-		# return await self._place_order_async(order = order)
+		(request_id, frame) = self._frame_spot_order(	symbol = symbol,
+													order_type = order_type,
+													order_side = order_side,
+													price = price,
+													size = size,
+													target_currency = target_currency,
+													client_order_id = client_order_id
+												)
+		return await self._send_frame(request_id = request_id, frame = frame)
 
 
 	def place_spot_order(self, 	symbol: str, 
@@ -136,14 +338,14 @@ class OkxApiClientWS(OkxApiClient):
 								target_currency: str,
 								*args, **kwargs):
 
-		order = self._frame_spot_order(	symbol = symbol,
-										order_type = order_type,
-										order_side = order_side,
-										price = price,
-										size = size,
-										target_currency = target_currency
-									)
-		return asyncio.get_event_loop().run_until_complete(self._place_order_async(order = order))
+		(request_id, frame) = self._frame_spot_order(	symbol = symbol,
+													order_type = order_type,
+													order_side = order_side,
+													price = price,
+													size = size,
+													target_currency = target_currency
+												)
+		return asyncio.get_event_loop().run_until_complete(self._place_order_async(request_id = request_id, frame = frame))
 
 	def assert_spot_resp_error(self, order_resp):
 		"""
@@ -165,37 +367,41 @@ class OkxApiClientWS(OkxApiClient):
 		"""
 		Returns the average bid / ask price of the perpetual asset, assuming that we intend to trade at a given lot size. 
 		"""
-		order_book 			= self.feed_client.sorted_order_book(exchange = "OKX", symbol = symbol)
-		bids 				= order_book["bids"]
-		average_bid_price 	= self._compute_average_bid_price(bids = bids, size = size)
-		asks 				= order_book["asks"]
-		average_ask_price 	= self._compute_average_ask_price(asks = asks, size = size)
-		updated_ts 			= order_book["updated"]
-		return (average_bid_price, average_ask_price, updated_ts)
-
-	def _frame_perpetual_order(self, symbol: str, 
-									 position_side: str, 
-									 order_type: str, 
-									 order_side: str,
-									 price: float,
-									 size: int):
-		order 	= {
-			"id" 	: f"PERP{order_side}",
-			"op" 	: "order",
-			"args" 	: [
-				{
-					"instId" 	 : symbol,
-					"tdMode" 	 : "cross",
-					"posSide" 	 : position_side,
-					"side" 		 : order_side,
-					"ordType" 	 : order_type,
-					"sz" 		 : size,
-					"px" 		 : str(price),
-					"reduceOnly" : True
-				}
-			]
-		}
-		return order
+		order_book 			= self.feed_client.sorted_order_book(exchange = "OKX", symbol = symbol, max_size = size)
+		return self._average_bid_ask_price(order_book = order_book, size = size)
+
+	def _perpetual_order_template(self, symbol: str, position_side: str, order_type: str, order_side: str):
+		template_key 	= ("perpetual", symbol, position_side, order_type, order_side)
+		template 		= self.order_templates.get(template_key)
+		if template is None:
+			args = {
+				"instId" 	 : symbol,
+				"tdMode" 	 : "cross",
+				"posSide" 	 : position_side,
+				"side" 		 : order_side,
+				"ordType" 	 : order_type,
+				"reduceOnly" : True
+			}
+			template = self.order_templates[template_key] = OkxOrderTemplate(fixed_args = args, price_format = "string")
+		return template
+
+	def _frame_perpetual_order_args(self, symbol: str, 
+										  position_side: str, 
+										  order_type: str, 
+										  order_side: str,
+										  price: float,
+										  size: int,
+										  client_order_id: str = None):
+		template = self._perpetual_order_template(symbol = symbol, position_side = position_side, order_type = order_type, order_side = order_side)
+		return template.frame_args(price = price, size = size, client_order_id = client_order_id)
+
+	def _frame_perpetual_order(self, *args, **kwargs):
+		"""
+		Returns the request id and the encoded order frame.
+		"""
+		request_id = self._next_order_id(prefix = "PERP")
+		with self.tracer.span("order_framing"):
+			return (request_id, frame_request(request_id = request_id, op = "order", args = [self._frame_perpetual_order_args(*args, **kwargs)]))
 
 	async def place_perpetual_order_async(self, symbol: str, 
 												position_side: str, 
@@ -203,18 +409,18 @@ class OkxApiClientWS(OkxApiClient):
 												order_side: str,
 												price: float,
 												size: int,
+												client_order_id: str = None,
 												*args, **kwargs):
 
-		order 	= self._frame_perpetual_order(	symbol = symbol,
-												position_side = position_side, 
-												order_type = order_type,
-												order_side = order_side,
-												price = price, 
-												size = size
-											)
-		await self.ws_private_client.send(json.dumps(order))
-		return self.ws_private_client.recv()
-		# return await self._place_order_async(order = order)
+		(request_id, frame) = self._frame_perpetual_order(	symbol = symbol,
+															position_side = position_side, 
+															order_type = order_type,
+															order_side = order_side,
+															price = price, 
+															size = size,
+															client_order_id = client_order_id
+														)
+		return await self._send_frame(request_id = request_id, frame = frame)
 
 	def place_perpetual_order(self, symbol: str, 
 									position_side: str, 
@@ -224,14 +430,14 @@ class OkxApiClientWS(OkxApiClient):
 									size: int,
 									*args, **kwargs):
 
-		order 	= self._frame_perpetual_order(	symbol = symbol,
-												position_side = position_side, 
-												order_type = order_type,
-												order_side = order_side,
-												price = price, 
-												size = size
-											)
-		return asyncio.get_event_loop().run_until_complete(self._place_order_async(order = order))
+		(request_id, frame) = self._frame_perpetual_order(	symbol = symbol,
+															position_side = position_side, 
+															order_type = order_type,
+															order_side = order_side,
+															price = price, 
+															size = size
+														)
+		return asyncio.get_event_loop().run_until_complete(self._place_order_async(request_id = request_id, frame = frame))
 
 	def assert_perpetual_resp_error(self, order_resp):
 		"""
@@ -255,30 +461,46 @@ class OkxApiClientWS(OkxApiClient):
 		"""
 		return self.get_spot_average_bid_ask_price(symbol = symbol, size = size)
 
-	def _frame_margin_order(self, symbol: str,
-								  ccy: str,
-								  trade_mode: str, 
-								  order_type: str, 
-								  order_side: str, 
-								  price: int,
-								  size: float):
-		order 	= {
-			"id" 	: f"MARGIN{order_side}",
-			"op" 	: "order",
-			"args" 	: [
-				{
-					"instId" 	 : symbol,
-					"ccy" 		 : ccy,
-					"tdMode" 	 : trade_mode,
-					"side" 		 : order_side,
-					"ordType" 	 : order_type,
-					"sz" 		 : size,
-					"px" 		 : str(price),
-					"reduceOnly" : False
-				}
-			]
-		}
-		return order
+	def get_margin_perpetual_average_bid_ask_price(self, margin_symbol: str, margin_size: float, perpetual_symbol: str, perpetual_size: float):
+		"""
+		Returns the average bid / ask price of the margin and perpetual assets, with both books fetched from the feed in one round trip.
+		"""
+		return self.get_spot_perpetual_average_bid_ask_price(spot_symbol = margin_symbol, spot_size = margin_size, 
+															 perpetual_symbol = perpetual_symbol, perpetual_size = perpetual_size)
+
+	def _margin_order_template(self, symbol: str, ccy: str, trade_mode: str, order_type: str, order_side: str):
+		template_key 	= ("margin", symbol, ccy, trade_mode, order_type, order_side)
+		template 		= self.order_templates.get(template_key)
+		if template is None:
+			args = {
+				"instId" 	 : symbol,
+				"ccy" 		 : ccy,
+				"tdMode" 	 : trade_mode,
+				"side" 		 : order_side,
+				"ordType" 	 : order_type,
+				"reduceOnly" : False
+			}
+			template = self.order_templates[template_key] = OkxOrderTemplate(fixed_args = args, price_format = "string")
+		return template
+
+	def _frame_margin_order_args(self, symbol: str,
+									   ccy: str,
+									   trade_mode: str, 
+									   order_type: str, 
+									   order_side: str, 
+									   price: int,
+									   size: float,
+									   client_order_id: str = None):
+		template = self._margin_order_template(symbol = symbol, ccy = ccy, trade_mode = trade_mode, order_type = order_type, order_side = order_side)
+		return template.frame_args(price = price, size = size, client_order_id = client_order_id)
+
+	def _frame_margin_order(self, *args, **kwargs):
+		"""
+		Returns the request id and the encoded order frame.
+		"""
+		request_id = self._next_order_id(prefix = "MARGIN")
+		with self.tracer.span("order_framing"):
+			return (request_id, frame_request(request_id = request_id, op = "order", args = [self._frame_margin_order_args(*args, **kwargs)]))
 
 	async def place_margin_order_async(self, symbol: str,
 											 ccy: str,
@@ -287,18 +509,19 @@ class OkxApiClientWS(OkxApiClient):
 											 order_side: str, 
 											 price: int,
 											 size: float,
+											 client_order_id: str = None,
 											 *args, **kwargs):
 
-		order 	= self._frame_margin_order(	symbol = symbol,
-											ccy = ccy,
-											trade_mode = trade_mode,
-											order_type = order_type,
-											order_side = order_side,
-											price = price,
-											size = size
-										)
-		await self.ws_private_client.send(json.dumps(order))
-		return self.ws_private_client.recv()
+		(request_id, frame) = self._frame_margin_order(	symbol = symbol,
+														ccy = ccy,
+														trade_mode = trade_mode,
+														order_type = order_type,
+														order_side = order_side,
+														price = price,
+														size = size,
+														client_order_id = client_order_id
+													)
+		return await self._send_frame(request_id = request_id, frame = frame)
 
 	def place_margin_order(self, symbol: str,
 								 ccy: str,
@@ -309,15 +532,15 @@ class OkxApiClientWS(OkxApiClient):
 								 size: float,
 								 *args, **kwargs):
 		
-		order 	= self._frame_margin_order(	symbol = symbol,
-											ccy = ccy,
-											trade_mode = trade_mode,
-											order_type = order_type,
-											order_side = order_side,
-											price = price,
-											size = size
-										)
-		return asyncio.get_event_loop().run_until_complete(self._place_order_async(order = order))
+		(request_id, frame) = self._frame_margin_order(	symbol = symbol,
+														ccy = ccy,
+														trade_mode = trade_mode,
+														order_type = order_type,
+														order_side = order_side,
+														price = price,
+														size = size
+													)
+		return asyncio.get_event_loop().run_until_complete(self._place_order_async(request_id = request_id, frame = frame))
 
 	def assert_margin_resp_error(self, order_resp):
 		"""
@@ -333,4 +556,87 @@ class OkxApiClientWS(OkxApiClient):
 
 	async def revert_margin_order_async(self, order_resp, revert_params):
 		self.logger.debug(f"Reverting margin order")
-		return await self.place_margin_order_async(**revert_params)
\ No newline at end of file
+		return await self.place_margin_order_async(**revert_params)
+
+	async def confirm_order_filled_async(self, order_resp: dict, order_params: dict):
+		"""
+		Returns True once the order is filled, False if it can no longer fill, and None while it is still working.
+
+		The order state is queried over REST, off the event loop.
+		"""
+		order_id 	= order_resp["data"][0]["ordId"]
+		state 		= await asyncio.get_event_loop().run_in_executor(None, functools.partial(self.get_order_state, symbol = order_params["symbol"], order_id = order_id))
+		return True if state == "filled" else (False if state == "canceled" else None)
+
+	async def get_order_async(self, order_resp: dict, order_params: dict):
+		"""
+		Returns the exchange details of an order, or None if the exchange has no such order.
+
+		The order is looked up by the ordId of order_resp if given, else by the client_order_id it was placed with.
+		"""
+		lookup 	= {"order_id" : order_resp["data"][0]["ordId"]} if order_resp is not None else {"client_order_id" : order_params["client_order_id"]}
+		return await asyncio.get_event_loop().run_in_executor(None, functools.partial(self.get_order_details, symbol = order_params["symbol"], **lookup))
+
+	async def get_position_async(self, asset_type: str, order_params: dict):
+		"""
+		Returns the signed position held on the symbol of an order, or None for margin orders whose positions are not netted.
+		"""
+		if asset_type == "spot":
+			position_fn = functools.partial(self.get_spot_trading_account_details, currency = order_params["symbol"].split("-")[0])
+		elif asset_type == "perpetual":
+			position_fn = functools.partial(self.get_perpetual_trading_account_details, currency = order_params["symbol"])
+		else:
+			return None
+		return await asyncio.get_event_loop().run_in_executor(None, position_fn)
+
+	async def cancel_order_async(self, order_resp: dict, order_params: dict):
+		"""
+		Cancels a working order and returns the parsed reply to the cancel.
+		"""
+		request_id 	= self._next_order_id(prefix = "CANCEL")
+		frame 		= json.dumps({"id" : request_id, "op" : "cancel-order", "args" : [{"instId" : order_params["symbol"], "ordId" : order_resp["data"][0]["ordId"]}]})
+		return json.loads(await (await self._send_frame(request_id = request_id, frame = frame)))
+
+	def _frame_order_args(self, asset_type: str, params: dict):
+		return self.frame_args_fns[asset_type](**params)
+
+	def _frame_batch_orders(self, legs: list):
+		"""
+		Returns the request id and the encoded batch-orders frame.
+		"""
+		request_id = self._next_order_id(prefix = "BATCH")
+		with self.tracer.span("order_framing"):
+			return (request_id, frame_request(request_id = request_id, op = "batch-orders", args = [self._frame_order_args(asset_type = asset_type, params = params) for (asset_type, params) in legs]))
+
+	def prepare_order_templates(self, legs: list):
+		"""
+		Builds the order templates of a list of (asset_type, params) legs ahead of trading, where asset_type is spot, perpetual or margin.
+
+		Only the fixed fields of params are used. Price and size are filled in when the order is placed.
+		"""
+		for (asset_type, params) in legs:
+			self._frame_order_args(asset_type = asset_type, params = params)
+		return
+
+	async def place_batch_orders_async(self, legs: list):
+		"""
+		Places a list of (asset_type, params) legs in one batch-orders message, where asset_type is spot, perpetual or margin.
+
+		Returns a future resolved with the raw batch reply. Use split_batch_order_resp to obtain the result of each leg.
+		"""
+		(request_id, frame) = self._frame_batch_orders(legs = legs)
+		return await self._send_frame(request_id = request_id, frame = frame)
+
+	def split_batch_order_resp(self, order_resp: dict, legs: int):
+		"""
+		Splits a batch-orders reply into one order reply per leg, in the order the legs were placed.
+
+		Each leg's sCode / sMsg become its code / msg, so that assert_*_resp_error can be applied to it.
+		If the request was rejected as a whole, every leg carries the batch error.
+		"""
+		leg_data = order_resp.get("data", [])
+		if len(leg_data) != legs:
+			# A reply without per-leg results cannot be trusted as a success
+			batch_code = order_resp["code"] if order_resp["code"] != "0" else "1"
+			return [{"id" : order_resp.get("id"), "op" : "order", "code" : batch_code, "msg" : order_resp.get("msg"), "data" : []} for _ in range(legs)]
+		return [{"id" : order_resp.get("id"), "op" : "order", "code" : each_leg["sCode"], "msg" : each_leg["sMsg"], "data" : [each_leg]} for each_leg in leg_data]
\ No newline at end of file
@@ -0,0 +1,442 @@
+import asyncio
+import base64
+import collections
+import hmac
+import itertools
+import json
+import logging
+import random
+import threading
+import time
+import websockets
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+class OkxMockExchange(object):
+	"""
+	Local stand in for the OKX v5 API, used to load and soak test executors and whole bots without network access.
+
+	- private websocket (ws_port, /ws/v5/private) 	: login, order, batch-orders, cancel-order and ping
+	- public websocket (ws_port, /ws/v5/public) 	: books5 snapshots of subscribed instruments, pushed every book_interval_s
+	- REST (rest_port, /api/v5/...) 				: instruments, ticker, books, funding and interest rates, positions, balance,
+													  order details by order id or client order id, leverage and orders
+
+	Instruments are given as {instId : mid price}, with ids ending in -SWAP served as perpetuals and the others as spot / margin.
+	Mid prices random walk by volatility_frac on every book push. Accepted orders fill immediately at the top of the book, 
+	except that limit orders rest unfilled with probability rest_rate, and orders fill only part of their size with probability
+	partial_fill_rate. Partially filled limit orders keep working, partially filled market orders are canceled with the rest.
+
+	Replies to orders are delayed by latency_s plus up to latency_jitter_s. Orders are rejected with probability reject_rate,
+	and the private connection is dropped without a reply with probability disconnect_rate per order request. Outcomes are
+	drawn from a seeded rng so that runs are reproducible. If api_key and api_secret_key are given, logins are verified against them.
+	"""
+	logger = logging.getLogger('OkxMockExchange')
+
+	def __init__(self, 	instruments: dict = None,
+						host: str = "localhost",
+						ws_port: int = 8765,
+						rest_port: int = 8766,
+						latency_s: float = 0,
+						latency_jitter_s: float = 0,
+						reject_rate: float = 0,
+						disconnect_rate: float = 0,
+						rest_rate: float = 0,
+						partial_fill_rate: float = 0,
+						book_interval_s: float = 0.1,
+						book_levels: int = 5,
+						level_size: float = 100,
+						tick_frac: float = 0.0001,
+						volatility_frac: float = 0.0001,
+						api_key: str = None,
+						api_secret_key: str = None,
+						seed: int = 0):
+		self.mids 				= dict(instruments) if instruments is not None else {"BTC-USDT" : 30000.0, "BTC-USDT-SWAP" : 30000.0}
+		self.host 				= host
+		self.ws_port 			= ws_port
+		self.rest_port 			= rest_port
+		self.latency_s 			= latency_s
+		self.latency_jitter_s 	= latency_jitter_s
+		self.reject_rate 		= reject_rate
+		self.disconnect_rate 	= disconnect_rate
+		self.rest_rate 			= rest_rate
+		self.partial_fill_rate 	= partial_fill_rate
+		self.book_interval_s 	= book_interval_s
+		self.book_levels 		= book_levels
+		self.level_size 		= level_size
+		self.tick_frac 			= tick_frac
+		self.volatility_frac 	= volatility_frac
+		self.api_key 			= api_key
+		self.api_secret_key 	= api_secret_key
+		self.rng 				= random.Random(seed)
+		# REST handlers run on their own threads
+		self.state_lock 		= threading.Lock()
+		self.order_ids 			= itertools.count(1)
+		self.orders 			= {}
+		self.positions 			= collections.defaultdict(float)
+		self.leverages 			= {}
+		self.stats 				= collections.Counter()
+		self.loop 				= None
+		self.serve_thread 		= None
+		self.ws_server 			= None
+		self.rest_server 		= None
+		self.stopped 			= None
+		return
+
+	def _inst_type(self, inst_id: str):
+		return "SWAP" if inst_id.endswith("-SWAP") else "SPOT"
+
+	def _delay_s(self):
+		with self.state_lock:
+			return self.latency_s + self.rng.random() * self.latency_jitter_s
+
+	def _roll(self, rate: float):
+		with self.state_lock:
+			return rate > 0 and self.rng.random() < rate
+
+	def _book(self, inst_id: str, depth: int = None):
+		mid 	= self.mids[inst_id]
+		tick 	= mid * self.tick_frac
+		levels 	= range(1, (depth or self.book_levels) + 1)
+		size 	= f"{self.level_size}"
+		return 	{
+					"asks" 	: [[f"{round(mid + level * tick, 8)}", size, "0", "1"] for level in levels],
+					"bids" 	: [[f"{round(mid - level * tick, 8)}", size, "0", "1"] for level in levels],
+					"ts" 	: f"{int(time.time() * 1000)}",
+				}
+
+	def _walk_mids(self):
+		with self.state_lock:
+			for inst_id in self.mids:
+				self.mids[inst_id] *= 1 + self.rng.gauss(0, self.volatility_frac)
+		return
+
+	def _verify_login(self, args: dict):
+		if self.api_key is None or self.api_secret_key is None:
+			return True
+		message = f"{args.get('timestamp')}GET/users/self/verify"
+		sign 	= base64.b64encode(hmac.new(bytes(self.api_secret_key, encoding = "utf8"), bytes(message, encoding = "utf-8"), digestmod = "sha256").digest())
+		return args.get("apiKey") == self.api_key and args.get("sign") == sign.decode("utf-8")
+
+	def _fill_order(self, args: dict):
+		"""
+		Fills one order and returns its result, in the format of an entry of the data of an OKX order reply.
+		"""
+		result = {"clOrdId" : args.get("clOrdId", ""), "ordId" : "", "tag" : "", "sCode" : "0", "sMsg" : ""}
+		if args.get("instId") not in self.mids:
+			return {**result, "sCode" : "51001", "sMsg" : "Instrument ID does not exist."}
+		if args.get("side") not in {"buy", "sell"} or float(args.get("sz", 0)) <= 0:
+			return {**result, "sCode" : "51000", "sMsg" : "Parameter sz error"}
+		if self._roll(self.reject_rate):
+			self.stats["rejects"] += 1
+			return {**result, "sCode" : "51008", "sMsg" : "Order placement failed due to insufficient balance"}
+
+		limit_order 	= args.get("ordType", "market") != "market"
+		(state, filled) = ("live", 0) if limit_order and self._roll(self.rest_rate) else ("filled", 1)
+		if state == "filled" and self._roll(self.partial_fill_rate):
+			with self.state_lock:
+				(state, filled) = ("partially_filled" if limit_order else "canceled", self.rng.uniform(0.1, 0.9))
+
+		with self.state_lock:
+			order_id 	= f"{next(self.order_ids)}"
+			inst_id 	= args["instId"]
+			tick 		= self.mids[inst_id] * self.tick_frac
+			fill_price 	= self.mids[inst_id] + tick if args["side"] == "buy" else self.mids[inst_id] - tick
+			size 		= float(args["sz"])
+			fill_size 	= round(size * filled, 8)
+			pos_side 	= args.get("posSide", "net")
+			signed_size = fill_size if args["side"] == "buy" else -1 * fill_size
+			# Buys reduce a short position, so the short side is tracked as a positive size
+			self.positions[(inst_id, args.get("tdMode", "cash"), pos_side)] += -1 * signed_size if pos_side == "short" else signed_size
+			self.orders[order_id] = {
+				"instId" 	: inst_id,
+				"instType" 	: self._inst_type(inst_id) if args.get("tdMode", "cash") == "cash" or inst_id.endswith("-SWAP") else "MARGIN",
+				"ordId" 	: order_id,
+				"clOrdId" 	: result["clOrdId"],
+				"side" 		: args["side"],
+				"posSide" 	: pos_side,
+				"ordType" 	: args.get("ordType", "market"),
+				"sz" 		: f"{size}",
+				"accFillSz" : f"{fill_size}",
+				"avgPx" 	: f"{fill_price}" if fill_size > 0 else "",
+				"state" 	: state,
+				"uTime" 	: f"{int(time.time() * 1000)}",
+			}
+			self.stats["fills" if state == "filled" else state] += 1
+		return {**result, "ordId" : order_id}
+
+	def _cancel_order(self, args: dict):
+		with self.state_lock:
+			order = self.orders.get(args.get("ordId"))
+			if order is None or order["state"] not in {"live", "partially_filled"}:
+				return {"clOrdId" : "", "ordId" : args.get("ordId", ""), "sCode" : "51400", "sMsg" : "Cancellation failed as the order does not exist or has been filled."}
+			order["state"] = "canceled"
+			return {"clOrdId" : order["clOrdId"], "ordId" : order["ordId"], "sCode" : "0", "sMsg" : ""}
+
+	def _order_reply(self, request_id: str, op: str, results: list):
+		failed 	= sum(1 for each_result in results if each_result["sCode"] != "0")
+		code 	= "0" if failed == 0 else ("1" if failed == len(results) else "2")
+		return {"id" : request_id, "op" : op, "data" : results, "code" : code, "msg" : "" if code == "0" else "Operation failed."}
+
+	def handle_order_request(self, request: dict):
+		"""
+		Returns the reply to an order, batch-orders or cancel-order request, as sent over the private websocket.
+		"""
+		op 		= request.get("op")
+		args 	= request.get("args", [])
+		self.stats[op] += 1
+		if op in {"order", "batch-orders"}:
+			return self._order_reply(request_id = request.get("id"), op = op, results = [self._fill_order(args = each_args) for each_args in args])
+		elif op == "cancel-order":
+			return self._order_reply(request_id = request.get("id"), op = op, results = [self._cancel_order(args = each_args) for each_args in args])
+		return {"id" : request.get("id"), "event" : "error", "code" : "60012", "msg" : f"Invalid request: {op}"}
+
+	async def _reply(self, ws_client, request: dict):
+		await asyncio.sleep(self._delay_s())
+		try:
+			await ws_client.send(json.dumps(self.handle_order_request(request = request)))
+		except websockets.ConnectionClosed:
+			# Replies in flight are lost with the connection
+			pass
+		return
+
+	async def _serve_private(self, ws_client):
+		logged_in = False
+		async for message in ws_client:
+			if message == "ping":
+				self.stats["pings"] += 1
+				await ws_client.send("pong")
+				continue
+
+			request = json.loads(message)
+			if request.get("op") == "login":
+				logged_in = len(request.get("args", [])) == 1 and self._verify_login(args = request["args"][0])
+				self.stats["logins" if logged_in else "failed_logins"] += 1
+				await ws_client.send(json.dumps({"event" : "login", "code" : "0", "msg" : ""} if logged_in else {"event" : "error", "code" : "60009", "msg" : "Login failed."}))
+			elif not logged_in:
+				await ws_client.send(json.dumps({"id" : request.get("id"), "event" : "error", "code" : "60011", "msg" : "Please log in"}))
+			elif self._roll(self.disconnect_rate):
+				self.stats["disconnects"] += 1
+				await ws_client.close()
+				return
+			else:
+				# Orders in flight are answered independently, as on the exchange
+				asyncio.ensure_future(self._reply(ws_client = ws_client, request = request))
+		return
+
+	async def _push_books(self, ws_client, subscriptions: set):
+		while True:
+			await asyncio.sleep(self.book_interval_s)
+			for inst_id in list(subscriptions):
+				await ws_client.send(json.dumps({"arg" : {"channel" : "books5", "instId" : inst_id}, "data" : [self._book(inst_id = inst_id)]}))
+
+	async def _serve_public(self, ws_client):
+		subscriptions 	= set()
+		push_task 		= asyncio.ensure_future(self._push_books(ws_client = ws_client, subscriptions = subscriptions))
+		try:
+			async for message in ws_client:
+				if message == "ping":
+					await ws_client.send("pong")
+					continue
+
+				request = json.loads(message)
+				for each_arg in request.get("args", []):
+					if each_arg.get("channel") != "books5" or each_arg.get("instId") not in self.mids:
+						await ws_client.send(json.dumps({"event" : "error", "code" : "60018", "msg" : f"Unsupported subscription {each_arg}"}))
+						continue
+					if request.get("op") == "subscribe":
+						subscriptions.add(each_arg["instId"])
+						await ws_client.send(json.dumps({"event" : "subscribe", "arg" : each_arg}))
+						await ws_client.send(json.dumps({"arg" : each_arg, "data" : [self._book(inst_id = each_arg["instId"])]}))
+					elif request.get("op") == "unsubscribe":
+						subscriptions.discard(each_arg["instId"])
+						await ws_client.send(json.dumps({"event" : "unsubscribe", "arg" : each_arg}))
+		finally:
+			push_task.cancel()
+		return
+
+	async def _serve_ws(self, ws_client, path: str):
+		try:
+			if path.startswith("/ws/v5/private"):
+				await self._serve_private(ws_client = ws_client)
+			elif path.startswith("/ws/v5/public"):
+				await self._serve_public(ws_client = ws_client)
+			else:
+				await ws_client.close(code = 4004, reason = f"Unknown path {path}")
+		except websockets.ConnectionClosed:
+			pass
+		return
+
+	async def _walk_books(self):
+		while True:
+			await asyncio.sleep(self.book_interval_s)
+			self._walk_mids()
+
+	def _rest_response(self, path: str, query: dict, body):
+		"""
+		Returns the (status, payload) of a REST request. Only the fields read by OkxApiClient are filled in.
+		"""
+		if path == "/api/v5/trade/order" and body is not None:
+			return (200, self._order_reply(request_id = None, op = "order", results = [self._fill_order(args = body)]))
+		elif path == "/api/v5/trade/batch-orders":
+			return (200, self._order_reply(request_id = None, op = "batch-orders", results = [self._fill_order(args = each_args) for each_args in body]))
+		elif path == "/api/v5/trade/cancel-order":
+			return (200, self._order_reply(request_id = None, op = "cancel-order", results = [self._cancel_order(args = body)]))
+		elif path == "/api/v5/account/set-leverage":
+			self.leverages[(body.get("instId"), body.get("ccy"))] = body.get("lever")
+			return (200, {"code" : "0", "msg" : "", "data" : [body]})
+
+		inst_id = query.get("instId")
+		if path == "/api/v5/trade/order":
+			order = self._order(order_id = query.get("ordId"), client_order_id = query.get("clOrdId"))
+			return (200, {"code" : "0", "msg" : "", "data" : [order]} if order is not None else {"code" : "51603", "msg" : "Order does not exist", "data" : []})
+		elif path in {"/api/v5/market/ticker", "/api/v5/market/books", "/api/v5/public/funding-rate"} and inst_id not in self.mids:
+			return (200, {"code" : "51001", "msg" : "Instrument ID does not exist.", "data" : []})
+		elif path == "/api/v5/market/ticker":
+			book = self._book(inst_id = inst_id, depth = 1)
+			return (200, {"code" : "0", "msg" : "", "data" : [{"instId" : inst_id, "last" : f"{self.mids[inst_id]}", "bidPx" : book["bids"][0][0], "askPx" : book["asks"][0][0], "ts" : book["ts"]}]})
+		elif path == "/api/v5/market/books":
+			return (200, {"code" : "0", "msg" : "", "data" : [self._book(inst_id = inst_id, depth = int(query.get("sz", self.book_levels)))]})
+		elif path == "/api/v5/public/instruments":
+			inst_type 	= query.get("instType")
+			inst_ids 	= [each_id for each_id in self.mids if (self._inst_type(each_id) == "SWAP") == (inst_type == "SWAP") and inst_id in {None, each_id}]
+			return (200, {"code" : "0", "msg" : "", "data" : [self._instrument(inst_id = each_id, inst_type = inst_type) for each_id in inst_ids]})
+		elif path == "/api/v5/public/funding-rate":
+			return (200, {"code" : "0", "msg" : "", "data" : [{"instId" : inst_id, "fundingRate" : "0.0001", "nextFundingRate" : "0.0001"}]})
+		elif path == "/api/v5/public/interest-rate-loan-quota":
+			currencies = sorted({each_ccy for each_id in self.mids for each_ccy in each_id.split("-")[:2]})
+			return (200, {"code" : "0", "msg" : "", "data" : [{"basic" : [{"ccy" : each_ccy, "rate" : "0.0002", "quota" : "1000000"} for each_ccy in currencies]}]})
+		elif path == "/api/v5/account/positions":
+			return (200, {"code" : "0", "msg" : "", "data" : self._positions(inst_type = query.get("instType"), inst_id = inst_id)})
+		elif path == "/api/v5/account/balance":
+			return (200, {"code" : "0", "msg" : "", "data" : [{"details" : [{"ccy" : query.get("ccy", "USDT"), "eq" : f"{self._balance(ccy = query.get('ccy', 'USDT'))}"}]}]})
+		return (404, {"code" : "50000", "msg" : f"Unsupported path {path}", "data" : []})
+
+	def _order(self, order_id: str = None, client_order_id: str = None):
+		with self.state_lock:
+			if order_id:
+				return self.orders.get(order_id)
+			# Client order ids are only unique among live orders, the latest order placed with the id is returned
+			matches = [each_order for each_order in self.orders.values() if client_order_id and each_order["clOrdId"] == client_order_id]
+			return matches[-1] if len(matches) > 0 else None
+
+	def _balance(self, ccy: str):
+		# Starts every currency at 1000000, moved by the spot orders filled on its instruments
+		with self.state_lock:
+			return 1000000 + sum(size for ((each_id, trade_mode, _), size) in self.positions.items() if trade_mode == "cash" and each_id.split("-")[0] == ccy and not each_id.endswith("-SWAP"))
+
+	def _instrument(self, inst_id: str, inst_type: str):
+		(base_ccy, quote_ccy) = inst_id.split("-")[:2]
+		return 	{
+					"instId" 	: inst_id,
+					"instType" 	: inst_type,
+					"baseCcy" 	: base_ccy if inst_type != "SWAP" else "",
+					"quoteCcy" 	: quote_ccy if inst_type != "SWAP" else "",
+					"uly" 		: f"{base_ccy}-{quote_ccy}" if inst_type == "SWAP" else "",
+					"ctVal" 	: "0.01" if inst_type == "SWAP" else "",
+					"minSz" 	: "1" if inst_type == "SWAP" else "0.00001",
+					"lotSz" 	: "1" if inst_type == "SWAP" else "0.00000001",
+					"tickSz" 	: "0.1",
+					"state" 	: "live",
+				}
+
+	def _positions(self, inst_type: str, inst_id: str):
+		positions = []
+		with self.state_lock:
+			for ((each_id, trade_mode, pos_side), size) in self.positions.items():
+				each_type = "SWAP" if each_id.endswith("-SWAP") else ("MARGIN" if trade_mode != "cash" else "SPOT")
+				if each_type == "SPOT" or inst_type not in {None, each_type} or inst_id not in {None, each_id}:
+					continue
+				positions.append({	"instId" 	: each_id,
+									"instType" 	: each_type,
+									"mgnMode" 	: trade_mode,
+									"posSide" 	: pos_side,
+									"pos" 		: f"{size}",
+									"availPos" 	: f"{abs(size)}",
+									"ccy" 		: each_id.split("-")[1],
+									"posCcy" 	: "",
+									"liab" 		: "0"})
+		return positions
+
+	def _rest_handler(self):
+		exchange = self
+
+		class OkxMockRestHandler(BaseHTTPRequestHandler):
+			def _respond(self, body):
+				time.sleep(exchange._delay_s())
+				request 		= urlparse(self.path)
+				query 			= {key : values[0] for (key, values) in parse_qs(request.query).items()}
+				(status, resp) 	= exchange._rest_response(path = request.path, query = query, body = body)
+				payload 		= json.dumps(resp).encode("utf-8")
+				self.send_response(status)
+				self.send_header("Content-Type", "application/json")
+				self.send_header("Content-Length", f"{len(payload)}")
+				self.end_headers()
+				self.wfile.write(payload)
+				return
+
+			def do_GET(self):
+				self._respond(body = None)
+				return
+
+			def do_POST(self):
+				length = int(self.headers.get("Content-Length", 0))
+				self._respond(body = json.loads(self.rfile.read(length)) if length > 0 else {})
+				return
+
+			def log_message(self, *args):
+				return
+
+		return OkxMockRestHandler
+
+	async def _serve(self, started: threading.Event):
+		self.stopped 		= asyncio.Event()
+		self.ws_server 		= await websockets.serve(self._serve_ws, self.host, self.ws_port)
+		self.ws_port 		= self.ws_server.sockets[0].getsockname()[1]
+		self.rest_server 	= ThreadingHTTPServer((self.host, self.rest_port), self._rest_handler())
+		self.rest_port 		= self.rest_server.server_address[1]
+		threading.Thread(target = self.rest_server.serve_forever, daemon = True).start()
+		walk_task 			= asyncio.ensure_future(self._walk_books())
+		started.set()
+		self.logger.info(f"Mock OKX exchange serving websockets on ws://{self.host}:{self.ws_port} and REST on http://{self.host}:{self.rest_port}")
+
+		await self.stopped.wait()
+		walk_task.cancel()
+		self.rest_server.shutdown()
+		self.rest_server.server_close()
+		self.ws_server.close()
+		await self.ws_server.wait_closed()
+		return
+
+	@property
+	def ws_private_url(self):
+		return f"ws://{self.host}:{self.ws_port}/ws/v5/private"
+
+	@property
+	def ws_public_url(self):
+		return f"ws://{self.host}:{self.ws_port}/ws/v5/public"
+
+	@property
+	def rest_url(self):
+		return f"http://{self.host}:{self.rest_port}"
+
+	def start(self):
+		"""
+		Starts serving from a background thread and returns once both servers are listening. Port 0 picks a free port.
+		"""
+		if self.serve_thread is None:
+			started 			= threading.Event()
+			self.loop 			= asyncio.new_event_loop()
+			self.serve_thread 	= threading.Thread(target = self.loop.run_until_complete, args = (self._serve(started = started),), daemon = True)
+			self.serve_thread.start()
+			assert started.wait(timeout = 10), "Mock exchange failed to start"
+		return self
+
+	def stop(self):
+		if self.serve_thread is not None:
+			self.loop.call_soon_threadsafe(self.stopped.set)
+			self.serve_thread.join()
+			self.serve_thread = None
+		return
+
+	def summary(self):
+		return dict(self.stats)
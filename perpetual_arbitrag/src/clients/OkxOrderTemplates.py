@@ -0,0 +1,35 @@
+import json
+
+class OkxOrderTemplate(object):
+	"""
+	Pre-encoded args of an OKX order for one combination of fixed fields (symbol, side, position side, trade mode ...).
+
+	Fixed fields are serialized once when the template is built. At trade time only size and price are encoded
+	and spliced in, so framing an order is a handful of string concatenations instead of a json.dumps of nested dicts.
+
+	price_format is one of
+	- number : px is sent as a JSON number
+	- string : px is sent as a JSON string, as required for perpetual and margin orders
+	- None 	 : px is not patched at trade time and has to be part of fixed_args
+	"""
+	def __init__(self, fixed_args: dict, price_format: str = "string"):
+		assert price_format in {"number", "string", None}, f"Unknown price format {price_format}"
+		# Drops the closing brace, so that size and price can be appended to the encoded fields
+		self.args_head 		= json.dumps(fixed_args, separators = (",", ":"))[:-1]
+		self.price_format 	= price_format
+		return
+
+	def frame_args(self, price: float, size: float, client_order_id: str = None):
+		# Client order ids are alphanumeric, as request ids
+		encoded_size 	= json.dumps(size) if client_order_id is None else f'{json.dumps(size)},"clOrdId":"{client_order_id}"'
+		if self.price_format == "number":
+			return f'{self.args_head},"sz":{encoded_size},"px":{json.dumps(price)}}}'
+		elif self.price_format == "string":
+			return f'{self.args_head},"sz":{encoded_size},"px":"{price}"}}'
+		return f'{self.args_head},"sz":{encoded_size}}}'
+
+def frame_request(request_id: str, op: str, args: list):
+	"""
+	Encodes a request from already encoded args. OKX request ids are alphanumeric and never need escaping.
+	"""
+	return f'{{"id":"{request_id}","op":"{op}","args":[{",".join(args)}]}}'
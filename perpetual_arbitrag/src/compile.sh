@@ -11,6 +11,9 @@ docker build -t jkok005/okx-spot-perp-arb:$version -f ./main/intra_exchange/okx/
 echo "Compiling Okx margin-perp bot"
 docker build -t jkok005/okx-margin-perp-arb:$version -f ./main/intra_exchange/okx/margin_perp/Dockerfile .
 
+echo "Compiling Okx multi-pair bot"
+docker build -t jkok005/okx-multi-pair-arb:$version -f ./main/intra_exchange/okx/multi_pair/Dockerfile .
+
 echo "Compiling arbitrag bot manager"
 docker build -t jkok005/arb-bot-manager:$version -f ./main/general/intra_exchange/Dockerfile .
 
@@ -22,3 +25,12 @@ docker build -t jkok005/log-listener:$version -f ./main/general/listeners/Docker
 
 echo "Compiling asset names listing"
 docker build -t jkok005/asset-names-listing:$version -f ./main/general/listings/Dockerfile .
+
+echo "Compiling order book pruner"
+docker build -t jkok005/book-pruner:$version -f ./main/general/pruner/Dockerfile .
+
+echo "Compiling order book writer"
+docker build -t jkok005/book-writer:$version -f ./main/general/book_writer/Dockerfile .
+
+echo "Compiling order book recorder"
+docker build -t jkok005/book-recorder:$version -f ./main/general/recorder/Dockerfile .
@@ -56,10 +56,13 @@ class AssetClient(metaclass = ABCMeta):
 	def new_table(self):
 		pass
 
-	def create_session(self):
+	def create_session(self, engine = None):
+		"""
+		engine may be shared between clients, e.g. by many pairs trading in one process. If None, a new engine is created
+		"""
 		# Do not invoke this part for testing
-		engine 			= create_engine(self.db_url, echo = False)
-		self.session 	= sessionmaker(engine)
+		_engine 		= create_engine(self.db_url, echo = False) if engine is None else engine
+		self.session 	= sessionmaker(_engine)
 		return self
 
 	def modify_entry(self, entry, attribute, new_value):
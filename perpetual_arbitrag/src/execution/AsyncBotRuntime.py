@@ -0,0 +1,135 @@
+import asyncio
+import functools
+import logging
+import time
+from feeds.TickTracer import NULL_TRACER
+
+class AsyncBotRuntime(object):
+	"""
+	Runs a bot on one persistent event loop, with each concern as a concurrent task:
+
+	- feed 		: waits for new books and wakes up the evaluation task. When books are pushed, poll_interval_s is only the longest
+				  time the bot stays idle without updates. When the feed is polled, the task wakes up every poll_interval_s
+	- evaluate 	: runs one strategy evaluation, including order placement, per wake up. Evaluations start at least
+				  min_eval_interval_s apart, and wake ups in between are coalesced into the next evaluation
+	- refresh 	: if a refresh_fn is given, runs it every refresh_interval_s to re-read slow inputs such as funding rates,
+				  and wakes up the evaluation task when it returns True (inputs changed)
+	- heartbeat : pings the private websocket (and its standby, if any) every heartbeat_interval_s and reconnects on failure
+
+	Evaluations that raise are logged and retried after retry_timeout_s, except for exceptions listed in fatal_exceptions, 
+	which stop every task and are re-raised from `run`.
+
+	If a tracer is given, each evaluation is traced as one tick, timed from the wake up by the feed task. 
+	The value returned by evaluate_fn is recorded as the decision of the tick.
+	"""
+	logger = logging.getLogger('AsyncBotRuntime')
+
+	def __init__(self, 	api_client, 
+						feed_client,
+						evaluate_fn,
+						poll_interval_s: float,
+						heartbeat_interval_s: float,
+						retry_timeout_s: float,
+						feed_push: bool,
+						fatal_exceptions: tuple = (),
+						tracer = NULL_TRACER,
+						min_eval_interval_s: float = 0,
+						refresh_fn = None,
+						refresh_interval_s: float = None):
+		self.api_client 			= api_client
+		self.feed_client 			= feed_client
+		self.evaluate_fn 			= evaluate_fn
+		self.poll_interval_s 		= poll_interval_s
+		self.heartbeat_interval_s 	= heartbeat_interval_s
+		self.retry_timeout_s 		= retry_timeout_s
+		self.feed_push 				= feed_push
+		self.fatal_exceptions 		= fatal_exceptions
+		self.tracer 				= tracer
+		self.min_eval_interval_s 	= min_eval_interval_s
+		self.refresh_fn 			= refresh_fn
+		self.refresh_interval_s 	= refresh_interval_s
+		self.tick 					= None
+		self.woken 					= None
+		return
+
+	async def _throttle(self, last_evaluated: float):
+		wait_s = last_evaluated + self.min_eval_interval_s - time.perf_counter() if last_evaluated is not None else 0
+		if wait_s > 0:
+			await asyncio.sleep(wait_s)
+		return time.perf_counter()
+
+	async def _feed_task(self):
+		loop = asyncio.get_event_loop()
+		while True:
+			if self.feed_push:
+				# wait_for_update blocks on a threading.Condition notified by the feed's own thread. Cancelling this task does
+				# not interrupt it, so `run` wakes it up on exit
+				await loop.run_in_executor(None, functools.partial(self.feed_client.wait_for_update, timeout_s = self.poll_interval_s))
+			else:
+				await asyncio.sleep(self.poll_interval_s)
+			if not self.tick.is_set():
+				self.woken = time.perf_counter()
+			self.tick.set()
+
+	async def _evaluate_task(self):
+		last_evaluated = None
+		while True:
+			await self.tick.wait()
+			last_evaluated = await self._throttle(last_evaluated = last_evaluated)
+			self.tick.clear()
+			self.tracer.start_tick(woken = self.woken)
+			try:
+				self.tracer.end_tick(decision = await self.evaluate_fn())
+			except self.fatal_exceptions:
+				raise
+			except Exception as ex:
+				self.tracer.end_tick(decision = "error")
+				self.logger.error(ex)
+				await asyncio.sleep(self.retry_timeout_s)
+
+	async def _refresh_task(self):
+		loop = asyncio.get_event_loop()
+		while True:
+			await asyncio.sleep(self.refresh_interval_s)
+			try:
+				changed = await loop.run_in_executor(None, self.refresh_fn)
+			except Exception as ex:
+				self.logger.error(f"Refreshing inputs failed, retrying on the next refresh: {ex}")
+				continue
+			if changed and not self.tick.is_set():
+				self.woken = time.perf_counter()
+				self.tick.set()
+
+	async def _heartbeat_task(self):
+		while True:
+			await asyncio.sleep(self.heartbeat_interval_s)
+			try:
+				await self.api_client.maintain_connection_async()
+			except Exception as ex:
+				self.logger.error(f"Restoring connection to WS server: {ex}")
+				try:
+					await self.api_client.make_connection_async()
+				except Exception as ex:
+					self.logger.error(f"Reconnection failed, retrying on the next heartbeat: {ex}")
+
+	async def run(self):
+		self.tick = asyncio.Event()
+		self.tick.set()
+		tasks = [asyncio.ensure_future(each_task()) for each_task in [self._feed_task, self._evaluate_task, self._heartbeat_task]] + \
+				([asyncio.ensure_future(self._refresh_task())] if self.refresh_fn is not None else [])
+		try:
+			(done, _) = await asyncio.wait(tasks, return_when = asyncio.FIRST_EXCEPTION)
+			for each_task in done:
+				each_task.result()
+		finally:
+			for each_task in tasks:
+				each_task.cancel()
+			if self.feed_push:
+				self.feed_client.wake_waiters()
+		return
+
+	def run_forever(self):
+		"""
+		Blocks on the runtime, using the same event loop as the websocket connection made by the api client.
+		"""
+		return asyncio.get_event_loop().run_until_complete(self.run())
\ No newline at end of file
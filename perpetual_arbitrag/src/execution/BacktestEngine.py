@@ -0,0 +1,300 @@
+import logging
+import numpy as np
+import time
+from strategies.MarginPerpArbitrag import MarginPerpArbitrag
+from strategies.SingleTradeArbitragV2 import ExecutionDecision
+from strategies.SpotPerpArbitrag import SpotPerpArbitrag
+
+class BacktestEngine(object):
+	"""
+	Replays the aligned ticks of a `PairBookReplay` through a SpotPerpArbitrag or MarginPerpArbitrag strategy.
+
+	The strategy object is the one the bots trade with, and keeps the positions of the backtest. To skip the ticks where
+	nothing can be traded, decisions are first computed for windows of ticks with the batch_trade_decision of the
+	strategy class, at the current positions. The strategy's own trade_decision is then asked at the first tick where
+	a trade could happen, and its decision is executed as the bots would:
+
+	- Both legs fill at the average price of their entry size, against the books at the decision (or fill_delay_s later).
+	  Books too thin to fill the entry size are dropped by the replay, so that every trade is a full entry
+	- Spot pairs only trade the decisions that do not short spot, margin pairs trade all of them
+	- fee_rate is charged on the notional of both legs
+
+	Perpetual funding is settled on the perpetual position at every funding snapshot time, and margin positions pay
+	interest for as long as they are held, at the quote rate when long and the base rate when short. Decisions see the
+	funding and interest rates as the bots do, non zero only within the funding intervals before each snapshot.
+
+	Trades, exposure samples (every sample_interval_s and after each trade) and a summary of the PnL are kept.
+	"""
+	logger = logging.getLogger('BacktestEngine')
+
+	def __init__(self, 	strategy,
+						entry_gap_frac: float,
+						profit_taking_frac: float,
+						asset_entry_vol: float,
+						perpetual_entry_lot_size: float,
+						perpetual_contract_size: float = 1,
+						fee_rate: float = 0,
+						funding_history: tuple = None,
+						current_funding_interval_s: float = 0,
+						estimated_funding_interval_s: float = 0,
+						funding_snapshot_times: tuple = ("00:00", "08:00", "16:00"),
+						margin_quote_daily_rate: float = 0,
+						margin_base_daily_rate: float = 0,
+						margin_loan_period_hr: int = 0,
+						fill_delay_s: float = 0,
+						sample_interval_s: float = 3600,
+						window: int = 4096):
+		"""
+		strategy 			- SpotPerpArbitrag or MarginPerpArbitrag, with the starting positions of the backtest
+		funding_history 	- (timestamps, funding rates, estimated funding rates) arrays, as published at each timestamp.
+							  If None, funding is zero
+		"""
+		assert isinstance(strategy, (SpotPerpArbitrag, MarginPerpArbitrag)), f"Unsupported strategy {type(strategy).__name__}"
+		self.strategy 						= strategy
+		self.is_margin 						= isinstance(strategy, MarginPerpArbitrag)
+		self.entry_gap_frac 				= entry_gap_frac
+		self.profit_taking_frac 			= profit_taking_frac
+		self.asset_entry_vol 				= asset_entry_vol
+		self.perpetual_entry_lot_size 		= perpetual_entry_lot_size
+		self.perpetual_contract_size 		= perpetual_contract_size
+		self.fee_rate 						= fee_rate
+		self.funding_history 				= funding_history if funding_history is not None else (np.zeros(0), np.zeros(0), np.zeros(0))
+		self.current_funding_interval_s 	= current_funding_interval_s
+		self.estimated_funding_interval_s 	= estimated_funding_interval_s
+		self.funding_snapshot_s 			= np.array(sorted(int(h) * 3600 + int(m) * 60 for (h, m) in (each.split(":") for each in funding_snapshot_times)), dtype = np.float64)
+		self.margin_quote_daily_rate 		= margin_quote_daily_rate
+		self.margin_base_daily_rate 		= margin_base_daily_rate
+		# Effective interest rates seen by decisions, compounded hourly over the loan period as by the exchange clients
+		self.margin_quote_interest_rate 	= (1 + margin_quote_daily_rate / 24) ** margin_loan_period_hr - 1
+		self.margin_base_interest_rate 		= (1 + margin_base_daily_rate / 24) ** margin_loan_period_hr - 1
+		self.fill_delay_s 					= fill_delay_s
+		self.sample_interval_s 				= sample_interval_s
+		self.window 						= window
+		# Spot cannot be shorted, so spot pairs only open long spot and take profit on it
+		self.tradable_codes 				= 	[ExecutionDecision.GO_LONG_A_SHORT_B.value, ExecutionDecision.TAKE_PROFIT_LONG_A_SHORT_B.value] if not self.is_margin else \
+												[ExecutionDecision.GO_LONG_A_SHORT_B.value, ExecutionDecision.GO_LONG_B_SHORT_A.value,
+												 ExecutionDecision.TAKE_PROFIT_LONG_A_SHORT_B.value, ExecutionDecision.TAKE_PROFIT_LONG_B_SHORT_A.value]
+		self.trades 						= []
+		self.exposures 						= []
+		self.totals 						= {"fees" : 0, "funding" : 0, "interest" : 0}
+		self.cash 							= 0
+		return
+
+	def _funding_rates_at(self, timestamps):
+		(funding_ts, funding_rates, estimated_funding_rates) = self.funding_history
+		idx 	= np.searchsorted(funding_ts, timestamps, side = "right") - 1
+		known 	= idx >= 0
+		return 	(	np.where(known, np.asarray(funding_rates)[np.maximum(idx, 0)] if len(funding_ts) > 0 else 0, 0),
+					np.where(known, np.asarray(estimated_funding_rates)[np.maximum(idx, 0)] if len(funding_ts) > 0 else 0, 0))
+
+	def _seconds_to_snapshot(self, timestamps):
+		seconds_of_day = np.mod(timestamps, 86400)
+		return np.min(np.mod(self.funding_snapshot_s[None, :] - seconds_of_day[:, None], 86400), axis = 1)
+
+	def _effective_funding_rates(self, timestamps):
+		(funding_rates, estimated_funding_rates) = self._funding_rates_at(timestamps = timestamps)
+		seconds_to_snapshot = self._seconds_to_snapshot(timestamps = timestamps)
+		return 	(	np.where(seconds_to_snapshot <= self.current_funding_interval_s, funding_rates, 0),
+					np.where(seconds_to_snapshot <= self.estimated_funding_interval_s, estimated_funding_rates, 0))
+
+	def _batch_decisions(self, ticks: dict, start: int, end: int):
+		(A_position, B_position) = self.strategy.get_asset_holdings()
+		window = slice(start, end)
+		if self.is_margin:
+			return MarginPerpArbitrag.batch_trade_decision(	margin_bid_price 			= ticks["A_bid"][window],
+															margin_ask_price 			= ticks["A_ask"][window],
+															margin_quote_interest_rate 	= self.margin_quote_interest_rate,
+															margin_base_interest_rate 	= self.margin_base_interest_rate,
+															perp_bid_price 				= ticks["B_bid"][window],
+															perp_ask_price 				= ticks["B_ask"][window],
+															perp_funding_rate 			= ticks["funding_rate"][window],
+															perp_estimated_funding_rate = ticks["estimated_funding_rate"][window],
+															current_margin_position 	= A_position,
+															max_margin_position 		= self.strategy.max_A_position,
+															current_perp_position 		= B_position,
+															max_perp_position 			= self.strategy.max_B_position,
+															entry_threshold 			= self.entry_gap_frac,
+															take_profit_threshold 		= self.profit_taking_frac)
+		return SpotPerpArbitrag.batch_trade_decision(	spot_bid_price 				= ticks["A_bid"][window],
+														spot_ask_price 				= ticks["A_ask"][window],
+														perp_bid_price 				= ticks["B_bid"][window],
+														perp_ask_price 				= ticks["B_ask"][window],
+														perp_funding_rate 			= ticks["funding_rate"][window],
+														perp_estimated_funding_rate = ticks["estimated_funding_rate"][window],
+														current_spot_vol 			= A_position,
+														max_spot_vol 				= self.strategy.max_A_position,
+														current_perp_lot_size 		= B_position,
+														max_perp_lot_size 			= self.strategy.max_B_position,
+														entry_threshold 			= self.entry_gap_frac,
+														take_profit_threshold 		= self.profit_taking_frac)
+
+	def _trade_decision(self, ticks: dict, idx: int):
+		if self.is_margin:
+			return self.strategy.trade_decision(margin_bid_price 			= ticks["A_bid"][idx],
+												margin_ask_price 			= ticks["A_ask"][idx],
+												margin_quote_interest_rate 	= self.margin_quote_interest_rate,
+												margin_base_interest_rate 	= self.margin_base_interest_rate,
+												perp_bid_price 				= ticks["B_bid"][idx],
+												perp_ask_price 				= ticks["B_ask"][idx],
+												perp_funding_rate 			= ticks["funding_rate"][idx],
+												perp_estimated_funding_rate = ticks["estimated_funding_rate"][idx],
+												entry_threshold 			= self.entry_gap_frac,
+												take_profit_threshold 		= self.profit_taking_frac)
+		return self.strategy.trade_decision(spot_bid_price 				= ticks["A_bid"][idx],
+											spot_ask_price 				= ticks["A_ask"][idx],
+											perp_bid_price 				= ticks["B_bid"][idx],
+											perp_ask_price 				= ticks["B_ask"][idx],
+											perp_funding_rate 			= ticks["funding_rate"][idx],
+											perp_estimated_funding_rate = ticks["estimated_funding_rate"][idx],
+											entry_threshold 			= self.entry_gap_frac,
+											take_profit_threshold 		= self.profit_taking_frac)
+
+	def _marks(self, ticks: dict, idx: int):
+		return ((ticks["A_bid"][idx] + ticks["A_ask"][idx]) / 2, (ticks["B_bid"][idx] + ticks["B_ask"][idx]) / 2)
+
+	def _settle(self, ticks: dict, until_ts: float):
+		"""
+		Settles funding snapshots and margin interest from the last settlement up to until_ts, at the current positions.
+		"""
+		(A_position, B_position) = self.strategy.get_asset_holdings()
+
+		while self.next_funding_ts <= until_ts:
+			idx 		= int(np.searchsorted(ticks["timestamp"], self.next_funding_ts, side = "right")) - 1
+			B_mark 		= self._marks(ticks = ticks, idx = idx)[1] if idx >= 0 else self.last_marks[1]
+			(funding_rate, _) = self._funding_rates_at(timestamps = np.array([self.next_funding_ts]))
+			# Positive funding is paid by longs to shorts
+			funding 	= -1 * B_position * self.perpetual_contract_size * B_mark * float(funding_rate[0])
+			self.cash 	+= funding
+			self.totals["funding"] += funding
+			self.next_funding_ts = self._next_funding_ts(after_ts = self.next_funding_ts)
+
+		if self.is_margin and A_position != 0:
+			daily_rate 	= self.margin_quote_daily_rate if A_position > 0 else self.margin_base_daily_rate
+			interest 	= abs(A_position) * self.last_marks[0] * daily_rate * (until_ts - self.interest_ts) / 86400
+			self.cash 	-= interest
+			self.totals["interest"] += interest
+		self.interest_ts = max(self.interest_ts, until_ts)
+		return
+
+	def _next_funding_ts(self, after_ts: float):
+		day_start = after_ts - np.mod(after_ts, 86400)
+		for each_day in [day_start, day_start + 86400]:
+			upcoming = each_day + self.funding_snapshot_s[each_day + self.funding_snapshot_s > after_ts]
+			if len(upcoming) > 0:
+				return float(upcoming[0])
+
+	def _sample(self, timestamp: float):
+		(A_position, B_position) 	= self.strategy.get_asset_holdings()
+		(A_mark, B_mark) 			= self.last_marks
+		(A_notional, B_notional) 	= (A_position * A_mark, B_position * self.perpetual_contract_size * B_mark)
+		self.exposures.append(	{
+									"timestamp" 	: float(timestamp),
+									"A_position" 	: A_position,
+									"B_position" 	: B_position,
+									"A_notional" 	: float(A_notional),
+									"B_notional" 	: float(B_notional),
+									"net_exposure" 	: float(A_notional + B_notional),
+									"pnl" 			: float(self.cash + A_notional + B_notional),
+								})
+		return
+
+	def _execute(self, ticks: dict, idx: int, decision):
+		fill_idx 	= idx if self.fill_delay_s <= 0 else \
+					  min(int(np.searchsorted(ticks["timestamp"], ticks["timestamp"][idx] + self.fill_delay_s, side = "left")), len(ticks["timestamp"]) - 1)
+		# Long A short B on entries into long A and on profit taking of long B, and the reverse otherwise
+		A_side 		= 1 if decision.value in {ExecutionDecision.GO_LONG_A_SHORT_B.value, ExecutionDecision.TAKE_PROFIT_LONG_B_SHORT_A.value} else -1
+		A_price 	= ticks["A_ask"][fill_idx] if A_side > 0 else ticks["A_bid"][fill_idx]
+		B_price 	= ticks["B_bid"][fill_idx] if A_side > 0 else ticks["B_ask"][fill_idx]
+		A_notional 	= self.asset_entry_vol * A_price
+		B_notional 	= self.perpetual_entry_lot_size * self.perpetual_contract_size * B_price
+		fees 		= self.fee_rate * (A_notional + B_notional)
+
+		self.cash 	+= -1 * A_side * A_notional + A_side * B_notional - fees
+		self.totals["fees"] += fees
+		self.strategy.change_asset_holdings(A_side * self.asset_entry_vol, -1 * A_side * self.perpetual_entry_lot_size)
+		self.trades.append(	{
+								"timestamp" : float(ticks["timestamp"][idx]),
+								"decision" 	: decision.name,
+								"A_side" 	: "buy" if A_side > 0 else "sell",
+								"A_price" 	: float(A_price),
+								"B_side" 	: "sell" if A_side > 0 else "buy",
+								"B_price" 	: float(B_price),
+								"fees" 		: float(fees),
+							})
+		return
+
+	def _replay_chunk(self, ticks: dict):
+		timestamps 	= ticks["timestamp"]
+		(ticks["funding_rate"], ticks["estimated_funding_rate"]) = self._effective_funding_rates(timestamps = timestamps)
+		# Ticks opening a new sample interval
+		sample_idx 	= np.flatnonzero(np.diff(np.floor(timestamps / self.sample_interval_s), prepend = np.floor(self.last_sample_ts / self.sample_interval_s)) > 0)
+		(start, next_sample) = (0, 0)
+
+		while start < len(timestamps):
+			end 		= min(start + self.window, len(timestamps))
+			tradable 	= np.flatnonzero(np.isin(self._batch_decisions(ticks = ticks, start = start, end = end), self.tradable_codes))
+			trade_idx 	= start + int(tradable[0]) if len(tradable) > 0 else None
+
+			# Samples before the trade (or the end of the window) are taken at the positions held until then
+			until_idx 	= trade_idx if trade_idx is not None else end
+			while next_sample < len(sample_idx) and sample_idx[next_sample] < until_idx:
+				each_idx 		= sample_idx[next_sample]
+				self.last_marks = self._marks(ticks = ticks, idx = each_idx)
+				self._settle(ticks = ticks, until_ts = timestamps[each_idx])
+				self._sample(timestamp = float(timestamps[each_idx]))
+				self.last_sample_ts = float(timestamps[each_idx])
+				next_sample 	+= 1
+
+			if trade_idx is None:
+				start = end
+				continue
+
+			self.last_marks = self._marks(ticks = ticks, idx = trade_idx)
+			self._settle(ticks = ticks, until_ts = timestamps[trade_idx])
+			decision = self._trade_decision(ticks = ticks, idx = trade_idx)
+			if decision.value in self.tradable_codes:
+				self._execute(ticks = ticks, idx = trade_idx, decision = decision)
+				self._sample(timestamp = float(timestamps[trade_idx]))
+			start = trade_idx + 1
+
+		self.last_marks = self._marks(ticks = ticks, idx = len(timestamps) - 1)
+		self._settle(ticks = ticks, until_ts = timestamps[-1])
+		return len(timestamps)
+
+	def run(self, replay):
+		"""
+		Replays every chunk of replay and returns the summary of the backtest.
+		"""
+		started 			= time.time()
+		(replayed, first_ts) = (0, None)
+		self.last_sample_ts = -np.inf
+
+		for ticks in replay.chunks():
+			if first_ts is None:
+				first_ts 			= float(ticks["timestamp"][0])
+				self.next_funding_ts = self._next_funding_ts(after_ts = first_ts)
+				self.interest_ts 	= first_ts
+				self.last_marks 	= self._marks(ticks = ticks, idx = 0)
+			replayed += self._replay_chunk(ticks = ticks)
+			self.logger.debug(f"Replayed {replayed} ticks up to {ticks['timestamp'][-1]}")
+
+		if first_ts is None:
+			self.logger.warning("No ticks to replay")
+			return None
+
+		self._sample(timestamp = self.interest_ts)
+		summary = 	{
+						"start" 				: first_ts,
+						"end" 					: float(self.interest_ts),
+						"ticks" 				: replayed,
+						"trades" 				: len(self.trades),
+						"pnl" 					: float(self.exposures[-1]["pnl"]),
+						"fees" 					: float(self.totals["fees"]),
+						"funding" 				: float(self.totals["funding"]),
+						"interest" 				: float(self.totals["interest"]),
+						"max_gross_exposure" 	: float(max(abs(each["A_notional"]) + abs(each["B_notional"]) for each in self.exposures)),
+						"final_positions" 		: self.strategy.get_asset_holdings(),
+						"elapsed_s" 			: time.time() - started,
+					}
+		self.logger.info(f"Backtest summary: {summary}")
+		return summary
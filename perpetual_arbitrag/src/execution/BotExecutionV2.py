@@ -1,25 +1,116 @@
 import asyncio
+import functools
+import itertools
 import logging
 import json
+import time
+from concurrent.futures import ThreadPoolExecutor
+from feeds.TickTracer import NULL_TRACER
 
 class BotExecutionV2(object):
-	logger 		= logging.getLogger('BotExecutionV2')
+	leg_thread_pool = None
+	tracer 			= NULL_TRACER
+	trade_ids 		= itertools.count()
+	logger 			= logging.getLogger('BotExecutionV2')
+
+	def _leg_thread_pool(self):
+		if self.leg_thread_pool is None:
+			# A single worker is enough, since the other leg is placed from the calling thread
+			self.leg_thread_pool = ThreadPoolExecutor(max_workers = 1, thread_name_prefix = "BotExecutionLeg")
+		return self.leg_thread_pool
+
+	def _leg_execution(self, order_fn, params, assert_resp_error_fn):
+		"""
+		Places one leg and returns (order_resp, order_succeed). Failures are logged rather than raised.
+		"""
+		order_resp = None
+		try:
+			order_resp = order_fn(**params)
+			assert_resp_error_fn(order_resp)
+			return (order_resp, True)
+		except Exception as ex:
+			self.logger.error(ex)
+			return (order_resp, False)
 
 	async def _trade_execution(self, trade_fnct, trade_params):
 		resp_future = await trade_fnct(**trade_params)
-		resp 		= await resp_future
+		with self.tracer.span("ack"):
+			resp 	= await resp_future
 		return json.loads(resp)
 
 	async def _trade_pair_execution(self, 	asset_A_order_fn, asset_A_params, 
-											asset_B_order_fn, asset_B_params):
+											asset_B_order_fn, asset_B_params,
+											order_state_fn = None):
+		"""
+		Places both legs at once and returns one parsed reply per leg.
+
+		A leg that could not be sent is returned as a failed reply, so that the other leg is still reverted. A leg whose
+		reply was lost may have reached the exchange. If order_state_fn is given, legs carry a client order id by which 
+		such a leg is looked up, and it is only failed if the exchange has not received or filled any of it.
+		"""
+		if order_state_fn is not None:
+			trade_id 		= f"PAIR{int(time.time() * 1000)}N{next(self.trade_ids)}"
+			asset_A_params 	= {**asset_A_params, "client_order_id" : f"{trade_id}A"}
+			asset_B_params 	= {**asset_B_params, "client_order_id" : f"{trade_id}B"}
+
+		sent = await asyncio.gather(
+						asset_A_order_fn(**asset_A_params), 
+						asset_B_order_fn(**asset_B_params),
+						return_exceptions = True
+					)
+		with self.tracer.span("ack"):
+			replies = iter(await asyncio.gather(*[each for each in sent if not isinstance(each, BaseException)], return_exceptions = True))
+		leg_replies = [(each, False) if isinstance(each, BaseException) else (next(replies), True) for each in sent]
+		return await asyncio.gather(*[	self._leg_resp(reply = reply, written = written, params = params, order_state_fn = order_state_fn)
+										for ((reply, written), params) in zip(leg_replies, [asset_A_params, asset_B_params])])
+
+	async def _leg_resp(self, reply, written: bool = True, params: dict = None, order_state_fn = None):
+		if not isinstance(reply, BaseException):
+			return json.loads(reply)
+		elif not written or order_state_fn is None:
+			self.logger.error(f"Order not acknowledged: {reply}")
+			return {"code" : "-1", "msg" : f"{reply}", "data" : []}
+
+		self.logger.error(f"Reply lost, looking up order {params['client_order_id']}: {reply}")
+		try:
+			order = await order_state_fn(order_resp = None, order_params = params)
+		except Exception as ex:
+			self.logger.error(f"Order {params['client_order_id']} could not be looked up: {ex}")
+			return {"code" : "-1", "msg" : f"{reply}", "data" : []}
+		if order is None or (order["state"] == "canceled" and float(order["accFillSz"] or 0) == 0):
+			return {"code" : "-1", "msg" : f"{reply}", "data" : []}
+		# Received by the exchange, so the leg is treated as acknowledged
+		return {"code" : "0", "msg" : "", "data" : [{"ordId" : order["ordId"], "clOrdId" : order["clOrdId"], "sCode" : "0", "sMsg" : ""}]}
+
+	async def _batch_trade_execution(self, batch_order_fn, batch_split_fn, legs: list):
+		"""
+		Places all (asset_type, params) legs in a single batch message and returns one response per leg, in order.
+		"""
+		resp_future = await batch_order_fn(legs = legs)
+		with self.tracer.span("ack"):
+			resp 	= await resp_future
+		return batch_split_fn(order_resp = json.loads(resp), legs = len(legs))
 
-		[resp_A_future, resp_B_future] = await asyncio.gather(
-												asset_A_order_fn(**asset_A_params), 
-												asset_B_order_fn(**asset_B_params)
-											)
-		resp_A = await resp_A_future
-		resp_B = await resp_B_future
-		return [json.loads(resp_A), json.loads(resp_B)]
+	async def _unwind_execution(self, unwind_engine, revert_fn, revert_params, order_resp, assert_resp_error_fn, asset_type, 
+										batch_order_fn, batch_split_fn, confirm_fill_fn, cancel_fn, order_state_fn, position_fn, failed_at: float):
+		"""
+		Hands the leg left open to the unwind engine, sending reverts through the same op as the original legs.
+		"""
+		async def _revert_fn(order_resp, revert_params):
+			if batch_order_fn is not None:
+				[revert_resp] = await self._batch_trade_execution(batch_order_fn = batch_order_fn, batch_split_fn = batch_split_fn, legs = [(asset_type, revert_params)])
+				return revert_resp
+			return await self._trade_execution(trade_fnct = revert_fn, trade_params = {"order_resp" : order_resp, "revert_params" : revert_params})
+
+		return await unwind_engine.unwind_async(revert_fn = _revert_fn,
+												revert_params = revert_params,
+												order_resp = order_resp,
+												assert_resp_error_fn = assert_resp_error_fn,
+												confirm_fill_fn = confirm_fill_fn,
+												cancel_fn = cancel_fn,
+												order_state_fn = order_state_fn,
+												position_fn = functools.partial(position_fn, asset_type = asset_type) if position_fn is not None else None,
+												failed_at = failed_at)
 
 	def idempotent_trade_execution(self, asset_A_order_fn,
 								 		 asset_A_revert_fn,
@@ -60,36 +151,95 @@ class BotExecutionV2(object):
 		self.logger.info(f"{asset_B_order_resp}")
 		return asset_A_order_succeed and asset_B_order_succeed
 
-	def idempotent_trade_execution_async(self, 	asset_A_order_fn,
-										 		asset_A_revert_fn,
-										 		asset_A_assert_resp_error_fn,
-										 		asset_A_params,
-										 		asset_A_revert_params,
-												asset_B_order_fn,
-												asset_B_revert_fn,
-												asset_B_assert_resp_error_fn,
-												asset_B_params,
-												asset_B_revert_params
+	def concurrent_trade_execution(self, asset_A_order_fn,
+								 		 asset_A_revert_fn,
+								 		 asset_A_assert_resp_error_fn,
+								 		 asset_A_params,
+								 		 asset_A_revert_params,
+										 asset_B_order_fn,
+										 asset_B_revert_fn,
+										 asset_B_assert_resp_error_fn,
+										 asset_B_params,
+										 asset_B_revert_params
+								):
+		"""
+		Blocking variant of `idempotent_trade_execution` that places both legs at the same time, for REST clients.
+
+		Leg A is placed from a worker thread while leg B is placed from the calling thread, so the legs are no longer 
+		separated by a full round trip. The leg that succeeded is reverted if the other one failed.
+		"""
+		# REST orders are sent and acked within the same call
+		with self.tracer.span("ack"):
+			asset_A_leg = self._leg_thread_pool().submit(self._leg_execution, asset_A_order_fn, asset_A_params, asset_A_assert_resp_error_fn)
+			(asset_B_order_resp, asset_B_order_succeed) = self._leg_execution(asset_B_order_fn, asset_B_params, asset_B_assert_resp_error_fn)
+			(asset_A_order_resp, asset_A_order_succeed) = asset_A_leg.result()
+
+		if asset_A_order_succeed and not asset_B_order_succeed:
+			with self.tracer.span("revert"):
+				asset_A_revert_fn(order_resp = asset_A_order_resp, revert_params = asset_A_revert_params)
+
+		elif asset_B_order_succeed and not asset_A_order_succeed:
+			with self.tracer.span("revert"):
+				asset_B_revert_fn(order_resp = asset_B_order_resp, revert_params = asset_B_revert_params)
+
+		self.logger.info(f"{asset_A_order_resp}")
+		self.logger.info(f"{asset_B_order_resp}")
+		return asset_A_order_succeed and asset_B_order_succeed
+
+	async def _idempotent_trade_execution_async(self, 	asset_A_order_fn,
+												 		asset_A_revert_fn,
+												 		asset_A_assert_resp_error_fn,
+												 		asset_A_params,
+												 		asset_A_revert_params,
+														asset_B_order_fn,
+														asset_B_revert_fn,
+														asset_B_assert_resp_error_fn,
+														asset_B_params,
+														asset_B_revert_params,
+														asset_A_type = None,
+														asset_B_type = None,
+														batch_order_fn = None,
+														batch_split_fn = None,
+														unwind_engine = None,
+														confirm_fill_fn = None,
+														cancel_fn = None,
+														order_state_fn = None,
+														position_fn = None
 								):
+		"""
+		Places both legs concurrently and reverts the leg that succeeded if the other one failed.
+
+		Order functions return a future of the reply to that very order, so responses are matched to legs by position.
+		If batch_order_fn is given, both legs and any revert are instead framed as asset_A_type / asset_B_type legs 
+		of one batch message, whose per-leg results are split out by batch_split_fn.
 
+		If unwind_engine is given, the leg left open is unwound by it, with fills confirmed by confirm_fill_fn and reverts 
+		that do not fill cancelled by cancel_fn. Reverts are resolved on the exchange through order_state_fn, and the position
+		of the leg, read by position_fn of (asset_type, order_params), is confirmed flat. Otherwise, a single revert is sent.
+		Legs whose reply was lost are also looked up through order_state_fn, when given.
+		"""
 		asset_A_order_resp 		= None
 		asset_B_order_resp 		= None
 		asset_A_order_succeed 	= False
 		asset_B_order_succeed	= False
 
-		[asset_A_order_resp_unordered, asset_B_order_resp_unordered] = asyncio.get_event_loop().run_until_complete(
-																				self._trade_pair_execution(
-																					asset_A_order_fn = asset_A_order_fn, 
-																					asset_A_params = asset_A_params,
-																					asset_B_order_fn = asset_B_order_fn,
-																					asset_B_params = asset_B_params
-																				)
-																			)
-
-		# By convention, asset A is the asset we are shorting and asset B is the asset we are going long
-		asset_A_order_resp = asset_A_order_resp_unordered if "sell" in asset_A_order_resp_unordered["id"] else asset_B_order_resp_unordered
-		asset_B_order_resp = asset_B_order_resp_unordered if "buy" 	in asset_B_order_resp_unordered["id"] else asset_A_order_resp_unordered
-		
+		if batch_order_fn is not None:
+			[asset_A_order_resp, asset_B_order_resp] = await self._batch_trade_execution(
+																batch_order_fn = batch_order_fn,
+																batch_split_fn = batch_split_fn,
+																legs = [(asset_A_type, asset_A_params), (asset_B_type, asset_B_params)]
+															)
+		else:
+			[asset_A_order_resp, asset_B_order_resp] = await self._trade_pair_execution(
+																asset_A_order_fn = asset_A_order_fn, 
+																asset_A_params = asset_A_params,
+																asset_B_order_fn = asset_B_order_fn,
+																asset_B_params = asset_B_params,
+																order_state_fn = order_state_fn
+															)
+		# Exposure of a naked leg is timed from the moment both replies are in
+		replies_at = time.monotonic()
+
 		self.logger.info(f"{asset_A_order_resp}")
 		self.logger.info(f"{asset_B_order_resp}")
 
@@ -105,26 +255,47 @@ class BotExecutionV2(object):
 		except Exception as ex:
 			self.logger.error(ex)
 
-		if asset_A_order_succeed and not asset_B_order_succeed:
+		revert_started = time.perf_counter()
+		if asset_A_order_succeed != asset_B_order_succeed and unwind_engine is not None:
+			open_leg 	= 	{
+								"revert_fn" 			: asset_A_revert_fn if asset_A_order_succeed else asset_B_revert_fn,
+								"revert_params" 		: asset_A_revert_params if asset_A_order_succeed else asset_B_revert_params,
+								"order_resp" 			: asset_A_order_resp if asset_A_order_succeed else asset_B_order_resp,
+								"assert_resp_error_fn" 	: asset_A_assert_resp_error_fn if asset_A_order_succeed else asset_B_assert_resp_error_fn,
+								"asset_type" 			: asset_A_type if asset_A_order_succeed else asset_B_type,
+							}
+			await self._unwind_execution(	unwind_engine = unwind_engine, batch_order_fn = batch_order_fn, batch_split_fn = batch_split_fn,
+											confirm_fill_fn = confirm_fill_fn, cancel_fn = cancel_fn, order_state_fn = order_state_fn, position_fn = position_fn,
+											failed_at = replies_at, **open_leg)
+
+		elif asset_A_order_succeed and not asset_B_order_succeed and batch_order_fn is not None:
+			[asset_A_revert_resp] = await self._batch_trade_execution(batch_order_fn = batch_order_fn, batch_split_fn = batch_split_fn, legs = [(asset_A_type, asset_A_revert_params)])
+			self.logger.info(f"{asset_A_revert_params}")
+			self.logger.info(f"{asset_A_revert_resp}")
+
+		elif asset_B_order_succeed and not asset_A_order_succeed and batch_order_fn is not None:
+			[asset_B_revert_resp] = await self._batch_trade_execution(batch_order_fn = batch_order_fn, batch_split_fn = batch_split_fn, legs = [(asset_B_type, asset_B_revert_params)])
+			self.logger.info(f"{asset_B_revert_params}")
+			self.logger.info(f"{asset_B_revert_resp}")
+
+		elif asset_A_order_succeed and not asset_B_order_succeed:
 			asset_A_params = {"order_resp" : asset_A_order_resp, "revert_params" : asset_A_revert_params}
-			asset_A_revert_resp = asyncio.get_event_loop().run_until_complete(
-												self._trade_execution(
-													trade_fnct = asset_A_revert_fn, 
-													trade_params = asset_A_params,
-												)
-											)
+			asset_A_revert_resp = await self._trade_execution(trade_fnct = asset_A_revert_fn, trade_params = asset_A_params)
 			self.logger.info(f"{asset_A_params}")
 			self.logger.info(f"{asset_A_revert_resp}")
 
 		elif asset_B_order_succeed and not asset_A_order_succeed:
 			asset_B_params = {"order_resp" : asset_B_order_resp, "revert_params" : asset_B_revert_params}
-			asset_B_revert_resp = asyncio.get_event_loop().run_until_complete(
-												self._trade_execution(
-													trade_fnct = asset_B_revert_fn, 
-													trade_params = asset_B_params,
-												)
-											)
+			asset_B_revert_resp = await self._trade_execution(trade_fnct = asset_B_revert_fn, trade_params = asset_B_params)
 			self.logger.info(f"{asset_B_params}")
 			self.logger.info(f"{asset_B_revert_resp}")
-		
-		return asset_A_order_succeed and asset_B_order_succeed
\ No newline at end of file
+
+		if asset_A_order_succeed != asset_B_order_succeed:
+			self.tracer.add_span(stage = "revert", started = revert_started)
+		return asset_A_order_succeed and asset_B_order_succeed
+
+	def idempotent_trade_execution_async(self, *args, **kwargs):
+		"""
+		Blocking wrapper around `_idempotent_trade_execution_async` for callers without a running event loop.
+		"""
+		return asyncio.get_event_loop().run_until_complete(self._idempotent_trade_execution_async(*args, **kwargs))
\ No newline at end of file
@@ -0,0 +1,140 @@
+import asyncio
+import functools
+import logging
+import time
+from execution.AsyncBotRuntime import AsyncBotRuntime
+
+class MultiPairBotRuntime(AsyncBotRuntime):
+	"""
+	Runs many pairs on one event loop, all sharing the same api client (and so its private websocket) and feed:
+
+	- feed 		: waits for new books (or poll_interval_s when the feed is polled) and wakes up only the pairs trading a symbol
+				  whose book changed. Every pair is woken on a poll, or when the feed cannot tell which books changed. A pair
+				  not evaluated for poll_interval_s is woken anyway, even while the books of other pairs keep changing
+	- pair 		: one task per pair, running one evaluation of the pair per wake up, at least min_eval_interval_s apart
+	- refresh 	: runs the refresh_fn of every pair that has one every refresh_interval_s, and wakes up the pairs whose inputs changed
+	- heartbeat : pings the private websocket (and its standby, if any) every heartbeat_interval_s and reconnects on failure
+
+	A pair whose evaluation raises is logged and retried after retry_timeout_s, without holding back the other pairs.
+	Exceptions listed in stop_exceptions, such as a tripped fail safe, stop only the pair that raised them.
+	`run` returns once every pair has stopped.
+	"""
+	logger = logging.getLogger('MultiPairBotRuntime')
+
+	def __init__(self, 	api_client,
+						feed_client,
+						poll_interval_s: float,
+						heartbeat_interval_s: float,
+						retry_timeout_s: float,
+						feed_push: bool,
+						stop_exceptions: tuple = (),
+						min_eval_interval_s: float = 0,
+						refresh_interval_s: float = None):
+		super(MultiPairBotRuntime, self).__init__(	api_client 				= api_client,
+													feed_client 			= feed_client,
+													evaluate_fn 			= None,
+													poll_interval_s 		= poll_interval_s,
+													heartbeat_interval_s 	= heartbeat_interval_s,
+													retry_timeout_s 		= retry_timeout_s,
+													feed_push 				= feed_push,
+													min_eval_interval_s 	= min_eval_interval_s,
+													refresh_interval_s 		= refresh_interval_s)
+		self.stop_exceptions 	= stop_exceptions
+		self.pairs 				= {}
+		self.refresh_fns 		= {}
+		self.symbol_pairs 		= {}
+		self.ticks 				= {}
+		self.evaluations 		= {}
+		self.last_evaluated 	= {}
+		return
+
+	def add_pair(self, name: str, symbols: [str], evaluate_fn, refresh_fn = None):
+		"""
+		Registers a pair, which is evaluated by awaiting evaluate_fn whenever the book of one of its symbols changes,
+		or whenever refresh_fn returns True.
+		"""
+		assert name not in self.pairs, f"Pair {name} is already registered"
+		self.pairs[name] 		= evaluate_fn
+		if refresh_fn is not None:
+			self.refresh_fns[name] = refresh_fn
+		self.evaluations[name] 	= 0
+		for each_symbol in symbols:
+			self.symbol_pairs.setdefault(each_symbol, []).append(name)
+		return self
+
+	def _wake(self, updated_symbols: set = None):
+		names = self.ticks.keys() if updated_symbols is None else \
+				{each_name for each_symbol in updated_symbols for each_name in self.symbol_pairs.get(each_symbol, [])}
+		for each_name in names:
+			self.ticks[each_name].set()
+		return
+
+	def _wake_idle(self):
+		now = time.perf_counter()
+		for (each_name, each_evaluated) in self.last_evaluated.items():
+			if now - each_evaluated >= self.poll_interval_s:
+				self.ticks[each_name].set()
+		return
+
+	async def _feed_task(self):
+		loop = asyncio.get_event_loop()
+		while True:
+			if self.feed_push:
+				# wait_for_update blocks on a threading.Condition notified by the feed's own thread. Cancelling this task does
+				# not interrupt it, so `run` wakes it up on exit
+				updated = await loop.run_in_executor(None, functools.partial(self.feed_client.wait_for_update, timeout_s = self.poll_interval_s))
+			else:
+				await asyncio.sleep(self.poll_interval_s)
+				updated = False
+			self._wake(updated_symbols = self.feed_client.pop_updated_symbols() if updated else None)
+			self._wake_idle()
+
+	async def _pair_task(self, name: str):
+		(evaluate_fn, tick) = (self.pairs[name], self.ticks[name])
+		last_evaluated 		= None
+		while True:
+			await tick.wait()
+			last_evaluated = await self._throttle(last_evaluated = last_evaluated)
+			tick.clear()
+			self.evaluations[name] 		+= 1
+			self.last_evaluated[name] 	= last_evaluated
+			try:
+				await evaluate_fn()
+			except self.stop_exceptions as ex:
+				self.logger.error(f"Stopping {name}: {ex}")
+				return
+			except Exception as ex:
+				self.logger.error(f"{name}: {ex}")
+				await asyncio.sleep(self.retry_timeout_s)
+
+	async def _refresh_task(self):
+		loop = asyncio.get_event_loop()
+		while True:
+			await asyncio.sleep(self.refresh_interval_s)
+			for (each_name, each_refresh_fn) in self.refresh_fns.items():
+				try:
+					changed = await loop.run_in_executor(None, each_refresh_fn)
+				except Exception as ex:
+					self.logger.error(f"{each_name}: refreshing inputs failed, retrying on the next refresh: {ex}")
+					continue
+				if changed:
+					self.ticks[each_name].set()
+
+	async def run(self):
+		self.ticks 	= {each_name : asyncio.Event() for each_name in self.pairs}
+		self._wake()
+		pair_tasks 	= [asyncio.ensure_future(self._pair_task(name = each_name)) for each_name in self.pairs]
+		tasks 		= pair_tasks + [asyncio.ensure_future(each_task()) for each_task in [self._feed_task, self._heartbeat_task]] + \
+					  ([asyncio.ensure_future(self._refresh_task())] if self.refresh_fns else [])
+		pending 	= set(tasks)
+		try:
+			while not all(each_task.done() for each_task in pair_tasks):
+				(done, pending) = await asyncio.wait(pending, return_when = asyncio.FIRST_COMPLETED)
+				for each_task in done:
+					each_task.result()
+		finally:
+			for each_task in tasks:
+				each_task.cancel()
+			if self.feed_push:
+				self.feed_client.wake_waiters()
+		return
@@ -0,0 +1,435 @@
+import asyncio
+import functools
+import logging
+from db.MarginClients import MarginClients
+from db.PerpetualClients import PerpetualClients
+from db.SpotClients import SpotClients
+from execution.FailSafeTrigger import FailSafeTrigger
+from feeds.TickTracer import NULL_TRACER
+from strategies.MarginPerpArbitrag import MarginPerpArbitrag, MarginPerpExecutionDecision
+from strategies.SpotPerpArbitrag import SpotPerpArbitrag, SpotPerpExecutionDecision
+
+class OkxPairBot(object):
+	"""
+	One pair traded by a multi pair process on OKX.
+
+	The api client, feed, executor and database engine are shared with every other pair of the process.
+	Each pair keeps its own strategy, positions, fail safe and prebuilt order params. `evaluate` runs one evaluation of
+	the pair, and is the evaluate fn of both the single and multi pair mains.
+
+	Feed, REST and database calls block, and `evaluate` runs them off the loop so that heartbeats and other pairs are not held up.
+	"""
+	logger = logging.getLogger('OkxPairBot')
+	tracer = NULL_TRACER
+
+	def __init__(self, 	client,
+						feed_client,
+						bot_executor,
+						order_type: str,
+						entry_gap_frac: float,
+						profit_taking_frac: float,
+						feed_latency_s: float,
+						fails_to_exit: int,
+						client_id: str = None,
+						db_url: str = None,
+						db_engine = None,
+						db_reset: bool = False):
+		self.client 			= client
+		self.feed_client 		= feed_client
+		self.bot_executor 		= bot_executor
+		self.order_type 		= order_type
+		self.entry_gap_frac 	= entry_gap_frac
+		self.profit_taking_frac = profit_taking_frac
+		self.feed_latency_s 	= feed_latency_s
+		self.fail_safe_trigger 	= FailSafeTrigger(counts_to_trigger = fails_to_exit)
+		self.client_id 			= client_id
+		self.db_url 			= db_url
+		self.db_engine 			= db_engine
+		self.db_reset 			= db_reset
+		self.db_clients 		= None
+		return
+
+	@property
+	def name(self):
+		return "/".join(self.symbols)
+
+	def _load_positions(self, strategy_id: str, asset_clients: list):
+		"""
+		Positions of the (client class, symbol, units) assets of the pair, from the database if any, else zero.
+		"""
+		if self.db_url is None:
+			self.logger.warning(f"Zero state execution of {self.name} as no db_url detected")
+			return [0 for _ in asset_clients]
+
+		self.db_clients = [	each_client_cls(url = self.db_url, strategy_id = strategy_id, client_id = self.client_id, exchange = "okx",
+											symbol = each_symbol, units = each_units).create_session(engine = self.db_engine)
+							for (each_client_cls, each_symbol, each_units) in asset_clients]
+		for each_client in self.db_clients:
+			each_client.create_entry() if not each_client.is_exists() else None
+			each_client.set_position(size = 0) if self.db_reset else None
+		return [each_client.get_position() for each_client in self.db_clients]
+
+	async def _run_blocking(self, fn, **kwargs):
+		# Spans recorded by fn, e.g. the feed read and book parse, still count towards the traced tick
+		return await asyncio.get_event_loop().run_in_executor(None, functools.partial(self.tracer.bind(fn), **kwargs))
+
+	async def _save_positions(self, positions: tuple):
+		if self.db_clients is not None:
+			for (each_client, each_position) in zip(self.db_clients, positions):
+				await self._run_blocking(each_client.set_position, size = each_position)
+		return
+
+	def _prepare_order_templates(self, asset_type: str):
+		self.client.prepare_order_templates(legs = [(each_type, params) for (_, first_params, perpetual_params, first_revert_params, perpetual_revert_params, _, _) in self.order_templates.values()
+														for (each_type, params) in [(asset_type, first_params), ("perpetual", perpetual_params), (asset_type, first_revert_params), ("perpetual", perpetual_revert_params)]
+													])
+		return
+
+	async def _record_execution(self, new_order_execution: bool, positions_fn):
+		self.fail_safe_trigger.reset() if new_order_execution else None
+		if new_order_execution:
+			await self._save_positions(positions = positions_fn())
+		return
+
+class OkxSpotPerpPairBot(OkxPairBot):
+	"""
+	Spot - perpetual pair, traded as by main/intra_exchange/okx/spot_perp/main.py
+	"""
+	logger = logging.getLogger('OkxSpotPerpPairBot')
+
+	def __init__(self, 	spot_trading_pair: str,
+						perpetual_trading_pair: str,
+						spot_entry_vol: float,
+						max_spot_vol: float,
+						perpetual_entry_lot_size: int,
+						max_perpetual_lot_size: int,
+						perpetual_leverage: int,
+						current_funding_interval_s: int,
+						estimated_funding_interval_s: int,
+						*args, **kwargs):
+		super(OkxSpotPerpPairBot, self).__init__(*args, **kwargs)
+		self.spot_trading_pair 				= spot_trading_pair
+		self.perpetual_trading_pair 		= perpetual_trading_pair
+		self.spot_entry_vol 				= spot_entry_vol
+		self.max_spot_vol 					= max_spot_vol
+		self.perpetual_entry_lot_size 		= perpetual_entry_lot_size
+		self.max_perpetual_lot_size 		= max_perpetual_lot_size
+		self.perpetual_leverage 			= perpetual_leverage
+		self.current_funding_interval_s 	= current_funding_interval_s
+		self.estimated_funding_interval_s 	= estimated_funding_interval_s
+		self.symbols 						= [spot_trading_pair, perpetual_trading_pair]
+		(self.perpetual_funding_rate, self.perpetual_estimated_funding_rate) = (None, None)
+		return
+
+	def _spot_order_params(self, order_side: str):
+		return 	{
+					"symbol" 	 		: self.spot_trading_pair,
+					"order_type" 		: self.order_type,
+					"price" 	 		: 1,
+					"size" 		 		: self.spot_entry_vol,
+					"target_currency" 	: "base_ccy",
+					"order_side" 		: order_side,
+				}
+
+	def _perpetual_order_params(self, order_side: str):
+		return 	{
+					"symbol" 	 	: self.perpetual_trading_pair,
+					"position_side" : "short",
+					"order_type" 	: self.order_type,
+					"price" 	 	: 1,
+					"size" 		 	: self.perpetual_entry_lot_size,
+					"order_side" 	: order_side,
+				}
+
+	def setup(self):
+		"""
+		Sets leverage, checks entry sizes and loads positions. Must be called once the api client is connected.
+		"""
+		self.client.set_perpetual_leverage(symbol = self.perpetual_trading_pair, leverage = self.perpetual_leverage)
+		assert 	self.spot_entry_vol >= self.client.get_spot_min_volume(symbol = self.spot_trading_pair), f"Minimum spot entry size not satisfied for {self.name}."
+		assert 	self.perpetual_entry_lot_size >= self.client.get_perpetual_min_lot_size(symbol = self.perpetual_trading_pair), f"Minimum perpetual entry size not satisfied for {self.name}."
+
+		(current_spot_vol, current_perpetual_lot_size) = self._load_positions(	strategy_id = SpotPerpArbitrag.get_strategy_id(),
+																				asset_clients = [(SpotClients, self.spot_trading_pair, "vol"), (PerpetualClients, self.perpetual_trading_pair, "lot")])
+
+		self.trade_strategy = SpotPerpArbitrag(	spot_symbol 			= self.spot_trading_pair,
+												current_spot_vol 		= current_spot_vol,
+												max_spot_vol 			= self.max_spot_vol,
+												perp_symbol 			= self.perpetual_trading_pair,
+												current_perp_lot_size 	= current_perpetual_lot_size,
+												max_perp_lot_size		= self.max_perpetual_lot_size,
+											)
+
+		self.refresh_inputs()
+
+		# Order params of every decision are built once, and only prices are set at trade time
+		self.order_templates = 	{
+									SpotPerpExecutionDecision.TAKE_PROFIT_LONG_SPOT_SHORT_PERP : (
+										self.bot_executor.short_spot_long_perpetual_async,
+										self._spot_order_params(order_side = "sell"), self._perpetual_order_params(order_side = "buy"),
+										self._spot_order_params(order_side = "buy"), self._perpetual_order_params(order_side = "sell"),
+										-1 * self.spot_entry_vol, self.perpetual_entry_lot_size
+									),
+									SpotPerpExecutionDecision.GO_LONG_SPOT_SHORT_PERP : (
+										self.bot_executor.long_spot_short_perpetual_async,
+										self._spot_order_params(order_side = "buy"), self._perpetual_order_params(order_side = "sell"),
+										self._spot_order_params(order_side = "sell"), self._perpetual_order_params(order_side = "buy"),
+										self.spot_entry_vol, -1 * self.perpetual_entry_lot_size
+									),
+								}
+		self._prepare_order_templates(asset_type = "spot")
+		return self
+
+	def refresh_inputs(self):
+		"""
+		Re-reads funding rates, which are not pushed by the feed. Returns True if they changed since the last read.
+		"""
+		funding_rates 	= self.client.get_perpetual_effective_funding_rate(	symbol = self.perpetual_trading_pair,
+																			seconds_before_current = self.current_funding_interval_s,
+																			seconds_before_estimated = self.estimated_funding_interval_s)
+		changed 		= funding_rates != (self.perpetual_funding_rate, self.perpetual_estimated_funding_rate)
+		(self.perpetual_funding_rate, self.perpetual_estimated_funding_rate) = funding_rates
+		return changed
+
+	async def evaluate(self):
+		if 	self.order_type == "limit":
+			spot_price 		= await self._run_blocking(self.client.get_spot_trading_price, symbol = self.spot_trading_pair)
+			perpetual_price = await self._run_blocking(self.client.get_perpetual_trading_price, symbol = self.perpetual_trading_pair)
+			(spot_bid, spot_ask, perpetual_bid, perpetual_ask) = (spot_price, spot_price, perpetual_price, perpetual_price)
+
+		elif self.order_type == "market":
+			((spot_bid, spot_ask, spot_ts), (perpetual_bid, perpetual_ask, perpetual_ts)) = \
+				await self._run_blocking(	self.client.get_spot_perpetual_average_bid_ask_price,
+											spot_symbol = self.spot_trading_pair, spot_size = self.spot_entry_vol,
+											perpetual_symbol = self.perpetual_trading_pair, perpetual_size = self.perpetual_entry_lot_size)
+			self.feed_client.metrics.check_latency(exchange = "OKX", symbol = self.spot_trading_pair, updated = spot_ts, permissible_latency_s = self.feed_latency_s)
+			self.feed_client.metrics.check_latency(exchange = "OKX", symbol = self.perpetual_trading_pair, updated = perpetual_ts, permissible_latency_s = self.feed_latency_s)
+
+		with self.tracer.span("trade_decision"):
+			decision = self.trade_strategy.trade_decision(	spot_bid_price 				= spot_bid,
+															spot_ask_price 				= spot_ask,
+															perp_bid_price 				= perpetual_bid,
+															perp_ask_price 				= perpetual_ask,
+															perp_funding_rate 			= self.perpetual_funding_rate,
+															perp_estimated_funding_rate = self.perpetual_estimated_funding_rate,
+															entry_threshold 			= self.entry_gap_frac,
+															take_profit_threshold 		= self.profit_taking_frac
+														)
+		self.logger.info(f"{self.name}: {decision} - Spot bid/ask: {(spot_bid, spot_ask)}, Perpetual bid/ask: {(perpetual_bid, perpetual_ask)} - Current/Est Funding: {(self.perpetual_funding_rate, self.perpetual_estimated_funding_rate)}")
+
+		new_order_execution = False
+
+		if decision in self.order_templates:
+			(execution_fn, spot_params, perpetual_params, spot_revert_params, perpetual_revert_params, delta_spot, delta_perp) = self.order_templates[decision]
+
+			if self.order_type == "limit":
+				for each_params in [spot_params, spot_revert_params]:
+					each_params["price"] = spot_price
+				for each_params in [perpetual_params, perpetual_revert_params]:
+					each_params["price"] = perpetual_price
+
+			new_order_execution = await execution_fn(	spot_params 			= spot_params,
+														perpetual_params 		= perpetual_params,
+														spot_revert_params  	= spot_revert_params,
+														perpetual_revert_params = perpetual_revert_params
+												)
+
+			self.trade_strategy.change_asset_holdings(delta_spot = delta_spot, delta_perp = delta_perp) \
+			if new_order_execution else self.fail_safe_trigger.increment()
+
+		await self._record_execution(new_order_execution = new_order_execution, positions_fn = self.trade_strategy.get_asset_holdings)
+
+		if not (	(new_order_execution) or \
+					(decision == SpotPerpExecutionDecision.NO_DECISION) or \
+					(decision == SpotPerpExecutionDecision.GO_LONG_PERP_SHORT_SPOT) or \
+					(decision == SpotPerpExecutionDecision.TAKE_PROFIT_LONG_PERP_SHORT_SPOT)):
+			raise Exception(f"Order execution failed - Status: {new_order_execution}, Decision: {decision}")
+		return decision
+
+class OkxMarginPerpPairBot(OkxPairBot):
+	"""
+	Margin - perpetual pair, traded as by main/intra_exchange/okx/margin_perp/main.py
+	"""
+	logger = logging.getLogger('OkxMarginPerpPairBot')
+
+	def __init__(self, 	margin_trading_pair: str,
+						perpetual_trading_pair: str,
+						margin_entry_vol: float,
+						max_margin_vol: float,
+						margin_leverage: float,
+						margin_tax_rate: float,
+						margin_loan_period_hr: int,
+						perpetual_entry_lot_size: int,
+						max_perpetual_lot_size: int,
+						perpetual_leverage: int,
+						current_funding_interval_s: int,
+						estimated_funding_interval_s: int,
+						*args, **kwargs):
+		super(OkxMarginPerpPairBot, self).__init__(*args, **kwargs)
+		self.margin_trading_pair 			= margin_trading_pair
+		self.perpetual_trading_pair 		= perpetual_trading_pair
+		self.margin_entry_vol 				= margin_entry_vol
+		self.max_margin_vol 				= max_margin_vol
+		self.margin_leverage 				= margin_leverage
+		self.margin_tax_rate 				= margin_tax_rate
+		self.margin_loan_period_hr 			= margin_loan_period_hr
+		self.perpetual_entry_lot_size 		= perpetual_entry_lot_size
+		self.max_perpetual_lot_size 		= max_perpetual_lot_size
+		self.perpetual_leverage 			= perpetual_leverage
+		self.current_funding_interval_s 	= current_funding_interval_s
+		self.estimated_funding_interval_s 	= estimated_funding_interval_s
+		self.symbols 						= [margin_trading_pair, perpetual_trading_pair]
+		(self.margin_quote_funding_rate, self.margin_base_funding_rate) 		= (None, None)
+		(self.perpetual_funding_rate, self.perpetual_estimated_funding_rate) 	= (None, None)
+		return
+
+	def _margin_order_params(self, order_side: str, size: float):
+		return 	{
+					"symbol" 	 		: self.margin_trading_pair,
+					"ccy" 				: "USDT",
+					"trade_mode" 		: "cross",
+					"order_type" 		: self.order_type,
+					"price" 	 		: 1,
+					"order_side" 		: order_side,
+					"size" 				: size,
+				}
+
+	def _perpetual_order_params(self, position_side: str, order_side: str):
+		return 	{
+					"symbol" 	 		: self.perpetual_trading_pair,
+					"position_side" 	: position_side,
+					"order_type" 		: self.order_type,
+					"price" 	 		: 1,
+					"size" 		 		: self.perpetual_entry_lot_size,
+					"order_side" 		: order_side,
+				}
+
+	def setup(self):
+		"""
+		Sets leverage, checks entry sizes, loads positions and reads funding rates. Must be called once the api client is connected.
+		"""
+		(quote_ccy, base_ccy) = self.margin_trading_pair.split("-")
+		self.client.set_margin_leverage(symbol = self.margin_trading_pair, ccy = base_ccy, leverage = self.margin_leverage)
+		self.client.set_perpetual_leverage(symbol = self.perpetual_trading_pair, leverage = self.perpetual_leverage)
+		assert 	self.margin_entry_vol >= self.client.get_margin_min_volume(symbol = self.margin_trading_pair), f"Minimum margin entry size not satisfied for {self.name}."
+		assert 	self.perpetual_entry_lot_size >= self.client.get_perpetual_min_lot_size(symbol = self.perpetual_trading_pair), f"Minimum perpetual entry size not satisfied for {self.name}."
+
+		(current_margin_vol, current_perpetual_lot_size) = self._load_positions(strategy_id = MarginPerpArbitrag.get_strategy_id(),
+																				asset_clients = [(MarginClients, self.margin_trading_pair, "vol"), (PerpetualClients, self.perpetual_trading_pair, "lot")])
+
+		self.trade_strategy = MarginPerpArbitrag(	margin_symbol 			 = self.margin_trading_pair,
+													current_margin_position = current_margin_vol,
+													max_margin_position 	 = self.max_margin_vol,
+													perp_symbol 			 = self.perpetual_trading_pair,
+													current_perp_position 	 = current_perpetual_lot_size,
+													max_perp_position		 = self.max_perpetual_lot_size,
+												)
+
+		self.refresh_inputs()
+
+		# Order params of every decision are built once. The size of margin buys, which is quoted in USDT, is set at trade time
+		short_margin_vol 		= self.margin_entry_vol * (1 - self.margin_tax_rate)
+		self.order_templates 	= 	{
+										MarginPerpExecutionDecision.TAKE_PROFIT_LONG_PERP_SHORT_MARGIN : (
+											self.bot_executor.long_margin_short_perpetual_async,
+											self._margin_order_params(order_side = "buy", size = None), self._perpetual_order_params(position_side = "long", order_side = "sell"),
+											self._margin_order_params(order_side = "sell", size = self.margin_entry_vol), self._perpetual_order_params(position_side = "long", order_side = "buy"),
+											self.margin_entry_vol, -1 * self.perpetual_entry_lot_size
+										),
+										MarginPerpExecutionDecision.TAKE_PROFIT_LONG_MARGIN_SHORT_PERP : (
+											self.bot_executor.short_margin_long_perpetual_async,
+											self._margin_order_params(order_side = "sell", size = short_margin_vol), self._perpetual_order_params(position_side = "short", order_side = "buy"),
+											self._margin_order_params(order_side = "buy", size = None), self._perpetual_order_params(position_side = "short", order_side = "sell"),
+											-1 * self.margin_entry_vol, self.perpetual_entry_lot_size
+										),
+										MarginPerpExecutionDecision.GO_LONG_MARGIN_SHORT_PERP : (
+											self.bot_executor.long_margin_short_perpetual_async,
+											self._margin_order_params(order_side = "buy", size = None), self._perpetual_order_params(position_side = "short", order_side = "sell"),
+											self._margin_order_params(order_side = "sell", size = self.margin_entry_vol), self._perpetual_order_params(position_side = "short", order_side = "buy"),
+											self.margin_entry_vol, -1 * self.perpetual_entry_lot_size
+										),
+										MarginPerpExecutionDecision.GO_LONG_PERP_SHORT_MARGIN : (
+											self.bot_executor.short_margin_long_perpetual_async,
+											self._margin_order_params(order_side = "sell", size = short_margin_vol), self._perpetual_order_params(position_side = "long", order_side = "buy"),
+											self._margin_order_params(order_side = "buy", size = None), self._perpetual_order_params(position_side = "long", order_side = "sell"),
+											-1 * self.margin_entry_vol, self.perpetual_entry_lot_size
+										),
+									}
+		self._prepare_order_templates(asset_type = "margin")
+		return self
+
+	def refresh_inputs(self):
+		"""
+		Re-reads margin interest and funding rates, which are not pushed by the feed. Returns True if they changed since the last read.
+		"""
+		(quote_ccy, base_ccy) = self.margin_trading_pair.split("-")
+		rates 	= (	self.client.get_margin_effective_funding_rate(ccy = quote_ccy, loan_period_hrs = self.margin_loan_period_hr),
+					self.client.get_margin_effective_funding_rate(ccy = base_ccy, loan_period_hrs = self.margin_loan_period_hr),
+					*self.client.get_perpetual_effective_funding_rate(	symbol = self.perpetual_trading_pair,
+																		seconds_before_current = self.current_funding_interval_s,
+																		seconds_before_estimated = self.estimated_funding_interval_s))
+		changed = rates != (self.margin_quote_funding_rate, self.margin_base_funding_rate, self.perpetual_funding_rate, self.perpetual_estimated_funding_rate)
+		(self.margin_quote_funding_rate, self.margin_base_funding_rate, self.perpetual_funding_rate, self.perpetual_estimated_funding_rate) = rates
+		return changed
+
+	async def evaluate(self):
+		if 	self.order_type == "limit":
+			margin_price 		= await self._run_blocking(self.client.get_margin_trading_price, symbol = self.margin_trading_pair)
+			perpetual_price 	= await self._run_blocking(self.client.get_perpetual_trading_price, symbol = self.perpetual_trading_pair)
+			(margin_bid, margin_ask, perpetual_bid, perpetual_ask) = (margin_price, margin_price, perpetual_price, perpetual_price)
+			margin_long_size 	= self.margin_entry_vol * margin_price
+
+		elif self.order_type == "market":
+			((margin_bid, margin_ask, margin_ts), (perpetual_bid, perpetual_ask, perpetual_ts)) = \
+				await self._run_blocking(	self.client.get_margin_perpetual_average_bid_ask_price,
+											margin_symbol = self.margin_trading_pair, margin_size = self.margin_entry_vol,
+											perpetual_symbol = self.perpetual_trading_pair, perpetual_size = self.perpetual_entry_lot_size)
+			margin_long_size 	= self.margin_entry_vol * margin_ask
+			self.feed_client.metrics.check_latency(exchange = "OKX", symbol = self.margin_trading_pair, updated = margin_ts, permissible_latency_s = self.feed_latency_s)
+			self.feed_client.metrics.check_latency(exchange = "OKX", symbol = self.perpetual_trading_pair, updated = perpetual_ts, permissible_latency_s = self.feed_latency_s)
+
+		with self.tracer.span("trade_decision"):
+			decision = self.trade_strategy.trade_decision(	margin_bid_price 			= margin_bid,
+															margin_ask_price 			= margin_ask,
+															margin_quote_interest_rate 	= self.margin_quote_funding_rate,
+															margin_base_interest_rate 	= self.margin_base_funding_rate,
+															perp_bid_price 				= perpetual_bid,
+															perp_ask_price 				= perpetual_ask,
+															perp_funding_rate 			= self.perpetual_funding_rate,
+															perp_estimated_funding_rate = self.perpetual_estimated_funding_rate,
+															entry_threshold 			= self.entry_gap_frac,
+															take_profit_threshold 		= self.profit_taking_frac
+														)
+		self.logger.info(f"{self.name}: {decision} - Margin bid/ask: {(margin_bid, margin_ask)}, Perpetual bid/ask: {(perpetual_bid, perpetual_ask)} - " \
+						 f"Margin quote - base interests: {self.margin_quote_funding_rate} / {self.margin_base_funding_rate} - Current/Est Funding: {(self.perpetual_funding_rate, self.perpetual_estimated_funding_rate)}")
+
+		new_order_execution = False
+
+		if decision in self.order_templates:
+			(execution_fn, margin_params, perpetual_params, margin_revert_params, perpetual_revert_params, delta_margin, delta_perp) = self.order_templates[decision]
+
+			# Only prices and the quote sized margin buy are patched into the prebuilt params
+			if self.order_type == "limit":
+				for each_params in [margin_params, margin_revert_params]:
+					each_params["price"] = margin_price
+				for each_params in [perpetual_params, perpetual_revert_params]:
+					each_params["price"] = perpetual_price
+
+			margin_buy_params 			= margin_params if margin_params["order_side"] == "buy" else margin_revert_params
+			margin_buy_params["size"] 	= margin_long_size
+
+			new_order_execution = await execution_fn(	margin_params 			= margin_params,
+														perpetual_params 		= perpetual_params,
+														margin_revert_params 	= margin_revert_params,
+														perpetual_revert_params = perpetual_revert_params
+												)
+
+			self.trade_strategy.change_asset_holdings(delta_margin = delta_margin, delta_perp = delta_perp) \
+			if new_order_execution else self.fail_safe_trigger.increment()
+
+		await self._record_execution(new_order_execution = new_order_execution, positions_fn = self.trade_strategy.get_asset_holdings)
+
+		if not (	(new_order_execution) or \
+					(decision == MarginPerpExecutionDecision.NO_DECISION)):
+			raise Exception(f"Order execution failed - Status: {new_order_execution}, Decision: {decision}")
+		return decision
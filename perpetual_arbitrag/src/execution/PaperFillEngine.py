@@ -0,0 +1,155 @@
+import asyncio
+import logging
+import time
+
+class PaperFillEngine(object):
+	"""
+	Fills paper orders against live order books, so that simulated execution sees realistic prices.
+
+	The book is read once when the order is placed and again latency_s later, and the order is matched against the second
+	read by walking levels from the best price. Limit orders only take levels at or better than their price, market orders
+	take whatever the book has. The remainder after the book (or the limit) runs out is not filled and the fill is recorded
+	as partial. Orders never rest on the book.
+
+	book_fn is a fn of (symbol, max_size) returning {"bids" : [[price, size]], "asks" : [[price, size]]} sorted from the
+	best price, e.g. the sorted_order_book of a feed. Fills, slippage against the best price at placement and positions
+	are kept per symbol.
+	"""
+	logger = logging.getLogger('PaperFillEngine')
+
+	def __init__(self, book_fn, latency_s: float = 0):
+		self.book_fn 	= book_fn
+		self.latency_s 	= latency_s
+		self.positions 	= {}
+		self.stats 		= {}
+		return
+
+	@staticmethod
+	def order_leg(params: dict, quote_size: bool = False):
+		"""
+		Paper leg of the order params passed to the executors. quote_size is True if params["size"] is in the quote currency
+		"""
+		return 	{
+					"symbol" 		: params["symbol"],
+					"order_side" 	: params["order_side"],
+					"size" 			: params["size"],
+					"limit_price" 	: params["price"] if params["order_type"] == "limit" else None,
+					"quote_size" 	: quote_size,
+				}
+
+	@staticmethod
+	def match(book: dict, order_side: str, size: float, limit_price: float = None, quote_size: bool = False):
+		"""
+		Walks the side of the book taken by the order. Returns the (base size, quote size) filled
+		"""
+		levels 			= book["asks"] if order_side == "buy" else book["bids"]
+		remaining 		= size
+		(filled_base, filled_quote) = (0, 0)
+
+		for (price, level_size) in levels:
+			if remaining <= 0:
+				break
+			if limit_price is not None and (price > limit_price if order_side == "buy" else price < limit_price):
+				break
+			take_base 		= min(level_size, remaining / price) if quote_size else min(level_size, remaining)
+			filled_base 	+= take_base
+			filled_quote 	+= take_base * price
+			remaining 		-= take_base * price if quote_size else take_base
+		return (filled_base, filled_quote)
+
+	def _book(self, symbol: str, size: float, quote_size: bool):
+		# Quote sized orders cannot bound the depth read in base units
+		return self.book_fn(symbol, None if quote_size else size)
+
+	def _best_price(self, book: dict, order_side: str):
+		levels = book["asks"] if order_side == "buy" else book["bids"]
+		return levels[0][0] if len(levels) > 0 else None
+
+	def _record(self, symbol: str, order_side: str, size: float, quote_size: bool, placed_price: float, filled_base: float, filled_quote: float):
+		# Sizes are compared in the units of the order, with some room for float error on quote sized orders
+		partial 	= (filled_quote if quote_size else filled_base) < size * (1 - 1e-9)
+		avg_price 	= filled_quote / filled_base if filled_base > 0 else None
+		sign 		= 1 if order_side == "buy" else -1
+		# Positive slippage is a worse price than the best price seen when the order was placed
+		slippage 	= sign * (avg_price - placed_price) / placed_price if avg_price is not None and placed_price is not None else None
+
+		self.positions[symbol] = self.positions.get(symbol, 0) + sign * filled_base
+		stats = self.stats.setdefault(symbol, {"orders" : 0, "partial_fills" : 0, "filled_base" : 0, "filled_quote" : 0, "slippage_sum" : 0, "slipped_orders" : 0})
+		stats["orders"] 		+= 1
+		stats["partial_fills"] 	+= 1 if partial else 0
+		stats["filled_base"] 	+= filled_base
+		stats["filled_quote"] 	+= filled_quote
+		if slippage is not None:
+			stats["slippage_sum"] 	+= slippage
+			stats["slipped_orders"] += 1
+
+		fill = 	{
+					"symbol" 		: symbol,
+					"order_side" 	: order_side,
+					"size" 			: size,
+					"filled" 		: filled_base,
+					"avg_price" 	: avg_price,
+					"partial" 		: partial,
+					"slippage" 		: slippage,
+				}
+		self.logger.info(f"Paper fill: {fill}")
+		return fill
+
+	def _fill_from_books(self, placed_book: dict, book: dict, symbol: str, order_side: str, size: float, limit_price: float = None, quote_size: bool = False):
+		(filled_base, filled_quote) = self.match(book = book, order_side = order_side, size = size, limit_price = limit_price, quote_size = quote_size)
+		return self._record(symbol = symbol, order_side = order_side, size = size, quote_size = quote_size,
+							placed_price = self._best_price(book = placed_book, order_side = order_side), filled_base = filled_base, filled_quote = filled_quote)
+
+	def fill(self, symbol: str, order_side: str, size: float, limit_price: float = None, quote_size: bool = False):
+		placed_book = self._book(symbol = symbol, size = size, quote_size = quote_size)
+		if self.latency_s > 0:
+			time.sleep(self.latency_s)
+			book = self._book(symbol = symbol, size = size, quote_size = quote_size)
+		else:
+			book = placed_book
+		return self._fill_from_books(placed_book = placed_book, book = book, symbol = symbol, order_side = order_side, size = size, limit_price = limit_price, quote_size = quote_size)
+
+	async def fill_async(self, symbol: str, order_side: str, size: float, limit_price: float = None, quote_size: bool = False):
+		placed_book = self._book(symbol = symbol, size = size, quote_size = quote_size)
+		if self.latency_s > 0:
+			await asyncio.sleep(self.latency_s)
+			book = self._book(symbol = symbol, size = size, quote_size = quote_size)
+		else:
+			book = placed_book
+		return self._fill_from_books(placed_book = placed_book, book = book, symbol = symbol, order_side = order_side, size = size, limit_price = limit_price, quote_size = quote_size)
+
+	def _flatten_legs(self, fills: [dict]):
+		# Whatever a failed pair did fill is sold back at market, as the revert of a live pair would
+		return [{"symbol" : each_fill["symbol"], "order_side" : "sell" if each_fill["order_side"] == "buy" else "buy", "size" : each_fill["filled"]}
+					for each_fill in fills if each_fill["filled"] > 0]
+
+	def execute_pair(self, legs: [dict]):
+		"""
+		Fills every leg of a pair. Returns True if all legs fill in full. Otherwise the filled amounts are flattened and False is returned
+		"""
+		fills = [self.fill(**each_leg) for each_leg in legs]
+		if all(not each_fill["partial"] for each_fill in fills):
+			return True
+		for each_revert in self._flatten_legs(fills = fills):
+			self.fill(**each_revert)
+		return False
+
+	async def execute_pair_async(self, legs: [dict]):
+		fills = await asyncio.gather(*[self.fill_async(**each_leg) for each_leg in legs])
+		if all(not each_fill["partial"] for each_fill in fills):
+			return True
+		await asyncio.gather(*[self.fill_async(**each_revert) for each_revert in self._flatten_legs(fills = fills)])
+		return False
+
+	def summary(self):
+		return 	{
+					symbol : 	{
+									"orders" 		: stats["orders"],
+									"partial_fills" : stats["partial_fills"],
+									"filled" 		: stats["filled_base"],
+									"avg_price" 	: stats["filled_quote"] / stats["filled_base"] if stats["filled_base"] > 0 else None,
+									"avg_slippage" 	: stats["slippage_sum"] / stats["slipped_orders"] if stats["slipped_orders"] > 0 else None,
+									"position" 		: self.positions.get(symbol, 0),
+								}
+					for (symbol, stats) in self.stats.items()
+				}
@@ -0,0 +1,323 @@
+import itertools
+import json
+import logging
+import math
+import numpy as np
+import os
+import tempfile
+from execution.BacktestEngine import BacktestEngine
+from feeds.BookRecording import BookRecording
+from feeds.PairBookReplay import PairBookReplay
+from multiprocessing import Pool
+from strategies.MarginPerpArbitrag import MarginPerpArbitrag
+from strategies.SpotPerpArbitrag import SpotPerpArbitrag
+
+SWEEP_PARAMS 	= ["entry_gap_frac", "profit_taking_frac", "asset_entry_vol", "perpetual_entry_lot_size"]
+TICKS_DTYPE 	= np.dtype([("timestamp", "<f8"), ("A_bid", "<f8"), ("A_ask", "<f8"), ("B_bid", "<f8"), ("B_ask", "<f8")])
+
+# Environment variables of the bots read from JobConfig.default_args, for each swept param
+DEFAULT_ARGS_NAMES = 	{
+							"spot_perp" 	: {	"entry_gap_frac" : "ENTRY_GAP_FRAC", "profit_taking_frac" : "PROFIT_TAKING_FRAC",
+												"asset_entry_vol" : "SPOT_ENTRY_VOL", "perpetual_entry_lot_size" : "PERPETUAL_ENTRY_LOT_SIZE"},
+							"margin_perp" 	: {	"entry_gap_frac" : "ENTRY_GAP_FRAC", "profit_taking_frac" : "PROFIT_TAKING_FRAC",
+												"asset_entry_vol" : "MARGIN_ENTRY_VOL", "perpetual_entry_lot_size" : "PERPETUAL_ENTRY_LOT_SIZE"},
+						}
+
+class AlignedTicks(object):
+	"""
+	Aligned ticks of a `PairBookReplay` saved to disk, which are replayed by every backtest with the same entry sizes.
+	Ticks are memory mapped, so that processes replaying the same file share its pages.
+	"""
+
+	def __init__(self, path: str, chunk_ticks: int = 1 << 20):
+		self.path 			= path
+		self.chunk_ticks 	= chunk_ticks
+		self.ticks 			= np.memmap(path, dtype = TICKS_DTYPE, mode = "r") if os.path.getsize(path) > 0 else np.zeros(0, dtype = TICKS_DTYPE)
+		return
+
+	@staticmethod
+	def save(replay: PairBookReplay, path: str):
+		with open(path, "wb") as f:
+			for each_chunk in replay.chunks():
+				ticks = np.zeros(len(each_chunk["timestamp"]), dtype = TICKS_DTYPE)
+				for each_name in TICKS_DTYPE.names:
+					ticks[each_name] = each_chunk[each_name]
+				f.write(ticks.tobytes())
+		return AlignedTicks(path = path)
+
+	def __len__(self):
+		return len(self.ticks)
+
+	def chunks(self):
+		for start in range(0, len(self.ticks), self.chunk_ticks):
+			chunk = self.ticks[start : start + self.chunk_ticks]
+			yield {each_name : np.ascontiguousarray(chunk[each_name]) for each_name in TICKS_DTYPE.names}
+		return
+
+def grid_params(space: dict):
+	"""
+	Every combination of the values of each param in space
+	"""
+	names = list(space.keys())
+	return [dict(zip(names, each_values)) for each_values in itertools.product(*[space[each_name] for each_name in names])]
+
+def random_params(space: dict, samples: int, seed: int = None):
+	"""
+	Samples params uniformly between the min and max values of each fraction in space. Entry sizes are picked from their
+	values, as they are limited to multiples of the minimum order sizes of the exchange.
+	"""
+	rng = np.random.default_rng(seed)
+	return [{each_name : _sample(rng = rng, name = each_name, values = each_values) for (each_name, each_values) in space.items()} for _ in range(samples)]
+
+def _sample(rng, name: str, values: list):
+	if name.endswith("_frac"):
+		return float(rng.uniform(min(values), max(values)))
+	return values[int(rng.integers(len(values)))]
+
+def _expected_improvement(observed_x, observed_y, candidate_x, length_scale: float = 0.2, noise: float = 1e-6):
+	# Gaussian process with a RBF kernel over params scaled to [0, 1], and scores scaled to zero mean and unit variance
+	kernel 		= lambda x1, x2: np.exp(-0.5 * ((x1[:, None, :] - x2[None, :, :]) ** 2).sum(axis = 2) / length_scale ** 2)
+	scale 		= observed_y.std() if observed_y.std() > 0 else 1
+	y 			= (observed_y - observed_y.mean()) / scale
+	cholesky 	= np.linalg.cholesky(kernel(observed_x, observed_x) + noise * np.eye(len(observed_x)))
+	alpha 		= np.linalg.solve(cholesky.T, np.linalg.solve(cholesky, y))
+	cross 		= kernel(candidate_x, observed_x)
+	mean 		= cross @ alpha
+	std 		= np.sqrt(np.maximum(1 - (np.linalg.solve(cholesky, cross.T) ** 2).sum(axis = 0), 1e-12))
+	z 			= (mean - y.max()) / std
+	cdf 		= 0.5 * (1 + np.vectorize(math.erf)(z / math.sqrt(2)))
+	pdf 		= np.exp(-0.5 * z ** 2) / math.sqrt(2 * math.pi)
+	return ((mean - y.max()) * cdf + std * pdf, mean * scale + observed_y.mean())
+
+class BayesianSearch(object):
+	"""
+	Proposes params where a Gaussian process fitted on the scores so far expects the most improvement.
+
+	Batches of proposals are picked one at a time, each assumed to score as predicted, so that a batch spreads over
+	the space and can be backtested in parallel.
+	"""
+
+	def __init__(self, space: dict, candidates: int = 2048, seed: int = None):
+		self.space 		= space
+		self.names 		= list(space.keys())
+		self.candidates = candidates
+		self.rng 		= np.random.default_rng(seed)
+		self.observed 	= []
+		return
+
+	def _scale(self, params: dict):
+		scaled = []
+		for each_name in self.names:
+			values = self.space[each_name]
+			if each_name.endswith("_frac"):
+				(low, high) = (min(values), max(values))
+				scaled.append((params[each_name] - low) / (high - low) if high > low else 0)
+			else:
+				scaled.append(values.index(params[each_name]) / (len(values) - 1) if len(values) > 1 else 0)
+		return scaled
+
+	def observe(self, params: dict, score: float):
+		self.observed.append((params, score))
+		return
+
+	def propose(self, batch: int):
+		candidates 	= random_params(space = self.space, samples = self.candidates, seed = self.rng.integers(1 << 31))
+		if len(self.observed) == 0:
+			return candidates[:batch]
+
+		candidate_x = np.array([self._scale(params = each) for each in candidates])
+		observed_x 	= [self._scale(params = each_params) for (each_params, _) in self.observed]
+		observed_y 	= [each_score for (_, each_score) in self.observed]
+		proposals 	= []
+		for _ in range(batch):
+			(improvement, mean) = _expected_improvement(observed_x = np.array(observed_x), observed_y = np.array(observed_y), candidate_x = candidate_x)
+			best_idx = int(np.argmax(improvement))
+			proposals.append(candidates[best_idx])
+			observed_x.append(candidate_x[best_idx].tolist())
+			observed_y.append(float(mean[best_idx]))
+		return proposals
+
+# Set in each process of the pool by _init_worker
+_worker = {}
+
+def _init_worker(context: dict):
+	global _worker
+	_worker = {"context" : context, "ticks" : {}}
+	return
+
+def _align(sizes: tuple):
+	"""
+	Saves the aligned ticks for one pair of entry sizes, and returns the path of the file
+	"""
+	context = _worker["context"]
+	(asset_entry_vol, perpetual_entry_lot_size) = sizes
+	replay 	= PairBookReplay(	A_recording 	= BookRecording(path = context["asset_recording"]),
+								B_recording 	= BookRecording(path = context["perpetual_recording"]),
+								A_size 			= asset_entry_vol,
+								B_size 			= perpetual_entry_lot_size,
+								**context["replay_params"])
+	path 	= os.path.join(context["ticks_dir"], f"ticks-{asset_entry_vol}-{perpetual_entry_lot_size}.bin")
+	AlignedTicks.save(replay = replay, path = path)
+	return path
+
+def _backtest(task: tuple):
+	(params, ticks_path) = task
+	context = _worker["context"]
+	if ticks_path not in _worker["ticks"]:
+		_worker["ticks"][ticks_path] = AlignedTicks(path = ticks_path)
+
+	if context["asset_type"] == "spot_perp":
+		strategy = SpotPerpArbitrag(spot_symbol 			= context["asset_recording"],
+									current_spot_vol 		= 0,
+									max_spot_vol 			= context["max_asset_vol"],
+									perp_symbol 			= context["perpetual_recording"],
+									current_perp_lot_size 	= 0,
+									max_perp_lot_size 		= context["max_perpetual_lot_size"])
+	else:
+		strategy = MarginPerpArbitrag(	margin_symbol 			= context["asset_recording"],
+										current_margin_position = 0,
+										max_margin_position 	= context["max_asset_vol"],
+										perp_symbol 			= context["perpetual_recording"],
+										current_perp_position 	= 0,
+										max_perp_position 		= context["max_perpetual_lot_size"])
+
+	engine 	= BacktestEngine(strategy = strategy, **params, **context["engine_params"])
+	summary = engine.run(replay = _worker["ticks"][ticks_path])
+	return {**params, **(summary if summary is not None else {"trades" : 0, "pnl" : 0.0, "max_gross_exposure" : 0.0})}
+
+class ParameterSweep(object):
+	"""
+	Backtests a pair over many values of entry_gap_frac, profit_taking_frac, asset_entry_vol and perpetual_entry_lot_size
+	with a pool of processes, and ranks the results.
+
+	Replays only depend on the entry sizes, so the aligned ticks of each pair of sizes are saved to ticks_dir once and
+	memory mapped by every backtest using them.
+	"""
+	logger = logging.getLogger('ParameterSweep')
+
+	def __init__(self, 	asset_type: str,
+						asset_recording: str,
+						perpetual_recording: str,
+						max_asset_vol: float,
+						max_perpetual_lot_size: int,
+						engine_params: dict,
+						replay_params: dict,
+						processors: int,
+						rank_by: str = "pnl",
+						ticks_dir: str = None):
+		"""
+		engine_params 	- BacktestEngine params other than the swept params, shared by all backtests
+		replay_params 	- PairBookReplay params other than the entry sizes
+		rank_by 		- Either pnl or return_on_exposure, which is the pnl over the max gross exposure
+		"""
+		assert asset_type in DEFAULT_ARGS_NAMES, f"Unsupported asset type {asset_type}"
+		assert rank_by in {"pnl", "return_on_exposure"}, f"Unsupported rank {rank_by}"
+		self.asset_type 	= asset_type
+		self.rank_by 		= rank_by
+		self.processors 	= processors
+		self._ticks_dir 	= tempfile.TemporaryDirectory() if ticks_dir is None else None
+		self.context 		= 	{
+									"asset_type" 				: asset_type,
+									"asset_recording" 			: asset_recording,
+									"perpetual_recording" 		: perpetual_recording,
+									"max_asset_vol" 			: max_asset_vol,
+									"max_perpetual_lot_size" 	: max_perpetual_lot_size,
+									"engine_params" 			: engine_params,
+									"replay_params" 			: replay_params,
+									"ticks_dir" 				: ticks_dir if ticks_dir is not None else self._ticks_dir.name,
+								}
+		self.pool 			= None
+		self.ticks_paths 	= {}
+		self.results 		= []
+		return
+
+	def _pool(self):
+		# Kept for the whole sweep, so that the batches of a bayesian search reuse the tick files mapped by each process
+		if self.pool is None:
+			self.pool = Pool(processes = self.processors, initializer = _init_worker, initargs = (self.context, ))
+		return self.pool
+
+	def _score(self, result: dict):
+		if self.rank_by == "return_on_exposure":
+			return result["pnl"] / result["max_gross_exposure"] if result["max_gross_exposure"] > 0 else 0.0
+		return result["pnl"]
+
+	def evaluate(self, params_list: list):
+		"""
+		Backtests every params in params_list, and returns their results in the same order
+		"""
+		sizes 		= sorted({(each["asset_entry_vol"], each["perpetual_entry_lot_size"]) for each in params_list} - set(self.ticks_paths.keys()))
+		# Backtests sharing entry sizes are sent together, so that each process maps few tick files
+		order 		= sorted(range(len(params_list)), key = lambda idx: (params_list[idx]["asset_entry_vol"], params_list[idx]["perpetual_entry_lot_size"]))
+		results 	= [None] * len(params_list)
+
+		pool 		= self._pool()
+		for (each_sizes, each_path) in zip(sizes, pool.map(_align, sizes)):
+			self.ticks_paths[each_sizes] = each_path
+		if len(sizes) > 0:
+			self.logger.info(f"Aligned ticks for {len(sizes)} entry sizes")
+
+		tasks 		= [(params_list[idx], self.ticks_paths[(params_list[idx]["asset_entry_vol"], params_list[idx]["perpetual_entry_lot_size"])]) for idx in order]
+		chunksize 	= max(1, len(tasks) // (4 * self.processors))
+		for (idx, each_result) in zip(order, pool.imap(_backtest, tasks, chunksize = chunksize)):
+			each_result["score"] 	= float(self._score(result = each_result))
+			results[idx] 			= each_result
+
+		self.results.extend(results)
+		self.logger.info(f"Backtested {len(params_list)} params, {len(self.results)} in total")
+		return results
+
+	def grid(self, space: dict):
+		return self.evaluate(params_list = grid_params(space = space))
+
+	def random(self, space: dict, samples: int, seed: int = None):
+		return self.evaluate(params_list = random_params(space = space, samples = samples, seed = seed))
+
+	def bayesian(self, space: dict, samples: int, initial_samples: int = None, seed: int = None):
+		"""
+		Backtests initial_samples random params, and then batches of the processors count proposed by a `BayesianSearch`
+		until samples params are backtested
+		"""
+		search 		= BayesianSearch(space = space, seed = seed)
+		batch_size 	= initial_samples if initial_samples is not None else max(self.processors, 4)
+		evaluated 	= 0
+		while evaluated < samples:
+			batch = search.propose(batch = min(batch_size, samples - evaluated))
+			for (each_params, each_result) in zip(batch, self.evaluate(params_list = batch)):
+				search.observe(params = each_params, score = each_result["score"])
+			evaluated 	+= len(batch)
+			batch_size 	= self.processors
+		return self.results[-samples:]
+
+	def ranked(self, exchange: str = None, user_id: int = None, first_asset: str = None, second_asset: str = None, base_default_args: dict = {}):
+		"""
+		Results from the best score down, with the JobConfig columns of a job trading the params. default_args holds
+		base_default_args with the swept params set.
+		"""
+		names 	= DEFAULT_ARGS_NAMES[self.asset_type]
+		rows 	= []
+		for (rank, each_result) in enumerate(sorted(self.results, key = lambda each: each["score"], reverse = True)):
+			default_args = {**base_default_args, **{names[each_name] : str(each_result[each_name]) for each_name in SWEEP_PARAMS}}
+			rows.append({	"rank" 				: rank,
+							**{each_name : each_result[each_name] for each_name in SWEEP_PARAMS},
+							"score" 			: each_result["score"],
+							"pnl" 				: each_result["pnl"],
+							"trades" 			: each_result["trades"],
+							"max_gross_exposure": each_result["max_gross_exposure"],
+							"user_id" 			: user_id,
+							"exchange" 			: exchange,
+							"asset_type" 		: self.asset_type.replace("_", "-"),
+							"first_asset" 		: first_asset,
+							"second_asset" 		: second_asset,
+							"default_args" 		: json.dumps(default_args),
+						})
+		return rows
+
+	def close(self):
+		if self.pool is not None:
+			self.pool.terminate()
+			self.pool.join()
+			self.pool = None
+		if self._ticks_dir is not None:
+			self._ticks_dir.cleanup()
+		return
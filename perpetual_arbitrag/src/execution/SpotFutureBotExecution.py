@@ -1,4 +1,3 @@
-import copy
 import logging
 from execution.BotExecutionV2 import BotExecutionV2
 
@@ -6,8 +5,12 @@ class SpotFutureBotExecution(BotExecutionV2):
 	api_client 	= None
 	logger 		= logging.getLogger('SpotFutureBotExecution')
 
-	def __init__(self, api_client):
+	def __init__(self, api_client, concurrent_legs: bool = False):
 		self.api_client = api_client
+		# Concurrent legs are placed from a worker thread, which is started here rather than on the first trade
+		self.trade_execution_fn = self.concurrent_trade_execution if concurrent_legs else self.idempotent_trade_execution
+		if concurrent_legs:
+			self._leg_thread_pool().submit(lambda: None)
 		return
 
 	def long_spot_short_futures(self, spot_params,
@@ -17,7 +20,7 @@ class SpotFutureBotExecution(BotExecutionV2):
 								):
 		self.logger.info(spot_params)
 		self.logger.info(future_params)
-		return self.idempotent_trade_execution(	asset_A_order_fn 				= self.api_client.place_futures_order,
+		return self.trade_execution_fn(			asset_A_order_fn 				= self.api_client.place_futures_order,
 												asset_A_params 					= future_params,
 												asset_A_assert_resp_error_fn 	= self.api_client.assert_futures_resp_error,
 												asset_A_revert_fn 				= self.api_client.revert_futures_order,
@@ -36,7 +39,7 @@ class SpotFutureBotExecution(BotExecutionV2):
 								):		
 		self.logger.info(spot_params)
 		self.logger.info(future_params)
-		return self.idempotent_trade_execution(	asset_A_order_fn 				= self.api_client.place_spot_order,
+		return self.trade_execution_fn(			asset_A_order_fn 				= self.api_client.place_spot_order,
 												asset_A_params 					= spot_params,
 												asset_A_assert_resp_error_fn 	= self.api_client.assert_spot_resp_error,
 												asset_A_revert_fn 				= self.api_client.revert_spot_order,
@@ -49,12 +52,19 @@ class SpotFutureBotExecution(BotExecutionV2):
 											)
 
 class SpotFutureSimulatedBotExecution(SpotFutureBotExecution):
-	def __init__(self, *args, **kwargs):
+	"""
+	Simulated execution. Without a fill_engine every trade succeeds, otherwise both legs are paper filled by the PaperFillEngine.
+	"""
+	def __init__(self, fill_engine = None, *args, **kwargs):
 		self.logger.warning("Order execution is simulated.")
-		super(SpotFutureSimulatedBotExecution, self).__init__(*args, *kwargs)
+		super(SpotFutureSimulatedBotExecution, self).__init__(*args, **kwargs)
+		self.fill_engine = fill_engine
 
-	def long_spot_short_futures(self, *args, **kwargs):
-		return True
+	def _paper_legs(self, spot_params, future_params):
+		return [self.fill_engine.order_leg(params = spot_params), self.fill_engine.order_leg(params = future_params)]
 
-	def short_spot_long_futures(self, *args, **kwargs):
-		return True
\ No newline at end of file
+	def long_spot_short_futures(self, spot_params, future_params, *args, **kwargs):
+		return self.fill_engine.execute_pair(legs = self._paper_legs(spot_params, future_params)) if self.fill_engine is not None else True
+
+	def short_spot_long_futures(self, spot_params, future_params, *args, **kwargs):
+		return self.fill_engine.execute_pair(legs = self._paper_legs(spot_params, future_params)) if self.fill_engine is not None else True
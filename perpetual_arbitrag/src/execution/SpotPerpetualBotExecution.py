@@ -6,55 +6,110 @@ class SpotPerpetualBotExecution(BotExecutionV2):
 	api_client 	= None
 	logger 		= logging.getLogger('SpotPerpetualBotExecution')
 
-	def __init__(self, api_client):
-		self.api_client = api_client
+	def __init__(self, api_client, batch_orders: bool = False, unwind_engine = None):
+		self.api_client 	= api_client
+		self.batch_orders 	= batch_orders
+		self.unwind_engine 	= unwind_engine
 		return
 
-	def long_spot_short_perpetual(self, spot_params,
+	def _batch_params(self, asset_A_type: str, asset_B_type: str):
+		# When batching, both legs and their reverts go out as one batch-orders message
+		return 	{
+				"asset_A_type" 		: asset_A_type,
+				"asset_B_type" 		: asset_B_type,
+				"batch_order_fn" 	: self.api_client.place_batch_orders_async if self.batch_orders else None,
+				"batch_split_fn" 	: self.api_client.split_batch_order_resp if self.batch_orders else None,
+				}
+
+	def _unwind_params(self):
+		# Without an unwind engine, a failed pair falls back to a single revert. Legs with lost replies are looked up either way
+		return 	{
+				"unwind_engine" 	: self.unwind_engine,
+				"confirm_fill_fn" 	: self.api_client.confirm_order_filled_async if self.unwind_engine is not None else None,
+				"cancel_fn" 		: self.api_client.cancel_order_async if self.unwind_engine is not None else None,
+				"order_state_fn" 	: self.api_client.get_order_async,
+				"position_fn" 		: self.api_client.get_position_async if self.unwind_engine is not None else None,
+				}
+
+	def _long_spot_short_perpetual_params(self, spot_params,
 									  	perpetual_params,
 									  	spot_revert_params,
 									  	perpetual_revert_params,
 								):
 		self.logger.info(spot_params)
 		self.logger.info(perpetual_params)
-		return self.idempotent_trade_execution_async(asset_A_order_fn 				= self.api_client.place_perpetual_order_async,
-													 asset_A_params 				= perpetual_params,
-													 asset_A_assert_resp_error_fn 	= self.api_client.assert_perpetual_resp_error,
-													 asset_A_revert_fn 				= self.api_client.revert_perpetual_order_async,
-													 asset_A_revert_params 			= perpetual_revert_params,
-													 asset_B_order_fn 				= self.api_client.place_spot_order_async,
-													 asset_B_params 				= spot_params,
-													 asset_B_assert_resp_error_fn 	= self.api_client.assert_spot_resp_error,
-													 asset_B_revert_fn 				= self.api_client.revert_spot_order_async,
-													 asset_B_revert_params 			= spot_revert_params
-												)
-
-	def short_spot_long_perpetual(self, spot_params,
+		return 	{
+				"asset_A_order_fn" 				: self.api_client.place_perpetual_order_async,
+				"asset_A_params" 					: perpetual_params,
+				"asset_A_assert_resp_error_fn" 	: self.api_client.assert_perpetual_resp_error,
+				"asset_A_revert_fn" 				: self.api_client.revert_perpetual_order_async,
+				"asset_A_revert_params" 			: perpetual_revert_params,
+				"asset_B_order_fn" 				: self.api_client.place_spot_order_async,
+				"asset_B_params" 					: spot_params,
+				"asset_B_assert_resp_error_fn" 	: self.api_client.assert_spot_resp_error,
+				"asset_B_revert_fn" 				: self.api_client.revert_spot_order_async,
+				"asset_B_revert_params" 			: spot_revert_params,
+				**self._batch_params(asset_A_type = "perpetual", asset_B_type = "spot"),
+				**self._unwind_params()
+				}
+
+	def long_spot_short_perpetual(self, *args, **kwargs):
+		return self.idempotent_trade_execution_async(**self._long_spot_short_perpetual_params(*args, **kwargs))
+
+	async def long_spot_short_perpetual_async(self, *args, **kwargs):
+		return await self._idempotent_trade_execution_async(**self._long_spot_short_perpetual_params(*args, **kwargs))
+
+	def _short_spot_long_perpetual_params(self, spot_params,
 									  	perpetual_params,
 									  	spot_revert_params,
 									  	perpetual_revert_params,
 								):
 		self.logger.info(spot_params)
 		self.logger.info(perpetual_params)
-		return self.idempotent_trade_execution_async(asset_A_order_fn 				= self.api_client.place_spot_order_async,
-												 	 asset_A_params 				= spot_params,
-												 	 asset_A_assert_resp_error_fn 	= self.api_client.assert_spot_resp_error,
-													 asset_A_revert_fn 				= self.api_client.revert_spot_order_async,
-												 	 asset_A_revert_params 			= spot_revert_params,
-												 	 asset_B_order_fn 				= self.api_client.place_perpetual_order_async,
-													 asset_B_params 				= perpetual_params,
-												 	 asset_B_assert_resp_error_fn 	= self.api_client.assert_perpetual_resp_error,
-													 asset_B_revert_fn 				= self.api_client.revert_perpetual_order_async,
-												 	 asset_B_revert_params 			= perpetual_revert_params
-												)
+		return 	{
+				"asset_A_order_fn" 				: self.api_client.place_spot_order_async,
+				"asset_A_params" 					: spot_params,
+				"asset_A_assert_resp_error_fn" 	: self.api_client.assert_spot_resp_error,
+				"asset_A_revert_fn" 				: self.api_client.revert_spot_order_async,
+				"asset_A_revert_params" 			: spot_revert_params,
+				"asset_B_order_fn" 				: self.api_client.place_perpetual_order_async,
+				"asset_B_params" 					: perpetual_params,
+				"asset_B_assert_resp_error_fn" 	: self.api_client.assert_perpetual_resp_error,
+				"asset_B_revert_fn" 				: self.api_client.revert_perpetual_order_async,
+				"asset_B_revert_params" 			: perpetual_revert_params,
+				**self._batch_params(asset_A_type = "spot", asset_B_type = "perpetual"),
+				**self._unwind_params()
+				}
+
+	def short_spot_long_perpetual(self, *args, **kwargs):
+		return self.idempotent_trade_execution_async(**self._short_spot_long_perpetual_params(*args, **kwargs))
+
+	async def short_spot_long_perpetual_async(self, *args, **kwargs):
+		return await self._idempotent_trade_execution_async(**self._short_spot_long_perpetual_params(*args, **kwargs))
 
 class SpotPerpetualSimulatedBotExecution(SpotPerpetualBotExecution):
-	def __init__(self, *args, **kwargs):
+	"""
+	Simulated execution. Without a fill_engine every trade succeeds, otherwise both legs are paper filled by the PaperFillEngine.
+	"""
+	def __init__(self, fill_engine = None, *args, **kwargs):
 		self.logger.warning("Order execution is simulated.")
-		super(SpotPerpetualSimulatedBotExecution, self).__init__(*args, *kwargs)
+		super(SpotPerpetualSimulatedBotExecution, self).__init__(*args, **kwargs)
+		self.fill_engine = fill_engine
 
-	def long_spot_short_perpetual(self, *args, **kwargs):
-		return True
+	def _paper_legs(self, spot_params, perpetual_params):
+		return 	[
+					self.fill_engine.order_leg(params = spot_params, quote_size = spot_params.get("target_currency") == "quote_ccy"),
+					self.fill_engine.order_leg(params = perpetual_params),
+				]
 
-	def short_spot_long_perpetual(self, *args, **kwargs):
-		return True
\ No newline at end of file
+	def long_spot_short_perpetual(self, spot_params, perpetual_params, *args, **kwargs):
+		return self.fill_engine.execute_pair(legs = self._paper_legs(spot_params, perpetual_params)) if self.fill_engine is not None else True
+
+	def short_spot_long_perpetual(self, spot_params, perpetual_params, *args, **kwargs):
+		return self.fill_engine.execute_pair(legs = self._paper_legs(spot_params, perpetual_params)) if self.fill_engine is not None else True
+
+	async def long_spot_short_perpetual_async(self, spot_params, perpetual_params, *args, **kwargs):
+		return await self.fill_engine.execute_pair_async(legs = self._paper_legs(spot_params, perpetual_params)) if self.fill_engine is not None else True
+
+	async def short_spot_long_perpetual_async(self, spot_params, perpetual_params, *args, **kwargs):
+		return await self.fill_engine.execute_pair_async(legs = self._paper_legs(spot_params, perpetual_params)) if self.fill_engine is not None else True
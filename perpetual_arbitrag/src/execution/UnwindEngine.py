@@ -0,0 +1,164 @@
+import asyncio
+import copy
+import logging
+import time
+from feeds.FeedLatencyMetrics import LatencyHistogram
+
+class UnwindEngine(object):
+	"""
+	Flattens the leg left open when the other leg of a paired order fails.
+
+	The revert is sent as soon as the failure is seen. An attempt fails if the revert is rejected, gets no reply within
+	reply_timeout_s or, when a confirm_fill_fn is given, is not filled within fill_timeout_s. A revert still working at
+	that point is cancelled through cancel_fn, if given. Failed attempts are retried after retry_interval_s with escalated 
+	params, up to max_attempts. By default, retries are sent as market orders.
+
+	Every revert carries its own client order id. If an order_state_fn is given, each revert is resolved on the exchange
+	by that id once its attempt is over, so that a revert whose reply was lost is never sent twice, and retries only
+	carry the size left unfilled. If a position_fn is given, the position is confirmed to have moved by the full revert 
+	size, within flat_tolerance_frac, before the leg is reported flat.
+
+	Time from the failure to a confirmed flat position is recorded in time_to_flat.
+	"""
+	logger = logging.getLogger('UnwindEngine')
+
+	def __init__(self, 	max_attempts: int = 3,
+						reply_timeout_s: float = 1,
+						fill_timeout_s: float = 0.5,
+						fill_poll_interval_s: float = 0.02,
+						retry_interval_s: float = 0.01,
+						flat_tolerance_frac: float = 0.01):
+		self.max_attempts 			= max_attempts
+		self.reply_timeout_s 		= reply_timeout_s
+		self.fill_timeout_s 		= fill_timeout_s
+		self.fill_poll_interval_s 	= fill_poll_interval_s
+		self.retry_interval_s 		= retry_interval_s
+		self.flat_tolerance_frac 	= flat_tolerance_frac
+		self.time_to_flat 			= LatencyHistogram()
+		self.unwinds 				= 0
+		self.failed_unwinds 		= 0
+		return
+
+	def escalate(self, revert_params: dict, attempt: int):
+		"""
+		Params of the revert for the given attempt, starting from 0. Retries cross the book with a market order.
+		"""
+		if attempt == 0 or revert_params.get("order_type") == "market":
+			return revert_params
+		escalated_params 				= copy.copy(revert_params)
+		escalated_params["order_type"] 	= "market"
+		return escalated_params
+
+	async def _wait_for_fill(self, confirm_fill_fn, revert_resp: dict, revert_params: dict):
+		deadline = time.monotonic() + self.fill_timeout_s
+		while True:
+			filled = await confirm_fill_fn(order_resp = revert_resp, order_params = revert_params)
+			if filled is not None:
+				return filled
+			if time.monotonic() >= deadline:
+				return False
+			await asyncio.sleep(self.fill_poll_interval_s)
+
+	async def _attempt(self, revert_fn, revert_params: dict, order_resp: dict, assert_resp_error_fn, confirm_fill_fn, cancel_fn, order_state_fn):
+		"""
+		Sends one revert and returns the size it filled.
+		"""
+		filled = 0
+		try:
+			revert_resp = await asyncio.wait_for(revert_fn(order_resp = order_resp, revert_params = revert_params), timeout = self.reply_timeout_s)
+			self.logger.info(f"{revert_resp}")
+			assert_resp_error_fn(revert_resp)
+			if confirm_fill_fn is not None and not await self._wait_for_fill(confirm_fill_fn = confirm_fill_fn, revert_resp = revert_resp, revert_params = revert_params):
+				if cancel_fn is not None and order_state_fn is None:
+					# Stops the working revert from filling on top of the next attempt
+					await asyncio.wait_for(cancel_fn(order_resp = revert_resp, order_params = revert_params), timeout = self.reply_timeout_s)
+				raise Exception(f"Revert not filled within {self.fill_timeout_s}s: {revert_resp}")
+			filled = revert_params["size"]
+		except Exception as ex:
+			self.logger.error(f"Revert {revert_params['client_order_id']} failed: {ex}")
+
+		if order_state_fn is not None:
+			filled = await self._resolve(order_state_fn = order_state_fn, cancel_fn = cancel_fn, revert_params = revert_params)
+		return filled
+
+	async def _resolve(self, order_state_fn, cancel_fn, revert_params: dict):
+		"""
+		Size filled by a revert as reported by the exchange, cancelling it first if still working. 0 if the exchange never received it.
+		"""
+		order = await order_state_fn(order_resp = None, order_params = revert_params)
+		if order is not None and order["state"] in {"live", "partially_filled"} and cancel_fn is not None:
+			await asyncio.wait_for(cancel_fn(order_resp = {"data" : [order]}, order_params = revert_params), timeout = self.reply_timeout_s)
+			order = await order_state_fn(order_resp = None, order_params = revert_params)
+		return 0 if order is None else float(order["accFillSz"])
+
+	def _size(self, revert_params: dict, size: float):
+		# Keeps the type of the original size, and drops float noise that the exchange would reject as a size precision error
+		return type(revert_params["size"])(round(size, 12))
+
+	async def unwind_async(self, revert_fn,
+								 revert_params: dict,
+								 order_resp: dict,
+								 assert_resp_error_fn,
+								 confirm_fill_fn = None,
+								 cancel_fn = None,
+								 order_state_fn = None,
+								 position_fn = None,
+								 failed_at: float = None):
+		"""
+		Reverts the open leg and returns True once the position is flat, or False if every attempt failed.
+
+		revert_fn 		: async fn of (order_resp, revert_params) returning the parsed reply to the revert
+		confirm_fill_fn : optional async fn of (order_resp, order_params) returning True once filled, False if it cannot fill and None while working
+		cancel_fn 		: optional async fn of (order_resp, order_params) cancelling a revert that did not fill in time
+		order_state_fn 	: optional async fn of (order_resp, order_params) returning the exchange details of the order with the 
+						  client_order_id of order_params, with its state and accFillSz, or None if the exchange has no such order
+		position_fn 	: optional async fn of (order_params) returning the signed position held on the symbol of the order,
+						  or None if it cannot be read
+		failed_at 		: time.monotonic() at which the failure was seen. Defaults to now
+		"""
+		_failed_at = time.monotonic() if failed_at is None else failed_at
+		self.unwinds += 1
+		unwind_id 	= f"UNWIND{int(time.time() * 1000)}N{self.unwinds}"
+		direction 	= 1 if revert_params["order_side"] == "buy" else -1
+		remaining 	= revert_params["size"]
+		try:
+			# Read before any revert is sent, as the position the reverts have to move by their full size
+			start_position = await position_fn(order_params = revert_params) if position_fn is not None else None
+		except Exception as ex:
+			self.logger.error(f"Unwinding without position checks, as the position could not be read: {ex}")
+			start_position = None
+
+		for attempt in range(self.max_attempts):
+			attempt_params = {	**self.escalate(revert_params = revert_params, attempt = attempt),
+								"size" 				: self._size(revert_params = revert_params, size = remaining),
+								"client_order_id" 	: f"{unwind_id}A{attempt}"}
+			try:
+				remaining -= await self._attempt(	revert_fn = revert_fn, revert_params = attempt_params, order_resp = order_resp, assert_resp_error_fn = assert_resp_error_fn,
+													confirm_fill_fn = confirm_fill_fn, cancel_fn = cancel_fn, order_state_fn = order_state_fn)
+				if start_position is not None:
+					remaining = direction * (start_position + direction * revert_params["size"] - await position_fn(order_params = revert_params))
+			except Exception as ex:
+				# Without the state of the last revert, another one could double the position instead of flattening it
+				self.logger.error(f"Unwind stopped as revert {attempt_params['client_order_id']} could not be resolved: {ex}")
+				break
+
+			if remaining <= self.flat_tolerance_frac * revert_params["size"]:
+				time_to_flat_s = time.monotonic() - _failed_at
+				self.time_to_flat.record(latency_s = time_to_flat_s)
+				self.logger.info(f"Flat after {attempt + 1} attempt(s) in {time_to_flat_s * 1000:.1f}ms - p99 time to flat: {self.time_to_flat.quantile_ms(0.99)}ms")
+				return True
+
+			self.logger.error(f"Unwind attempt {attempt + 1} of {self.max_attempts} left {remaining} open")
+			if attempt + 1 < self.max_attempts:
+				await asyncio.sleep(self.retry_interval_s)
+
+		self.failed_unwinds += 1
+		self.logger.error(f"Position left open after {attempt + 1} unwind attempt(s): {revert_params}")
+		return False
+
+	def summary(self):
+		return 	{
+					"unwinds" 			: self.unwinds,
+					"failed_unwinds" 	: self.failed_unwinds,
+					"time_to_flat" 		: self.time_to_flat.summary(),
+				}
@@ -0,0 +1,121 @@
+import numpy as np
+import os
+import struct
+
+"""
+Fixed depth layout for recorded order book snapshots of one symbol, read back through a memory map without parsing.
+
+| magic "BKRC" | depth (uint32) | records ... |
+
+Each record is | timestamp (float64) | bids (depth x float64 price, qty) | asks (depth x float64 price, qty) |, little endian.
+Bids are stored highest price first and asks lowest price first. Books with fewer levels than the depth are padded
+with zero quantity levels, which do not change any average price.
+"""
+
+RECORDING_MAGIC 		= b"BKRC"
+RECORDING_HEADER 		= struct.Struct("<4sI")
+RECORDING_HEADER_SIZE 	= RECORDING_HEADER.size
+
+def recording_dtype(depth: int):
+	return np.dtype([("timestamp", "<f8"), ("bids", "<f8", (depth, 2)), ("asks", "<f8", (depth, 2))])
+
+def _fixed_depth(levels, depth: int, descending: bool):
+	_levels = np.asarray(levels, dtype = "<f8").reshape(-1, 2)
+	if len(_levels) > 1 and ((_levels[1:, 0] > _levels[:-1, 0]).any() if descending else (_levels[1:, 0] < _levels[:-1, 0]).any()):
+		order 	= np.argsort(_levels[:, 0], kind = "stable")
+		_levels = _levels[order[::-1]] if descending else _levels[order]
+
+	fixed 					= np.zeros((depth, 2), dtype = "<f8")
+	fixed[:, 0] 			= np.nan
+	fixed[:len(_levels)] 	= _levels[:depth]
+	if 0 < len(_levels) < depth:
+		# Padded levels repeat the last price, so that prices stay ordered
+		fixed[len(_levels):, 0] = _levels[-1, 0]
+	return fixed
+
+class BookRecorder(object):
+	"""
+	Appends snapshots of one symbol to a recording. An existing recording is appended to, and must have the same depth.
+	A record left incomplete at its end, e.g. by a recorder killed mid write, is dropped before appending.
+	"""
+
+	def __init__(self, path: str, depth: int):
+		self.path 	= path
+		self.depth 	= depth
+		self.dtype 	= recording_dtype(depth = depth)
+		self.last_timestamp = None
+		if os.path.exists(path) and os.path.getsize(path) > 0:
+			recording = BookRecording(path = path)
+			assert recording.depth == depth, f"{path} is recorded with depth {recording.depth}, not {depth}"
+			self.last_timestamp = float(recording.records["timestamp"][-1]) if len(recording) > 0 else None
+			self.file = open(path, "ab")
+			# Appended records must start on a record boundary, or every later record is read shifted
+			self.file.truncate(RECORDING_HEADER_SIZE + len(recording) * self.dtype.itemsize)
+			del recording
+		else:
+			self.file = open(path, "wb")
+			self.file.write(RECORDING_HEADER.pack(RECORDING_MAGIC, depth))
+		return
+
+	def append(self, bids, asks, timestamp: float):
+		"""
+		Writes one snapshot, with bids / asks given as [[price, qty], ...]. Snapshots must be appended in time order.
+		"""
+		assert self.last_timestamp is None or timestamp >= self.last_timestamp, f"Snapshot at {timestamp} is older than {self.last_timestamp}"
+		record 				= np.zeros(1, dtype = self.dtype)
+		record["timestamp"] = timestamp
+		record["bids"] 		= _fixed_depth(levels = bids, depth = self.depth, descending = True)
+		record["asks"] 		= _fixed_depth(levels = asks, depth = self.depth, descending = False)
+		self.file.write(record.tobytes())
+		self.last_timestamp = timestamp
+		return self
+
+	def flush(self):
+		self.file.flush()
+		return self
+
+	def close(self):
+		self.file.close()
+		return
+
+class BookRecording(object):
+	"""
+	Read only view over a recording. Records are memory mapped, so that months of snapshots are streamed from disk
+	chunk by chunk instead of being loaded at once.
+	"""
+
+	def __init__(self, path: str):
+		self.path = path
+		with open(path, "rb") as f:
+			(magic, self.depth) = RECORDING_HEADER.unpack(f.read(RECORDING_HEADER_SIZE))
+		assert magic == RECORDING_MAGIC, f"{path} is not a book recording"
+		self.dtype 		= recording_dtype(depth = self.depth)
+		records 		= (os.path.getsize(path) - RECORDING_HEADER_SIZE) // self.dtype.itemsize
+		self.records 	= np.memmap(path, dtype = self.dtype, mode = "r", offset = RECORDING_HEADER_SIZE, shape = (records, )) \
+						  if records > 0 else np.zeros(0, dtype = self.dtype)
+		self._timestamps = None
+		return
+
+	def __len__(self):
+		return len(self.records)
+
+	@property
+	def timestamps(self):
+		# Copied out of the records once, as searches over the strided column would copy it on every call
+		if self._timestamps is None:
+			self._timestamps = np.ascontiguousarray(self.records["timestamp"])
+		return self._timestamps
+
+	def index_at(self, timestamp: float):
+		"""
+		Index of the first record at or after timestamp
+		"""
+		return int(np.searchsorted(self.timestamps, timestamp, side = "left"))
+
+	def between(self, start_ts: float, end_ts: float):
+		"""
+		Records in [start_ts, end_ts), together with the last record before start_ts if any, which is still the
+		latest book at start_ts.
+		"""
+		(start_idx, end_idx) = (self.index_at(start_ts), self.index_at(end_ts))
+		return self.records[max(start_idx - 1, 0) : end_idx]
@@ -0,0 +1,123 @@
+import json
+import logging
+import threading
+from feeds.CryptoStoreRedisFeeds import CryptoStoreRedisFeeds
+from feeds.LocalOrderBook import LocalOrderBook
+
+class CryptoStoreRedisDeltaFeeds(CryptoStoreRedisFeeds):
+	"""
+	Reads L2 delta updates written by cryptostore running with SNAPSHOT_ONLY=False.
+
+	Each symbol is kept as a `LocalOrderBook` in process. The book is seeded from the latest snapshot in Redis,
+	after which entries from the score of the last applied one are read, and those not applied yet are applied.
+	If the last applied entry is no longer in Redis, entries may have been pruned before they were read, and the book
+	is rebuilt from the latest snapshot.
+	Periodic snapshots written by cryptostore (SNAPSHOT_INTERVAL) replace the local book, which bounds any drift.
+	Depth limits are ignored, since the whole book has to be kept for deltas to apply.
+	"""
+	logger = logging.getLogger('CryptoStoreRedisDeltaFeeds')
+
+	def __init__(self, *args, **kwargs):
+		super(CryptoStoreRedisDeltaFeeds, self).__init__(*args, **kwargs)
+		assert self.encoding == "json", "Delta feeds are only written by cryptostore as json"
+		self.local_books 	= {}
+		self.last_scores 	= {}
+		self.last_members 	= {}
+		self.entry_sizes 	= {}
+		self.books_lock 	= threading.Lock()
+		return
+
+	def track_entry_sizes(self, exchange: str, symbol: str, sizes: [float]):
+		"""
+		Average prices for these sizes are maintained incrementally as deltas arrive.
+		"""
+		redis_key 	= self._book_key(symbol = symbol, exchange = exchange)
+		self.entry_sizes[redis_key] = sizes
+		return self
+
+	def _levels(self, side):
+		# Snapshots are {price : qty} while deltas may be either {price : qty} or [[price, qty], ...]
+		return side.items() if isinstance(side, dict) else side
+
+	def _apply_entries(self, redis_key: str, entries):
+		local_book 	= self.local_books[redis_key]
+		for (resp, score) in entries:
+			# Entries sharing the last applied score are read again, and skipped if already applied
+			if score == self.last_scores.get(redis_key) and resp in self.last_members[redis_key]:
+				continue
+
+			resp_dict = json.loads(resp)
+			if "book" in resp_dict:
+				local_book.apply_snapshot(	bids = self._levels(resp_dict["book"]["bid"]),
+											asks = self._levels(resp_dict["book"]["ask"]),
+											timestamp = resp_dict["timestamp"],
+											received = resp_dict.get("receipt_timestamp"))
+			elif "delta" in resp_dict:
+				local_book.apply_delta(	bids = self._levels(resp_dict["delta"].get("bid", [])),
+										asks = self._levels(resp_dict["delta"].get("ask", [])),
+										timestamp = resp_dict["timestamp"],
+										received = resp_dict.get("receipt_timestamp"))
+			if score != self.last_scores.get(redis_key):
+				(self.last_scores[redis_key], self.last_members[redis_key]) = (score, set())
+			self.last_members[redis_key].add(resp)
+		return
+
+	def _apply_new_entries(self, redis_key: str, entries):
+		if len(entries) > 0 and entries[0][1] > self.last_scores[redis_key]:
+			self.logger.warning(f"Last applied entry of {redis_key} was pruned before newer entries were read, resyncing")
+			self._resync(redis_key = redis_key)
+		else:
+			self._apply_entries(redis_key = redis_key, entries = entries)
+		return
+
+	def _resync(self, redis_key: str):
+		"""
+		Rebuilds the local book from the latest snapshot held in Redis and every delta after it.
+		"""
+		entries 		= self.redis_cli.zrange(redis_key, 0, -1, withscores = True)
+		snapshot_idx 	= None
+		for idx in range(len(entries) -1, -1, -1):
+			if "book" in json.loads(entries[idx][0]):
+				snapshot_idx = idx
+				break
+
+		assert snapshot_idx is not None, f"No snapshot available in {redis_key} to build the local book from"
+		self.local_books[redis_key] = LocalOrderBook(entry_sizes = self.entry_sizes.get(redis_key, []))
+		(self.last_scores[redis_key], self.last_members[redis_key]) = (None, set())
+		self._apply_entries(redis_key = redis_key, entries = entries[snapshot_idx : ])
+		self.logger.info(f"Local book for {redis_key} rebuilt from {len(entries) - snapshot_idx} entries")
+		return
+
+	def _fetch_order_book(self, redis_key: str, *args, **kwargs):
+		with self.books_lock:
+			if redis_key not in self.local_books:
+				self._resync(redis_key = redis_key)
+			else:
+				entries = self.redis_cli.zrangebyscore(redis_key, self.last_scores[redis_key], "+inf", withscores = True)
+				self._apply_new_entries(redis_key = redis_key, entries = entries)
+			return self._record_receipt(redis_key = redis_key, order_book = self.local_books[redis_key].to_order_book())
+
+	def sorted_order_books(self, exchange: str, symbols: [str], *args, **kwargs):
+		"""
+		New entries for every local book that is not refreshed by a subscription are read in a single MULTI / EXEC round trip.
+		"""
+		redis_keys 	= [self._book_key(symbol = each_symbol, exchange = exchange) for each_symbol in symbols]
+		keys_to_fetch = [each_key for each_key in redis_keys if each_key not in self.order_books]
+
+		with self.books_lock:
+			for each_key in keys_to_fetch:
+				if each_key not in self.local_books:
+					self._resync(redis_key = each_key)
+
+			if len(keys_to_fetch) > 0:
+				pipe = self.redis_cli.pipeline(transaction = True)
+				for each_key in keys_to_fetch:
+					pipe.zrangebyscore(each_key, self.last_scores[each_key], "+inf", withscores = True)
+				with self.tracer.span("feed_read"):
+					resps = pipe.execute()
+				with self.tracer.span("book_parse"):
+					for (each_key, each_resp) in zip(keys_to_fetch, resps):
+						self._apply_new_entries(redis_key = each_key, entries = each_resp)
+						self._record_receipt(redis_key = each_key, order_book = self.local_books[each_key].to_order_book())
+
+		return [self._record_read(redis_key = each_key, order_book = self.order_books[each_key] if each_key in self.order_books else self.local_books[each_key].to_order_book()) for each_key in redis_keys]
\ No newline at end of file
@@ -1,8 +1,13 @@
 import json
 import logging
+import numpy as np
 import redis
 from datetime import datetime, timedelta
+from feeds.FeedLatencyMetrics import FeedLatencyMetrics
+from feeds.OrderBook import OrderBook
+from feeds.OrderBookEncoding import decode_order_book
 from feeds.PriceFeeds import PriceFeeds
+from feeds.PushedBookUpdates import PushedBookUpdates
 from functools import wraps
 
 def assert_latency(func):
@@ -14,48 +19,211 @@ def assert_latency(func):
 	def wrapper(*args, **kwargs):
 		resp 	= func(*args, **kwargs)
 		resp_df = datetime.utcfromtimestamp(resp["updated"])
-		assert datetime.utcnow() - resp_df <= timedelta(milliseconds = args[0].permissible_latency_s * 1000), "latency too large"
+		latency = datetime.utcnow() - resp_df
+		assert latency <= timedelta(milliseconds = args[0].permissible_latency_s * 1000), f"latency too large: {latency.total_seconds() * 1000:.1f}ms, permissible {args[0].permissible_latency_s * 1000:.1f}ms"
 		return resp
 	return wrapper
 
-class CryptoStoreRedisFeeds(PriceFeeds):
+class CryptoStoreRedisFeeds(PushedBookUpdates, PriceFeeds):
 	"""
 	Class reads real time feeds from Crypto Store (ref: https://github.com/bmoscon/cryptostore).
 	Realtime feeds are expected to be stored in Redis.
+
+	Books are either polled from Redis on every read, or pushed into memory after `subscribe` is called.
+	Snapshots are stored either as cryptostore JSON, or packed with `feeds.OrderBookEncoding` when encoding is binary.
+	Books are returned as `OrderBook`, so depth indexes built on a subscribed book are shared by all its readers.
+	Exchange to receipt and receipt to read latencies, plus stale reads, are recorded per symbol in `metrics`.
+
+	Reads can be depth limited with max_size / max_levels, in which case levels are only converted until the cumulative 
+	quantity covers max_size. Average prices for sizes up to max_size are unaffected.
 	"""
 	redis_cli = None
+	redis_db = 0
 	permissible_latency_s = 0
+	pubsub = None
+	pubsub_thread = None
 	logger = logging.getLogger('CryptoStoreRedisFeeds')
 
 	def __init__(self, 	redis_url: str, 
 						redis_port: int,
 						permissible_latency_s: float,
+						encoding: str = "json",
 						*args, **kwargs):
 
 		super(CryptoStoreRedisFeeds, self).__init__(*args, **kwargs)
 		self.redis_url = redis_url
 		self.redis_port = redis_port
 		self.permissible_latency_s = permissible_latency_s
+		self.encoding = encoding
+		self.order_books = {}
+		self.key_symbols = {}
+		self.metrics = FeedLatencyMetrics()
+		self.depth_limits = {}
 		return
 
 	def connect(self):
 		self.logger.debug(f"Connecting to redis at {self.redis_url}:{self.redis_port}")
-		self.redis_cli = redis.Redis(host = self.redis_url, port = self.redis_port)
+		self.redis_cli = redis.Redis(host = self.redis_url, port = self.redis_port, db = self.redis_db)
 		return self
 
-	def symbol_to_key_mapping(self, symbol: str, exchange: str):
+	@staticmethod
+	def symbol_to_key_mapping(symbol: str, exchange: str):
 		new_symbol = symbol
 		if exchange.lower() == "okx" and "swap" in symbol.lower():
 			# OKX symbols are denoted by SWAP but crypto store uses PERP
 			new_symbol = new_symbol.replace("SWAP", "PERP").replace("swap", "PERP")
 		return new_symbol
-			
-	def sorted_order_book(self, symbol: str, exchange: str, *args, **kwargs):
+
+	def _book_key(self, symbol: str, exchange: str):
 		new_symbol 	= self.symbol_to_key_mapping(symbol = symbol, exchange = exchange)
-		redis_key 	= f"book-{exchange}-{new_symbol}" 		# Exchange and symbols are all UPPER case
-		resp 		= self.redis_cli.zrange(redis_key, -1, -1)[0]
+		return f"book-{exchange}-{new_symbol}" 		# Exchange and symbols are all UPPER case
+
+	def _key_labels(self, redis_key: str):
+		(_, exchange, symbol) = redis_key.split("-", 2)
+		return (exchange, symbol)
+
+	def _record_receipt(self, redis_key: str, order_book):
+		(exchange, symbol) = self._key_labels(redis_key = redis_key)
+		self.metrics.record_receipt(exchange = exchange, symbol = symbol, order_book = order_book)
+		return order_book
+
+	def _record_read(self, redis_key: str, order_book):
+		(exchange, symbol) = self._key_labels(redis_key = redis_key)
+		self.metrics.record_read(exchange = exchange, symbol = symbol, order_book = order_book, permissible_latency_s = self.permissible_latency_s)
+		return order_book
+
+	def limit_depth(self, exchange: str, symbol: str, max_size: float = None, max_levels: int = None):
+		"""
+		Default depth limits for reads of symbol, including the refreshes of subscribed books.
+		"""
+		redis_key 	= self._book_key(symbol = symbol, exchange = exchange)
+		self.depth_limits[redis_key] = (max_size, max_levels)
+		return self
+
+	def _limit_levels(self, levels, max_size: float, max_levels: int):
+		# Cryptostore writes levels best price first, so conversion stops as soon as the limits are covered
+		(parsed, filled_qty) = ([], 0)
+		for (price, qty) in levels:
+			if (max_levels is not None and len(parsed) >= max_levels) or (max_size is not None and filled_qty >= max_size):
+				break
+			parsed.append((float(price), float(qty)))
+			filled_qty += parsed[-1][1]
+		return parsed
+
+	def _limit_array(self, levels, max_size: float, max_levels: int):
+		# Slicing keeps views over the decoded arrays rather than copying the kept levels again
+		_levels = levels[ : max_levels] if max_levels is not None else levels
+		if max_size is not None and len(_levels) > 0:
+			_levels = _levels[ : np.searchsorted(np.cumsum(_levels[:, 1]), max_size) + 1]
+		return _levels
+
+	def _parse_order_book(self, resp, max_size: float = None, max_levels: int = None):
+		if self.encoding == "binary":
+			order_book = OrderBook(decode_order_book(payload = resp))
+			if max_size is not None or max_levels is not None:
+				order_book["bids"] = self._limit_array(levels = order_book["bids"], max_size = max_size, max_levels = max_levels)
+				order_book["asks"] = self._limit_array(levels = order_book["asks"], max_size = max_size, max_levels = max_levels)
+			return order_book
+
 		resp_dict 	= json.loads(resp)
-		bids 		= [(float(k), float(v)) for (k, v) in resp_dict["book"]["bid"].items()]
-		asks 		= [(float(k), float(v)) for (k, v) in resp_dict["book"]["ask"].items()]
+		if max_size is None and max_levels is None:
+			bids 	= [(float(k), float(v)) for (k, v) in resp_dict["book"]["bid"].items()]
+			asks 	= [(float(k), float(v)) for (k, v) in resp_dict["book"]["ask"].items()]
+		else:
+			bids 	= self._limit_levels(levels = resp_dict["book"]["bid"].items(), max_size = max_size, max_levels = max_levels)
+			asks 	= self._limit_levels(levels = resp_dict["book"]["ask"].items(), max_size = max_size, max_levels = max_levels)
 		timestamp 	= resp_dict["timestamp"]
-		return {"bids" : bids, "asks" : asks, "updated" : timestamp}
\ No newline at end of file
+		return OrderBook(bids = bids, asks = asks, updated = timestamp, received = resp_dict.get("receipt_timestamp"))
+
+	def _fetch_order_book(self, redis_key: str, max_size: float = None, max_levels: int = None):
+		(_max_size, _max_levels) = (max_size, max_levels) if max_size is not None or max_levels is not None else self.depth_limits.get(redis_key, (None, None))
+		resp 		= self.redis_cli.zrange(redis_key, -1, -1)[0]
+		return self._record_receipt(redis_key = redis_key, order_book = self._parse_order_book(resp, max_size = _max_size, max_levels = _max_levels))
+
+	def _enable_keyspace_notifications(self):
+		try:
+			# K - keyspace events, z - sorted set commands
+			self.redis_cli.config_set("notify-keyspace-events", "Kz")
+		except redis.exceptions.ResponseError as ex:
+			self.logger.warning(f"Unable to enable keyspace notifications, expecting them to be set on the server: {ex}")
+		return
+
+	def _on_keyspace_event(self, message):
+		"""
+		Refreshes the in memory book whenever cryptostore adds a new snapshot to the key.
+		Other events on the key, such as pruning, are ignored.
+		"""
+		try:
+			channel 	= message["channel"].decode("utf-8") if isinstance(message["channel"], bytes) else message["channel"]
+			event 		= message["data"].decode("utf-8") if isinstance(message["data"], bytes) else message["data"]
+			redis_key 	= channel.split(":", 1)[1]
+
+			if event == "zadd":
+				self.order_books[redis_key] = self._fetch_order_book(redis_key)
+				self._mark_updated(symbol = self.key_symbols[redis_key])
+		except Exception as ex:
+			self.logger.error(f"Failed to refresh order book on {message}: {ex}")
+		return
+
+	def subscribe(self, exchange: str, symbols: [str]):
+		"""
+		Switches the symbols to push based delivery. 
+
+		The latest book for each symbol is kept in memory and refreshed by a background thread on Redis keyspace notifications.
+		Subsequent calls to `sorted_order_book` for these symbols are served from memory.
+		"""
+		redis_keys 	= [self._book_key(symbol = each_symbol, exchange = exchange) for each_symbol in symbols]
+		for (each_key, each_symbol) in zip(redis_keys, symbols):
+			self.order_books[each_key] 	= self._fetch_order_book(each_key)
+			self.key_symbols[each_key] 	= each_symbol
+
+		if self.pubsub is None:
+			self._enable_keyspace_notifications()
+			self.pubsub = self.redis_cli.pubsub(ignore_subscribe_messages = True)
+
+		self.pubsub.subscribe(**{f"__keyspace@{self.redis_db}__:{each_key}" : self._on_keyspace_event for each_key in redis_keys})
+
+		if self.pubsub_thread is None:
+			self.pubsub_thread = self.pubsub.run_in_thread(sleep_time = 0.001, daemon = True)
+
+		self.logger.info(f"Subscribed to {redis_keys}")
+		return self
+
+	def close(self):
+		if self.pubsub_thread is not None:
+			self.pubsub_thread.stop()
+			self.pubsub_thread = None
+		if self.pubsub is not None:
+			self.pubsub.close()
+			self.pubsub = None
+		self.wake_waiters()
+		return
+			
+	def sorted_order_book(self, symbol: str, exchange: str, max_size: float = None, max_levels: int = None, *args, **kwargs):
+		redis_key 	= self._book_key(symbol = symbol, exchange = exchange)
+		order_book 	= self.order_books[redis_key] if redis_key in self.order_books else self._fetch_order_book(redis_key, max_size = max_size, max_levels = max_levels)
+		return self._record_read(redis_key = redis_key, order_book = order_book)
+
+	def sorted_order_books(self, exchange: str, symbols: [str], max_sizes: [float] = None, *args, **kwargs):
+		"""
+		Books that are not held in memory are fetched together in a single MULTI / EXEC round trip, 
+		so that all legs are read at the same instant.
+		"""
+		redis_keys 	= [self._book_key(symbol = each_symbol, exchange = exchange) for each_symbol in symbols]
+		keys_to_fetch = [each_key for each_key in redis_keys if each_key not in self.order_books]
+		limits 		= {	each_key : (each_size, None) if each_size is not None else self.depth_limits.get(each_key, (None, None)) 
+						for (each_key, each_size) in zip(redis_keys, max_sizes if max_sizes is not None else [None] * len(redis_keys))}
+
+		fetched_books = {}
+		if len(keys_to_fetch) > 0:
+			pipe = self.redis_cli.pipeline(transaction = True)
+			for each_key in keys_to_fetch:
+				pipe.zrange(each_key, -1, -1)
+			with self.tracer.span("feed_read"):
+				resps = pipe.execute()
+			with self.tracer.span("book_parse"):
+				for (each_key, each_resp) in zip(keys_to_fetch, resps):
+					(max_size, max_levels) 	= limits[each_key]
+					fetched_books[each_key] = self._record_receipt(redis_key = each_key, order_book = self._parse_order_book(each_resp[0], max_size = max_size, max_levels = max_levels))
+
+		return [self._record_read(redis_key = each_key, order_book = self.order_books[each_key] if each_key in self.order_books else fetched_books[each_key]) for each_key in redis_keys]
\ No newline at end of file
@@ -0,0 +1,143 @@
+import bisect
+import json
+import logging
+import signal
+import threading
+import time
+
+class LatencyHistogram(object):
+	"""
+	Fixed bucket histogram of latencies in seconds. Bucket bounds are upper bounds in milliseconds.
+	"""
+	bounds_ms = [0.1, 0.25, 0.5, 1, 2.5, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000]
+
+	def __init__(self, bounds_ms: [float] = None):
+		self.bounds_ms 	= bounds_ms if bounds_ms is not None else self.bounds_ms
+		self.counts 	= [0] * (len(self.bounds_ms) + 1)
+		self.total 		= 0
+		self.sum_ms 	= 0
+		self.max_ms 	= 0
+		return
+
+	def record(self, latency_s: float):
+		latency_ms 		= latency_s * 1000
+		self.counts[bisect.bisect_left(self.bounds_ms, latency_ms)] += 1
+		self.total 		+= 1
+		self.sum_ms 	+= latency_ms
+		self.max_ms 	= max(self.max_ms, latency_ms)
+		return
+
+	def quantile_ms(self, q: float):
+		"""
+		Upper bound of the bucket holding the q-th quantile. Latencies beyond the last bucket report the max seen.
+		"""
+		if self.total == 0:
+			return None
+		(rank, seen) = (q * self.total, 0)
+		for (idx, count) in enumerate(self.counts):
+			seen += count
+			if seen >= rank and count > 0:
+				return min(self.bounds_ms[idx], self.max_ms) if idx < len(self.bounds_ms) else self.max_ms
+		return self.max_ms
+
+	def summary(self):
+		return 	{
+					"count" 	: self.total,
+					"mean_ms" 	: self.sum_ms / self.total if self.total > 0 else None,
+					"p50_ms" 	: self.quantile_ms(0.5),
+					"p99_ms" 	: self.quantile_ms(0.99),
+					"p999_ms" 	: self.quantile_ms(0.999),
+					"max_ms" 	: self.max_ms,
+					"buckets" 	: {f"<={bound}" : count for (bound, count) in zip(self.bounds_ms + ["inf"], self.counts) if count > 0},
+				}
+
+class SymbolLatencyMetrics(object):
+	"""
+	Latency metrics of one (exchange, symbol) feed.
+
+	- exchange_to_receipt 	: exchange timestamp to receipt by the feed handler, recorded once per book received
+	- receipt_to_read 		: receipt by the feed handler to the book being read by the bot, recorded on every read
+	- stale_reads 			: reads where the book was older than the permissible latency
+	"""
+	def __init__(self):
+		self.exchange_to_receipt 	= LatencyHistogram()
+		self.receipt_to_read 		= LatencyHistogram()
+		self.reads 					= 0
+		self.stale_reads 			= 0
+		self.last_received 			= None
+		return
+
+	def summary(self):
+		return 	{
+					"exchange_to_receipt" 	: self.exchange_to_receipt.summary(),
+					"receipt_to_read" 		: self.receipt_to_read.summary(),
+					"reads" 				: self.reads,
+					"stale_reads" 			: self.stale_reads,
+				}
+
+class FeedLatencyMetrics(object):
+	"""
+	Per exchange / symbol latency histograms and staleness counts for a price feed.
+
+	Books are expected to carry `updated` (exchange timestamp) and, where the feed knows it, `received` (receipt timestamp).
+	"""
+	logger = logging.getLogger('FeedLatencyMetrics')
+
+	def __init__(self):
+		self.symbols 	= {}
+		self.lock 		= threading.Lock()
+		return
+
+	def _metrics(self, exchange: str, symbol: str):
+		if (exchange, symbol) not in self.symbols:
+			with self.lock:
+				self.symbols.setdefault((exchange, symbol), SymbolLatencyMetrics())
+		return self.symbols[(exchange, symbol)]
+
+	def record_receipt(self, exchange: str, symbol: str, order_book):
+		"""
+		Records the exchange to receipt lag of a newly received book. Polled feeds may hand in the same book more than once, which is only recorded once.
+		"""
+		metrics = self._metrics(exchange = exchange, symbol = symbol)
+		if order_book.get("received") is not None and order_book["received"] != metrics.last_received:
+			metrics.exchange_to_receipt.record(latency_s = order_book["received"] - order_book["updated"])
+			metrics.last_received = order_book["received"]
+		return
+
+	def record_read(self, exchange: str, symbol: str, order_book, permissible_latency_s: float, now: float = None):
+		"""
+		Records the receipt to read lag of a book handed to the bot, and whether the book is stale. Returns the age of the book.
+		"""
+		_now 	= time.time() if now is None else now
+		metrics = self._metrics(exchange = exchange, symbol = symbol)
+		age_s 	= _now - order_book["updated"]
+
+		metrics.reads += 1
+		if order_book.get("received") is not None:
+			metrics.receipt_to_read.record(latency_s = _now - order_book["received"])
+		if age_s > permissible_latency_s:
+			metrics.stale_reads += 1
+		return age_s
+
+	def check_latency(self, exchange: str, symbol: str, updated: float, permissible_latency_s: float, now: float = None):
+		"""
+		Asserts that a book timestamped `updated` is no older than permissible_latency_s.
+		Stale reads are already counted by the feed, so they are not counted again here.
+		"""
+		age_s = (time.time() if now is None else now) - updated
+		assert age_s <= permissible_latency_s, f"{exchange} {symbol} book is {age_s * 1000:.1f}ms old, above the permissible {permissible_latency_s * 1000:.1f}ms"
+		return age_s
+
+	def summary(self):
+		return {f"{exchange}:{symbol}" : metrics.summary() for ((exchange, symbol), metrics) in list(self.symbols.items())}
+
+	def dump(self):
+		self.logger.info(f"Feed latency metrics: {json.dumps(self.summary())}")
+		return
+
+	def dump_on_signal(self, signum: int = signal.SIGUSR1):
+		"""
+		Logs the summary whenever the process receives `signum`, e.g. `kill -USR1 <pid>`. Must be called from the main thread.
+		"""
+		signal.signal(signum, lambda *args: self.dump())
+		return self
\ No newline at end of file
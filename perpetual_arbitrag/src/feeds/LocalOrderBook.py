@@ -0,0 +1,142 @@
+import bisect
+import logging
+from feeds.OrderBook import OrderBook
+
+class LocalOrderBookSide(object):
+	"""
+	One side of a L2 book, with price levels kept sorted from the best price outwards.
+
+	Bids are keyed by their negated price so that both sides are stored in ascending key order.
+	"""
+
+	def __init__(self, descending: bool, entry_sizes: [float]):
+		self.descending 	= descending
+		self.keys 			= []
+		self.levels 		= {}
+		self.entry_sizes 	= sorted(entry_sizes)
+		self.average_prices = {}
+		self.depth_key 		= None
+		return
+
+	def _key(self, price: float):
+		return -price if self.descending else price
+
+	def clear(self):
+		self.keys 	= []
+		self.levels = {}
+		return
+
+	def set_level(self, price: float, qty: float):
+		"""
+		Sets qty at a price level. A qty of 0 removes the level.
+		"""
+		key = self._key(price)
+		if qty == 0:
+			if key in self.levels:
+				del self.levels[key]
+				del self.keys[bisect.bisect_left(self.keys, key)]
+		else:
+			if key not in self.levels:
+				bisect.insort(self.keys, key)
+			self.levels[key] = qty
+		return key
+
+	def affects_average_prices(self, key: float):
+		"""
+		A change at `key` only moves the average prices of the entry sizes if it lies within the depth they consume.
+		"""
+		return self.depth_key is None or key <= self.depth_key
+
+	def update_average_prices(self):
+		"""
+		Walks only the levels needed to fill the largest entry size.
+		"""
+		self.average_prices = {}
+		self.depth_key 		= None
+		if len(self.entry_sizes) == 0:
+			return
+
+		(size_idx, filled_qty, notional) = (0, 0, 0)
+		for key in self.keys:
+			(price, qty) = (abs(key), self.levels[key])
+			while size_idx < len(self.entry_sizes) and filled_qty + qty >= self.entry_sizes[size_idx]:
+				size = self.entry_sizes[size_idx]
+				self.average_prices[size] = (notional + price * (size - filled_qty)) / size if size > 0 else price
+				size_idx += 1
+			filled_qty 	+= qty
+			notional 	+= price * qty
+			if size_idx >= len(self.entry_sizes):
+				self.depth_key = key
+				break
+
+		# Sizes beyond the book are filled with everything available, and any new level can change them
+		for size in self.entry_sizes[size_idx : ]:
+			self.average_prices[size] = notional / filled_qty if filled_qty > 0 else None
+		return
+
+	def price_qty_pairs(self):
+		return [(abs(key), self.levels[key]) for key in self.keys]
+
+class LocalOrderBook(object):
+	"""
+	In process L2 order book built from a snapshot and kept up to date by applying deltas.
+
+	Average prices for the configured entry sizes are refreshed incrementally, 
+	only when a delta touches the levels those sizes would trade against.
+	"""
+	logger = logging.getLogger('LocalOrderBook')
+
+	def __init__(self, entry_sizes: [float] = []):
+		self.bids 		= LocalOrderBookSide(descending = True, entry_sizes = entry_sizes)
+		self.asks 		= LocalOrderBookSide(descending = False, entry_sizes = entry_sizes)
+		self.updated 	= None
+		self.received 	= None
+		self.order_book = None
+		return
+
+	def _apply(self, side: LocalOrderBookSide, levels):
+		changed = False
+		for (price, qty) in levels:
+			key 	= side.set_level(price = float(price), qty = float(qty))
+			changed = changed or side.affects_average_prices(key = key)
+		if changed:
+			side.update_average_prices()
+		return
+
+	def apply_snapshot(self, bids, asks, timestamp: float, received: float = None):
+		"""
+		Replaces the book. bids / asks are [[price, qty], ...] in any order.
+		"""
+		self.bids.clear()
+		self.asks.clear()
+		self.bids.depth_key = self.asks.depth_key = None
+		self._apply(side = self.bids, levels = bids)
+		self._apply(side = self.asks, levels = asks)
+		self.updated 	= timestamp
+		self.received 	= received
+		self.order_book = None
+		return self
+
+	def apply_delta(self, bids, asks, timestamp: float, received: float = None):
+		"""
+		Applies level updates. bids / asks are [[price, qty], ...], where a qty of 0 deletes the level.
+		"""
+		self._apply(side = self.bids, levels = bids)
+		self._apply(side = self.asks, levels = asks)
+		self.updated 	= timestamp
+		self.received 	= received
+		self.order_book = None
+		return self
+
+	def to_order_book(self):
+		"""
+		Returns the book in the `PriceFeeds` format, with the incrementally maintained average prices attached.
+		The result is cached until the next update.
+		"""
+		if self.order_book is None:
+			self.order_book = OrderBook(bids = self.bids.price_qty_pairs(), asks = self.asks.price_qty_pairs(), updated = self.updated, received = self.received)
+			self.order_book.cached_average_prices = {
+				**{("bids", size) : price for (size, price) in self.bids.average_prices.items() if price is not None},
+				**{("asks", size) : price for (size, price) in self.asks.average_prices.items() if price is not None},
+			}
+		return self.order_book
\ No newline at end of file
@@ -0,0 +1,221 @@
+import asyncio
+import json
+import logging
+import threading
+import time
+import websockets
+import zlib
+from feeds.FeedLatencyMetrics import FeedLatencyMetrics
+from feeds.LocalOrderBook import LocalOrderBook
+from feeds.PriceFeeds import PriceFeeds
+from feeds.PushedBookUpdates import PushedBookUpdates
+
+def okx_checksum(bids: [[str]], asks: [[str]]):
+	"""
+	OKX book checksum: signed CRC32 over the top 25 levels interleaved as bid_px:bid_sz:ask_px:ask_sz:...
+	Prices and sizes have to be the strings sent by the exchange.
+	"""
+	parts = []
+	for idx in range(25):
+		if idx < len(bids):
+			parts += bids[idx][:2]
+		if idx < len(asks):
+			parts += asks[idx][:2]
+	crc = zlib.crc32(":".join(parts).encode("utf-8"))
+	return crc - (1 << 32) if crc >= (1 << 31) else crc
+
+class OkxWebsocketFeeds(PushedBookUpdates, PriceFeeds):
+	"""
+	Reads order books directly from the OKX public websocket (ref: https://www.okx.com/docs-v5/en/#websocket-api-public-channel-order-book-channel).
+
+	A background thread keeps a `LocalOrderBook` for each subscribed symbol, so `sorted_order_book` is served from memory.
+	The `books5` channel pushes a 5 level snapshot on every update. The `books` channel pushes a 400 level snapshot 
+	followed by incremental updates, which are validated against the exchange checksum and resubscribed on mismatch.
+	Latencies and stale reads are recorded per symbol in `metrics`, with the receipt time taken when a message is read off the socket.
+	"""
+	ws_public_url 	= "wss://ws.okx.com:8443/ws/v5/public"
+	ws_client 		= None
+	loop 			= None
+	listen_thread 	= None
+	logger 			= logging.getLogger('OkxWebsocketFeeds')
+
+	def __init__(self, 	permissible_latency_s: float,
+						feed_url: str = None,
+						channel: str = "books5",
+						ping_interval_s: float = 25,
+						reconnect_interval_s: float = 1,
+						*args, **kwargs):
+
+		super(OkxWebsocketFeeds, self).__init__(*args, **kwargs)
+		assert channel in {"books5", "books"}, f"Unsupported OKX book channel {channel}"
+		self.ws_public_url 			= feed_url if feed_url is not None else self.ws_public_url
+		self.permissible_latency_s 	= permissible_latency_s
+		self.channel 				= channel
+		self.ping_interval_s 		= ping_interval_s
+		self.reconnect_interval_s 	= reconnect_interval_s
+		self.symbols 				= []
+		self.entry_sizes 			= {}
+		self.local_books 			= {}
+		self.raw_levels 			= {}
+		self.order_books 			= {}
+		self.book_events 			= {}
+		self.running 				= False
+		self.metrics 				= FeedLatencyMetrics()
+		return
+
+	def _subscribe_payload(self, op: str, symbols: [str]):
+		return json.dumps({"op" : op, "args" : [{"channel" : self.channel, "instId" : each_symbol} for each_symbol in symbols]})
+
+	def _apply_levels(self, symbol: str, levels: [[str]], side: str):
+		# Raw strings are kept alongside the local book for the checksum
+		raw_side = self.raw_levels[symbol][side]
+		for level in levels:
+			price = float(level[0])
+			if float(level[1]) == 0:
+				raw_side.pop(price, None)
+			else:
+				raw_side[price] = level[:2]
+		return [(level[0], level[1]) for level in levels]
+
+	def _checksum_matches(self, symbol: str, checksum: int):
+		local_book 	= self.local_books[symbol]
+		raw_bids 	= [self.raw_levels[symbol]["bids"][abs(key)] for key in local_book.bids.keys[:25]]
+		raw_asks 	= [self.raw_levels[symbol]["asks"][abs(key)] for key in local_book.asks.keys[:25]]
+		return okx_checksum(bids = raw_bids, asks = raw_asks) == checksum
+
+	def _on_book(self, symbol: str, action: str, data: dict, received: float):
+		"""
+		Applies one book message and publishes the resulting book. Returns False if the checksum did not match.
+
+		Updates for a symbol without a local book are dropped until its next snapshot, as they only hold the changed levels.
+		"""
+		timestamp = int(data["ts"]) / 1000
+		if action == "update" and symbol not in self.local_books:
+			return True
+		elif action == "update":
+			self.local_books[symbol].apply_delta(	bids = self._apply_levels(symbol = symbol, levels = data["bids"], side = "bids"),
+													asks = self._apply_levels(symbol = symbol, levels = data["asks"], side = "asks"),
+													timestamp = timestamp,
+													received = received)
+		else:
+			self.local_books[symbol] = LocalOrderBook(entry_sizes = self.entry_sizes.get(symbol, []))
+			self.raw_levels[symbol] = {"bids" : {}, "asks" : {}}
+			self.local_books[symbol].apply_snapshot(bids = self._apply_levels(symbol = symbol, levels = data["bids"], side = "bids"),
+													asks = self._apply_levels(symbol = symbol, levels = data["asks"], side = "asks"),
+													timestamp = timestamp,
+													received = received)
+
+		if "checksum" in data and not self._checksum_matches(symbol = symbol, checksum = data["checksum"]):
+			self.logger.warning(f"Checksum mismatch on {symbol}, resubscribing")
+			del self.local_books[symbol]
+			self.order_books.pop(symbol, None)
+			self.book_events.setdefault(symbol, threading.Event()).clear()
+			return False
+
+		self.order_books[symbol] = self.local_books[symbol].to_order_book()
+		self.metrics.record_receipt(exchange = "OKX", symbol = symbol, order_book = self.order_books[symbol])
+		self.book_events.setdefault(symbol, threading.Event()).set()
+		self._mark_updated(symbol = symbol)
+		return True
+
+	async def _on_message(self, message: str):
+		received = time.time()
+		if message == "pong":
+			return
+
+		resp = json.loads(message)
+		if "event" in resp:
+			if resp["event"] == "error":
+				self.logger.error(f"Subscription error: {resp}")
+			return
+
+		symbol = resp["arg"]["instId"]
+		for data in resp["data"]:
+			if not self._on_book(symbol = symbol, action = resp.get("action", "snapshot"), data = data, received = received):
+				await self.ws_client.send(self._subscribe_payload(op = "unsubscribe", symbols = [symbol]))
+				await self.ws_client.send(self._subscribe_payload(op = "subscribe", symbols = [symbol]))
+				break
+		return
+
+	async def _listen(self):
+		while self.running:
+			try:
+				async with websockets.connect(self.ws_public_url) as ws_client:
+					self.ws_client = ws_client
+					if len(self.symbols) > 0:
+						await ws_client.send(self._subscribe_payload(op = "subscribe", symbols = self.symbols))
+
+					while self.running:
+						try:
+							message = await asyncio.wait_for(ws_client.recv(), timeout = self.ping_interval_s)
+						except asyncio.TimeoutError:
+							# OKX drops connections that are idle for 30s
+							await ws_client.send("ping")
+							continue
+						await self._on_message(message)
+
+			except Exception as ex:
+				if self.running:
+					self.logger.error(f"Public websocket disconnected, reconnecting: {ex}")
+					await asyncio.sleep(self.reconnect_interval_s)
+			finally:
+				# Books are rebuilt from the snapshot sent on resubscription, stale ones must not be served meanwhile
+				self.ws_client 		= None
+				self.local_books 	= {}
+				self.order_books 	= {}
+				for each_event in self.book_events.values():
+					each_event.clear()
+		return
+
+	def connect(self):
+		"""
+		Starts the background thread that maintains the books.
+		"""
+		if self.listen_thread is None:
+			self.running 	= True
+			self.loop 		= asyncio.new_event_loop()
+			self.listen_thread = threading.Thread(target = self.loop.run_until_complete, args = (self._listen(),), daemon = True)
+			self.listen_thread.start()
+		return self
+
+	def track_entry_sizes(self, exchange: str, symbol: str, sizes: [float]):
+		"""
+		Average prices for these sizes are maintained incrementally as the book updates.
+		"""
+		self.entry_sizes[symbol] = sizes
+		return self
+
+	def subscribe(self, exchange: str, symbols: [str]):
+		"""
+		Subscribes to the book channel of symbols, which are OKX instrument ids.
+		"""
+		new_symbols = [each_symbol for each_symbol in symbols if each_symbol not in self.symbols]
+		self.symbols += new_symbols
+		if self.ws_client is not None and len(new_symbols) > 0:
+			asyncio.run_coroutine_threadsafe(self.ws_client.send(self._subscribe_payload(op = "subscribe", symbols = new_symbols)), self.loop).result()
+		self.logger.info(f"Subscribed to {self.channel} for {new_symbols}")
+		return self
+
+	def close(self):
+		self.running = False
+		if self.ws_client is not None:
+			asyncio.run_coroutine_threadsafe(self.ws_client.close(), self.loop)
+		if self.listen_thread is not None:
+			self.listen_thread.join(timeout = self.reconnect_interval_s + 1)
+			self.listen_thread = None
+		self.wake_waiters()
+		return
+
+	def sorted_order_book(self, symbol: str, exchange: str, *args, **kwargs):
+		"""
+		Symbols are subscribed on first use. Blocks for up to permissible_latency_s for the first book to arrive.
+		"""
+		if symbol not in self.symbols:
+			self.subscribe(exchange = exchange, symbols = [symbol])
+
+		if symbol not in self.order_books:
+			self.book_events.setdefault(symbol, threading.Event()).wait(timeout = self.permissible_latency_s)
+		assert symbol in self.order_books, f"No order book received for {symbol}"
+		order_book = self.order_books[symbol]
+		self.metrics.record_read(exchange = "OKX", symbol = symbol, order_book = order_book, permissible_latency_s = self.permissible_latency_s)
+		return order_book
\ No newline at end of file
@@ -0,0 +1,66 @@
+import numpy as np
+import sys
+from feeds.OrderBookDepth import DepthIndex
+
+class OrderBook(dict):
+	"""
+	Order book in the `PriceFeeds` format: {"bids" : [[price, qty], ...], "asks" : [[price, qty], ...], "updated" : <timestamp>}, optionally with "received" : <receipt timestamp>
+
+	Depth indexes for each side are built on first use and kept with the snapshot, 
+	so that every consumer of the same book in the process shares them.
+	Producers that already know the average prices for some sizes can hand them over in `cached_average_prices`.
+	"""
+
+	def __init__(self, *args, **kwargs):
+		super(OrderBook, self).__init__(*args, **kwargs)
+		# Set per book, so that indexes and cached prices are never shared between books
+		self.bid_depth_index 		= None
+		self.ask_depth_index 		= None
+		self.cached_average_prices 	= {}
+		return
+
+	def bid_depth(self):
+		if self.bid_depth_index is None:
+			self.bid_depth_index = DepthIndex(levels = self["bids"], descending = True)
+		return self.bid_depth_index
+
+	def ask_depth(self):
+		if self.ask_depth_index is None:
+			self.ask_depth_index = DepthIndex(levels = self["asks"], descending = False)
+		return self.ask_depth_index
+
+	def average_bid_price(self, size):
+		"""
+		Average price of selling `size` into the bids. Defaults to 0 if there are no bids.
+		"""
+		if np.isscalar(size) and ("bids", size) in self.cached_average_prices:
+			return self.cached_average_prices[("bids", size)]
+		elif len(self["bids"]) > 0:
+			return self.bid_depth().average_price(size = size)
+		return 0 if np.isscalar(size) else np.full(np.shape(size), 0)
+
+	def average_ask_price(self, size):
+		"""
+		Average price of buying `size` from the asks. Defaults to sys.maxsize if there are no asks.
+		"""
+		if np.isscalar(size) and ("asks", size) in self.cached_average_prices:
+			return self.cached_average_prices[("asks", size)]
+		elif len(self["asks"]) > 0:
+			return self.ask_depth().average_price(size = size)
+		return sys.maxsize if np.isscalar(size) else np.full(np.shape(size), sys.maxsize)
+
+	def bid_size_within_bps(self, bps: float):
+		"""
+		Quantity that can be sold before the bid price falls more than `bps` basis points below the best bid.
+		"""
+		if len(self["bids"]) > 0:
+			return self.bid_depth().size_within_bps(bps = bps)
+		return 0
+
+	def ask_size_within_bps(self, bps: float):
+		"""
+		Quantity that can be bought before the ask price rises more than `bps` basis points above the best ask.
+		"""
+		if len(self["asks"]) > 0:
+			return self.ask_depth().size_within_bps(bps = bps)
+		return 0
\ No newline at end of file
@@ -0,0 +1,106 @@
+import numpy as np
+
+class DepthIndex(object):
+	"""
+	Prefix sums of quantity and notional for one side of an order book, ordered from the best price outwards.
+
+	Average fill prices for any size are answered with a binary search over the cumulative quantity,
+	instead of walking the levels one by one.
+	"""
+
+	def __init__(self, levels, descending: bool, assume_sorted: bool = False):
+		"""
+		levels 			- [[price, qty], ...] or a (levels, 2) array
+		descending 		- True for bids (highest price first), False for asks (lowest price first)
+		assume_sorted 	- If True, levels are walked in the order given without checking
+
+		Levels which already follow the expected ordering, as guaranteed by `PriceFeeds`, are not sorted again.
+		"""
+		_levels 	= levels if isinstance(levels, np.ndarray) and levels.dtype == np.float64 else np.array(levels, dtype = np.float64)
+		_levels 	= _levels.reshape(-1, 2) if _levels.ndim != 2 else _levels
+		prices 		= _levels[:, 0]
+
+		if len(prices) > 1 and not assume_sorted:
+			is_unsorted = (prices[1:] > prices[:-1]).any() if descending else (prices[1:] < prices[:-1]).any()
+			if is_unsorted:
+				order 	= np.argsort(prices, kind = "stable")
+				_levels = _levels[order[::-1]] if descending else _levels[order]
+
+		self.descending 	= descending
+		self.prices 		= _levels[:, 0]
+		self.qtys 			= _levels[:, 1]
+		self.cum_qty 		= np.cumsum(self.qtys)
+		self.cum_notional 	= np.cumsum(self.prices * self.qtys)
+		return
+
+	def __len__(self):
+		return len(self.prices)
+
+	def total_qty(self):
+		return float(self.cum_qty[-1])
+
+	def _average_prices(self, sizes):
+		# Sizes beyond the book are capped to the last level, which then fills its full quantity
+		level_idx 	= np.minimum(np.searchsorted(self.cum_qty, sizes, side = "left"), len(self.prices) - 1)
+		filled_qty 	= np.minimum(sizes, self.cum_qty[-1])
+		prev_qty 	= self.cum_qty[level_idx] - self.qtys[level_idx]
+		notional 	= self.cum_notional[level_idx] - self.prices[level_idx] * (self.qtys[level_idx] - (filled_qty - prev_qty))
+		return np.divide(notional, filled_qty, out = np.full(filled_qty.shape, self.prices[0]), where = filled_qty > 0)
+
+	def average_price(self, size):
+		"""
+		Average price of filling `size` by walking the book from the best price. 
+
+		If the book does not hold enough quantity, the average over all available levels is returned.
+		`size` can either be a single value or an array of sizes, in which case an array of prices is returned.
+		"""
+		if not np.isscalar(size):
+			return self._average_prices(sizes = np.asarray(size, dtype = np.float64))
+
+		level_idx = int(self.cum_qty.searchsorted(size))
+		if level_idx >= len(self.prices):
+			filled_qty 	= float(self.cum_qty[-1])
+			notional 	= float(self.cum_notional[-1])
+		elif level_idx > 0:
+			filled_qty 	= size
+			notional 	= float(self.cum_notional[level_idx - 1]) + float(self.prices[level_idx]) * (size - float(self.cum_qty[level_idx - 1]))
+		else:
+			filled_qty 	= size
+			notional 	= float(self.prices[0]) * size
+		return notional / filled_qty if filled_qty > 0 else float(self.prices[0])
+
+	def size_within_bps(self, bps):
+		"""
+		Cumulative quantity of all levels priced within `bps` basis points of the best price.
+		
+		`bps` can either be a single value or an array, in which case an array of sizes is returned.
+		"""
+		_bps 		= np.asarray(bps, dtype = np.float64)
+		best_price 	= self.prices[0]
+		if self.descending:
+			# Bid prices are descending, search over the negated prices to keep them ascending
+			level_idx = np.searchsorted(-self.prices, -best_price * (1 - _bps / 10000), side = "right")
+		else:
+			level_idx = np.searchsorted(self.prices, best_price * (1 + _bps / 10000), side = "right")
+		sizes = np.where(level_idx > 0, self.cum_qty[np.maximum(level_idx, 1) - 1], 0)
+		return float(sizes) if sizes.ndim == 0 else sizes
+
+def fixed_depth_average_prices(levels, size: float, partial_fills: bool = True):
+	"""
+	Average prices of filling `size` against many books at once.
+
+	levels 			- (books, depth, 2) array of [price, qty] levels, ordered from the best price outwards
+	partial_fills 	- If True, books that do not hold enough quantity return the average over all their levels, as with
+					  `DepthIndex.average_price`. If False, they return NaN
+
+	Books without any quantity return NaN.
+	"""
+	_levels 	= np.asarray(levels, dtype = np.float64)
+	(prices, qtys) = (_levels[:, :, 0], _levels[:, :, 1])
+	qty_before 	= np.cumsum(qtys, axis = 1) - qtys
+	filled 		= np.clip(size - qty_before, 0, qtys)
+	notional 	= np.where(filled > 0, prices * filled, 0).sum(axis = 1)
+	# Books thinner than size fill every level, and so the quantity filled is the total of the book
+	filled_qty 	= np.minimum(qtys.sum(axis = 1), size)
+	fillable 	= (filled_qty > 0) if partial_fills else (filled_qty > 0) & (filled_qty >= size)
+	return np.divide(notional, filled_qty, out = np.full(filled_qty.shape, np.nan), where = fillable)
@@ -0,0 +1,77 @@
+import logging
+import numpy as np
+from feeds.BookRecording import BookRecording
+from feeds.OrderBookDepth import fixed_depth_average_prices
+
+class PairBookReplay(object):
+	"""
+	Replays the recorded books of both legs of a pair as one time aligned stream of ticks.
+
+	A tick is emitted whenever either leg has a new snapshot, with the latest book of each leg at that time. Each book is
+	reduced to the average bid / ask for the entry size of its leg, as read by the bots in market mode. Ticks where either
+	book is older than max_staleness_s, or does not hold the entry size of its leg within the recorded depth, are dropped,
+	as their average prices would not be the prices of a full entry.
+
+	Recordings are streamed in chunks of chunk_s seconds, so that memory only holds one chunk at a time.
+	"""
+	logger = logging.getLogger('PairBookReplay')
+
+	def __init__(self, 	A_recording: BookRecording,
+						B_recording: BookRecording,
+						A_size: float,
+						B_size: float,
+						max_staleness_s: float,
+						start_ts: float = None,
+						end_ts: float = None,
+						chunk_s: float = 86400):
+		self.A_recording 		= A_recording
+		self.B_recording 		= B_recording
+		self.A_size 			= A_size
+		self.B_size 			= B_size
+		self.max_staleness_s 	= max_staleness_s
+		self.start_ts 			= start_ts if start_ts is not None else max(A_recording.timestamps[0], B_recording.timestamps[0])
+		self.end_ts 			= end_ts if end_ts is not None else min(A_recording.timestamps[-1], B_recording.timestamps[-1]) + 1e-6
+		self.chunk_s 			= chunk_s
+		return
+
+	def _leg(self, recording: BookRecording, size: float, chunk_start: float, chunk_end: float):
+		records = recording.between(start_ts = chunk_start, end_ts = chunk_end)
+		return 	(	np.asarray(records["timestamp"]),
+					fixed_depth_average_prices(levels = records["bids"], size = size, partial_fills = False),
+					fixed_depth_average_prices(levels = records["asks"], size = size, partial_fills = False))
+
+	def align(self, chunk_start: float, chunk_end: float):
+		"""
+		Aligned ticks in [chunk_start, chunk_end), as a dict of timestamp, A_bid, A_ask, B_bid and B_ask arrays.
+		"""
+		(A_ts, A_bid, A_ask) = self._leg(recording = self.A_recording, size = self.A_size, chunk_start = chunk_start, chunk_end = chunk_end)
+		(B_ts, B_bid, B_ask) = self._leg(recording = self.B_recording, size = self.B_size, chunk_start = chunk_start, chunk_end = chunk_end)
+
+		timestamp 	= np.union1d(A_ts[A_ts >= chunk_start], B_ts[B_ts >= chunk_start])
+		A_idx 		= np.searchsorted(A_ts, timestamp, side = "right") - 1
+		B_idx 		= np.searchsorted(B_ts, timestamp, side = "right") - 1
+		valid 		= (A_idx >= 0) & (B_idx >= 0)
+		(timestamp, A_idx, B_idx) = (timestamp[valid], A_idx[valid], B_idx[valid])
+
+		valid 		= 	(timestamp - A_ts[A_idx] <= self.max_staleness_s) & (timestamp - B_ts[B_idx] <= self.max_staleness_s) \
+						& np.isfinite(A_bid[A_idx]) & np.isfinite(A_ask[A_idx]) & np.isfinite(B_bid[B_idx]) & np.isfinite(B_ask[B_idx])
+		return 	{
+					"timestamp" : timestamp[valid],
+					"A_bid" 	: A_bid[A_idx[valid]],
+					"A_ask" 	: A_ask[A_idx[valid]],
+					"B_bid" 	: B_bid[B_idx[valid]],
+					"B_ask" 	: B_ask[B_idx[valid]],
+				}
+
+	def chunks(self):
+		"""
+		Yields the aligned ticks of every chunk from start_ts to end_ts, in time order. Chunks without ticks are skipped.
+		"""
+		chunk_start = self.start_ts
+		while chunk_start < self.end_ts:
+			chunk_end 	= min(chunk_start + self.chunk_s, self.end_ts)
+			ticks 		= self.align(chunk_start = chunk_start, chunk_end = chunk_end)
+			if len(ticks["timestamp"]) > 0:
+				yield ticks
+			chunk_start = chunk_end
+		return
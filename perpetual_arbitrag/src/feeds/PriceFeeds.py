@@ -1,7 +1,10 @@
 from abc import ABCMeta
 from abc import abstractmethod
+from feeds.TickTracer import NULL_TRACER
 
 class PriceFeeds(metaclass = ABCMeta):
+	# Replaced with a TickTracer to time feed reads within a tick
+	tracer = NULL_TRACER
 
 	def __init__(self, *args, **kwargs):
 		return		
@@ -16,5 +19,25 @@ class PriceFeeds(metaclass = ABCMeta):
 		- Sorted book 		: Bids are sorted by highest price first. Asks are sorted by lowest price first.
 		- Relevance 		: The book reflects the latest data available. The `updated` field contains the timestamp for the order book
 		- Bid / Asks 		: All bids / asks will be structured as [price, qty]
+		- Receipt 			: Feeds that know when the book reached them add a `received` timestamp, used for latency metrics
 		"""
-		pass
\ No newline at end of file
+		pass
+
+	def sorted_order_books(self, exchange: str, symbols: [str], max_sizes: [float] = None, *args, **kwargs):
+		"""
+		Fetches the order books of several symbols at once, in the same order as `symbols`.
+
+		Each book follows the format of `sorted_order_book` and carries its own `updated` timestamp.
+		max_sizes optionally gives, per symbol, the size the book is read for. Feeds may then stop parsing once it is covered.
+		Feeds that are able to read all books in one round trip should override this method.
+		"""
+		_max_sizes = max_sizes if max_sizes is not None else [None] * len(symbols)
+		return [self.sorted_order_book(symbol = each_symbol, exchange = exchange, max_size = each_size, *args, **kwargs) for (each_symbol, each_size) in zip(symbols, _max_sizes)]
+
+	def pop_updated_symbols(self):
+		"""
+		Returns the set of subscribed symbols whose books were refreshed since the last call, and clears it.
+
+		Feeds that do not push books return None, as they cannot tell which books changed.
+		"""
+		return None
\ No newline at end of file
@@ -0,0 +1,53 @@
+import threading
+
+class PushedBookUpdates(object):
+	"""
+	Book update notifications of feeds that push books into memory from a background thread.
+
+	The feed's thread calls `_mark_updated` whenever the book of a symbol is refreshed. Readers block in `wait_for_update`
+	and then ask `pop_updated_symbols` which books changed. Mixed in before `PriceFeeds`, whose `pop_updated_symbols`
+	only serves feeds that cannot tell which books changed.
+	"""
+
+	def __init__(self, *args, **kwargs):
+		super(PushedBookUpdates, self).__init__(*args, **kwargs)
+		self.updated_symbols 		= set()
+		self.updates_lock 			= threading.Lock()
+		# Updates are counted under the lock, so that none arriving while a waiter wakes up is lost
+		self.updates_condition 		= threading.Condition(self.updates_lock)
+		self.update_count 			= 0
+		self.waited_update_count 	= 0
+		return
+
+	def _mark_updated(self, symbol: str):
+		with self.updates_condition:
+			self.updated_symbols.add(symbol)
+			self.update_count += 1
+			self.updates_condition.notify_all()
+		return
+
+	def wait_for_update(self, timeout_s: float):
+		"""
+		Blocks until any subscribed book has been updated since the last call, or until timeout_s has elapsed.
+
+		Returns True if a new book arrived (or waiters were woken by `wake_waiters`), False on timeout.
+		"""
+		with self.updates_condition:
+			updated = self.updates_condition.wait_for(lambda: self.update_count != self.waited_update_count, timeout = timeout_s)
+			self.waited_update_count = self.update_count
+		return updated
+
+	def pop_updated_symbols(self):
+		with self.updates_lock:
+			(updated_symbols, self.updated_symbols) = (self.updated_symbols, set())
+		return updated_symbols
+
+	def wake_waiters(self):
+		"""
+		Returns every pending `wait_for_update` at once, without marking any symbol as updated. Used on shut down, as a
+		wait running in an executor thread is not interrupted by cancelling the task awaiting it.
+		"""
+		with self.updates_condition:
+			self.update_count += 1
+			self.updates_condition.notify_all()
+		return
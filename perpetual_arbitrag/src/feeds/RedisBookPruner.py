@@ -0,0 +1,80 @@
+import logging
+import redis
+import time
+
+class RedisBookPruner(object):
+	"""
+	Trims order book entries older than a retention window from every key matching a pattern.
+
+	Each cycle is a single round trip. In lua mode, the SCAN and ZREMRANGEBYSCORE loop runs server side in one script call.
+	In pipeline mode, keys are scanned first and trimmed in one pipelined batch, for servers where scripting is disabled.
+	"""
+	prune_script = """
+		local cursor 	= "0"
+		local pruned 	= 0
+		repeat
+			local resp 	= redis.call("SCAN", cursor, "MATCH", ARGV[1], "COUNT", 1000)
+			cursor 		= resp[1]
+			for _, key in ipairs(resp[2]) do
+				pruned = pruned + redis.call("ZREMRANGEBYSCORE", key, "-inf", ARGV[2])
+			end
+		until cursor == "0"
+		return pruned
+	"""
+	redis_cli 	= None
+	logger 		= logging.getLogger('RedisBookPruner')
+
+	def __init__(self, 	redis_url: str, 
+						redis_port: int, 
+						key_pattern: str = "book-*", 
+						retention_s: float = 5, 
+						mode: str = "lua"):
+		assert mode in {"lua", "pipeline"}, f"Unsupported prune mode {mode}"
+		self.redis_url 		= redis_url
+		self.redis_port 	= redis_port
+		self.key_pattern 	= key_pattern
+		self.retention_s 	= retention_s
+		self.mode 			= mode
+		return
+
+	def connect(self):
+		self.logger.debug(f"Connecting to redis at {self.redis_url}:{self.redis_port}")
+		self.redis_cli 		= redis.Redis(host = self.redis_url, port = self.redis_port)
+		self.prune_cmd 		= self.redis_cli.register_script(self.prune_script)
+		return self
+
+	def prune(self, now: float = None):
+		"""
+		Removes entries with a score (cryptostore timestamp) older than now - retention_s. Returns the number of entries removed.
+		"""
+		up_to_time = (time.time() if now is None else now) - self.retention_s
+
+		if self.mode == "lua":
+			return self.prune_cmd(args = [self.key_pattern, up_to_time])
+
+		keys = list(self.redis_cli.scan_iter(match = self.key_pattern, count = 1000))
+		if len(keys) == 0:
+			return 0
+
+		pipe = self.redis_cli.pipeline(transaction = False)
+		for each_key in keys:
+			pipe.zremrangebyscore(each_key, "-inf", up_to_time)
+		return sum(pipe.execute())
+
+	def run(self, cycle_s: float, report_interval_s: float = 60):
+		"""
+		Prunes every cycle_s seconds. The number of entries pruned is logged every report_interval_s.
+		"""
+		(pruned, last_report) = (0, time.time())
+		while True:
+			cycle_start = time.time()
+			try:
+				pruned += self.prune(now = cycle_start)
+			except redis.exceptions.RedisError as ex:
+				self.logger.error(f"Prune failed: {ex}")
+
+			if cycle_start - last_report >= report_interval_s:
+				self.logger.info(f"Pruned {pruned} entries from {self.key_pattern} in the last {cycle_start - last_report:.1f}s")
+				(pruned, last_report) = (0, cycle_start)
+
+			time.sleep(max(0, cycle_s - (time.time() - cycle_start)))
\ No newline at end of file
@@ -0,0 +1,45 @@
+import logging
+import redis
+from feeds.CryptoStoreRedisFeeds import CryptoStoreRedisFeeds
+from feeds.OrderBookEncoding import encode_order_book
+
+class RedisBookWriter(object):
+	"""
+	Writes order book snapshots to Redis packed with `feeds.OrderBookEncoding`, in the keys and scores cryptostore uses,
+	so that they are read by `CryptoStoreRedisFeeds` with encoding binary and trimmed by `RedisBookPruner`.
+	"""
+	redis_cli 	= None
+	logger 		= logging.getLogger('RedisBookWriter')
+
+	def __init__(self, redis_url: str, redis_port: int, decimals: dict = {}):
+		"""
+		decimals 	- Optional (price decimals, qty decimals) of each symbol. Otherwise they are inferred from every book
+		"""
+		self.redis_url 	= redis_url
+		self.redis_port = redis_port
+		self.decimals 	= decimals
+		return
+
+	def connect(self):
+		self.logger.debug(f"Connecting to redis at {self.redis_url}:{self.redis_port}")
+		self.redis_cli = redis.Redis(host = self.redis_url, port = self.redis_port)
+		return self
+
+	def _book_key(self, symbol: str, exchange: str):
+		return f"book-{exchange}-{CryptoStoreRedisFeeds.symbol_to_key_mapping(symbol = symbol, exchange = exchange)}"
+
+	def write(self, exchange: str, order_books: dict):
+		"""
+		Adds the books of {symbol : order_book} to their keys in one pipelined batch, scored by their `updated` timestamp.
+		"""
+		pipe = self.redis_cli.pipeline(transaction = False)
+		for (each_symbol, each_book) in order_books.items():
+			(price_decimals, qty_decimals) = self.decimals.get(each_symbol, (None, None))
+			payload = encode_order_book(bids 				= each_book["bids"],
+										asks 				= each_book["asks"],
+										timestamp 			= each_book["updated"],
+										receipt_timestamp 	= each_book.get("received") or 0,
+										price_decimals 		= price_decimals,
+										qty_decimals 		= qty_decimals)
+			pipe.zadd(self._book_key(symbol = each_symbol, exchange = exchange), {payload : each_book["updated"]})
+		return pipe.execute()
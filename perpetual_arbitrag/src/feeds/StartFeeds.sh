@@ -8,7 +8,14 @@ bash feeds/StartFeeds.sh \
 -e <EXCHANGE> \
 -c <CURRENCY PAIRS A> \
 -c <CURRENCY PAIRS B> \
--c ...
+-c ... \
+[-d <SNAPSHOT_INTERVAL>] \
+[-r <RETENTION_S>]
+
+-d writes L2 deltas (SNAPSHOT_ONLY=False) with a full snapshot every SNAPSHOT_INTERVAL updates, 
+for bots running with --feed_mode delta. Pick an interval that still lands a snapshot inside the prune window.
+Without it, a snapshot is written on every update.
+-r sets how many seconds of entries are kept in Redis. Defaults to 5.
 
 Example:
 
@@ -27,7 +34,11 @@ function cleanUpDocker {
 	docker container prune -f
 }
 
-while getopts ":e::c::h::p:" opt; do
+SNAPSHOT_ONLY=True
+SNAPSHOT_INTERVAL=1
+RETENTION_S=5
+
+while getopts ":e::c::h::p::d::r:" opt; do
 	case $opt in 
 		e)
 			EXCHANGE=$OPTARG
@@ -41,6 +52,13 @@ while getopts ":e::c::h::p:" opt; do
 		p)
 			REDIS_PORT=$OPTARG
 			;;
+		d)
+			SNAPSHOT_ONLY=False
+			SNAPSHOT_INTERVAL=$OPTARG
+			;;
+		r)
+			RETENTION_S=$OPTARG
+			;;
 		\?)
 			echo "Invalid option: -$OPTARG"
 			exit 1
@@ -65,18 +83,16 @@ for CUR in "${CURRENCY[@]}"; do
 	-e BACKEND='REDIS' \
 	-e HOST=$REDIS_HOST \
 	-e PORT=$REDIS_PORT \
-	-e SNAPSHOT_ONLY=True \
-	-e SNAPSHOT_INTERVAL=1 \
+	-e SNAPSHOT_ONLY=$SNAPSHOT_ONLY \
+	-e SNAPSHOT_INTERVAL=$SNAPSHOT_INTERVAL \
 	-l cryptostore.exchange=$EXCHANGE \
 	jkok005/cryptostore-fork:latest
 done
 
-while true; do
-	for CUR in $(redis-cli -h $REDIS_HOST -p $REDIS_PORT --scan --pattern book-$EXCHANGE-*); do
-		up_to_time=$(date --date='-5 seconds' '+%s')
-		cmd="redis-cli -h $REDIS_HOST -p $REDIS_PORT ZREMRANGEBYSCORE $CUR 0 $up_to_time"
-		echo $cmd
-		eval $cmd
-	done
-	sleep 0.1
-done
\ No newline at end of file
+# Stale snapshots are trimmed by a single long running pruner, instead of one redis-cli process per key per cycle
+PYTHONPATH=.:$PYTHONPATH python3 main/general/pruner/book_pruner.py \
+--redis_url $REDIS_HOST \
+--redis_port $REDIS_PORT \
+--key_pattern "book-$EXCHANGE-*" \
+--retention_s $RETENTION_S \
+--cycle_s 0.1
\ No newline at end of file
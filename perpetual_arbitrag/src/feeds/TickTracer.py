@@ -0,0 +1,197 @@
+import functools
+import json
+import logging
+import signal
+import threading
+import time
+from feeds.FeedLatencyMetrics import LatencyHistogram
+
+class _Span(object):
+	__slots__ = ("tracer", "stage", "started")
+
+	def __init__(self, tracer, stage: str):
+		self.tracer = tracer
+		self.stage 	= stage
+		return
+
+	def __enter__(self):
+		self.started = time.perf_counter()
+		return self
+
+	def __exit__(self, *args):
+		self.tracer.add_span(stage = self.stage, started = self.started)
+		return False
+
+class _NullSpan(object):
+	def __enter__(self):
+		return self
+
+	def __exit__(self, *args):
+		return False
+
+class NullTickTracer(object):
+	"""
+	Tracer used when tracing is off. Every call is a no-op.
+	"""
+	null_span = _NullSpan()
+
+	def start_tick(self, *args, **kwargs):
+		return
+
+	def span(self, stage: str):
+		return self.null_span
+
+	def add_span(self, *args, **kwargs):
+		return
+
+	def bind(self, fn):
+		return fn
+
+	def end_tick(self, *args, **kwargs):
+		return
+
+NULL_TRACER = NullTickTracer()
+
+class TickTracer(object):
+	"""
+	Traces where time goes within a tick, from the wake up on a new book to the exchange ack.
+
+	Spans are timed on the monotonic perf_counter clock and summed per stage within a tick:
+
+	- wake 				: feed update to the start of the evaluation
+	- feed_read 		: round trip to the feed store
+	- book_parse 		: decoding / building the books that were read
+	- vwap 				: average fill prices of the entry sizes
+	- trade_decision 	: strategy decision
+	- order_framing 	: encoding order frames
+	- send 				: writing orders to the exchange
+	- ack 				: waiting for the exchange replies to the orders
+	- revert 			: reverting or unwinding a failed pair
+
+	Stages may nest, e.g. the framing, send and ack of a revert also count towards revert.
+
+	Only spans recorded from the thread that started the tick count, so background feed threads do not pollute it.
+	Blocking calls of the tick run in executor threads are wrapped with `bind`, so that their spans count as well.
+	Each tick is appended to trace_path as one compact JSON line with span durations in microseconds, and feeds
+	per symbol / stage histograms. summarize_trace_records gives exact quantiles from the trace file of a run.
+	"""
+	stages 		= ["wake", "feed_read", "book_parse", "vwap", "trade_decision", "order_framing", "send", "ack", "revert"]
+	bounds_ms 	= [0.001, 0.0025, 0.005, 0.01, 0.025, 0.05] + LatencyHistogram.bounds_ms
+	logger 		= logging.getLogger('TickTracer')
+
+	def __init__(self, symbol: str, trace_path: str = None):
+		self.symbol 		= symbol
+		self.trace_file 	= open(trace_path, "a") if trace_path is not None else None
+		self.histograms 	= {}
+		self.spans 			= None
+		self.tick_threads 	= set()
+		self.tick_started 	= None
+		return
+
+	def _histogram(self, symbol: str, stage: str):
+		if (symbol, stage) not in self.histograms:
+			self.histograms[(symbol, stage)] = LatencyHistogram(bounds_ms = self.bounds_ms)
+		return self.histograms[(symbol, stage)]
+
+	def start_tick(self, woken: float = None):
+		"""
+		Starts a tick. woken is the perf_counter time at which the new book was seen, if known.
+		"""
+		self.tick_started 	= time.perf_counter()
+		self.tick_threads 	= {threading.get_ident()}
+		self.spans 			= {}
+		if woken is not None:
+			self.spans["wake"] = self.tick_started - woken
+		return
+
+	def span(self, stage: str):
+		return _Span(tracer = self, stage = stage)
+
+	def add_span(self, stage: str, started: float, ended: float = None):
+		if self.spans is None or threading.get_ident() not in self.tick_threads:
+			return
+		self.spans[stage] = self.spans.get(stage, 0) + (time.perf_counter() if ended is None else ended) - started
+		return
+
+	def bind(self, fn):
+		"""
+		Wraps fn, which is called on behalf of the current tick from another thread, e.g. by `loop.run_in_executor`.
+		Spans recorded by the thread while it runs fn count towards the tick.
+		"""
+		@functools.wraps(fn)
+		def _bound(*args, **kwargs):
+			thread = threading.get_ident()
+			self.tick_threads.add(thread)
+			try:
+				return fn(*args, **kwargs)
+			finally:
+				self.tick_threads.discard(thread)
+		return _bound
+
+	def end_tick(self, decision = None):
+		"""
+		Closes the tick, recording its spans and the total tick time.
+		"""
+		if self.spans is None:
+			return
+		(spans, self.spans) = (self.spans, None)
+		spans["tick"] = time.perf_counter() - self.tick_started + spans.get("wake", 0)
+
+		for (stage, duration_s) in spans.items():
+			self._histogram(symbol = self.symbol, stage = stage).record(latency_s = duration_s)
+
+		if self.trace_file is not None:
+			record = {"ts" : round(time.time(), 6), "symbol" : self.symbol, "decision" : str(decision), "us" : {stage : round(duration_s * 1e6, 1) for (stage, duration_s) in spans.items()}}
+			self.trace_file.write(json.dumps(record, separators = (",", ":")) + "\n")
+		return
+
+	def summary(self):
+		return {f"{symbol}:{stage}" : histogram.summary() for ((symbol, stage), histogram) in list(self.histograms.items())}
+
+	def dump(self):
+		if self.trace_file is not None:
+			self.trace_file.flush()
+		self.logger.info(f"Tick trace: {json.dumps(self.summary())}")
+		return
+
+	def dump_on_signal(self, signum: int = signal.SIGUSR2):
+		"""
+		Logs the summary and flushes the trace file whenever the process receives `signum`, e.g. `kill -USR2 <pid>`. Must be called from the main thread.
+		"""
+		signal.signal(signum, lambda *args: self.dump())
+		return self
+
+	def close(self):
+		if self.trace_file is not None:
+			self.trace_file.close()
+			self.trace_file = None
+		return
+
+def _quantile(sorted_values: [float], q: float):
+	return sorted_values[min(int(q * len(sorted_values)), len(sorted_values) - 1)]
+
+def summarize_trace_records(lines):
+	"""
+	Exact p50 / p99 / p999 per symbol and stage, in microseconds, from the JSON lines written by TickTracer.
+	"""
+	durations = {}
+	for each_line in lines:
+		if len(each_line.strip()) == 0:
+			continue
+		record = json.loads(each_line)
+		for (stage, duration_us) in record["us"].items():
+			durations.setdefault(record["symbol"], {}).setdefault(stage, []).append(duration_us)
+
+	summary = {}
+	for (symbol, stages) in durations.items():
+		summary[symbol] = {}
+		for (stage, values) in stages.items():
+			_values = sorted(values)
+			summary[symbol][stage] = 	{
+											"count" 	: len(_values),
+											"p50_us" 	: _quantile(_values, 0.5),
+											"p99_us" 	: _quantile(_values, 0.99),
+											"p999_us" 	: _quantile(_values, 0.999),
+											"max_us" 	: _values[-1],
+										}
+	return summary
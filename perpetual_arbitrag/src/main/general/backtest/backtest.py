@@ -0,0 +1,134 @@
+import argparse
+import csv
+import json
+import logging
+import numpy as np
+import os
+from execution.BacktestEngine import BacktestEngine
+from feeds.BookRecording import BookRecording
+from feeds.PairBookReplay import PairBookReplay
+from strategies.MarginPerpArbitrag import MarginPerpArbitrag
+from strategies.SpotPerpArbitrag import SpotPerpArbitrag
+
+"""
+python3 main/general/backtest/backtest.py \
+--asset_type spot_perp \
+--asset_recording /data/books/OKX-BTC-USDT.bin \
+--perpetual_recording /data/books/OKX-BTC-USDT-SWAP.bin \
+--asset_entry_vol 0.01 \
+--max_asset_vol 0.1 \
+--perpetual_entry_lot_size 1 \
+--max_perpetual_lot_size 10 \
+--perpetual_contract_size 0.01 \
+--entry_gap_frac 0.002 \
+--profit_taking_frac 0.001 \
+--fee_rate 0.0005 \
+--funding_csv /data/funding/BTC-USDT-SWAP.csv \
+--current_funding_interval_s 1800 \
+--estimated_funding_interval_s 1800 \
+--max_staleness_s 2 \
+--fill_delay_s 0 \
+--trades_path /tmp/trades.csv \
+--exposure_path /tmp/exposure.csv
+"""
+
+def write_csv(path: str, rows: list):
+	if path is None or len(rows) == 0:
+		return
+	with open(path, "w", newline = "") as f:
+		writer = csv.DictWriter(f, fieldnames = list(rows[0].keys()))
+		writer.writeheader()
+		writer.writerows(rows)
+	return
+
+if __name__ == "__main__":
+	parser 	= argparse.ArgumentParser(description='Backtests an arbitrag pair on recorded order books')
+	parser.add_argument('--asset_type', type=str, nargs='?', choices={"spot_perp", "margin_perp"}, default=os.environ.get("ASSET_TYPE"), help='Either spot_perp or margin_perp')
+	parser.add_argument('--asset_recording', type=str, nargs='?', default=os.environ.get("ASSET_RECORDING"), help='Book recording of the spot / margin leg')
+	parser.add_argument('--perpetual_recording', type=str, nargs='?', default=os.environ.get("PERPETUAL_RECORDING"), help='Book recording of the perpetual leg, with sizes in lots')
+	parser.add_argument('--asset_entry_vol', type=float, nargs='?', default=os.environ.get("ASSET_ENTRY_VOL"), help='Volume of spot / margin assets for each entry')
+	parser.add_argument('--max_asset_vol', type=float, nargs='?', default=os.environ.get("MAX_ASSET_VOL"), help='Max volume of spot / margin assets to long / short')
+	parser.add_argument('--perpetual_entry_lot_size', type=int, nargs='?', default=os.environ.get("PERPETUAL_ENTRY_LOT_SIZE"), help='Lot size for each entry for perpetual')
+	parser.add_argument('--max_perpetual_lot_size', type=int, nargs='?', default=os.environ.get("MAX_PERPETUAL_LOT_SIZE"), help='Max lot size to long / short perpetual')
+	parser.add_argument('--perpetual_contract_size', type=float, nargs='?', default=os.environ.get("PERPETUAL_CONTRACT_SIZE", 1), help='Base currency per perpetual lot')
+	parser.add_argument('--entry_gap_frac', type=float, nargs='?', default=os.environ.get("ENTRY_GAP_FRAC"), help='Fraction of price difference which we can consider making an entry')
+	parser.add_argument('--profit_taking_frac', type=float, nargs='?', default=os.environ.get("PROFIT_TAKING_FRAC"), help='Fraction of price difference which we can consider taking profit')
+	parser.add_argument('--fee_rate', type=float, nargs='?', default=os.environ.get("FEE_RATE", 0), help='Fee charged on the notional of every leg')
+	parser.add_argument('--funding_csv', type=str, nargs='?', default=os.environ.get("FUNDING_CSV"), help='CSV of timestamp, funding_rate, estimated_funding_rate rows with a header, in time order. If None, funding is zero')
+	parser.add_argument('--current_funding_interval_s', type=int, nargs='?', default=os.environ.get("CURRENT_FUNDING_INTERVAL_S", 0), help='Seconds before funding snapshot timings which we consider valid to account for current funding rate P/L')
+	parser.add_argument('--estimated_funding_interval_s', type=int, nargs='?', default=os.environ.get("ESTIMATED_FUNDING_INTERVAL_S", 0), help='Seconds before funding snapshot timings which we consider valid to account for estimated funding rate P/L')
+	parser.add_argument('--margin_quote_daily_rate', type=float, nargs='?', default=os.environ.get("MARGIN_QUOTE_DAILY_RATE", 0), help='Daily interest rate of borrowing the quote currency. Only used by margin_perp')
+	parser.add_argument('--margin_base_daily_rate', type=float, nargs='?', default=os.environ.get("MARGIN_BASE_DAILY_RATE", 0), help='Daily interest rate of borrowing the base currency. Only used by margin_perp')
+	parser.add_argument('--margin_loan_period_hr', type=int, nargs='?', default=os.environ.get("MARGIN_LOAN_PERIOD_HR", 0), help='Expected hours a margin position is held for, over which interest is compounded in trade decisions')
+	parser.add_argument('--max_staleness_s', type=float, nargs='?', default=os.environ.get("MAX_STALENESS_S", 2), help='Ticks where the book of either leg is older than this are not traded')
+	parser.add_argument('--fill_delay_s', type=float, nargs='?', default=os.environ.get("FILL_DELAY_S", 0), help='Orders fill against the books this many seconds after the decision')
+	parser.add_argument('--start_ts', type=float, nargs='?', default=os.environ.get("START_TS"), help='Epoch seconds to start the backtest from. If None, the start of the recordings')
+	parser.add_argument('--end_ts', type=float, nargs='?', default=os.environ.get("END_TS"), help='Epoch seconds to end the backtest at. If None, the end of the recordings')
+	parser.add_argument('--chunk_s', type=float, nargs='?', default=os.environ.get("CHUNK_S", 86400), help='Seconds of recordings replayed at a time')
+	parser.add_argument('--sample_interval_s', type=float, nargs='?', default=os.environ.get("SAMPLE_INTERVAL_S", 3600), help='Seconds between exposure samples')
+	parser.add_argument('--trades_path', type=str, nargs='?', default=os.environ.get("TRADES_PATH"), help='If set, trades are written to this CSV')
+	parser.add_argument('--exposure_path', type=str, nargs='?', default=os.environ.get("EXPOSURE_PATH"), help='If set, exposure and PnL samples are written to this CSV')
+	args 	= parser.parse_args()
+
+	logging.basicConfig(format='%(asctime)s %(levelname)-8s %(module)s.%(funcName)s %(lineno)d - %(message)s',
+    					level=logging.INFO,
+    					datefmt='%Y-%m-%d %H:%M:%S')
+
+	logging.info(f"Starting backtest with the following params: {args}")
+	# Strategies log every decision and position change, which would flood the logs of a replay
+	for each_logger in ["SpotPerpArbitrag", "MarginPerpArbitrag", "SingleTradeArbitragV2"]:
+		logging.getLogger(each_logger).setLevel(logging.WARNING)
+
+	(asset_symbol, perpetual_symbol) = [os.path.splitext(os.path.basename(each_path))[0] for each_path in [args.asset_recording, args.perpetual_recording]]
+
+	if args.asset_type == "spot_perp":
+		strategy = SpotPerpArbitrag(spot_symbol 			= asset_symbol,
+									current_spot_vol 		= 0,
+									max_spot_vol 			= args.max_asset_vol,
+									perp_symbol 			= perpetual_symbol,
+									current_perp_lot_size 	= 0,
+									max_perp_lot_size 		= args.max_perpetual_lot_size)
+	else:
+		strategy = MarginPerpArbitrag(	margin_symbol 			= asset_symbol,
+										current_margin_position = 0,
+										max_margin_position 	= args.max_asset_vol,
+										perp_symbol 			= perpetual_symbol,
+										current_perp_position 	= 0,
+										max_perp_position 		= args.max_perpetual_lot_size)
+
+	if args.funding_csv is not None:
+		funding 		= np.loadtxt(args.funding_csv, delimiter = ",", skiprows = 1, ndmin = 2)
+		funding_history = (funding[:, 0], funding[:, 1], funding[:, 2])
+	else:
+		logging.warning("No funding_csv, funding is zero")
+		funding_history = None
+
+	replay 	= PairBookReplay(	A_recording 	= BookRecording(path = args.asset_recording),
+								B_recording 	= BookRecording(path = args.perpetual_recording),
+								A_size 			= args.asset_entry_vol,
+								B_size 			= args.perpetual_entry_lot_size,
+								max_staleness_s = args.max_staleness_s,
+								start_ts 		= args.start_ts,
+								end_ts 			= args.end_ts,
+								chunk_s 		= args.chunk_s)
+
+	engine 	= BacktestEngine(	strategy 						= strategy,
+								entry_gap_frac 					= args.entry_gap_frac,
+								profit_taking_frac 				= args.profit_taking_frac,
+								asset_entry_vol 				= args.asset_entry_vol,
+								perpetual_entry_lot_size 		= args.perpetual_entry_lot_size,
+								perpetual_contract_size 		= args.perpetual_contract_size,
+								fee_rate 						= args.fee_rate,
+								funding_history 				= funding_history,
+								current_funding_interval_s 		= args.current_funding_interval_s,
+								estimated_funding_interval_s 	= args.estimated_funding_interval_s,
+								margin_quote_daily_rate 		= args.margin_quote_daily_rate,
+								margin_base_daily_rate 			= args.margin_base_daily_rate,
+								margin_loan_period_hr 			= args.margin_loan_period_hr,
+								fill_delay_s 					= args.fill_delay_s,
+								sample_interval_s 				= args.sample_interval_s)
+
+	summary = engine.run(replay = replay)
+	write_csv(path = args.trades_path, rows = engine.trades)
+	write_csv(path = args.exposure_path, rows = engine.exposures)
+	print(json.dumps(summary, indent = 2))
@@ -0,0 +1,142 @@
+import argparse
+import csv
+import json
+import logging
+import numpy as np
+import os
+from execution.ParameterSweep import ParameterSweep
+
+"""
+python3 main/general/backtest/parameter_sweep.py \
+--asset_type margin_perp \
+--asset_recording /data/books/OKX-BTC-USDT.bin \
+--perpetual_recording /data/books/OKX-BTC-USDT-SWAP.bin \
+--max_asset_vol 0.1 \
+--max_perpetual_lot_size 10 \
+--perpetual_contract_size 0.01 \
+--search bayesian \
+--samples 200 \
+--entry_gap_frac 0.0005 0.005 \
+--profit_taking_frac -0.002 0.002 \
+--asset_entry_vol 0.01 0.02 0.05 \
+--perpetual_entry_lot_size 1 2 5 \
+--fee_rate 0.0005 \
+--funding_csv /data/funding/BTC-USDT-SWAP.csv \
+--processors 8 \
+--exchange okx \
+--user_id 1 \
+--first_asset BTC-USDT \
+--second_asset BTC-USDT-SWAP \
+--output_path /tmp/sweep.csv
+"""
+
+def _env_list(name: str):
+	return os.environ.get(name, "").split()
+
+if __name__ == "__main__":
+	parser 	= argparse.ArgumentParser(description='Sweeps arbitrag params over recorded order books')
+	parser.add_argument('--asset_type', type=str, nargs='?', choices={"spot_perp", "margin_perp"}, default=os.environ.get("ASSET_TYPE"), help='Either spot_perp or margin_perp')
+	parser.add_argument('--asset_recording', type=str, nargs='?', default=os.environ.get("ASSET_RECORDING"), help='Book recording of the spot / margin leg')
+	parser.add_argument('--perpetual_recording', type=str, nargs='?', default=os.environ.get("PERPETUAL_RECORDING"), help='Book recording of the perpetual leg, with sizes in lots')
+	parser.add_argument('--max_asset_vol', type=float, nargs='?', default=os.environ.get("MAX_ASSET_VOL"), help='Max volume of spot / margin assets to long / short')
+	parser.add_argument('--max_perpetual_lot_size', type=int, nargs='?', default=os.environ.get("MAX_PERPETUAL_LOT_SIZE"), help='Max lot size to long / short perpetual')
+	parser.add_argument('--perpetual_contract_size', type=float, nargs='?', default=os.environ.get("PERPETUAL_CONTRACT_SIZE", 1), help='Base currency per perpetual lot')
+	parser.add_argument('--search', type=str, nargs='?', choices={"grid", "random", "bayesian"}, default=os.environ.get("SEARCH", "grid"), help='Grid over all values, or random / bayesian search between the min and max fractions')
+	parser.add_argument('--samples', type=int, nargs='?', default=os.environ.get("SAMPLES", 100), help='Params backtested by random / bayesian search')
+	parser.add_argument('--initial_samples', type=int, nargs='?', default=os.environ.get("INITIAL_SAMPLES"), help='Random params backtested before bayesian search starts. Defaults to the processors')
+	parser.add_argument('--seed', type=int, nargs='?', default=os.environ.get("SEED"), help='Seed of random / bayesian search')
+	parser.add_argument('--entry_gap_frac', type=float, nargs='+', default=_env_list("ENTRY_GAP_FRAC"), help='Values of entry_gap_frac. Random / bayesian search samples between their min and max')
+	parser.add_argument('--profit_taking_frac', type=float, nargs='+', default=_env_list("PROFIT_TAKING_FRAC"), help='Values of profit_taking_frac. Random / bayesian search samples between their min and max')
+	parser.add_argument('--asset_entry_vol', type=float, nargs='+', default=_env_list("ASSET_ENTRY_VOL"), help='Values of spot / margin volume for each entry')
+	parser.add_argument('--perpetual_entry_lot_size', type=int, nargs='+', default=_env_list("PERPETUAL_ENTRY_LOT_SIZE"), help='Values of perpetual lot size for each entry')
+	parser.add_argument('--fee_rate', type=float, nargs='?', default=os.environ.get("FEE_RATE", 0), help='Fee charged on the notional of every leg')
+	parser.add_argument('--funding_csv', type=str, nargs='?', default=os.environ.get("FUNDING_CSV"), help='CSV of timestamp, funding_rate, estimated_funding_rate rows with a header, in time order. If None, funding is zero')
+	parser.add_argument('--current_funding_interval_s', type=int, nargs='?', default=os.environ.get("CURRENT_FUNDING_INTERVAL_S", 0), help='Seconds before funding snapshot timings which we consider valid to account for current funding rate P/L')
+	parser.add_argument('--estimated_funding_interval_s', type=int, nargs='?', default=os.environ.get("ESTIMATED_FUNDING_INTERVAL_S", 0), help='Seconds before funding snapshot timings which we consider valid to account for estimated funding rate P/L')
+	parser.add_argument('--margin_quote_daily_rate', type=float, nargs='?', default=os.environ.get("MARGIN_QUOTE_DAILY_RATE", 0), help='Daily interest rate of borrowing the quote currency. Only used by margin_perp')
+	parser.add_argument('--margin_base_daily_rate', type=float, nargs='?', default=os.environ.get("MARGIN_BASE_DAILY_RATE", 0), help='Daily interest rate of borrowing the base currency. Only used by margin_perp')
+	parser.add_argument('--margin_loan_period_hr', type=int, nargs='?', default=os.environ.get("MARGIN_LOAN_PERIOD_HR", 0), help='Expected hours a margin position is held for, over which interest is compounded in trade decisions')
+	parser.add_argument('--max_staleness_s', type=float, nargs='?', default=os.environ.get("MAX_STALENESS_S", 2), help='Ticks where the book of either leg is older than this are not traded')
+	parser.add_argument('--fill_delay_s', type=float, nargs='?', default=os.environ.get("FILL_DELAY_S", 0), help='Orders fill against the books this many seconds after the decision')
+	parser.add_argument('--start_ts', type=float, nargs='?', default=os.environ.get("START_TS"), help='Epoch seconds to start the backtests from. If None, the start of the recordings')
+	parser.add_argument('--end_ts', type=float, nargs='?', default=os.environ.get("END_TS"), help='Epoch seconds to end the backtests at. If None, the end of the recordings')
+	parser.add_argument('--processors', type=int, nargs='?', default=os.environ.get("PROCESSORS", os.cpu_count()), help='Processes backtesting in parallel')
+	parser.add_argument('--rank_by', type=str, nargs='?', choices={"pnl", "return_on_exposure"}, default=os.environ.get("RANK_BY", "pnl"), help='Either pnl, or pnl over the max gross exposure')
+	parser.add_argument('--ticks_dir', type=str, nargs='?', default=os.environ.get("TICKS_DIR"), help='Directory of the aligned ticks of each entry size. If None, a temporary directory is used')
+	parser.add_argument('--exchange', type=str, nargs='?', default=os.environ.get("EXCHANGE"), help='JobConfig exchange of the results')
+	parser.add_argument('--user_id', type=int, nargs='?', default=os.environ.get("USER_ID"), help='JobConfig user ID of the results')
+	parser.add_argument('--first_asset', type=str, nargs='?', default=os.environ.get("FIRST_ASSET"), help='JobConfig first asset of the results')
+	parser.add_argument('--second_asset', type=str, nargs='?', default=os.environ.get("SECOND_ASSET"), help='JobConfig second asset of the results')
+	parser.add_argument('--base_default_args', type=str, nargs='?', default=os.environ.get("BASE_DEFAULT_ARGS", "{}"), help='JSON of the JobConfig default_args the swept params are written into')
+	parser.add_argument('--output_path', type=str, nargs='?', default=os.environ.get("OUTPUT_PATH"), help='CSV the ranked results are written to')
+	args 	= parser.parse_args()
+
+	logging.basicConfig(format='%(asctime)s %(levelname)-8s %(module)s.%(funcName)s %(lineno)d - %(message)s',
+    					level=logging.INFO,
+    					datefmt='%Y-%m-%d %H:%M:%S')
+
+	logging.info(f"Starting parameter sweep with the following params: {args}")
+	# Strategies log every decision and position change, which would flood the logs of a replay
+	for each_logger in ["SpotPerpArbitrag", "MarginPerpArbitrag", "SingleTradeArbitragV2", "BacktestEngine"]:
+		logging.getLogger(each_logger).setLevel(logging.WARNING)
+
+	space 	= 	{
+					"entry_gap_frac" 			: [float(each) for each in args.entry_gap_frac],
+					"profit_taking_frac" 		: [float(each) for each in args.profit_taking_frac],
+					"asset_entry_vol" 			: [float(each) for each in args.asset_entry_vol],
+					"perpetual_entry_lot_size" 	: [int(each) for each in args.perpetual_entry_lot_size],
+				}
+
+	if args.funding_csv is not None:
+		funding 		= np.loadtxt(args.funding_csv, delimiter = ",", skiprows = 1, ndmin = 2)
+		funding_history = (funding[:, 0], funding[:, 1], funding[:, 2])
+	else:
+		logging.warning("No funding_csv, funding is zero")
+		funding_history = None
+
+	sweep 	= ParameterSweep(	asset_type 				= args.asset_type,
+								asset_recording 		= args.asset_recording,
+								perpetual_recording 	= args.perpetual_recording,
+								max_asset_vol 			= args.max_asset_vol,
+								max_perpetual_lot_size 	= args.max_perpetual_lot_size,
+								engine_params 			= 	{
+																"perpetual_contract_size" 		: args.perpetual_contract_size,
+																"fee_rate" 						: args.fee_rate,
+																"funding_history" 				: funding_history,
+																"current_funding_interval_s" 	: args.current_funding_interval_s,
+																"estimated_funding_interval_s" 	: args.estimated_funding_interval_s,
+																"margin_quote_daily_rate" 		: args.margin_quote_daily_rate,
+																"margin_base_daily_rate" 		: args.margin_base_daily_rate,
+																"margin_loan_period_hr" 		: args.margin_loan_period_hr,
+																"fill_delay_s" 					: args.fill_delay_s,
+															},
+								replay_params 			= 	{
+																"max_staleness_s" 	: args.max_staleness_s,
+																"start_ts" 			: args.start_ts,
+																"end_ts" 			: args.end_ts,
+															},
+								processors 				= args.processors,
+								rank_by 				= args.rank_by,
+								ticks_dir 				= args.ticks_dir)
+
+	try:
+		if args.search == "grid":
+			sweep.grid(space = space)
+		elif args.search == "random":
+			sweep.random(space = space, samples = args.samples, seed = args.seed)
+		else:
+			sweep.bayesian(space = space, samples = args.samples, initial_samples = args.initial_samples, seed = args.seed)
+	finally:
+		sweep.close()
+
+	rows = sweep.ranked(exchange = args.exchange, user_id = args.user_id, first_asset = args.first_asset,
+						second_asset = args.second_asset, base_default_args = json.loads(args.base_default_args))
+
+	if args.output_path is not None:
+		with open(args.output_path, "w", newline = "") as f:
+			writer = csv.DictWriter(f, fieldnames = list(rows[0].keys()))
+			writer.writeheader()
+			writer.writerows(rows)
+
+	for each_row in rows[:10]:
+		logging.info(f"Rank {each_row['rank']}, score {each_row['score']}: {each_row['default_args']}")
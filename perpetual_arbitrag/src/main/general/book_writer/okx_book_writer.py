@@ -0,0 +1,57 @@
+import argparse
+import logging
+import os
+import time
+from feeds.OkxWebsocketFeeds import OkxWebsocketFeeds
+from feeds.RedisBookWriter import RedisBookWriter
+
+"""
+python3 main/general/book_writer/okx_book_writer.py \
+--symbols BTC-USDT BTC-USDT-SWAP \
+--redis_url localhost \
+--redis_port 6379 \
+--feed_channel books5 \
+--feed_latency_s 1 \
+--report_interval_s 60
+"""
+
+if __name__ == "__main__":
+	parser 	= argparse.ArgumentParser(description='Writes OKX order books to Redis in the packed binary encoding')
+	parser.add_argument('--symbols', type=str, nargs='+', default=os.environ.get("SYMBOLS", "").split(), help='OKX instrument ids to write')
+	parser.add_argument('--redis_url', type=str, nargs='?', default=os.environ.get("REDIS_URL"), help="Redis host read by the bots")
+	parser.add_argument('--redis_port', type=int, nargs='?', default=os.environ.get("REDIS_PORT"), help="Redis port read by the bots")
+	parser.add_argument('--feed_url', type=str, nargs='?', default=os.environ.get("FEED_URL"), help="Overrides the OKX public websocket URL")
+	parser.add_argument('--feed_channel', type=str, nargs='?', choices={"books5", "books"}, default=os.environ.get("FEED_CHANNEL", "books5"), help="OKX book channel written")
+	parser.add_argument('--feed_latency_s', type=float, nargs='?', default=os.environ.get("FEED_LATENCY_S", 1), help="Books older than this when written are counted as stale in the feed metrics")
+	parser.add_argument('--report_interval_s', type=float, nargs='?', default=os.environ.get("REPORT_INTERVAL_S", 60), help="Seconds between reports of the number of books written")
+	args 	= parser.parse_args()
+
+	logging.basicConfig(format='%(asctime)s %(levelname)-8s %(module)s.%(funcName)s %(lineno)d - %(message)s',
+    					level=logging.INFO,
+    					datefmt='%Y-%m-%d %H:%M:%S')
+
+	logging.info(f"Starting book writer with the following params: {args}")
+
+	feed_client = OkxWebsocketFeeds(permissible_latency_s = args.feed_latency_s, feed_url = args.feed_url, channel = args.feed_channel).connect()
+	feed_client.subscribe(exchange = "OKX", symbols = args.symbols)
+	writer 		= RedisBookWriter(redis_url = args.redis_url, redis_port = args.redis_port).connect()
+	(written, last_report) = (0, time.time())
+
+	while True:
+		if not feed_client.wait_for_update(timeout_s = 1):
+			continue
+
+		order_books = {}
+		for each_symbol in feed_client.pop_updated_symbols():
+			try:
+				order_books[each_symbol] = feed_client.sorted_order_book(symbol = each_symbol, exchange = "OKX")
+			except Exception as ex:
+				logging.error(f"Unable to read {each_symbol}: {ex}")
+
+		if len(order_books) > 0:
+			writer.write(exchange = "OKX", order_books = order_books)
+			written += len(order_books)
+
+		if time.time() - last_report >= args.report_interval_s:
+			logging.info(f"Written {written} books in the last {args.report_interval_s}s")
+			(written, last_report) = (0, time.time())
@@ -0,0 +1,105 @@
+import argparse
+import asyncio
+import json
+import logging
+import os
+import time
+from clients.OkxApiClientWS import OkxApiClientWS
+from execution.SpotPerpetualBotExecution import SpotPerpetualBotExecution
+from execution.UnwindEngine import UnwindEngine
+from feeds.FeedLatencyMetrics import LatencyHistogram
+
+"""
+python3 main/general/mock_exchange/load_tester.py \
+--ws_private_url ws://localhost:8765/ws/v5/private \
+--rest_url http://localhost:8766 \
+--spot_trading_pair BTC-USDT \
+--perpetual_trading_pair BTC-USDT-SWAP \
+--trades 10000 \
+--concurrency 8 \
+--batch_orders 0 \
+--unwind_attempts 3 \
+--retry_timeout_s 0.1
+"""
+
+async def run_trades(bot_executor, spot_params: dict, perpetual_params: dict, spot_revert_params: dict, perpetual_revert_params: dict, trades: int, concurrency: int, retry_timeout_s: float):
+	"""
+	Executes `trades` paired trades with up to `concurrency` in flight, and returns the pair latency histogram and the failed trade count.
+
+	As in the bots, a trade that raises (e.g. while the private websocket fails over) is followed by a pause of retry_timeout_s.
+	"""
+	pair_latency 	= LatencyHistogram()
+	remaining 		= iter(range(trades))
+	failed 			= 0
+
+	async def _worker():
+		nonlocal failed
+		for _ in remaining:
+			started = time.perf_counter()
+			try:
+				succeed = await bot_executor.long_spot_short_perpetual_async(spot_params = spot_params, perpetual_params = perpetual_params,
+																			spot_revert_params = spot_revert_params, perpetual_revert_params = perpetual_revert_params)
+			except Exception as ex:
+				logging.error(ex)
+				succeed = False
+				await asyncio.sleep(retry_timeout_s)
+			pair_latency.record(latency_s = time.perf_counter() - started)
+			failed += 0 if succeed else 1
+
+	await asyncio.gather(*[_worker() for _ in range(concurrency)])
+	return (pair_latency, failed)
+
+if __name__ == "__main__":
+	parser 	= argparse.ArgumentParser(description='Load tests the OKX websocket executor against the mock exchange')
+	parser.add_argument('--ws_private_url', type=str, nargs='?', default=os.environ.get("WS_PRIVATE_URL", "ws://localhost:8765/ws/v5/private"), help='Private websocket URL of the mock exchange')
+	parser.add_argument('--rest_url', type=str, nargs='?', default=os.environ.get("REST_URL", "http://localhost:8766"), help='REST URL of the mock exchange')
+	parser.add_argument('--spot_trading_pair', type=str, nargs='?', default=os.environ.get("SPOT_TRADING_PAIR", "BTC-USDT"), help='Spot trading pair symbol')
+	parser.add_argument('--perpetual_trading_pair', type=str, nargs='?', default=os.environ.get("PERPETUAL_TRADING_PAIR", "BTC-USDT-SWAP"), help='Perpetual trading pair symbol')
+	parser.add_argument('--trades', type=int, nargs='?', default=os.environ.get("TRADES", 10000), help='Paired trades to execute')
+	parser.add_argument('--concurrency', type=int, nargs='?', default=os.environ.get("CONCURRENCY", 8), help='Paired trades in flight at any time')
+	parser.add_argument('--batch_orders', type=int, nargs='?', choices={0, 1}, default=os.environ.get("BATCH_ORDERS", 0), help='If 1, both legs of a trade are sent in a single batch-orders message')
+	parser.add_argument('--unwind_attempts', type=int, nargs='?', default=os.environ.get("UNWIND_ATTEMPTS", 3), help='Attempts to flatten the leg left open when the other leg fails. If 0, a single unconfirmed revert is sent')
+	parser.add_argument('--retry_timeout_s', type=float, nargs='?', default=os.environ.get("RETRY_TIMEOUT_S", 0.1), help='Pause of a worker after a trade raised, e.g. on a disconnect')
+	parser.add_argument('--ws_standby', type=int, nargs='?', choices={0, 1}, default=os.environ.get("WS_STANDBY", 1), help='If 1, a logged in standby private websocket is kept for failover')
+	args 	= parser.parse_args()
+
+	logging.basicConfig(format='%(asctime)s %(levelname)-8s %(module)s.%(funcName)s %(lineno)d - %(message)s',
+    					level=logging.WARNING,
+    					datefmt='%Y-%m-%d %H:%M:%S')
+
+	client 	= OkxApiClientWS(api_key 				= "mock",
+							 api_secret_key 		= "mock",
+							 passphrase 			= "mock",
+							 feed_client 			= None,
+							 funding_rate_enable 	= False,
+							 ws_standby 			= args.ws_standby == 1,
+							 ws_private_url 		= args.ws_private_url,
+							 rest_url 				= args.rest_url,
+							)
+	client.make_connection()
+
+	unwind_engine 	= UnwindEngine(max_attempts = args.unwind_attempts) if args.unwind_attempts > 0 else None
+	bot_executor 	= SpotPerpetualBotExecution(api_client = client, batch_orders = args.batch_orders == 1, unwind_engine = unwind_engine)
+
+	spot_params 				= {"symbol" : args.spot_trading_pair, "order_type" : "market", "order_side" : "buy", "price" : 1, "size" : 100, "target_currency" : "quote_ccy"}
+	perpetual_params 			= {"symbol" : args.perpetual_trading_pair, "position_side" : "short", "order_type" : "market", "order_side" : "sell", "price" : 1, "size" : 1}
+	spot_revert_params 			= {**spot_params, "order_side" : "sell", "size" : 0.001, "target_currency" : "base_ccy"}
+	perpetual_revert_params 	= {**perpetual_params, "order_side" : "buy"}
+
+	started = time.perf_counter()
+	(pair_latency, failed) = asyncio.get_event_loop().run_until_complete(
+								run_trades(	bot_executor = bot_executor, spot_params = spot_params, perpetual_params = perpetual_params,
+											spot_revert_params = spot_revert_params, perpetual_revert_params = perpetual_revert_params,
+											trades = args.trades, concurrency = args.concurrency, retry_timeout_s = args.retry_timeout_s)
+							)
+	elapsed_s = time.perf_counter() - started
+
+	report 	= 	{
+					"trades" 			: args.trades,
+					"failed_trades" 	: failed,
+					"trades_per_s" 		: round(args.trades / elapsed_s, 1),
+					"pair_latency" 		: pair_latency.summary(),
+					"unwind" 			: unwind_engine.summary() if unwind_engine is not None else None,
+				}
+	print(json.dumps(report, indent = 2))
+	asyncio.get_event_loop().run_until_complete(client.close_async())
@@ -0,0 +1,70 @@
+import argparse
+import logging
+import os
+import signal
+from clients.OkxMockExchange import OkxMockExchange
+
+"""
+python3 main/general/mock_exchange/okx_mock_exchange.py \
+--instruments BTC-USDT:30000 BTC-USDT-SWAP:30000 \
+--host localhost \
+--ws_port 8765 \
+--rest_port 8766 \
+--latency_s 0.005 \
+--latency_jitter_s 0.002 \
+--reject_rate 0.01 \
+--disconnect_rate 0.001 \
+--rest_rate 0.01 \
+--partial_fill_rate 0.01 \
+--book_interval_s 0.1 \
+--seed 0
+"""
+
+if __name__ == "__main__":
+	parser 	= argparse.ArgumentParser(description='Local OKX compatible mock exchange for load and soak tests')
+	parser.add_argument('--instruments', type=str, nargs='+', default=os.environ.get("INSTRUMENTS", "BTC-USDT:30000 BTC-USDT-SWAP:30000").split(), help='Instruments served, as instId:mid_price. Ids ending with -SWAP are served as perpetuals, others as spot / margin')
+	parser.add_argument('--host', type=str, nargs='?', default=os.environ.get("HOST", "localhost"), help='Host to serve on')
+	parser.add_argument('--ws_port', type=int, nargs='?', default=os.environ.get("WS_PORT", 8765), help='Port of the private (/ws/v5/private) and public (/ws/v5/public) websockets')
+	parser.add_argument('--rest_port', type=int, nargs='?', default=os.environ.get("REST_PORT", 8766), help='Port of the REST API')
+	parser.add_argument('--latency_s', type=float, nargs='?', default=os.environ.get("LATENCY_S", 0), help='Delay before every order reply and REST response')
+	parser.add_argument('--latency_jitter_s', type=float, nargs='?', default=os.environ.get("LATENCY_JITTER_S", 0), help='Uniform random delay added on top of latency_s')
+	parser.add_argument('--reject_rate', type=float, nargs='?', default=os.environ.get("REJECT_RATE", 0), help='Probability that an order is rejected')
+	parser.add_argument('--disconnect_rate', type=float, nargs='?', default=os.environ.get("DISCONNECT_RATE", 0), help='Probability that the private websocket is dropped without a reply on an order request')
+	parser.add_argument('--rest_rate', type=float, nargs='?', default=os.environ.get("REST_RATE", 0), help='Probability that a limit order rests on the book without filling')
+	parser.add_argument('--partial_fill_rate', type=float, nargs='?', default=os.environ.get("PARTIAL_FILL_RATE", 0), help='Probability that an order fills only part of its size. Limit orders keep working the rest, market orders are canceled')
+	parser.add_argument('--book_interval_s', type=float, nargs='?', default=os.environ.get("BOOK_INTERVAL_S", 0.1), help='Seconds between books5 pushes on the public websocket')
+	parser.add_argument('--volatility_frac', type=float, nargs='?', default=os.environ.get("VOLATILITY_FRAC", 0.0001), help='Standard deviation of the mid price move between book pushes, as a fraction of the price')
+	parser.add_argument('--api_key', type=str, nargs='?', default=os.environ.get("API_KEY"), help='If set along with api_secret_key, websocket logins are verified against them. If None, any login is accepted')
+	parser.add_argument('--api_secret_key', type=str, nargs='?', default=os.environ.get("API_SECRET_KEY"), help='Secret key used to verify websocket logins')
+	parser.add_argument('--seed', type=int, nargs='?', default=os.environ.get("SEED", 0), help='Seed of the rng drawing latencies, rejects, disconnects and fills')
+	args 	= parser.parse_args()
+
+	logging.basicConfig(format='%(asctime)s %(levelname)-8s %(module)s.%(funcName)s %(lineno)d - %(message)s',
+    					level=logging.INFO,
+    					datefmt='%Y-%m-%d %H:%M:%S')
+
+	logging.info(args)
+
+	exchange = OkxMockExchange(	instruments 		= {each.split(":")[0] : float(each.split(":")[1]) for each in args.instruments},
+								host 				= args.host,
+								ws_port 			= args.ws_port,
+								rest_port 			= args.rest_port,
+								latency_s 			= args.latency_s,
+								latency_jitter_s 	= args.latency_jitter_s,
+								reject_rate 		= args.reject_rate,
+								disconnect_rate 	= args.disconnect_rate,
+								rest_rate 			= args.rest_rate,
+								partial_fill_rate 	= args.partial_fill_rate,
+								book_interval_s 	= args.book_interval_s,
+								volatility_frac 	= args.volatility_frac,
+								api_key 			= args.api_key,
+								api_secret_key 		= args.api_secret_key,
+								seed 				= args.seed
+							).start()
+
+	signal.signal(signal.SIGUSR1, lambda *args: logging.info(f"Mock exchange stats: {exchange.summary()}"))
+	try:
+		exchange.serve_thread.join()
+	except KeyboardInterrupt:
+		exchange.stop()
+		logging.info(f"Mock exchange stats: {exchange.summary()}")
@@ -0,0 +1,40 @@
+import argparse
+import logging
+import os
+from feeds.RedisBookPruner import RedisBookPruner
+
+"""
+python3 main/general/pruner/book_pruner.py \
+--redis_url localhost \
+--redis_port 6379 \
+--key_pattern book-OKX-* \
+--retention_s 5 \
+--cycle_s 0.1 \
+--mode lua
+"""
+
+if __name__ == "__main__":
+	parser 	= argparse.ArgumentParser(description='Prunes stale order book entries written by cryptostore')
+	parser.add_argument('--redis_url', type=str, nargs='?', default=os.environ.get("REDIS_URL"), help="Redis host written to by cryptostore")
+	parser.add_argument('--redis_port', type=int, nargs='?', default=os.environ.get("REDIS_PORT"), help="Redis port written to by cryptostore")
+	parser.add_argument('--key_pattern', type=str, nargs='?', default=os.environ.get("KEY_PATTERN", "book-*"), help="Pattern of keys to prune")
+	parser.add_argument('--retention_s', type=float, nargs='?', default=os.environ.get("RETENTION_S", 5), help="Entries older than retention_s are removed")
+	parser.add_argument('--cycle_s', type=float, nargs='?', default=os.environ.get("CYCLE_S", 0.1), help="Seconds between prune cycles")
+	parser.add_argument('--report_interval_s', type=float, nargs='?', default=os.environ.get("REPORT_INTERVAL_S", 60), help="Seconds between reports of the number of entries pruned")
+	parser.add_argument('--mode', type=str, nargs='?', choices={"lua", "pipeline"}, default=os.environ.get("MODE", "lua"), help="lua prunes all keys in one server side script call. pipeline scans keys and prunes them in one pipelined batch")
+	args 	= parser.parse_args()
+
+	logging.basicConfig(format='%(asctime)s %(levelname)-8s %(module)s.%(funcName)s %(lineno)d - %(message)s',
+    					level=logging.INFO,
+    					datefmt='%Y-%m-%d %H:%M:%S')
+
+	logging.info(args)
+
+	pruner = RedisBookPruner(	redis_url 	= args.redis_url, 
+								redis_port 	= args.redis_port, 
+								key_pattern = args.key_pattern, 
+								retention_s = args.retention_s, 
+								mode 		= args.mode
+							).connect()
+
+	pruner.run(cycle_s = args.cycle_s, report_interval_s = args.report_interval_s)
\ No newline at end of file
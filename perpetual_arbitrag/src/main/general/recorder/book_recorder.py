@@ -0,0 +1,96 @@
+import argparse
+import logging
+import os
+import signal
+import sys
+from feeds.BookRecording import BookRecorder
+from feeds.CryptoStoreRedisFeeds import CryptoStoreRedisFeeds
+from feeds.OkxWebsocketFeeds import OkxWebsocketFeeds
+
+"""
+python3 main/general/recorder/book_recorder.py \
+--exchange OKX \
+--symbols BTC-USDT BTC-USDT-SWAP \
+--output_dir /data/books \
+--depth 20 \
+--record_interval_s 1 \
+--flush_interval_s 10 \
+--feed_url xxx \
+--feed_port xxx \
+--feed_latency_s 0.5 \
+--feed_encoding json \
+--feed_channel books
+"""
+
+if __name__ == "__main__":
+	parser 	= argparse.ArgumentParser(description='Records order book snapshots for backtests')
+	parser.add_argument('--exchange', type=str, nargs='?', default=os.environ.get("EXCHANGE", "OKX"), help='Exchange of the symbols, as named by the price feed')
+	parser.add_argument('--symbols', type=str, nargs='+', default=os.environ.get("SYMBOLS", "").split(), help='Symbols to record')
+	parser.add_argument('--output_dir', type=str, nargs='?', default=os.environ.get("OUTPUT_DIR"), help='Directory of the recordings. Each symbol is appended to <output_dir>/<exchange>-<symbol>.bin')
+	parser.add_argument('--depth', type=int, nargs='?', default=os.environ.get("DEPTH", 20), help='Levels recorded on each side of the book')
+	parser.add_argument('--record_interval_s', type=float, nargs='?', default=os.environ.get("RECORD_INTERVAL_S", 1), help='Minimum seconds between recorded snapshots of a symbol. Books updated in between are skipped')
+	parser.add_argument('--flush_interval_s', type=float, nargs='?', default=os.environ.get("FLUSH_INTERVAL_S", 10), help='Seconds between flushes of the recordings to disk')
+	parser.add_argument('--feed_url', type=str, nargs='?', default=os.environ.get("FEED_URL"), help="URL pointing to price feed channel. Either the Redis host written to by cryptostore, or a ws:// / wss:// OKX public websocket URL")
+	parser.add_argument('--feed_port', type=str, nargs='?', default=os.environ.get("FEED_PORT"), help="Port pointing to price feed channel")
+	parser.add_argument('--feed_latency_s', type=float, nargs='?', default=os.environ.get("FEED_LATENCY_S", 0.5), help="Permissible latency between fetches of data from price feed")
+	parser.add_argument('--feed_encoding', type=str, nargs='?', choices={"json", "binary"}, default=os.environ.get("FEED_ENCODING", "json"), help="Encoding of order book snapshots in the price feed. Either cryptostore json or packed binary")
+	parser.add_argument('--feed_channel', type=str, nargs='?', choices={"books5", "books"}, default=os.environ.get("FEED_CHANNEL", "books"), help="OKX book channel used when feed_url is a websocket URL")
+	args 	= parser.parse_args()
+
+	logging.basicConfig(format='%(asctime)s %(levelname)-8s %(module)s.%(funcName)s %(lineno)d - %(message)s',
+    					level=logging.INFO,
+    					datefmt='%Y-%m-%d %H:%M:%S')
+
+	logging.info(f"Starting book recorder with the following params: {args}")
+
+	if args.feed_url.startswith(("ws://", "wss://")):
+		feed_client = OkxWebsocketFeeds(permissible_latency_s = args.feed_latency_s,
+										feed_url 	= args.feed_url,
+										channel 	= args.feed_channel
+									).connect()
+	else:
+		feed_client = CryptoStoreRedisFeeds(redis_url 	= args.feed_url,
+											redis_port 	= args.feed_port,
+											permissible_latency_s = args.feed_latency_s,
+											encoding 	= args.feed_encoding
+										).connect()
+		for each_symbol in args.symbols:
+			feed_client.limit_depth(exchange = args.exchange, symbol = each_symbol, max_levels = args.depth)
+
+	feed_client.subscribe(exchange = args.exchange, symbols = args.symbols)
+
+	recorders 		= {each_symbol : BookRecorder(path = os.path.join(args.output_dir, f"{args.exchange}-{each_symbol}.bin"), depth = args.depth) for each_symbol in args.symbols}
+	# Recordings reopened after a restart carry on from their last snapshot
+	last_recorded 	= {each_symbol : each_recorder.last_timestamp for (each_symbol, each_recorder) in recorders.items()}
+	(recorded, last_flush) = (0, None)
+
+	def close(signum, frame):
+		for each_recorder in recorders.values():
+			each_recorder.close()
+		sys.exit(f"Recorded {recorded} snapshots since the last flush")
+
+	signal.signal(signal.SIGTERM, close)
+	signal.signal(signal.SIGINT, close)
+
+	while True:
+		updated 		= feed_client.wait_for_update(timeout_s = args.record_interval_s)
+		updated_symbols = feed_client.pop_updated_symbols() if updated else None
+		# Feeds that cannot tell which books changed have every symbol read again
+		for each_symbol in (args.symbols if updated_symbols is None else updated_symbols & set(args.symbols)):
+			try:
+				order_book = feed_client.sorted_order_book(symbol = each_symbol, exchange = args.exchange)
+			except Exception as ex:
+				logging.error(f"Unable to read {each_symbol}: {ex}")
+				continue
+
+			if 	last_recorded[each_symbol] is None or order_book["updated"] >= last_recorded[each_symbol] + args.record_interval_s:
+				recorders[each_symbol].append(bids = order_book["bids"], asks = order_book["asks"], timestamp = order_book["updated"])
+				last_recorded[each_symbol] = order_book["updated"]
+				recorded += 1
+
+		now = max((each_ts for each_ts in last_recorded.values() if each_ts is not None), default = None)
+		if now is not None and (last_flush is None or now - last_flush >= args.flush_interval_s):
+			for each_recorder in recorders.values():
+				each_recorder.flush()
+			logging.info(f"Recorded {recorded} snapshots since the last flush")
+			(recorded, last_flush) = (0, now)
@@ -1,10 +1,10 @@
 import argparse
 import copy
 import os
+import signal
 import logging
 import sys
 from clients.FtxApiClientWS import FtxApiClientWS
-from datetime import datetime, timedelta
 from db.MarginClients import MarginClients
 from db.PerpetualClients import PerpetualClients
 from execution.FailSafeTrigger import FailSafeTrigger, FailSafeException
@@ -39,6 +39,7 @@ python3 main/intra_exchange/ftx/margin_perp/main.py \
 --feed_url xxx \
 --feed_port xxx \
 --feed_latency_s 0.05 \
+--feed_subscribe 1 \
 --fails_to_exit 3
 """
 
@@ -69,6 +70,7 @@ if __name__ == "__main__":
 	parser.add_argument('--feed_url', type=str, nargs='?', default=os.environ.get("FEED_URL"), help="URL pointing to price feed channel")
 	parser.add_argument('--feed_port', type=str, nargs='?', default=os.environ.get("FEED_PORT"), help="Port pointing to price feed channel")
 	parser.add_argument('--feed_latency_s', type=float, nargs='?', default=os.environ.get("FEED_LATENCY_S"), help="Permissible latency between fetches of data from price feed")
+	parser.add_argument('--feed_subscribe', type=int, nargs='?', choices={0, 1}, default=os.environ.get("FEED_SUBSCRIBE", 0), help="If 1, order books are pushed into memory on every update and the bot re-evaluates as soon as a new book arrives, waiting at most poll_interval_s. If 0, the feed is polled every poll_interval_s")
 	parser.add_argument('--fails_to_exit', type=int, nargs='?', default=os.environ.get("FAILS_TO_EXIT"), help="Allowable failures for trades before programme will be foreced to terminate")
 	args 	= parser.parse_args()
 
@@ -85,6 +87,11 @@ if __name__ == "__main__":
 										permissible_latency_s = args.feed_latency_s
 									).connect()
 
+	if args.feed_subscribe == 1:
+		feed_client.subscribe(exchange = "FTX", symbols = [args.margin_trading_pair, args.perpetual_trading_pair])
+
+	feed_client.metrics.dump_on_signal(signum = signal.SIGUSR1)
+
 	client 	= FtxApiClientWS(	api_key 				= args.api_key, 
 								api_secret_key 			= args.api_secret_key, 
 								feed_client 			= feed_client,
@@ -178,7 +185,8 @@ if __name__ == "__main__":
 							 	)
 				price_str 			= f"Margin bid/ask: {(avg_margin_bid, avg_margin_ask)}, Perpetual bid/ask: {(avg_perpetual_bid, avg_perpetual_ask)}"
 				margin_long_size 	= args.margin_entry_vol * avg_margin_ask
-				assert datetime.utcnow() - min(datetime.utcfromtimestamp(margin_ts), datetime.utcfromtimestamp(perpetual_ts)) <= timedelta(milliseconds = args.feed_latency_s * 1000), "Trade latency too large" 
+				feed_client.metrics.check_latency(exchange = "FTX", symbol = args.margin_trading_pair, updated = margin_ts, permissible_latency_s = args.feed_latency_s)
+				feed_client.metrics.check_latency(exchange = "FTX", symbol = args.perpetual_trading_pair, updated = perpetual_ts, permissible_latency_s = args.feed_latency_s)
 
 			funding_str = f"Margin quote - base interests: {margin_quote_funding_rate} / {margin_base_funding_rate} - Current/Est Funding: {(perpetual_funding_rate, perpetual_estimated_funding_rate)}"
 			logging.info(f"{decision} - {price_str} - {funding_str}")
@@ -340,7 +348,7 @@ if __name__ == "__main__":
 
 			if 	(new_order_execution) or \
 				(decision == MarginPerpExecutionDecision.NO_DECISION):
-				sleep(args.poll_interval_s)
+				feed_client.wait_for_update(timeout_s = args.poll_interval_s) if args.feed_subscribe == 1 else sleep(args.poll_interval_s)
 			
 			else:
 				raise Exception(f"Order execution failed - Status: {new_order_execution}, Decision: {decision}")
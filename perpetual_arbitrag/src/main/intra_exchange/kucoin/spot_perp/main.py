@@ -1,10 +1,14 @@
 import argparse
+import copy
 import logging
 import os
+import signal
 from clients.KucoinApiClient import KucoinApiClient
 from db.FutureClients import FutureClients
 from db.SpotClients import SpotClients
+from execution.PaperFillEngine import PaperFillEngine
 from execution.SpotFutureBotExecution import SpotFutureBotExecution, SpotFutureSimulatedBotExecution
+from feeds.TickTracer import NULL_TRACER, TickTracer
 from strategies.SpotPerpArbitrag import SpotPerpArbitrag, SpotPerpTradePosition, SpotPerpExecutionDecision
 from time import sleep
 
@@ -32,9 +36,12 @@ python3 main/intra_exchange/kucoin/spot_perp/main.py \
 --estimated_funding_interval_s 1800 \
 --retry_timeout_s 30 \
 --funding_rate_disable 0 \
+--concurrent_legs 1 \
+--trace_path /tmp/ticks.jsonl \
 --db_url xxx \
 --use_sandbox \
---fake_orders
+--fake_orders \
+--paper_latency_s 0.2
 """
 
 if __name__ == "__main__":
@@ -60,11 +67,14 @@ if __name__ == "__main__":
 	parser.add_argument('--current_funding_interval_s', type=int, nargs='?', default=os.environ.get("CURRENT_FUNDING_INTERVAL_S"), help='Seconds before funding snapshot timings which we consider valid to account for current funding rate P/L')
 	parser.add_argument('--estimated_funding_interval_s', type=int, nargs='?', default=os.environ.get("ESTIMATED_FUNDING_INTERVAL_S"), help='Seconds before funding snapshot timings which we consider valid to account for estimated funding rate P/L')
 	parser.add_argument('--retry_timeout_s', type=int, nargs='?', default=os.environ.get("RETRY_TIMEOUT_S"), help='Retry main loop after specified seconds')
+	parser.add_argument('--concurrent_legs', type=int, nargs='?', choices={0, 1}, default=os.environ.get("CONCURRENT_LEGS", 1), help='If 1, the spot and futures orders of a trade are placed at the same time. If 0, the second order is only placed once the first one returns')
+	parser.add_argument('--trace_path', type=str, nargs='?', default=os.environ.get("TRACE_PATH"), help='If set, per stage timings of every tick are appended to this file as JSON lines and their quantiles are logged on SIGUSR2. If None, ticks are not traced')
 	parser.add_argument('--db_url', type=str, nargs='?', default=os.environ.get("DB_URL"), help="URL pointing to the database. If None, the program will not connect to a DB and zero-state execution is assumed")
 	parser.add_argument('--funding_rate_disable', type=int, nargs='?', choices={0, 1}, default=os.environ.get("FUNDING_RATE_DISABLE"), help='If 1, disable the effects of funding rate in the trade decision. If 0, otherwise')
 	parser.add_argument('--db_reset', action='store_true', help='Resets the state in the database to zero-state. This means all spot / futures lot sizes are set to 0')
 	parser.add_argument('--use_sandbox', action='store_true', help='If present, trades in Sandbox env. Else, trades in REAL env')
 	parser.add_argument('--fake_orders', action='store_true', help='If present, we fake order placements. This is used for simulation purposes only')
+	parser.add_argument('--paper_latency_s', type=float, nargs='?', default=os.environ.get("PAPER_LATENCY_S", 0), help='Latency after which fake orders are filled against the order book. Only used with fake_orders')
 	args 	= parser.parse_args()
 
 	logging.basicConfig(level = logging.INFO)
@@ -111,44 +121,58 @@ if __name__ == "__main__":
 										max_perp_lot_size		= args.max_futures_lot_size,
 									)
 
-	bot_executor 	= SpotFutureSimulatedBotExecution(api_client = client) if args.fake_orders else SpotFutureBotExecution(api_client = client)
+	# Fake orders are filled against the exchange books, which are read latency_s after the order is placed
+	paper_book_fn 	= lambda symbol, size: client.get_spot_order_book(symbol = symbol) if symbol == args.spot_trading_pair else client.get_futures_order_book(symbol = symbol)
+	bot_executor 	= SpotFutureSimulatedBotExecution(api_client = client, fill_engine = PaperFillEngine(book_fn = paper_book_fn, latency_s = args.paper_latency_s)) if args.fake_orders else SpotFutureBotExecution(api_client = client, concurrent_legs = args.concurrent_legs == 1)
+
+	if args.trace_path is not None:
+		tracer = TickTracer(symbol = f"{args.spot_trading_pair}/{args.futures_trading_pair}", trace_path = args.trace_path).dump_on_signal(signum = signal.SIGUSR2)
+		bot_executor.tracer = tracer
+	else:
+		tracer = NULL_TRACER
 
 	while True:
+		tracer.start_tick()
 		try:
 			if 	args.order_type == "limit":
-				spot_price 		= client.get_spot_trading_price(symbol = args.spot_trading_pair)
-				futures_price 	= client.get_futures_trading_price(symbol = args.futures_trading_pair)
+				with tracer.span("feed_read"):
+					spot_price 		= client.get_spot_trading_price(symbol = args.spot_trading_pair)
+					futures_price 	= client.get_futures_trading_price(symbol = args.futures_trading_pair)
 				(futures_funding_rate, futures_estimated_funding_rate) = client.get_futures_effective_funding_rate(	symbol = args.futures_trading_pair, 
 																													seconds_before_current = args.current_funding_interval_s,
 																													seconds_before_estimated = args.estimated_funding_interval_s)
 				
-				decision 		= trade_strategy.trade_decision(spot_bid_price 				= spot_price, 
-																spot_ask_price 				= spot_price,
-																perp_bid_price 				= futures_price,
-																perp_ask_price 				= futures_price,
-																perp_funding_rate 			= futures_funding_rate,
-																perp_estimated_funding_rate = futures_estimated_funding_rate,
-																entry_threshold 			= args.entry_gap_frac,
-																take_profit_threshold 		= args.profit_taking_frac
-															)
+				with tracer.span("trade_decision"):
+					decision 		= trade_strategy.trade_decision(spot_bid_price 				= spot_price, 
+																	spot_ask_price 				= spot_price,
+																	perp_bid_price 				= futures_price,
+																	perp_ask_price 				= futures_price,
+																	perp_funding_rate 			= futures_funding_rate,
+																	perp_estimated_funding_rate = futures_estimated_funding_rate,
+																	entry_threshold 			= args.entry_gap_frac,
+																	take_profit_threshold 		= args.profit_taking_frac
+																)
 				logging.info(f"Spot price: {spot_price}, Futures price: {futures_price}")			
 
 			elif args.order_type == "market":
-				(avg_spot_bid, avg_spot_ask) 		= client.get_spot_average_bid_ask_price(symbol = args.spot_trading_pair, size = args.spot_entry_vol)
-				(avg_futures_bid, avg_futures_ask) 	= client.get_futures_average_bid_ask_price(symbol = args.futures_trading_pair, size = args.futures_entry_lot_size)
+				# Books are fetched over REST and averaged in the same call
+				with tracer.span("feed_read"):
+					(avg_spot_bid, avg_spot_ask) 		= client.get_spot_average_bid_ask_price(symbol = args.spot_trading_pair, size = args.spot_entry_vol)
+					(avg_futures_bid, avg_futures_ask) 	= client.get_futures_average_bid_ask_price(symbol = args.futures_trading_pair, size = args.futures_entry_lot_size)
 				(futures_funding_rate, futures_estimated_funding_rate) = client.get_futures_effective_funding_rate(	symbol = args.futures_trading_pair,
 																													seconds_before_current = args.current_funding_interval_s,
 																													seconds_before_estimated = args.estimated_funding_interval_s)
 
-				decision 		= trade_strategy.trade_decision(spot_bid_price 				= avg_spot_bid,
-																spot_ask_price 				= avg_spot_ask,
-																perp_bid_price 				= avg_futures_bid,
-																perp_ask_price 				= avg_futures_ask,
-																perp_funding_rate 			= futures_funding_rate,
-																perp_estimated_funding_rate = futures_estimated_funding_rate,
-																entry_threshold 			= args.entry_gap_frac,
-																take_profit_threshold 		= args.profit_taking_frac
-															)
+				with tracer.span("trade_decision"):
+					decision 		= trade_strategy.trade_decision(spot_bid_price 				= avg_spot_bid,
+																	spot_ask_price 				= avg_spot_ask,
+																	perp_bid_price 				= avg_futures_bid,
+																	perp_ask_price 				= avg_futures_ask,
+																	perp_funding_rate 			= futures_funding_rate,
+																	perp_estimated_funding_rate = futures_estimated_funding_rate,
+																	entry_threshold 			= args.entry_gap_frac,
+																	take_profit_threshold 		= args.profit_taking_frac
+																)
 				logging.info(f"Avg spot bid: {avg_spot_bid}, asks: {avg_spot_ask} / Perpetuals bid: {avg_futures_bid}, asks: {avg_futures_ask}")
 			logging.info(f"Executing trade decision: {decision}")
 
@@ -157,36 +181,62 @@ if __name__ == "__main__":
 
 			if 	(decision == SpotPerpExecutionDecision.GO_LONG_SPOT_SHORT_PERP) \
 				or (decision == SpotPerpExecutionDecision.TAKE_PROFIT_LONG_PERP_SHORT_SPOT):
-				new_order_execution = bot_executor.long_spot_short_futures(	spot_params 	= { "symbol" 		: args.spot_trading_pair, 
-																								"order_type" 	: args.order_type,
-																								"price" 		: spot_price if args.order_type == "limit" else 1,
-																								"size" 			: args.spot_entry_vol,
-																							},
-
-																			future_params 	= {	"symbol" 		: args.futures_trading_pair, 
-																								"order_type" 	: args.order_type, 
-																								"price" 		: futures_price if args.order_type == "limit" else 1,
-																								"size" 			: args.futures_entry_lot_size,
-																								"lever" 		: args.futures_entry_leverage,
-																							},
+				spot_params 	= { "symbol" 		: args.spot_trading_pair, 
+									"order_type" 	: args.order_type,
+									"order_side" 	: "buy",
+									"price" 		: spot_price if args.order_type == "limit" else 1,
+									"size" 			: args.spot_entry_vol,
+								}
+
+				future_params 	= {	"symbol" 		: args.futures_trading_pair, 
+									"order_type" 	: args.order_type, 
+									"order_side" 	: "sell",
+									"price" 		: futures_price if args.order_type == "limit" else 1,
+									"size" 			: args.futures_entry_lot_size,
+									"lever" 		: args.futures_entry_leverage,
+								}
+
+				spot_revert_params 					= copy.copy(spot_params)
+				spot_revert_params["order_side"] 	= "sell"
+
+				future_revert_params 				= copy.copy(future_params)
+				future_revert_params["order_side"] 	= "buy"
+
+				new_order_execution = bot_executor.long_spot_short_futures(	spot_params 			= spot_params,
+																			future_params 			= future_params,
+																			spot_revert_params 		= spot_revert_params,
+																			future_revert_params 	= future_revert_params
 																		)
 				trade_strategy.change_asset_holdings(delta_spot = args.spot_entry_vol, delta_perp = -1 * args.futures_entry_lot_size) \
 				if new_order_execution else None
 
 			elif (decision == SpotPerpExecutionDecision.GO_LONG_PERP_SHORT_SPOT) \
 				or (decision == SpotPerpExecutionDecision.TAKE_PROFIT_LONG_SPOT_SHORT_PERP):
-				new_order_execution = bot_executor.short_spot_long_futures(	spot_params 	= {	"symbol" 		: args.spot_trading_pair, 
-																								"order_type" 	: args.order_type,
-																								"price" 		: spot_price if args.order_type == "limit" else 1,
-																								"size" 			: args.spot_entry_vol,
-																							},
-
-																			future_params 	= {	"symbol" 		: args.futures_trading_pair, 
-																								"order_type" 	: args.order_type, 
-																								"price" 		: futures_price if args.order_type == "limit" else 1,
-																								"size" 			: args.futures_entry_lot_size,
-																								"lever" 		: args.futures_entry_leverage,
-																							},
+				spot_params 	= {	"symbol" 		: args.spot_trading_pair, 
+									"order_type" 	: args.order_type,
+									"order_side" 	: "sell",
+									"price" 		: spot_price if args.order_type == "limit" else 1,
+									"size" 			: args.spot_entry_vol,
+								}
+
+				future_params 	= {	"symbol" 		: args.futures_trading_pair, 
+									"order_type" 	: args.order_type, 
+									"order_side" 	: "buy",
+									"price" 		: futures_price if args.order_type == "limit" else 1,
+									"size" 			: args.futures_entry_lot_size,
+									"lever" 		: args.futures_entry_leverage,
+								}
+
+				spot_revert_params 					= copy.copy(spot_params)
+				spot_revert_params["order_side"] 	= "buy"
+
+				future_revert_params 				= copy.copy(future_params)
+				future_revert_params["order_side"] 	= "sell"
+
+				new_order_execution = bot_executor.short_spot_long_futures(	spot_params 			= spot_params,
+																			future_params 			= future_params,
+																			spot_revert_params 		= spot_revert_params,
+																			future_revert_params 	= future_revert_params
 																		)
 				trade_strategy.change_asset_holdings(delta_spot = -1 * args.spot_entry_vol, delta_perp = args.futures_entry_lot_size) \
 				if new_order_execution else None
@@ -198,11 +248,13 @@ if __name__ == "__main__":
 
 			if 	(new_order_execution) or \
 				(decision == SpotPerpExecutionDecision.NO_DECISION):
+				tracer.end_tick(decision = decision)
 				sleep(args.poll_interval_s)
 			
 			else:
 				raise Exception(f"Order execution failed - Status: {new_order_execution}, Decision: {decision}")
 
 		except Exception as ex:
+			tracer.end_tick(decision = "error")
 			logging.error(ex)
 			sleep(args.retry_timeout_s)
\ No newline at end of file
@@ -0,0 +1,195 @@
+import argparse
+import json
+import os
+import signal
+import logging
+import sys
+from clients.OkxApiClientWS import OkxApiClientWS
+from execution.FailSafeTrigger import FailSafeException
+from execution.MarginPerpetualBotExecution import MarginPerpetualBotExecution, MarginPerpetualSimulatedBotExecution
+from execution.MultiPairBotRuntime import MultiPairBotRuntime
+from execution.OkxPairBots import OkxMarginPerpPairBot, OkxSpotPerpPairBot
+from execution.PaperFillEngine import PaperFillEngine
+from execution.SpotPerpetualBotExecution import SpotPerpetualBotExecution, SpotPerpetualSimulatedBotExecution
+from execution.UnwindEngine import UnwindEngine
+from feeds.CryptoStoreRedisDeltaFeeds import CryptoStoreRedisDeltaFeeds
+from feeds.CryptoStoreRedisFeeds import CryptoStoreRedisFeeds
+from feeds.OkxWebsocketFeeds import OkxWebsocketFeeds
+from sqlalchemy import create_engine
+
+"""
+python3 main/intra_exchange/okx/multi_pair/main.py \
+--client_id 123asd \
+--pairs_config pairs.json \
+--api_key xxx \
+--api_secret_key xxx \
+--api_passphrase xxx \
+--order_type market \
+--poll_interval_s 60 \
+--min_eval_interval_s 0.01 \
+--funding_refresh_s 60 \
+--current_funding_interval_s 1800 \
+--estimated_funding_interval_s 1800 \
+--funding_rate_disable 0 \
+--retry_timeout_s 30 \
+--heartbeat_interval_s 15 \
+--batch_orders 0 \
+--ws_standby 1 \
+--unwind_attempts 3 \
+--db_url xxx \
+--feed_url xxx \
+--feed_port xxx \
+--feed_latency_s 0.05 \
+--feed_subscribe 1 \
+--feed_encoding json \
+--feed_mode snapshot \
+--feed_channel books5 \
+--fails_to_exit 3 \
+--fake_orders \
+--paper_latency_s 0.05
+"""
+
+# Pair bots by the asset_type of each entry in pairs_config
+PAIR_BOTS = {
+	"spot_perp" 	: OkxSpotPerpPairBot,
+	"margin_perp" 	: OkxMarginPerpPairBot,
+}
+
+if __name__ == "__main__":
+	parser 	= argparse.ArgumentParser(description='Multi pair arbitrag trading')
+	parser.add_argument('--client_id', type=str, nargs='?', default=os.environ.get("CLIENT_ID"), help='Client ID registered on the exchange')
+	parser.add_argument('--pairs_config', type=str, nargs='?', default=os.environ.get("PAIRS_CONFIG"), help='Path to a JSON list of the pairs to trade. Each entry has an asset_type of spot_perp or margin_perp, and the pair flags of the spot_perp / margin_perp main')
+	parser.add_argument('--order_type', type=str, nargs='?', default=os.environ.get("ORDER_TYPE"), help='Either limit or market orders')
+	parser.add_argument('--poll_interval_s', type=float, nargs='?', default=os.environ.get("POLL_INTERVAL_S"), help='Poll interval in seconds. If books are pushed, the most seconds without book updates before evaluating anyway')
+	parser.add_argument('--min_eval_interval_s', type=float, nargs='?', default=os.environ.get("MIN_EVAL_INTERVAL_S", 0), help='Minimum seconds between evaluations. Book updates in between are coalesced into the next evaluation')
+	parser.add_argument('--funding_refresh_s', type=float, nargs='?', default=os.environ.get("FUNDING_REFRESH_S", 60), help='Seconds between reads of funding and interest rates, which are not pushed by the feed. The bot is re-evaluated when they change')
+	parser.add_argument('--api_key', type=str, nargs='?', default=os.environ.get("API_KEY"), help='Exchange api key')
+	parser.add_argument('--api_secret_key', type=str, nargs='?', default=os.environ.get("API_SECRET_KEY"), help='Exchange secret api key')
+	parser.add_argument('--api_passphrase', type=str, nargs='?', default=os.environ.get("API_PASSPHRASE"), help='Exchange api passphrase')
+	parser.add_argument('--current_funding_interval_s', type=int, nargs='?', default=os.environ.get("CURRENT_FUNDING_INTERVAL_S"), help='Seconds before funding snapshot timings which we consider valid to account for current funding rate P/L')
+	parser.add_argument('--estimated_funding_interval_s', type=int, nargs='?', default=os.environ.get("ESTIMATED_FUNDING_INTERVAL_S"), help='Seconds before funding snapshot timings which we consider valid to account for estimated funding rate P/L')
+	parser.add_argument('--heartbeat_interval_s', type=float, nargs='?', default=os.environ.get("HEARTBEAT_INTERVAL_S", 15), help='Seconds between pings to the private websocket, which run concurrently with trading')
+	parser.add_argument('--batch_orders', type=int, nargs='?', choices={0, 1}, default=os.environ.get("BATCH_ORDERS", 0), help='If 1, both legs of a trade and their reverts are sent in a single OKX batch-orders message. If 0, each leg is sent as its own order')
+	parser.add_argument('--ws_standby', type=int, nargs='?', choices={0, 1}, default=os.environ.get("WS_STANDBY", 1), help='If 1, a second logged in private websocket is kept alive and swapped in as soon as the primary connection drops')
+	parser.add_argument('--unwind_attempts', type=int, nargs='?', default=os.environ.get("UNWIND_ATTEMPTS", 3), help='Attempts to flatten the leg left open when the other leg of a trade fails, escalating to market orders after the first. If 0, a single unconfirmed revert is sent')
+	parser.add_argument('--ws_private_url', type=str, nargs='?', default=os.environ.get("WS_PRIVATE_URL"), help='Overrides the OKX private websocket URL, e.g. to trade against a local mock exchange. If None, the live OKX URL is used')
+	parser.add_argument('--rest_url', type=str, nargs='?', default=os.environ.get("REST_URL"), help='Overrides the OKX REST URL, e.g. to trade against a local mock exchange. If None, the live OKX URL is used')
+	parser.add_argument('--retry_timeout_s', type=float, nargs='?', default=os.environ.get("RETRY_TIMEOUT_S"), help='Retry the evaluation of a pair after specified seconds')
+	parser.add_argument('--funding_rate_disable', type=int, nargs='?', choices={0, 1}, default=os.environ.get("FUNDING_RATE_DISABLE"), help='If 1, disable the effects of funding rate in the trade decision. If 0, otherwise')
+	parser.add_argument('--db_url', type=str, nargs='?', default=os.environ.get("DB_URL"), help="URL pointing to the database. If None, the program will not connect to a DB and zero-state execution is assumed")
+	parser.add_argument('--db_reset', action='store_true', help='Resets the state in the database to zero-state. This means all positions of every pair are set to 0')
+	parser.add_argument('--feed_url', type=str, nargs='?', default=os.environ.get("FEED_URL"), help="URL pointing to price feed channel. Either the Redis host written to by cryptostore, or a ws:// / wss:// OKX public websocket URL to read books directly from the exchange")
+	parser.add_argument('--feed_port', type=str, nargs='?', default=os.environ.get("FEED_PORT"), help="Port pointing to price feed channel")
+	parser.add_argument('--feed_latency_s', type=float, nargs='?', default=os.environ.get("FEED_LATENCY_S"), help="Permissible latency between fetches of data from price feed")
+	parser.add_argument('--feed_subscribe', type=int, nargs='?', choices={0, 1}, default=os.environ.get("FEED_SUBSCRIBE"), help="If 1, order books are pushed into memory on every update and only the pairs whose books changed are evaluated. If 0, the feed is polled and every pair is evaluated every poll_interval_s")
+	parser.add_argument('--feed_encoding', type=str, nargs='?', choices={"json", "binary"}, default=os.environ.get("FEED_ENCODING", "json"), help="Encoding of order book snapshots in the price feed. Either cryptostore json or packed binary")
+	parser.add_argument('--feed_channel', type=str, nargs='?', choices={"books5", "books"}, default=os.environ.get("FEED_CHANNEL", "books5"), help="OKX book channel used when feed_url is a websocket URL")
+	parser.add_argument('--feed_mode', type=str, nargs='?', choices={"snapshot", "delta"}, default=os.environ.get("FEED_MODE", "snapshot"), help="If delta, order books are maintained in process from cryptostore L2 deltas. If snapshot, full snapshots are read from the price feed")
+	parser.add_argument('--fake_orders', action='store_true', help='If present, we fake order placements. This is used for simulation purposes only')
+	parser.add_argument('--paper_latency_s', type=float, nargs='?', default=os.environ.get("PAPER_LATENCY_S", 0), help='Latency after which fake orders are filled against the order book. Only used with fake_orders')
+	parser.add_argument('--fails_to_exit', type=int, nargs='?', default=os.environ.get("FAILS_TO_EXIT"), help="Allowable failures for trades of a pair before the pair is stopped")
+	args 	= parser.parse_args()
+
+	logging.basicConfig(format='%(asctime)s %(levelname)-8s %(module)s.%(funcName)s %(lineno)d - %(message)s',
+    					level=logging.INFO,
+    					datefmt='%Y-%m-%d %H:%M:%S')
+
+	logging.info(f"Starting Okx multi pair arbitrag bot with the following params: {args}")
+
+	with open(args.pairs_config) as f:
+		pairs_config = json.load(f)
+
+	if args.feed_url.startswith(("ws://", "wss://")):
+		feed_client = OkxWebsocketFeeds(permissible_latency_s = args.feed_latency_s,
+										feed_url 	= args.feed_url,
+										channel 	= args.feed_channel
+									).connect()
+	else:
+		feed_class 	= CryptoStoreRedisDeltaFeeds if args.feed_mode == "delta" else CryptoStoreRedisFeeds
+		feed_client = feed_class(	redis_url 	= args.feed_url,
+									redis_port 	= args.feed_port,
+									permissible_latency_s = args.feed_latency_s,
+									encoding 	= args.feed_encoding
+								).connect()
+
+	# Symbols may be traded by several pairs, e.g. one perpetual against both its spot and margin pairs
+	entry_sizes = {}
+	for each_config in pairs_config:
+		first_symbol = each_config.get("spot_trading_pair", each_config.get("margin_trading_pair"))
+		entry_sizes.setdefault(first_symbol, set()).add(each_config.get("spot_entry_vol", each_config.get("margin_entry_vol")))
+		entry_sizes.setdefault(each_config["perpetual_trading_pair"], set()).add(each_config["perpetual_entry_lot_size"])
+
+	for (each_symbol, each_sizes) in entry_sizes.items():
+		if isinstance(feed_client, (OkxWebsocketFeeds, CryptoStoreRedisDeltaFeeds)):
+			feed_client.track_entry_sizes(exchange = "OKX", symbol = each_symbol, sizes = sorted(each_sizes))
+		else:
+			# Subscribed snapshots only need the levels covering the largest entry size
+			feed_client.limit_depth(exchange = "OKX", symbol = each_symbol, max_size = max(each_sizes))
+
+	if args.feed_subscribe == 1 or isinstance(feed_client, OkxWebsocketFeeds):
+		# One subscription serves the books of every pair
+		feed_client.subscribe(exchange = "OKX", symbols = list(entry_sizes.keys()))
+
+	feed_client.metrics.dump_on_signal(signum = signal.SIGUSR1)
+
+	client 	= OkxApiClientWS(api_key 				= args.api_key,
+							 api_secret_key 		= args.api_secret_key,
+							 passphrase 			= args.api_passphrase,
+							 feed_client 			= feed_client,
+							 funding_rate_enable 	= args.funding_rate_disable == 0,
+							 ws_standby 			= args.ws_standby == 1,
+							 ws_private_url 		= args.ws_private_url,
+							 rest_url 				= args.rest_url,
+							)
+
+	client.make_connection()
+
+	# Executors hold no per pair state, so one of each kind places the orders of every pair
+	unwind_engine 	= UnwindEngine(max_attempts = args.unwind_attempts) if args.unwind_attempts > 0 else None
+	fill_engine 	= PaperFillEngine(book_fn = lambda symbol, size: feed_client.sorted_order_book(exchange = "OKX", symbol = symbol, max_size = size), latency_s = args.paper_latency_s)
+	bot_executors 	= 	{
+							"spot_perp" 	: SpotPerpetualSimulatedBotExecution(api_client = client, fill_engine = fill_engine) if args.fake_orders else \
+											  SpotPerpetualBotExecution(api_client = client, batch_orders = args.batch_orders == 1, unwind_engine = unwind_engine),
+							"margin_perp" 	: MarginPerpetualSimulatedBotExecution(api_client = client, fill_engine = fill_engine) if args.fake_orders else \
+											  MarginPerpetualBotExecution(api_client = client, batch_orders = args.batch_orders == 1, unwind_engine = unwind_engine),
+						}
+
+	if args.db_url is not None:
+		logging.info(f"State management at {args.db_url}")
+		db_engine = create_engine(args.db_url, echo = False)
+	else:
+		logging.warning(f"Zero state execution as no db_url detected")
+		db_engine = None
+
+	runtime = MultiPairBotRuntime(	api_client 				= client,
+									feed_client 			= feed_client,
+									poll_interval_s 		= args.poll_interval_s,
+									heartbeat_interval_s 	= args.heartbeat_interval_s,
+									retry_timeout_s 		= args.retry_timeout_s,
+									feed_push 				= args.feed_subscribe == 1 or isinstance(feed_client, OkxWebsocketFeeds),
+									stop_exceptions 		= (FailSafeException, ),
+									min_eval_interval_s 	= args.min_eval_interval_s,
+									refresh_interval_s 		= args.funding_refresh_s,
+								)
+
+	for each_config in pairs_config:
+		pair_params = {each_key : each_value for (each_key, each_value) in each_config.items() if each_key != "asset_type"}
+		pair_bot 	= PAIR_BOTS[each_config["asset_type"]](	client 							= client,
+															feed_client 					= feed_client,
+															bot_executor 					= bot_executors[each_config["asset_type"]],
+															order_type 						= args.order_type,
+															feed_latency_s 					= args.feed_latency_s,
+															fails_to_exit 					= args.fails_to_exit,
+															current_funding_interval_s 		= args.current_funding_interval_s,
+															estimated_funding_interval_s 	= args.estimated_funding_interval_s,
+															client_id 						= args.client_id,
+															db_url 							= args.db_url,
+															db_engine 						= db_engine,
+															db_reset 						= args.db_reset,
+															**pair_params
+														).setup()
+		runtime.add_pair(name = pair_bot.name, symbols = pair_bot.symbols, evaluate_fn = pair_bot.evaluate, refresh_fn = pair_bot.refresh_inputs)
+
+	logging.info(f"Trading {len(pairs_config)} pairs")
+	runtime.run_forever()
+	sys.exit("Every pair has been stopped")
@@ -1,17 +1,19 @@
 import argparse
-import copy
 import os
+import signal
 import logging
 import sys
 from clients.OkxApiClientWS import OkxApiClientWS
-from datetime import datetime, timedelta
-from db.SpotClients import SpotClients
-from db.PerpetualClients import PerpetualClients
-from execution.FailSafeTrigger import FailSafeTrigger, FailSafeException
+from execution.AsyncBotRuntime import AsyncBotRuntime
+from execution.FailSafeTrigger import FailSafeException
+from execution.OkxPairBots import OkxSpotPerpPairBot
+from execution.PaperFillEngine import PaperFillEngine
 from execution.SpotPerpetualBotExecution import SpotPerpetualBotExecution, SpotPerpetualSimulatedBotExecution
+from execution.UnwindEngine import UnwindEngine
+from feeds.CryptoStoreRedisDeltaFeeds import CryptoStoreRedisDeltaFeeds
 from feeds.CryptoStoreRedisFeeds import CryptoStoreRedisFeeds
-from strategies.SpotPerpArbitrag import SpotPerpArbitrag, SpotPerpTradePosition, SpotPerpExecutionDecision
-from time import sleep
+from feeds.OkxWebsocketFeeds import OkxWebsocketFeeds
+from feeds.TickTracer import NULL_TRACER, TickTracer
 
 """
 python3 main/intra_exchange/okx/spot_perp/main.py \
@@ -30,16 +32,28 @@ python3 main/intra_exchange/okx/spot_perp/main.py \
 --entry_gap_frac 0.01 \
 --profit_taking_frac 0.005 \
 --poll_interval_s 60 \
+--min_eval_interval_s 0.01 \
+--funding_refresh_s 60 \
 --current_funding_interval_s 1800 \
 --estimated_funding_interval_s 1800 \
 --funding_rate_disable 0 \
 --retry_timeout_s 30 \
+--heartbeat_interval_s 15 \
+--batch_orders 0 \
+--ws_standby 1 \
+--unwind_attempts 3 \
+--trace_path /tmp/ticks.jsonl \
 --db_url xxx \
 --feed_url xxx \
 --feed_port xxx \
 --feed_latency_s 0.05 \
+--feed_subscribe 1 \
+--feed_encoding json \
+--feed_mode snapshot \
+--feed_channel books5 \
 --fails_to_exit 3 \
---fake_orders
+--fake_orders \
+--paper_latency_s 0.05
 """
 
 if __name__ == "__main__":
@@ -48,7 +62,9 @@ if __name__ == "__main__":
 	parser.add_argument('--spot_trading_pair', type=str, nargs='?', default=os.environ.get("SPOT_TRADING_PAIR"), help='Spot trading pair symbol as defined by exchange')
 	parser.add_argument('--perpetual_trading_pair', type=str, nargs='?', default=os.environ.get("PERPETUAL_TRADING_PAIR"), help='Perpetual trading pair symbol as defined by exchange')
 	parser.add_argument('--order_type', type=str, nargs='?', default=os.environ.get("ORDER_TYPE"), help='Either limit or market orders')
-	parser.add_argument('--poll_interval_s', type=float, nargs='?', default=os.environ.get("POLL_INTERVAL_S"), help='Poll interval in seconds')
+	parser.add_argument('--poll_interval_s', type=float, nargs='?', default=os.environ.get("POLL_INTERVAL_S"), help='Poll interval in seconds. If books are pushed, the most seconds without book updates before evaluating anyway')
+	parser.add_argument('--min_eval_interval_s', type=float, nargs='?', default=os.environ.get("MIN_EVAL_INTERVAL_S", 0), help='Minimum seconds between evaluations. Book updates in between are coalesced into the next evaluation')
+	parser.add_argument('--funding_refresh_s', type=float, nargs='?', default=os.environ.get("FUNDING_REFRESH_S", 60), help='Seconds between reads of funding and interest rates, which are not pushed by the feed. The bot is re-evaluated when they change')
 	parser.add_argument('--spot_entry_vol', type=float, nargs='?', default=os.environ.get("SPOT_ENTRY_VOL"), help='Volume of spot assets for each entry')
 	parser.add_argument('--max_spot_vol', type=float, nargs='?', default=os.environ.get("MAX_SPOT_VOL"), help='Max volume of spot assets to long / short')
 	parser.add_argument('--perpetual_entry_lot_size', type=int, nargs='?', default=os.environ.get("PERPETUAL_ENTRY_LOT_SIZE"), help='Lot size for each entry for perpetual')
@@ -61,14 +77,26 @@ if __name__ == "__main__":
 	parser.add_argument('--api_passphrase', type=str, nargs='?', default=os.environ.get("API_PASSPHRASE"), help='Exchange api passphrase')
 	parser.add_argument('--current_funding_interval_s', type=int, nargs='?', default=os.environ.get("CURRENT_FUNDING_INTERVAL_S"), help='Seconds before funding snapshot timings which we consider valid to account for current funding rate P/L')
 	parser.add_argument('--estimated_funding_interval_s', type=int, nargs='?', default=os.environ.get("ESTIMATED_FUNDING_INTERVAL_S"), help='Seconds before funding snapshot timings which we consider valid to account for estimated funding rate P/L')
+	parser.add_argument('--heartbeat_interval_s', type=float, nargs='?', default=os.environ.get("HEARTBEAT_INTERVAL_S", 15), help='Seconds between pings to the private websocket, which run concurrently with trading')
+	parser.add_argument('--batch_orders', type=int, nargs='?', choices={0, 1}, default=os.environ.get("BATCH_ORDERS", 0), help='If 1, both legs of a trade and their reverts are sent in a single OKX batch-orders message. If 0, each leg is sent as its own order')
+	parser.add_argument('--ws_standby', type=int, nargs='?', choices={0, 1}, default=os.environ.get("WS_STANDBY", 1), help='If 1, a second logged in private websocket is kept alive and swapped in as soon as the primary connection drops')
+	parser.add_argument('--unwind_attempts', type=int, nargs='?', default=os.environ.get("UNWIND_ATTEMPTS", 3), help='Attempts to flatten the leg left open when the other leg of a trade fails, escalating to market orders after the first. If 0, a single unconfirmed revert is sent')
+	parser.add_argument('--ws_private_url', type=str, nargs='?', default=os.environ.get("WS_PRIVATE_URL"), help='Overrides the OKX private websocket URL, e.g. to trade against a local mock exchange. If None, the live OKX URL is used')
+	parser.add_argument('--rest_url', type=str, nargs='?', default=os.environ.get("REST_URL"), help='Overrides the OKX REST URL, e.g. to trade against a local mock exchange. If None, the live OKX URL is used')
+	parser.add_argument('--trace_path', type=str, nargs='?', default=os.environ.get("TRACE_PATH"), help='If set, per stage timings of every tick are appended to this file as JSON lines and their quantiles are logged on SIGUSR2. If None, ticks are not traced')
 	parser.add_argument('--retry_timeout_s', type=float, nargs='?', default=os.environ.get("RETRY_TIMEOUT_S"), help='Retry main loop after specified seconds')
 	parser.add_argument('--funding_rate_disable', type=int, nargs='?', choices={0, 1}, default=os.environ.get("FUNDING_RATE_DISABLE"), help='If 1, disable the effects of funding rate in the trade decision. If 0, otherwise')
 	parser.add_argument('--db_url', type=str, nargs='?', default=os.environ.get("DB_URL"), help="URL pointing to the database. If None, the program will not connect to a DB and zero-state execution is assumed")
 	parser.add_argument('--db_reset', action='store_true', help='Resets the state in the database to zero-state. This means all spot / perpetual lot sizes are set to 0')
-	parser.add_argument('--feed_url', type=str, nargs='?', default=os.environ.get("FEED_URL"), help="URL pointing to price feed channel")
+	parser.add_argument('--feed_url', type=str, nargs='?', default=os.environ.get("FEED_URL"), help="URL pointing to price feed channel. Either the Redis host written to by cryptostore, or a ws:// / wss:// OKX public websocket URL to read books directly from the exchange")
 	parser.add_argument('--feed_port', type=str, nargs='?', default=os.environ.get("FEED_PORT"), help="Port pointing to price feed channel")
 	parser.add_argument('--feed_latency_s', type=float, nargs='?', default=os.environ.get("FEED_LATENCY_S"), help="Permissible latency between fetches of data from price feed")
+	parser.add_argument('--feed_subscribe', type=int, nargs='?', choices={0, 1}, default=os.environ.get("FEED_SUBSCRIBE"), help="If 1, order books are pushed into memory on every update and the bot wakes up on new books. If 0, the feed is polled every poll_interval_s")
+	parser.add_argument('--feed_encoding', type=str, nargs='?', choices={"json", "binary"}, default=os.environ.get("FEED_ENCODING", "json"), help="Encoding of order book snapshots in the price feed. Either cryptostore json or packed binary")
+	parser.add_argument('--feed_channel', type=str, nargs='?', choices={"books5", "books"}, default=os.environ.get("FEED_CHANNEL", "books5"), help="OKX book channel used when feed_url is a websocket URL")
+	parser.add_argument('--feed_mode', type=str, nargs='?', choices={"snapshot", "delta"}, default=os.environ.get("FEED_MODE", "snapshot"), help="If delta, order books are maintained in process from cryptostore L2 deltas. If snapshot, full snapshots are read from the price feed")
 	parser.add_argument('--fake_orders', action='store_true', help='If present, we fake order placements. This is used for simulation purposes only')
+	parser.add_argument('--paper_latency_s', type=float, nargs='?', default=os.environ.get("PAPER_LATENCY_S", 0), help='Latency after which fake orders are filled against the order book. Only used with fake_orders')
 	parser.add_argument('--fails_to_exit', type=int, nargs='?', default=os.environ.get("FAILS_TO_EXIT"), help="Allowable failures for trades before programme will be foreced to terminate")
 	args 	= parser.parse_args()
 
@@ -78,198 +106,98 @@ if __name__ == "__main__":
 
 	logging.info(f"Starting Okx arbitrag bot with the following params: {args}")
 
-	fail_safe_trigger = FailSafeTrigger(counts_to_trigger = args.fails_to_exit)
-
-	feed_client = CryptoStoreRedisFeeds(redis_url 	= args.feed_url,
-										redis_port 	= args.feed_port,
-										permissible_latency_s = args.feed_latency_s
+	if args.feed_url.startswith(("ws://", "wss://")):
+		feed_client = OkxWebsocketFeeds(permissible_latency_s = args.feed_latency_s,
+										feed_url 	= args.feed_url,
+										channel 	= args.feed_channel
 									).connect()
+	else:
+		feed_class 	= CryptoStoreRedisDeltaFeeds if args.feed_mode == "delta" else CryptoStoreRedisFeeds
+		feed_client = feed_class(	redis_url 	= args.feed_url,
+									redis_port 	= args.feed_port,
+									permissible_latency_s = args.feed_latency_s,
+									encoding 	= args.feed_encoding
+								).connect()
+
+	if isinstance(feed_client, (OkxWebsocketFeeds, CryptoStoreRedisDeltaFeeds)):
+		feed_client.track_entry_sizes(exchange = "OKX", symbol = args.spot_trading_pair, sizes = [args.spot_entry_vol])
+		feed_client.track_entry_sizes(exchange = "OKX", symbol = args.perpetual_trading_pair, sizes = [args.perpetual_entry_lot_size])
+	else:
+		# Subscribed snapshots only need the levels covering the entry sizes
+		feed_client.limit_depth(exchange = "OKX", symbol = args.spot_trading_pair, max_size = args.spot_entry_vol)
+		feed_client.limit_depth(exchange = "OKX", symbol = args.perpetual_trading_pair, max_size = args.perpetual_entry_lot_size)
+
+	if args.feed_subscribe == 1 or isinstance(feed_client, OkxWebsocketFeeds):
+		feed_client.subscribe(exchange = "OKX", symbols = [args.spot_trading_pair, args.perpetual_trading_pair])
+
+	feed_client.metrics.dump_on_signal(signum = signal.SIGUSR1)
 
 	client 	= OkxApiClientWS(api_key 				= args.api_key, 
 							 api_secret_key 		= args.api_secret_key, 
 							 passphrase 			= args.api_passphrase,
 							 feed_client 			= feed_client,
-							 funding_rate_enable 	= args.funding_rate_disable == 0
+							 funding_rate_enable 	= args.funding_rate_disable == 0,
+							 ws_standby 			= args.ws_standby == 1,
+							 ws_private_url 		= args.ws_private_url,
+							 rest_url 				= args.rest_url,
 							)
 
 	client.make_connection()
-	client.set_perpetual_leverage(symbol = args.perpetual_trading_pair, leverage = args.perpetual_leverage)
-
-	assert 	args.spot_entry_vol >= client.get_spot_min_volume(symbol = args.spot_trading_pair), "Minimum spot entry size not satisfied."
-	assert 	args.perpetual_entry_lot_size >= client.get_perpetual_min_lot_size(symbol = args.perpetual_trading_pair), "Minimum perpetual entry size not satisfied."
-
-	if args.db_url is not None:
-		logging.info(f"State management at {args.db_url}")
-
-		strategy_id = SpotPerpArbitrag.get_strategy_id()
-		client_id 	= args.client_id
 
-		db_spot_client 			= SpotClients(url = args.db_url, strategy_id = strategy_id, client_id = client_id, exchange = "okx", symbol = args.spot_trading_pair, units = "vol").create_session()
-		db_perpetual_clients 	= PerpetualClients(url = args.db_url, strategy_id = strategy_id, client_id = client_id, exchange = "okx", symbol = args.perpetual_trading_pair, units = "lot").create_session()
-		
-		db_spot_client.create_entry() if not db_spot_client.is_exists() else None
-		db_perpetual_clients.create_entry() if not db_perpetual_clients.is_exists() else None
-		
-		db_spot_client.set_position(size = 0) if args.db_reset else None
-		db_perpetual_clients.set_position(size = 0) if args.db_reset else None
-
-		(current_spot_vol, current_perpetual_lot_size) = (db_spot_client.get_position(), db_perpetual_clients.get_position())
-	else:
-		logging.warning(f"Zero state execution as no db_url detected")
-		(current_spot_vol, current_perpetual_lot_size) = (0, 0)
-
-	trade_strategy 	= SpotPerpArbitrag(	spot_symbol 			= args.spot_trading_pair,
-										current_spot_vol 		= current_spot_vol,
-										max_spot_vol 			= args.max_spot_vol,
-										perp_symbol 			= args.perpetual_trading_pair,
-										current_perp_lot_size 	= current_perpetual_lot_size,
-										max_perp_lot_size		= args.max_perpetual_lot_size,
+	# Fake orders are filled against the feed books, which are read latency_s after the order is placed
+	fill_engine 	= PaperFillEngine(book_fn = lambda symbol, size: feed_client.sorted_order_book(exchange = "OKX", symbol = symbol, max_size = size), latency_s = args.paper_latency_s)
+	bot_executor 	= SpotPerpetualSimulatedBotExecution(api_client = client, fill_engine = fill_engine) if args.fake_orders else SpotPerpetualBotExecution(api_client = client, batch_orders = args.batch_orders == 1,
+																	unwind_engine = UnwindEngine(max_attempts = args.unwind_attempts) if args.unwind_attempts > 0 else None)
+
+	# The single pair bot is traded exactly as each pair of the multi pair main
+	pair_bot 		= OkxSpotPerpPairBot(	client 							= client,
+										feed_client 					= feed_client,
+										bot_executor 					= bot_executor,
+										order_type 						= args.order_type,
+										entry_gap_frac 					= args.entry_gap_frac,
+										profit_taking_frac 				= args.profit_taking_frac,
+										feed_latency_s 					= args.feed_latency_s,
+										fails_to_exit 					= args.fails_to_exit,
+										spot_trading_pair 				= args.spot_trading_pair,
+										perpetual_trading_pair 			= args.perpetual_trading_pair,
+										spot_entry_vol 					= args.spot_entry_vol,
+										max_spot_vol 					= args.max_spot_vol,
+										perpetual_entry_lot_size 		= args.perpetual_entry_lot_size,
+										max_perpetual_lot_size 			= args.max_perpetual_lot_size,
+										perpetual_leverage 				= args.perpetual_leverage,
+										current_funding_interval_s 		= args.current_funding_interval_s,
+										estimated_funding_interval_s 	= args.estimated_funding_interval_s,
+										client_id 						= args.client_id,
+										db_url 							= args.db_url,
+										db_reset 						= args.db_reset,
 									)
 
-	bot_executor 	= SpotPerpetualSimulatedBotExecution(api_client = client) if args.fake_orders else SpotPerpetualBotExecution(api_client = client)
-
-	(perpetual_funding_rate, perpetual_estimated_funding_rate) = client.get_perpetual_effective_funding_rate(	symbol = args.perpetual_trading_pair, 
-																															seconds_before_current = args.current_funding_interval_s,
-																															seconds_before_estimated = args.estimated_funding_interval_s)
-
-	while True:
-		try:
-			if 	args.order_type == "limit":
-				spot_price 		= client.get_spot_trading_price(symbol = args.spot_trading_pair)
-				perpetual_price = client.get_perpetual_trading_price(symbol = args.perpetual_trading_pair)
-				
-				decision 		= trade_strategy.trade_decision(spot_bid_price 				= spot_price,
-																spot_ask_price 				= spot_price, 
-																perp_bid_price 				= perpetual_price,
-																perp_ask_price 				= perpetual_price,
-																perp_funding_rate 			= perpetual_funding_rate,
-																perp_estimated_funding_rate = perpetual_estimated_funding_rate,
-																entry_threshold 			= args.entry_gap_frac,
-																take_profit_threshold 		= args.profit_taking_frac
-															)
-
-				price_str 		= f"Spot price: {spot_price}, perpetual price: {perpetual_price}"		
-
-			elif args.order_type == "market":
-				(perpetual_funding_rate, perpetual_estimated_funding_rate) = client.get_perpetual_effective_funding_rate(	symbol = args.perpetual_trading_pair,
-																															seconds_before_current = args.current_funding_interval_s,
-																															seconds_before_estimated = args.estimated_funding_interval_s)
-				(avg_spot_bid, avg_spot_ask, spot_ts) 					= client.get_spot_average_bid_ask_price(symbol = args.spot_trading_pair, size = args.spot_entry_vol)
-				(avg_perpetual_bid, avg_perpetual_ask, perpetual_ts) 	= client.get_perpetual_average_bid_ask_price(symbol = args.perpetual_trading_pair, size = args.perpetual_entry_lot_size)
-				
-				decision 		= trade_strategy.trade_decision(spot_bid_price 				= avg_spot_bid,
-																spot_ask_price 				= avg_spot_ask,
-																perp_bid_price 				= avg_perpetual_bid,
-																perp_ask_price 				= avg_perpetual_ask,
-																perp_funding_rate 			= perpetual_funding_rate,
-																perp_estimated_funding_rate = perpetual_estimated_funding_rate,
-																entry_threshold 			= args.entry_gap_frac,
-																take_profit_threshold 		= args.profit_taking_frac
-															)
-				
-				price_str 		= f"Spot bid/ask: {(avg_spot_bid, avg_spot_ask)}, Perpetual bid/ask: {(avg_perpetual_bid, avg_perpetual_ask)}"
-				assert datetime.utcnow() - min(datetime.utcfromtimestamp(spot_ts), datetime.utcfromtimestamp(perpetual_ts)) <= timedelta(milliseconds = args.feed_latency_s * 1000), "Trade latency too large" 
-
-			funding_str = f"Current/Est Funding: {(perpetual_funding_rate, perpetual_estimated_funding_rate)}"
-			logging.info(f"{decision} - {price_str} - {funding_str}")
-
-			# Execute orders
-			new_order_execution = False
-
-			if decision == SpotPerpExecutionDecision.TAKE_PROFIT_LONG_SPOT_SHORT_PERP:
-				spot_params 	= {
-					"symbol" 	 		: args.spot_trading_pair, 
-					"order_type" 		: args.order_type, 
-					"price" 	 		: spot_price if args.order_type == "limit" else 1,
-					"size" 		 		: args.spot_entry_vol,
-					"target_currency" 	: "base_ccy",
-					"order_side" 		: "sell",
-				}
-
-				perpetual_params = {
-					"symbol" 	 	: args.perpetual_trading_pair,
-					"position_side" : "short",
-					"order_type" 	: args.order_type, 
-					"price" 	 	: perpetual_price if args.order_type == "limit" else 1,
-					"size" 		 	: args.perpetual_entry_lot_size,
-					"order_side" 	: "buy",
-				}
-
-				spot_revert_params 						= copy.copy(spot_params)
-				spot_revert_params["order_side"] 		= "buy"
-
-				perpetual_revert_params 				= copy.copy(perpetual_params)
-				perpetual_revert_params["order_side"] 	= "sell"
-
-				new_order_execution = bot_executor.short_spot_long_perpetual(	spot_params 			= spot_params,
-																				perpetual_params 		= perpetual_params,
-																				spot_revert_params  	= spot_revert_params,
-																				perpetual_revert_params = perpetual_revert_params
-																		)
-
-				trade_strategy.change_asset_holdings(delta_spot = -1 * args.spot_entry_vol, delta_perp = args.perpetual_entry_lot_size) \
-				if new_order_execution else fail_safe_trigger.increment()
-
-			elif decision == SpotPerpExecutionDecision.GO_LONG_SPOT_SHORT_PERP:
-				spot_params 	 = {
-					"symbol" 	 		: args.spot_trading_pair, 
-					"order_type" 		: args.order_type, 
-					"price" 	 		: spot_price if args.order_type == "limit" else 1,
-					"size" 		 		: args.spot_entry_vol,
-					"target_currency" 	: "base_ccy",
-					"order_side" 		: "buy",
-				}
-
-				perpetual_params = {
-					"symbol" 	 	: args.perpetual_trading_pair,
-					"position_side" : "short",
-					"order_type" 	: args.order_type, 
-					"price" 	 	: perpetual_price if args.order_type == "limit" else 1,
-					"size" 		 	: args.perpetual_entry_lot_size,
-					"order_side" 	: "sell",
-				}
-
-				spot_revert_params 						= copy.copy(spot_params)
-				spot_revert_params["order_side"] 		= "sell"
-
-				perpetual_revert_params 				= copy.copy(perpetual_params)
-				perpetual_revert_params["order_side"] 	= "buy"
-
-				new_order_execution = bot_executor.long_spot_short_perpetual(	spot_params 			= spot_params,
-																				perpetual_params 		= perpetual_params,
-																				spot_revert_params  	= spot_revert_params,
-																				perpetual_revert_params = perpetual_revert_params
-																		)
-
-				trade_strategy.change_asset_holdings(delta_spot = args.spot_entry_vol, delta_perp = -1 * args.perpetual_entry_lot_size) \
-				if new_order_execution else fail_safe_trigger.increment()
-
-			fail_safe_trigger.reset() if new_order_execution else None
-
-			if new_order_execution and args.db_url is not None:
-				(current_spot_vol, current_perpetual_lot_size) = trade_strategy.get_asset_holdings()
-				db_spot_client.set_position(size = current_spot_vol)
-				db_perpetual_clients.set_position(size = current_perpetual_lot_size)
-
-			if 	(new_order_execution) or \
-				(decision == SpotPerpExecutionDecision.NO_DECISION) or \
-				(decision == SpotPerpExecutionDecision.GO_LONG_PERP_SHORT_SPOT) or \
-				(decision == SpotPerpExecutionDecision.TAKE_PROFIT_LONG_PERP_SHORT_SPOT):
-				sleep(args.poll_interval_s)
-			
-			else:
-				raise Exception(f"Order execution failed - Status: {new_order_execution}, Decision: {decision}")
+	if args.trace_path is not None:
+		tracer = TickTracer(symbol = pair_bot.name, trace_path = args.trace_path).dump_on_signal(signum = signal.SIGUSR2)
+		(feed_client.tracer, client.tracer, bot_executor.tracer, pair_bot.tracer) = (tracer, tracer, tracer, tracer)
+	else:
+		tracer = NULL_TRACER
 
-		except FailSafeException as ex:
-			sys.exit(ex)
+	if args.db_url is not None:
+		logging.info(f"State management at {args.db_url}")
 
-		except Exception as ex:
-			logging.error(ex)
-			sleep(args.retry_timeout_s)
+	pair_bot.setup()
+
+	runtime = AsyncBotRuntime(	api_client 				= client,
+								feed_client 			= feed_client,
+								evaluate_fn 			= pair_bot.evaluate,
+								poll_interval_s 		= args.poll_interval_s,
+								heartbeat_interval_s 	= args.heartbeat_interval_s,
+								retry_timeout_s 		= args.retry_timeout_s,
+								feed_push 				= args.feed_subscribe == 1 or isinstance(feed_client, OkxWebsocketFeeds),
+								fatal_exceptions 		= (FailSafeException, ),
+								tracer 					= tracer,
+								min_eval_interval_s 	= args.min_eval_interval_s,
+								refresh_fn 				= pair_bot.refresh_inputs,
+								refresh_interval_s 		= args.funding_refresh_s,
+							)
 
-		finally:
-			try:
-				client.maintain_connection()
-			except Exception as ex:
-				logging.error("Restoring connection to WS server")
-				client.make_connection()
\ No newline at end of file
+	try:
+		runtime.run_forever()
+	except FailSafeException as ex:
+		sys.exit(ex)
\ No newline at end of file
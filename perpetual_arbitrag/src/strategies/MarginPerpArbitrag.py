@@ -1,5 +1,6 @@
 import hashlib
 import logging
+import numpy as np
 from enum import Enum
 from strategies.SingleTradeArbitragV2 import SingleTradeArbitragV2, TradePosition, ExecutionDecision
 
@@ -80,4 +81,45 @@ class MarginPerpArbitrag(SingleTradeArbitragV2):
 										  	take_profit_threshold = take_profit_threshold,
 									  	)
 
-		return mapping[decision]
\ No newline at end of file
+		return mapping[decision]
+
+	@staticmethod
+	def batch_trade_decision(	margin_bid_price: np.ndarray,
+								margin_ask_price: np.ndarray,
+								margin_quote_interest_rate: np.ndarray,
+								margin_base_interest_rate: np.ndarray,
+								perp_bid_price: np.ndarray,
+								perp_ask_price: np.ndarray,
+								perp_funding_rate: np.ndarray,
+								perp_estimated_funding_rate: np.ndarray,
+								current_margin_position: np.ndarray,
+								max_margin_position: np.ndarray,
+								current_perp_position: np.ndarray,
+								max_perp_position: np.ndarray,
+								entry_threshold: np.ndarray,
+								take_profit_threshold: np.ndarray,
+							):
+		"""
+		Vectorized trade_decision over many pairs / ticks. Returns an int array of MarginPerpExecutionDecision values
+		"""
+		margin_bid_price 	= np.asarray(margin_bid_price, dtype = float)
+		margin_ask_price 	= np.asarray(margin_ask_price, dtype = float)
+		perp_bid_price 		= np.asarray(perp_bid_price, dtype = float)
+		perp_ask_price 		= np.asarray(perp_ask_price, dtype = float)
+		funding_multiplier 	= 1 + np.asarray(perp_funding_rate, dtype = float) + np.asarray(perp_estimated_funding_rate, dtype = float)
+
+		return SingleTradeArbitragV2._batch_trade_decision(	asset_A_bid_price = margin_bid_price,
+															asset_A_effective_bid_price = margin_bid_price * (1 - np.asarray(margin_quote_interest_rate, dtype = float)),
+															asset_A_ask_price = margin_ask_price,
+															asset_A_effective_ask_price = margin_ask_price * (1 + np.asarray(margin_base_interest_rate, dtype = float)),
+															asset_B_bid_price = perp_bid_price,
+															asset_B_effective_bid_price = perp_bid_price * funding_multiplier,
+															asset_B_ask_price = perp_ask_price,
+															asset_B_effective_ask_price = perp_ask_price * funding_multiplier,
+															current_A_position = current_margin_position,
+															max_A_position = max_margin_position,
+															current_B_position = current_perp_position,
+															max_B_position = max_perp_position,
+															entry_threshold = entry_threshold,
+															take_profit_threshold = take_profit_threshold,
+														)
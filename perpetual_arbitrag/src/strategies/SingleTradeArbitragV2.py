@@ -1,6 +1,7 @@
 import deprecation
 import hashlib
 import logging
+import numpy as np
 from enum import Enum
 from strategies.StrategiesV2 import StrategiesV2
 
@@ -116,4 +117,57 @@ class SingleTradeArbitragV2(StrategiesV2):
 				 and (current_position is not TradePosition.LONG_A_SHORT_B):
 				decision = ExecutionDecision.GO_LONG_B_SHORT_A
 
-		return decision
\ No newline at end of file
+		return decision
+
+	@staticmethod
+	def _batch_trade_decision(	asset_A_bid_price: np.ndarray,
+								asset_A_effective_bid_price: np.ndarray,
+								asset_A_ask_price: np.ndarray,
+								asset_A_effective_ask_price: np.ndarray,
+								asset_B_bid_price: np.ndarray,
+								asset_B_effective_bid_price: np.ndarray,
+								asset_B_ask_price: np.ndarray,
+								asset_B_effective_ask_price: np.ndarray,
+								current_A_position: np.ndarray,
+								max_A_position: np.ndarray,
+								current_B_position: np.ndarray,
+								max_B_position: np.ndarray,
+								entry_threshold: np.ndarray,
+								take_profit_threshold: np.ndarray,
+							):
+		"""
+		Vectorized _trade_decision over many pairs / ticks, one per array element. Scalars are broadcast.
+
+		Returns an int array of ExecutionDecision values. The values are shared by the decision enums of every strategy,
+		so a code can be mapped back with ExecutionDecision(code) or SpotPerpExecutionDecision(code).
+		"""
+		current_A_position 			= np.asarray(current_A_position, dtype = float)
+		current_B_position 			= np.asarray(current_B_position, dtype = float)
+		asset_A_bid_price 			= np.asarray(asset_A_bid_price, dtype = float)
+		asset_A_ask_price 			= np.asarray(asset_A_ask_price, dtype = float)
+
+		long_A_short_B 				= (current_A_position > 0) & (current_B_position < 0)
+		long_B_short_A 				= (current_A_position < 0) & (current_B_position > 0)
+		profit_from_long_A_short_B 	= np.asarray(asset_B_effective_bid_price, dtype = float) - np.asarray(asset_A_effective_ask_price, dtype = float)
+		profit_from_short_A_long_B 	= np.asarray(asset_A_effective_bid_price, dtype = float) - np.asarray(asset_B_effective_ask_price, dtype = float)
+
+		# Conditions are ordered as the scalar if / elif chain, np.select picks the first one that holds
+		conditions 	= [
+			long_A_short_B & (profit_from_short_A_long_B >= take_profit_threshold * (asset_A_bid_price + asset_B_ask_price)),
+			long_B_short_A & (profit_from_long_A_short_B >= take_profit_threshold * (asset_A_ask_price + asset_B_bid_price)),
+			(np.abs(current_A_position) >= max_A_position) | (np.abs(current_B_position) >= max_B_position),
+			(profit_from_long_A_short_B > profit_from_short_A_long_B) \
+				& (profit_from_long_A_short_B >= entry_threshold * (asset_A_ask_price + asset_B_bid_price)) \
+				& ~long_B_short_A,
+			(profit_from_short_A_long_B > profit_from_long_A_short_B) \
+				& (profit_from_short_A_long_B >= entry_threshold * (asset_A_bid_price + asset_B_ask_price)) \
+				& ~long_A_short_B,
+		]
+		choices 	= [
+			ExecutionDecision.TAKE_PROFIT_LONG_A_SHORT_B.value,
+			ExecutionDecision.TAKE_PROFIT_LONG_B_SHORT_A.value,
+			ExecutionDecision.NO_DECISION.value,
+			ExecutionDecision.GO_LONG_A_SHORT_B.value,
+			ExecutionDecision.GO_LONG_B_SHORT_A.value,
+		]
+		return np.select(conditions, choices, default = ExecutionDecision.NO_DECISION.value).astype(int)
@@ -1,5 +1,6 @@
 import hashlib
 import logging
+import numpy as np
 from enum import Enum
 from strategies.SingleTradeArbitragV2 import SingleTradeArbitragV2, TradePosition, ExecutionDecision
 
@@ -88,4 +89,41 @@ class SpotPerpArbitrag(SingleTradeArbitragV2):
 										  	take_profit_threshold = take_profit_threshold,
 									  	)
 
-		return mapping[decision]
\ No newline at end of file
+		return mapping[decision]
+
+	@staticmethod
+	def batch_trade_decision(	spot_bid_price: np.ndarray,
+								spot_ask_price: np.ndarray,
+								perp_bid_price: np.ndarray,
+								perp_ask_price: np.ndarray,
+								perp_funding_rate: np.ndarray,
+								perp_estimated_funding_rate: np.ndarray,
+								current_spot_vol: np.ndarray,
+								max_spot_vol: np.ndarray,
+								current_perp_lot_size: np.ndarray,
+								max_perp_lot_size: np.ndarray,
+								entry_threshold: np.ndarray,
+								take_profit_threshold: np.ndarray,
+							):
+		"""
+		Vectorized trade_decision over many pairs / ticks. Returns an int array of SpotPerpExecutionDecision values
+		"""
+		funding_multiplier 	= 1 + np.asarray(perp_funding_rate, dtype = float) + np.asarray(perp_estimated_funding_rate, dtype = float)
+		perp_bid_price 		= np.asarray(perp_bid_price, dtype = float)
+		perp_ask_price 		= np.asarray(perp_ask_price, dtype = float)
+
+		return SingleTradeArbitragV2._batch_trade_decision(	asset_A_bid_price = spot_bid_price,
+															asset_A_effective_bid_price = spot_bid_price,
+															asset_A_ask_price = spot_ask_price,
+															asset_A_effective_ask_price = spot_ask_price,
+															asset_B_bid_price = perp_bid_price,
+															asset_B_effective_bid_price = perp_bid_price * funding_multiplier,
+															asset_B_ask_price = perp_ask_price,
+															asset_B_effective_ask_price = perp_ask_price * funding_multiplier,
+															current_A_position = current_spot_vol,
+															max_A_position = max_spot_vol,
+															current_B_position = current_perp_lot_size,
+															max_B_position = max_perp_lot_size,
+															entry_threshold = entry_threshold,
+															take_profit_threshold = take_profit_threshold,
+														)
@@ -0,0 +1,17 @@
+import asyncio
+from unittest.mock import MagicMock
+
+def coroutine_mock(**kwargs):
+	"""
+	MagicMock whose calls return coroutines, as unittest.mock.AsyncMock needs python 3.8.
+
+	return_value and side_effect behave as on a MagicMock and apply when the call is awaited; a side_effect returning a
+	coroutine is awaited too. Calls are recorded on the returned mock.
+	"""
+	result_mock = MagicMock(**kwargs)
+	async def _call(*args, **call_kwargs):
+		result = result_mock(*args, **call_kwargs)
+		if asyncio.iscoroutine(result):
+			result = await result
+		return result
+	return MagicMock(side_effect = _call)
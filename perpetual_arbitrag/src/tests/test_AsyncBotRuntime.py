@@ -0,0 +1,135 @@
+import asyncio
+from execution.AsyncBotRuntime import AsyncBotRuntime
+from execution.FailSafeTrigger import FailSafeException
+from feeds.TickTracer import TickTracer
+from unittest import TestCase
+from unittest.mock import MagicMock
+from CoroutineMock import coroutine_mock
+
+class TestAsyncBotRuntime(TestCase):
+	def setUp(self):
+		self.loop 			= asyncio.new_event_loop()
+		self.api_client 	= MagicMock()
+		self.api_client.maintain_connection_async = coroutine_mock(return_value = None)
+		self.api_client.make_connection_async = coroutine_mock(return_value = None)
+		self.feed_client 	= MagicMock()
+		self.feed_client.wait_for_update.return_value = True
+		self.evaluations 	= 0
+		return
+
+	def tearDown(self):
+		self.loop.close()
+		return
+
+	def _runtime(self, evaluate_fn, feed_push = True, heartbeat_interval_s = 0.01):
+		return AsyncBotRuntime(	api_client 				= self.api_client,
+								feed_client 			= self.feed_client,
+								evaluate_fn 			= evaluate_fn,
+								poll_interval_s 		= 0.01,
+								heartbeat_interval_s 	= heartbeat_interval_s,
+								retry_timeout_s 		= 0.01,
+								feed_push 				= feed_push,
+								fatal_exceptions 		= (FailSafeException, )
+							)
+
+	def test_fatal_exception_stops_runtime(self):
+		async def _evaluate():
+			self.evaluations += 1
+			if self.evaluations == 3:
+				raise FailSafeException(trigger = 3)
+
+		with self.assertRaises(FailSafeException):
+			self.loop.run_until_complete(self._runtime(evaluate_fn = _evaluate).run())
+		assert(self.evaluations == 3 and self.feed_client.wait_for_update.call_count >= 2)
+		# The wait left running in the executor is woken so that the loop shuts down without waiting for its timeout
+		self.feed_client.wake_waiters.assert_called_once_with()
+
+	def test_evaluation_errors_are_retried(self):
+		async def _evaluate():
+			self.evaluations += 1
+			if self.evaluations < 3:
+				raise Exception("order failed")
+			raise FailSafeException(trigger = 1)
+
+		with self.assertRaises(FailSafeException):
+			self.loop.run_until_complete(self._runtime(evaluate_fn = _evaluate, feed_push = False).run())
+		assert(self.evaluations == 3)
+		self.feed_client.wait_for_update.assert_not_called()
+
+	def test_heartbeat_runs_concurrently_with_evaluation(self):
+		async def _evaluate():
+			# Long running evaluation, e.g. waiting on order responses, spanning several heartbeat intervals
+			await asyncio.sleep(0.2)
+			raise FailSafeException(trigger = 1)
+
+		with self.assertRaises(FailSafeException):
+			self.loop.run_until_complete(self._runtime(evaluate_fn = _evaluate).run())
+		assert(self.api_client.maintain_connection_async.call_count >= 2)
+
+	def test_heartbeat_reconnects_on_failure(self):
+		self.api_client.maintain_connection_async = coroutine_mock(side_effect = Exception("connection closed"))
+		async def _evaluate():
+			await asyncio.sleep(0.03)
+			raise FailSafeException(trigger = 1)
+
+		with self.assertRaises(FailSafeException):
+			self.loop.run_until_complete(self._runtime(evaluate_fn = _evaluate).run())
+		assert(self.api_client.make_connection_async.call_count >= 1)
+
+	def test_evaluations_are_traced(self):
+		tracer = TickTracer(symbol = "BTC-USDT")
+		async def _evaluate():
+			self.evaluations += 1
+			if self.evaluations == 3:
+				raise FailSafeException(trigger = 3)
+			return "NO_DECISION"
+
+		runtime = self._runtime(evaluate_fn = _evaluate)
+		runtime.tracer = tracer
+		with self.assertRaises(FailSafeException):
+			self.loop.run_until_complete(runtime.run())
+		assert(tracer.summary()["BTC-USDT:tick"]["count"] == 2 and tracer.summary()["BTC-USDT:wake"]["count"] >= 1)
+
+	def test_evaluations_are_throttled(self):
+		started = []
+		async def _evaluate():
+			started.append(self.loop.time())
+			if len(started) == 3:
+				raise FailSafeException(trigger = 3)
+
+		# Books are pushed far more often than the minimum interval between evaluations
+		self.feed_client.wait_for_update.side_effect = lambda timeout_s: True
+		runtime = self._runtime(evaluate_fn = _evaluate)
+		runtime.min_eval_interval_s = 0.05
+		with self.assertRaises(FailSafeException):
+			self.loop.run_until_complete(runtime.run())
+		assert(all(later - earlier >= 0.045 for (earlier, later) in zip(started, started[1:])))
+
+	def test_changed_inputs_wake_up_evaluation(self):
+		refreshes = []
+		def _refresh():
+			refreshes.append(1)
+			return len(refreshes) == 2
+
+		async def _evaluate():
+			self.evaluations += 1
+			if self.evaluations == 2:
+				raise FailSafeException(trigger = 2)
+
+		# No book arrives, and the idle fallback is far longer than the test
+		self.feed_client.wait_for_update.side_effect = lambda timeout_s: False
+		runtime = AsyncBotRuntime(	api_client 				= self.api_client,
+									feed_client 			= self.feed_client,
+									evaluate_fn 			= _evaluate,
+									poll_interval_s 		= 10,
+									heartbeat_interval_s 	= 10,
+									retry_timeout_s 		= 0.01,
+									feed_push 				= False,
+									fatal_exceptions 		= (FailSafeException, ),
+									refresh_fn 				= _refresh,
+									refresh_interval_s 		= 0.01
+								)
+		with self.assertRaises(FailSafeException):
+			self.loop.run_until_complete(asyncio.wait_for(runtime.run(), timeout = 2))
+		# Evaluated once on start, then only once the inputs changed
+		assert(self.evaluations == 2 and len(refreshes) == 2)
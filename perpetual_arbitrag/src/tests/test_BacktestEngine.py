@@ -0,0 +1,122 @@
+import numpy as np
+from execution.BacktestEngine import BacktestEngine
+from strategies.MarginPerpArbitrag import MarginPerpArbitrag
+from strategies.SpotPerpArbitrag import SpotPerpArbitrag
+from unittest import TestCase
+
+# Midnight UTC, which is a funding snapshot time
+DAY_START = 86400 * 19000
+
+class _Replay(object):
+	def __init__(self, chunks: list):
+		self._chunks = chunks
+
+	def chunks(self):
+		for each_chunk in self._chunks:
+			yield {each_key : np.array(each_value, dtype = np.float64) for (each_key, each_value) in each_chunk.items()}
+
+class TestBacktestEngine(TestCase):
+	def _ticks(self, timestamps: list, A_prices: list, B_prices: list):
+		return 	{
+					"timestamp" : timestamps,
+					"A_bid" 	: [each_bid for (each_bid, _) in A_prices],
+					"A_ask" 	: [each_ask for (_, each_ask) in A_prices],
+					"B_bid" 	: [each_bid for (each_bid, _) in B_prices],
+					"B_ask" 	: [each_ask for (_, each_ask) in B_prices],
+				}
+
+	def _spot_strategy(self):
+		return SpotPerpArbitrag(spot_symbol = "BTC-USDT", current_spot_vol = 0, max_spot_vol = 0.02,
+								perp_symbol = "BTC-USDT-SWAP", current_perp_lot_size = 0, max_perp_lot_size = 2)
+
+	def _margin_strategy(self):
+		return MarginPerpArbitrag(	margin_symbol = "BTC-USDT", current_margin_position = 0, max_margin_position = 0.02,
+									perp_symbol = "BTC-USDT-SWAP", current_perp_position = 0, max_perp_position = 2)
+
+	def _engine(self, strategy, **kwargs):
+		params = 	{
+						"strategy" 					: strategy,
+						"entry_gap_frac" 			: 0.01,
+						"profit_taking_frac" 		: -0.01,
+						"asset_entry_vol" 			: 0.01,
+						"perpetual_entry_lot_size" 	: 1,
+						"perpetual_contract_size" 	: 0.01,
+					}
+		params.update(kwargs)
+		return BacktestEngine(**params)
+
+	def test_entries_and_take_profits(self):
+		# Perpetual trades above spot for 3 ticks, then converges
+		ticks 	= self._ticks(	timestamps 	= [DAY_START + each for each in range(1, 7)],
+								A_prices 	= [(100, 101)] * 6,
+								B_prices 	= [(110, 111)] * 3 + [(100, 101)] * 3)
+		engine 	= self._engine(strategy = self._spot_strategy(), fee_rate = 0.001)
+		summary = engine.run(replay = _Replay(chunks = [ticks]))
+		assert([each["decision"] for each in engine.trades] == [	"GO_LONG_SPOT_SHORT_PERP", "GO_LONG_SPOT_SHORT_PERP",
+																	"TAKE_PROFIT_LONG_SPOT_SHORT_PERP", "TAKE_PROFIT_LONG_SPOT_SHORT_PERP"])
+		assert([each["timestamp"] - DAY_START for each in engine.trades] == [1, 2, 4, 5])
+		# Entries earn 1.1 - 1.01 and exits lose 1.01 - 1 on each leg pair
+		fees = 0.001 * (2 * (1.01 + 1.1) + 2 * (1 + 1.01))
+		assert(np.isclose(summary["fees"], fees) and np.isclose(summary["pnl"], 0.16 - fees))
+		assert(summary["final_positions"] == (0, 0) and summary["trades"] == 4)
+
+	def test_spot_is_never_shorted(self):
+		ticks = self._ticks(timestamps 	= [DAY_START + each for each in range(1, 4)],
+							A_prices 	= [(110, 111)] * 3,
+							B_prices 	= [(100, 101)] * 3)
+		spot_engine 	= self._engine(strategy = self._spot_strategy())
+		margin_engine 	= self._engine(strategy = self._margin_strategy())
+		spot_engine.run(replay = _Replay(chunks = [ticks]))
+		margin_engine.run(replay = _Replay(chunks = [ticks]))
+		assert(spot_engine.trades == [])
+		assert([each["decision"] for each in margin_engine.trades] == ["GO_LONG_PERP_SHORT_MARGIN"] * 2)
+		assert(margin_engine.strategy.get_asset_holdings() == (-0.02, 2))
+
+	def test_funding_settled_at_snapshots(self):
+		# Short 1 perpetual lot held over the 08:00 snapshot, at a funding rate of 0.1%
+		ticks 	= self._ticks(	timestamps 	= [DAY_START + 3600, DAY_START + 7 * 3600, DAY_START + 9 * 3600],
+								A_prices 	= [(100, 101)] * 3,
+								B_prices 	= [(110, 111)] * 3)
+		engine 	= self._engine(strategy = self._spot_strategy(), funding_history = (np.array([DAY_START]), np.array([0.001]), np.array([0])))
+		engine.strategy.max_A_position = 0.01
+		summary = engine.run(replay = _Replay(chunks = [ticks]))
+		assert(np.isclose(summary["funding"], 0.01 * 110.5 * 0.001))
+
+	def test_margin_interest_accrued_while_held(self):
+		ticks 	= self._ticks(	timestamps 	= [DAY_START + 3600, DAY_START + 3600 + 86400 / 2],
+								A_prices 	= [(100, 101)] * 2,
+								B_prices 	= [(110, 111)] * 2)
+		engine 	= self._engine(strategy = self._margin_strategy(), margin_quote_daily_rate = 0.01)
+		engine.strategy.max_A_position = 0.01
+		summary = engine.run(replay = _Replay(chunks = [ticks]))
+		# Long 0.01 margin marked at 100.5 for half a day
+		assert(np.isclose(summary["interest"], 0.01 * 100.5 * 0.01 / 2))
+
+	def test_matches_decisions_at_every_tick(self):
+		rng 		= np.random.default_rng(0)
+		n_ticks 	= 2000
+		mid 		= 100 + np.cumsum(rng.normal(0, 0.2, n_ticks))
+		gap 		= 3 * np.sin(np.arange(n_ticks) / 50) + rng.normal(0, 0.5, n_ticks)
+		timestamps 	= DAY_START + np.arange(n_ticks, dtype = np.float64)
+		ticks 		= self._ticks(	timestamps 	= timestamps,
+									A_prices 	= list(zip(mid - 0.05, mid + 0.05)),
+									B_prices 	= list(zip(mid + gap - 0.05, mid + gap + 0.05)))
+
+		for strategy_fn in [self._spot_strategy, self._margin_strategy]:
+			engine = self._engine(strategy = strategy_fn(), entry_gap_frac = 0.01, profit_taking_frac = 0, window = 64)
+			# Chunks split the ticks, as replays of many days would
+			engine.run(replay = _Replay(chunks = [{each_key : each_value[:777] for (each_key, each_value) in ticks.items()},
+												  {each_key : each_value[777:] for (each_key, each_value) in ticks.items()}]))
+
+			naive 		= self._engine(strategy = strategy_fn(), entry_gap_frac = 0.01, profit_taking_frac = 0)
+			expected 	= []
+			each_ticks 	= {each_key : np.array(each_value, dtype = np.float64) for (each_key, each_value) in ticks.items()}
+			(each_ticks["funding_rate"], each_ticks["estimated_funding_rate"]) = (np.zeros(n_ticks), np.zeros(n_ticks))
+			for idx in range(n_ticks):
+				decision = naive._trade_decision(ticks = each_ticks, idx = idx)
+				if decision.value in naive.tradable_codes:
+					naive.strategy.change_asset_holdings(*[(1 if decision.value in {2, 5} else -1) * each_size for each_size in (0.01, -1)])
+					expected.append((float(timestamps[idx]), decision.name))
+
+			assert(len(expected) > 10)
+			assert([(each["timestamp"], each["decision"]) for each in engine.trades] == expected)
@@ -0,0 +1,84 @@
+import numpy as np
+import os
+import tempfile
+from feeds.BookRecording import BookRecorder, BookRecording
+from unittest import TestCase
+
+class TestBookRecording(TestCase):
+	def setUp(self):
+		self.dir 	= tempfile.TemporaryDirectory()
+		self.path 	= os.path.join(self.dir.name, "OKX-BTC-USDT.bin")
+		return
+
+	def tearDown(self):
+		self.dir.cleanup()
+		return
+
+	def _record(self, timestamps: list, depth: int = 3):
+		recorder = BookRecorder(path = self.path, depth = depth)
+		for each_ts in timestamps:
+			recorder.append(bids = [[100 - each_ts, 1], [99 - each_ts, 2]], asks = [[101 + each_ts, 1], [102 + each_ts, 2]], timestamp = each_ts)
+		recorder.close()
+		return
+
+	def test_recorded_books_are_read_back(self):
+		self._record(timestamps = [1, 2, 3])
+		recording = BookRecording(path = self.path)
+		assert(len(recording) == 3 and recording.depth == 3)
+		assert(recording.timestamps.tolist() == [1, 2, 3])
+		assert(recording.records["bids"][1].tolist() == [[98, 1], [97, 2], [97, 0]])
+		assert(recording.records["asks"][2].tolist() == [[104, 1], [105, 2], [105, 0]])
+
+	def test_unsorted_levels_are_sorted_and_truncated(self):
+		recorder = BookRecorder(path = self.path, depth = 2)
+		recorder.append(bids = [[98, 1], [100, 1], [99, 1]], asks = [[103, 1], [101, 1], [102, 1]], timestamp = 1)
+		recorder.close()
+		record = BookRecording(path = self.path).records[0]
+		assert(record["bids"][:, 0].tolist() == [100, 99] and record["asks"][:, 0].tolist() == [101, 102])
+
+	def test_empty_side_has_no_quantity(self):
+		recorder = BookRecorder(path = self.path, depth = 2)
+		recorder.append(bids = [], asks = [[101, 1]], timestamp = 1)
+		recorder.close()
+		record = BookRecording(path = self.path).records[0]
+		assert(np.isnan(record["bids"][:, 0]).all() and record["bids"][:, 1].sum() == 0)
+
+	def test_recording_is_appended_to(self):
+		self._record(timestamps = [1, 2])
+		self._record(timestamps = [3])
+		assert(BookRecording(path = self.path).timestamps.tolist() == [1, 2, 3])
+
+	def test_partial_record_is_dropped_before_appending(self):
+		self._record(timestamps = [1, 2])
+		with open(self.path, "ab") as f:
+			f.write(b"\x00" * 7)
+		self._record(timestamps = [3])
+		recording = BookRecording(path = self.path)
+		assert(recording.timestamps.tolist() == [1, 2, 3])
+		assert(recording.records["bids"][2].tolist() == [[97, 1], [96, 2], [96, 0]])
+
+	def test_reopened_recorder_keeps_time_order(self):
+		self._record(timestamps = [1, 2])
+		recorder = BookRecorder(path = self.path, depth = 3)
+		assert(recorder.last_timestamp == 2)
+		with self.assertRaises(AssertionError):
+			recorder.append(bids = [[100, 1]], asks = [[101, 1]], timestamp = 1)
+		recorder.close()
+
+	def test_append_with_other_depth_fails(self):
+		self._record(timestamps = [1])
+		with self.assertRaises(AssertionError):
+			BookRecorder(path = self.path, depth = 5)
+
+	def test_append_out_of_order_fails(self):
+		recorder = BookRecorder(path = self.path, depth = 2)
+		recorder.append(bids = [[100, 1]], asks = [[101, 1]], timestamp = 2)
+		with self.assertRaises(AssertionError):
+			recorder.append(bids = [[100, 1]], asks = [[101, 1]], timestamp = 1)
+		recorder.close()
+
+	def test_between_includes_latest_book_before_start(self):
+		self._record(timestamps = [1, 2, 3, 4, 5])
+		recording = BookRecording(path = self.path)
+		assert(recording.between(start_ts = 2.5, end_ts = 4)["timestamp"].tolist() == [2, 3])
+		assert(recording.between(start_ts = 0, end_ts = 2)["timestamp"].tolist() == [1])
@@ -1,9 +1,14 @@
+import asyncio
 import copy
+import json
 import sys
+import threading
 import pytest
 from execution.BotExecutionV2 import BotExecutionV2
+from execution.UnwindEngine import UnwindEngine
 from unittest import TestCase
 from unittest.mock import MagicMock
+from CoroutineMock import coroutine_mock
 class TestBotExecution(TestCase):
 
 	def setUp(self):
@@ -127,4 +132,166 @@ class TestBotExecution(TestCase):
 					}
 		
 		execution_resp 	= self.bot_executor.idempotent_trade_execution(**fn_params)
-		assert fn_params["asset_A_revert_fn"].called and not fn_params["asset_B_revert_fn"].called
\ No newline at end of file
+		assert fn_params["asset_A_revert_fn"].called and not fn_params["asset_B_revert_fn"].called
+
+	def test_async_asset_A_order_reverted_when_asset_B_send_fails(self):
+		fn_params 						= self._ws_fn_params(asset_A_resp = {"id" : "PERPsell", "code" : "0"}, asset_B_resp = {})
+		fn_params["asset_B_order_fn"] 	= coroutine_mock(side_effect = ConnectionError("Private websocket is not connected"))
+		execution_resp 	= asyncio.new_event_loop().run_until_complete(self.bot_executor._idempotent_trade_execution_async(**fn_params))
+		assert execution_resp == False
+		assert fn_params["asset_A_revert_fn"].called and not fn_params["asset_B_revert_fn"].called
+
+	def _rest_fn_params(self, asset_A_order_fn, asset_B_order_fn):
+		return 	{
+					"asset_A_order_fn" 				: asset_A_order_fn,
+					"asset_A_params" 				: {},
+					"asset_A_assert_resp_error_fn" 	: MagicMock(return_value = None),
+					"asset_A_revert_fn" 			: MagicMock(return_value = None),
+					"asset_A_revert_params" 		: {},
+					"asset_B_order_fn" 				: asset_B_order_fn,
+					"asset_B_params" 				: {},
+					"asset_B_assert_resp_error_fn" 	: MagicMock(return_value = None),
+					"asset_B_revert_fn" 			: MagicMock(return_value = None),
+					"asset_B_revert_params" 		: {},
+				}
+
+	def test_concurrent_trade_execution_places_legs_together(self):
+		# Each leg only returns once the other one has been placed, which deadlocks if the legs are placed one after the other
+		(asset_A_placed, asset_B_placed) = (threading.Event(), threading.Event())
+		def _order_fn(placed, other_placed):
+			def _place(*args, **kwargs):
+				placed.set()
+				return {"placed_together" : other_placed.wait(timeout = 1)}
+			return MagicMock(side_effect = _place)
+
+		fn_params 		= self._rest_fn_params(asset_A_order_fn = _order_fn(asset_A_placed, asset_B_placed), asset_B_order_fn = _order_fn(asset_B_placed, asset_A_placed))
+		execution_resp 	= self.bot_executor.concurrent_trade_execution(**fn_params)
+		assert execution_resp == True
+		fn_params["asset_A_assert_resp_error_fn"].assert_called_once_with({"placed_together" : True})
+		fn_params["asset_B_assert_resp_error_fn"].assert_called_once_with({"placed_together" : True})
+
+	def test_concurrent_trade_execution_reverts_asset_B_when_asset_A_fails(self):
+		fn_params 		= self._rest_fn_params(asset_A_order_fn = MagicMock(side_effect = Exception('order failed')), asset_B_order_fn = MagicMock(return_value = {"order_id" : 100}))
+		execution_resp 	= self.bot_executor.concurrent_trade_execution(**fn_params)
+		assert execution_resp == False
+		assert fn_params["asset_B_revert_fn"].called and not fn_params["asset_A_revert_fn"].called
+		fn_params["asset_B_revert_fn"].assert_called_once_with(order_resp = {"order_id" : 100}, revert_params = {})
+
+	def test_concurrent_trade_execution_no_revert_when_both_fail(self):
+		fn_params 		= self._rest_fn_params(asset_A_order_fn = MagicMock(side_effect = Exception('order failed')), asset_B_order_fn = MagicMock(side_effect = Exception('order failed')))
+		execution_resp 	= self.bot_executor.concurrent_trade_execution(**fn_params)
+		assert execution_resp == False
+		assert not fn_params["asset_A_revert_fn"].called and not fn_params["asset_B_revert_fn"].called
+
+	def _ws_order_fn(self, resp: dict, delay_s: float = 0):
+		# Mimics OkxApiClientWS.place_*_order_async, which sends the order and returns the pending reply
+		async def _recv():
+			await asyncio.sleep(delay_s)
+			return json.dumps(resp)
+
+		async def _order_fn(*args, **kwargs):
+			return _recv()
+		return MagicMock(side_effect = _order_fn)
+
+	def _ws_fn_params(self, asset_A_resp: dict, asset_B_resp: dict, asset_A_delay_s: float = 0):
+		def _assert_resp_error(order_resp):
+			if order_resp["code"] != "0":
+				raise Exception(f"Order failed: {order_resp}")
+		return 	{
+					"asset_A_order_fn" 				: self._ws_order_fn(resp = asset_A_resp, delay_s = asset_A_delay_s),
+					"asset_A_params" 				: {},
+					"asset_A_assert_resp_error_fn" 	: MagicMock(side_effect = _assert_resp_error),
+					"asset_A_revert_fn" 			: self._ws_order_fn(resp = {"id" : "PERPbuy", "code" : "0"}),
+					"asset_A_revert_params" 		: {},
+					"asset_B_order_fn" 				: self._ws_order_fn(resp = asset_B_resp),
+					"asset_B_params" 				: {},
+					"asset_B_assert_resp_error_fn" 	: MagicMock(side_effect = _assert_resp_error),
+					"asset_B_revert_fn" 			: self._ws_order_fn(resp = {"id" : "SPOTsell", "code" : "0"}),
+					"asset_B_revert_params" 		: {},
+				}
+
+	def test_async_trade_execution_succeeds(self):
+		fn_params 		= self._ws_fn_params(asset_A_resp = {"id" : "PERPsell", "code" : "0"}, asset_B_resp = {"id" : "SPOTbuy", "code" : "0"})
+		execution_resp 	= asyncio.new_event_loop().run_until_complete(self.bot_executor._idempotent_trade_execution_async(**fn_params))
+		assert execution_resp == True
+		assert not fn_params["asset_A_revert_fn"].called and not fn_params["asset_B_revert_fn"].called
+
+	def test_async_asset_A_order_reverted_when_asset_B_fails(self):
+		fn_params 		= self._ws_fn_params(asset_A_resp = {"id" : "PERPsell", "code" : "0"}, asset_B_resp = {"id" : "SPOTbuy", "code" : "1"})
+		execution_resp 	= asyncio.new_event_loop().run_until_complete(self.bot_executor._idempotent_trade_execution_async(**fn_params))
+		assert execution_resp == False
+		assert fn_params["asset_A_revert_fn"].called and not fn_params["asset_B_revert_fn"].called
+
+	def test_async_replies_matched_to_legs_when_received_out_of_order(self):
+		fn_params 		= self._ws_fn_params(asset_A_resp = {"id" : "PERP0", "code" : "1"}, asset_B_resp = {"id" : "SPOT1", "code" : "0"}, asset_A_delay_s = 0.01)
+		execution_resp 	= asyncio.new_event_loop().run_until_complete(self.bot_executor._idempotent_trade_execution_async(**fn_params))
+		assert execution_resp == False
+		assert fn_params["asset_B_revert_fn"].called and not fn_params["asset_A_revert_fn"].called
+		fn_params["asset_A_assert_resp_error_fn"].assert_called_once_with({"id" : "PERP0", "code" : "1"})
+
+	def _lost_reply_order_fn(self):
+		# Sent, but the connection dropped before the reply arrived
+		async def _recv():
+			raise ConnectionError("Reply lost")
+
+		async def _order_fn(*args, **kwargs):
+			return _recv()
+		return MagicMock(side_effect = _order_fn)
+
+	def test_async_leg_not_sent_is_failed_without_lookup(self):
+		fn_params 						= self._ws_fn_params(asset_A_resp = {"id" : "PERP0", "code" : "0"}, asset_B_resp = {})
+		fn_params["asset_B_order_fn"] 	= coroutine_mock(side_effect = ConnectionError("Private websocket is not connected"))
+		fn_params["order_state_fn"] 	= coroutine_mock(return_value = None)
+		execution_resp 					= asyncio.new_event_loop().run_until_complete(self.bot_executor._idempotent_trade_execution_async(**fn_params))
+		assert execution_resp == False
+		assert fn_params["asset_A_revert_fn"].called and not fn_params["order_state_fn"].called
+
+	def test_async_leg_with_lost_reply_looked_up(self):
+		fn_params 						= self._ws_fn_params(asset_A_resp = {"id" : "PERP0", "code" : "0"}, asset_B_resp = {})
+		fn_params["asset_B_order_fn"] 	= self._lost_reply_order_fn()
+		fn_params["order_state_fn"] 	= coroutine_mock(return_value = {"ordId" : "12", "clOrdId" : "PAIR1B", "state" : "filled", "accFillSz" : "1"})
+		execution_resp 					= asyncio.new_event_loop().run_until_complete(self.bot_executor._idempotent_trade_execution_async(**fn_params))
+		assert execution_resp == True and not fn_params["asset_A_revert_fn"].called
+		client_order_id = fn_params["asset_B_order_fn"].call_args[1]["client_order_id"]
+		assert fn_params["order_state_fn"].call_args[1]["order_params"]["client_order_id"] == client_order_id
+		assert fn_params["asset_A_order_fn"].call_args[1]["client_order_id"] != client_order_id
+
+	def test_async_leg_with_lost_reply_not_received_is_failed(self):
+		fn_params 						= self._ws_fn_params(asset_A_resp = {"id" : "PERP0", "code" : "0"}, asset_B_resp = {})
+		fn_params["asset_B_order_fn"] 	= self._lost_reply_order_fn()
+		fn_params["order_state_fn"] 	= coroutine_mock(return_value = None)
+		execution_resp 					= asyncio.new_event_loop().run_until_complete(self.bot_executor._idempotent_trade_execution_async(**fn_params))
+		assert execution_resp == False and fn_params["asset_A_revert_fn"].called
+
+	def test_async_open_leg_handed_to_unwind_engine(self):
+		fn_params 					= self._ws_fn_params(asset_A_resp = {"id" : "PERP0", "code" : "0"}, asset_B_resp = {"id" : "SPOT1", "code" : "1"})
+		fn_params["unwind_engine"] 	= UnwindEngine(max_attempts = 2, retry_interval_s = 0)
+		fn_params["asset_A_revert_params"] = {"order_side" : "buy", "size" : 1}
+		execution_resp 				= asyncio.new_event_loop().run_until_complete(self.bot_executor._idempotent_trade_execution_async(**fn_params))
+		assert execution_resp == False
+		assert fn_params["asset_A_revert_fn"].call_count == 1 and not fn_params["asset_B_revert_fn"].called
+		assert fn_params["unwind_engine"].summary()["time_to_flat"]["count"] == 1
+
+	def _batch_fn_params(self, asset_A_code: str, asset_B_code: str):
+		fn_params = self._ws_fn_params(asset_A_resp = {"code" : asset_A_code}, asset_B_resp = {"code" : asset_B_code})
+		fn_params["asset_A_type"] 	= "perpetual"
+		fn_params["asset_B_type"] 	= "spot"
+		fn_params["batch_order_fn"] = MagicMock(side_effect = lambda legs: self._ws_order_fn(resp = {"codes" : [asset_A_code, asset_B_code] if len(legs) == 2 else ["0"]})(legs = legs))
+		fn_params["batch_split_fn"] = MagicMock(side_effect = lambda order_resp, legs: [{"code" : each_code} for each_code in order_resp["codes"]])
+		return fn_params
+
+	def test_batch_trade_execution_sends_both_legs_in_one_message(self):
+		fn_params 		= self._batch_fn_params(asset_A_code = "0", asset_B_code = "0")
+		execution_resp 	= asyncio.new_event_loop().run_until_complete(self.bot_executor._idempotent_trade_execution_async(**fn_params))
+		assert execution_resp == True
+		fn_params["batch_order_fn"].assert_called_once_with(legs = [("perpetual", fn_params["asset_A_params"]), ("spot", fn_params["asset_B_params"])])
+		assert not fn_params["asset_A_order_fn"].called and not fn_params["asset_B_order_fn"].called
+
+	def test_batch_trade_execution_reverts_through_batch(self):
+		fn_params 		= self._batch_fn_params(asset_A_code = "0", asset_B_code = "51008")
+		fn_params["asset_A_revert_params"] = {"order_side" : "buy"}
+		execution_resp 	= asyncio.new_event_loop().run_until_complete(self.bot_executor._idempotent_trade_execution_async(**fn_params))
+		assert execution_resp == False
+		assert fn_params["batch_order_fn"].call_count == 2
+		fn_params["batch_order_fn"].assert_called_with(legs = [("perpetual", {"order_side" : "buy"})])
+		assert not fn_params["asset_A_revert_fn"].called and not fn_params["asset_B_revert_fn"].called
\ No newline at end of file
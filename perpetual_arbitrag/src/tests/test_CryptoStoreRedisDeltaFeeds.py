@@ -0,0 +1,86 @@
+from feeds.CryptoStoreRedisDeltaFeeds import CryptoStoreRedisDeltaFeeds
+from unittest import TestCase
+from unittest.mock import patch
+
+class TestCryptoStoreRedisDeltaFeeds(TestCase):
+	def setUp(self):
+		self.cli = CryptoStoreRedisDeltaFeeds(redis_url = None, redis_port = None, permissible_latency_s = 5)
+		self.entries = [
+			(b'{"exchange":"OKX","symbol":"DOT-USDT-PERP","delta":{"bid":[["18.0",1]],"ask":[]},"timestamp":1647401539.0,"receipt_timestamp":1647401539.1}', 1647401539.0),
+			(b'{"exchange":"OKX","symbol":"DOT-USDT-PERP","book":{"bid":{"18.081":1,"18.08":95},"ask":{"18.082":36,"18.083":49}},"timestamp":1647401540.0,"receipt_timestamp":1647401540.1}', 1647401540.0),
+			(b'{"exchange":"OKX","symbol":"DOT-USDT-PERP","delta":{"bid":[["18.081",0]],"ask":[["18.0815",2]]},"timestamp":1647401541.0,"receipt_timestamp":1647401541.1}', 1647401541.0),
+		]
+		return
+
+	@patch("redis.Redis")
+	def test_resync_from_latest_snapshot(self, mock_redis):
+		mock_redis.zrange.return_value = self.entries
+		self.cli.redis_cli = mock_redis
+
+		order_book = self.cli.sorted_order_book(symbol = "DOT-USDT-SWAP", exchange = "OKX")
+		assert(	order_book["bids"] == [(18.08, 95)] and 
+				order_book["asks"] == [(18.0815, 2), (18.082, 36), (18.083, 49)] and 
+				order_book["updated"] == 1647401541.0)
+
+	@patch("redis.Redis")
+	def test_only_newer_entries_are_read(self, mock_redis):
+		mock_redis.zrange.return_value = self.entries[:2]
+		# Reads include the last applied entry, which is skipped
+		mock_redis.zrangebyscore.return_value = self.entries[1:]
+		self.cli.redis_cli = mock_redis
+
+		self.cli.sorted_order_book(symbol = "DOT-USDT-SWAP", exchange = "OKX")
+		order_book = self.cli.sorted_order_book(symbol = "DOT-USDT-SWAP", exchange = "OKX")
+		mock_redis.zrangebyscore.assert_called_once_with("book-OKX-DOT-USDT-PERP", 1647401540.0, "+inf", withscores = True)
+		assert(order_book["bids"] == [(18.08, 95)] and order_book["asks"] == [(18.0815, 2), (18.082, 36), (18.083, 49)])
+		mock_redis.zrange.assert_called_once()
+
+	@patch("redis.Redis")
+	def test_delta_with_same_score_is_applied(self, mock_redis):
+		same_score = (b'{"exchange":"OKX","symbol":"DOT-USDT-PERP","delta":{"bid":[["18.08",0]],"ask":[]},"timestamp":1647401540.0,"receipt_timestamp":1647401540.2}', 1647401540.0)
+		mock_redis.zrange.return_value = self.entries[:2]
+		mock_redis.zrangebyscore.return_value = [self.entries[1], same_score]
+		self.cli.redis_cli = mock_redis
+
+		self.cli.sorted_order_book(symbol = "DOT-USDT-SWAP", exchange = "OKX")
+		assert(self.cli.sorted_order_book(symbol = "DOT-USDT-SWAP", exchange = "OKX")["bids"] == [(18.081, 1)])
+		# Both entries at the score are applied only once
+		assert(self.cli.sorted_order_book(symbol = "DOT-USDT-SWAP", exchange = "OKX")["bids"] == [(18.081, 1)])
+
+	@patch("redis.Redis")
+	def test_pruned_entries_force_resync(self, mock_redis):
+		mock_redis.zrange.return_value = self.entries[:2]
+		mock_redis.zrangebyscore.return_value = self.entries[2:]
+		self.cli.redis_cli = mock_redis
+
+		self.cli.sorted_order_book(symbol = "DOT-USDT-SWAP", exchange = "OKX")
+		mock_redis.zrange.return_value = self.entries
+		order_book = self.cli.sorted_order_book(symbol = "DOT-USDT-SWAP", exchange = "OKX")
+		assert(mock_redis.zrange.call_count == 2 and order_book["updated"] == 1647401541.0)
+
+	@patch("redis.Redis")
+	def test_missing_snapshot_raises(self, mock_redis):
+		mock_redis.zrange.return_value = self.entries[:1]
+		self.cli.redis_cli = mock_redis
+
+		with self.assertRaises(AssertionError):
+			self.cli.sorted_order_book(symbol = "DOT-USDT-SWAP", exchange = "OKX")
+
+	@patch("redis.Redis")
+	def test_tracked_entry_sizes_are_cached(self, mock_redis):
+		mock_redis.zrange.return_value = self.entries
+		self.cli.redis_cli = mock_redis
+		self.cli.track_entry_sizes(exchange = "OKX", symbol = "DOT-USDT-SWAP", sizes = [10])
+
+		order_book = self.cli.sorted_order_book(symbol = "DOT-USDT-SWAP", exchange = "OKX")
+		assert(("asks", 10) in order_book.cached_average_prices and ("bids", 10) in order_book.cached_average_prices)
+
+	@patch("redis.Redis")
+	def test_sorted_order_books_pipelines_new_entries(self, mock_redis):
+		mock_redis.zrange.return_value = self.entries[:2]
+		pipe = mock_redis.pipeline.return_value
+		pipe.execute.return_value = [self.entries[1:]]
+		self.cli.redis_cli = mock_redis
+
+		[order_book] = self.cli.sorted_order_books(exchange = "OKX", symbols = ["DOT-USDT-SWAP"])
+		assert(pipe.zrangebyscore.call_count == 1 and order_book["bids"] == [(18.08, 95)])
\ No newline at end of file
@@ -1,6 +1,7 @@
 import copy
 import redis
 from feeds.CryptoStoreRedisFeeds import CryptoStoreRedisFeeds, assert_latency
+from feeds.OrderBookEncoding import encode_order_book
 from freezegun import freeze_time
 from unittest import TestCase
 from unittest.mock import patch
@@ -51,4 +52,116 @@ class TestCryptoStoreRedisFeeds(TestCase):
 		input_symbol 	= "DOT-USDT-SWAP"
 		input_exchange 	= "OKX"
 		expected_symbol = "DOT-USDT-PERP"
-		assert(self.cli.symbol_to_key_mapping(symbol = input_symbol, exchange = input_exchange) == expected_symbol)
\ No newline at end of file
+		assert(self.cli.symbol_to_key_mapping(symbol = input_symbol, exchange = input_exchange) == expected_symbol)
+
+	@patch("redis.Redis")
+	def test_subscribed_order_book_served_from_memory(self, mock_redis):
+		mock_redis.zrange.return_value = ['{"exchange":"OKX","symbol":"DOT-USDT-PERP","book":{"bid":{"18.081":1},"ask":{"18.082":36}},"timestamp":1647401540.262,"receipt_timestamp":1647401540.288211}']
+		self.cli.redis_cli = mock_redis
+		self.cli.subscribe(exchange = "OKX", symbols = ["DOT-USDT-SWAP"])
+		mock_redis.zrange.reset_mock()
+
+		order_book = self.cli.sorted_order_book(symbol = "DOT-USDT-SWAP", exchange = "OKX")
+		assert(order_book["updated"] == 1647401540.262 and not mock_redis.zrange.called)
+
+	@patch("redis.Redis")
+	def test_keyspace_event_refreshes_book_and_wakes_waiter(self, mock_redis):
+		mock_redis.zrange.return_value = ['{"exchange":"OKX","symbol":"DOT-USDT-PERP","book":{"bid":{"18.081":1},"ask":{"18.082":36}},"timestamp":1647401540.262,"receipt_timestamp":1647401540.288211}']
+		self.cli.redis_cli = mock_redis
+		self.cli.subscribe(exchange = "OKX", symbols = ["DOT-USDT-SWAP"])
+		assert(not self.cli.wait_for_update(timeout_s = 0))
+
+		mock_redis.zrange.return_value = ['{"exchange":"OKX","symbol":"DOT-USDT-PERP","book":{"bid":{"18.081":1},"ask":{"18.082":36}},"timestamp":1647401541.262,"receipt_timestamp":1647401541.288211}']
+		self.cli._on_keyspace_event({"channel" : b"__keyspace@0__:book-OKX-DOT-USDT-PERP", "data" : b"zadd"})
+		assert(self.cli.wait_for_update(timeout_s = 0))
+		assert(self.cli.sorted_order_book(symbol = "DOT-USDT-SWAP", exchange = "OKX")["updated"] == 1647401541.262)
+
+	@patch("redis.Redis")
+	def test_keyspace_event_marks_symbol_updated(self, mock_redis):
+		mock_redis.zrange.return_value = ['{"exchange":"OKX","symbol":"DOT-USDT-PERP","book":{"bid":{"18.081":1},"ask":{"18.082":36}},"timestamp":1647401540.262,"receipt_timestamp":1647401540.288211}']
+		self.cli.redis_cli = mock_redis
+		self.cli.subscribe(exchange = "OKX", symbols = ["DOT-USDT-SWAP", "DOT-USDT"])
+		assert(self.cli.pop_updated_symbols() == set())
+
+		self.cli._on_keyspace_event({"channel" : b"__keyspace@0__:book-OKX-DOT-USDT-PERP", "data" : b"zadd"})
+		assert(self.cli.pop_updated_symbols() == {"DOT-USDT-SWAP"})
+		assert(self.cli.pop_updated_symbols() == set())
+
+	@patch("redis.Redis")
+	def test_keyspace_prune_event_ignored(self, mock_redis):
+		mock_redis.zrange.return_value = ['{"exchange":"OKX","symbol":"DOT-USDT-PERP","book":{"bid":{"18.081":1},"ask":{"18.082":36}},"timestamp":1647401540.262,"receipt_timestamp":1647401540.288211}']
+		self.cli.redis_cli = mock_redis
+		self.cli.subscribe(exchange = "OKX", symbols = ["DOT-USDT-SWAP"])
+		mock_redis.zrange.reset_mock()
+
+		self.cli._on_keyspace_event({"channel" : b"__keyspace@0__:book-OKX-DOT-USDT-PERP", "data" : b"zremrangebyscore"})
+		assert(not mock_redis.zrange.called and not self.cli.wait_for_update(timeout_s = 0))
+
+	@patch("redis.Redis")
+	def test_sorted_order_books_fetched_in_single_pipeline(self, mock_redis):
+		mock_pipe = mock_redis.pipeline.return_value
+		mock_pipe.execute.return_value = [	['{"exchange":"OKX","symbol":"DOT-USDT","book":{"bid":{"18.07":1},"ask":{"18.09":2}},"timestamp":1647401540.1,"receipt_timestamp":1647401540.2}'],
+											['{"exchange":"OKX","symbol":"DOT-USDT-PERP","book":{"bid":{"18.081":1},"ask":{"18.082":36}},"timestamp":1647401540.262,"receipt_timestamp":1647401540.288211}']]
+		self.cli.redis_cli = mock_redis
+
+		(spot_book, perp_book) = self.cli.sorted_order_books(exchange = "OKX", symbols = ["DOT-USDT", "DOT-USDT-SWAP"])
+		assert(mock_pipe.execute.call_count == 1 and not mock_redis.zrange.called)
+		assert(spot_book["updated"] == 1647401540.1 and perp_book["updated"] == 1647401540.262)
+		assert(mock_pipe.zrange.call_args_list[1][0][0] == "book-OKX-DOT-USDT-PERP")
+
+	@patch("redis.Redis")
+	def test_binary_encoded_order_book(self, mock_redis):
+		mock_redis.zrange.return_value = [encode_order_book(bids = [[18.081, 1], [18.08, 95]], asks = [[18.082, 36]], timestamp = 1647401540.262)]
+		self.cli.encoding 	= "binary"
+		self.cli.redis_cli 	= mock_redis
+
+		order_book = self.cli.sorted_order_book(symbol = "DOT-USDT-SWAP", exchange = "OKX")
+		assert(order_book["bids"].tolist() == [[18.081, 1], [18.08, 95]] and order_book["asks"].tolist() == [[18.082, 36]])
+		assert(order_book["updated"] == 1647401540.262)
+
+	@patch("redis.Redis")
+	def test_reads_recorded_in_metrics(self, mock_redis):
+		mock_redis.zrange.return_value = ['{"exchange":"OKX","symbol":"DOT-USDT-PERP","book":{"bid":{"18.081":1},"ask":{"18.082":36}},"timestamp":1647401540.262,"receipt_timestamp":1647401540.288211}']
+		self.cli.redis_cli = mock_redis
+
+		order_book = self.cli.sorted_order_book(symbol = "DOT-USDT-SWAP", exchange = "OKX")
+		metrics 	= self.cli.metrics.summary()["OKX:DOT-USDT-PERP"]
+		assert(order_book["received"] == 1647401540.288211)
+		assert(metrics["reads"] == 1 and metrics["stale_reads"] == 1 and metrics["exchange_to_receipt"]["count"] == 1)
+
+	@patch("redis.Redis")
+	def test_depth_limited_by_size(self, mock_redis):
+		mock_redis.zrange.return_value = ['{"exchange":"OKX","symbol":"DOT-USDT-PERP","book":{"bid":{"18.081":1,"18.08":95,"18.077":58,"18.076":103},"ask":{"18.082":36,"18.083":49,"18.084":6,"18.085":7}},"timestamp":1647401540.262,"receipt_timestamp":1647401540.288211}']
+		self.cli.redis_cli = mock_redis
+
+		order_book = self.cli.sorted_order_book(symbol = "DOT-USDT-SWAP", exchange = "OKX", max_size = 40)
+		assert(order_book["bids"] == [(18.081, 1), (18.08, 95)] and order_book["asks"] == [(18.082, 36), (18.083, 49)])
+
+	@patch("redis.Redis")
+	def test_depth_limited_by_levels(self, mock_redis):
+		mock_redis.zrange.return_value = ['{"exchange":"OKX","symbol":"DOT-USDT-PERP","book":{"bid":{"18.081":1,"18.08":95,"18.077":58,"18.076":103},"ask":{"18.082":36,"18.083":49,"18.084":6,"18.085":7}},"timestamp":1647401540.262,"receipt_timestamp":1647401540.288211}']
+		self.cli.redis_cli = mock_redis
+		self.cli.limit_depth(exchange = "OKX", symbol = "DOT-USDT-SWAP", max_levels = 1)
+
+		order_book = self.cli.sorted_order_book(symbol = "DOT-USDT-SWAP", exchange = "OKX")
+		assert(order_book["bids"] == [(18.081, 1)] and order_book["asks"] == [(18.082, 36)])
+
+	@patch("redis.Redis")
+	def test_binary_depth_limited_by_size(self, mock_redis):
+		mock_redis.zrange.return_value = [encode_order_book(bids = [[18.081, 1], [18.08, 95], [18.077, 58]], asks = [[18.082, 36], [18.083, 49], [18.084, 6]], timestamp = 1647401540.262)]
+		self.cli.redis_cli = mock_redis
+		self.cli.encoding = "binary"
+
+		order_book = self.cli.sorted_order_book(symbol = "DOT-USDT-SWAP", exchange = "OKX", max_size = 36)
+		assert(order_book["bids"].tolist() == [[18.081, 1], [18.08, 95]] and order_book["asks"].tolist() == [[18.082, 36]])
+
+	@patch("redis.Redis")
+	def test_update_while_waking_is_not_lost(self, mock_redis):
+		mock_redis.zrange.return_value = ['{"exchange":"OKX","symbol":"DOT-USDT-PERP","book":{"bid":{"18.081":1},"ask":{"18.082":36}},"timestamp":1647401540.262,"receipt_timestamp":1647401540.288211}']
+		self.cli.redis_cli = mock_redis
+		self.cli.subscribe(exchange = "OKX", symbols = ["DOT-USDT-SWAP"])
+		self.cli._on_keyspace_event({"channel" : b"__keyspace@0__:book-OKX-DOT-USDT-PERP", "data" : b"zadd"})
+		assert(self.cli.wait_for_update(timeout_s = 0))
+		# A book arriving after the waiter woke up wakes the next wait
+		self.cli._on_keyspace_event({"channel" : b"__keyspace@0__:book-OKX-DOT-USDT-PERP", "data" : b"zadd"})
+		assert(self.cli.wait_for_update(timeout_s = 0) and not self.cli.wait_for_update(timeout_s = 0))
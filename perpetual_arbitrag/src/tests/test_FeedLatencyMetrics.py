@@ -0,0 +1,40 @@
+from feeds.FeedLatencyMetrics import FeedLatencyMetrics, LatencyHistogram
+from unittest import TestCase
+
+class TestFeedLatencyMetrics(TestCase):
+	def setUp(self):
+		self.metrics = FeedLatencyMetrics()
+		return
+
+	def test_histogram_quantiles(self):
+		histogram = LatencyHistogram()
+		for latency_s in [0.001] * 98 + [0.04, 20]:
+			histogram.record(latency_s = latency_s)
+		assert(histogram.quantile_ms(0.5) == 1 and histogram.quantile_ms(0.99) == 50 and histogram.quantile_ms(1) == 20000)
+		assert(histogram.summary()["count"] == 100 and histogram.summary()["buckets"] == {"<=1" : 98, "<=50" : 1, "<=inf" : 1})
+
+	def test_empty_histogram(self):
+		assert(LatencyHistogram().quantile_ms(0.5) is None)
+
+	def test_receipt_recorded_once_per_book(self):
+		order_book = {"bids" : [], "asks" : [], "updated" : 100, "received" : 100.002}
+		self.metrics.record_receipt(exchange = "OKX", symbol = "BTC-USDT", order_book = order_book)
+		self.metrics.record_receipt(exchange = "OKX", symbol = "BTC-USDT", order_book = order_book)
+		assert(self.metrics.symbols[("OKX", "BTC-USDT")].exchange_to_receipt.total == 1)
+
+	def test_read_counts_stale_books(self):
+		order_book = {"bids" : [], "asks" : [], "updated" : 100, "received" : 100.002}
+		self.metrics.record_read(exchange = "OKX", symbol = "BTC-USDT", order_book = order_book, permissible_latency_s = 0.05, now = 100.01)
+		self.metrics.record_read(exchange = "OKX", symbol = "BTC-USDT", order_book = order_book, permissible_latency_s = 0.05, now = 100.1)
+		summary = self.metrics.summary()["OKX:BTC-USDT"]
+		assert(summary["reads"] == 2 and summary["stale_reads"] == 1 and summary["receipt_to_read"]["count"] == 2)
+
+	def test_read_without_receipt(self):
+		order_book = {"bids" : [], "asks" : [], "updated" : 100}
+		self.metrics.record_read(exchange = "OKX", symbol = "BTC-USDT", order_book = order_book, permissible_latency_s = 0.05, now = 100.01)
+		assert(self.metrics.summary()["OKX:BTC-USDT"]["receipt_to_read"]["count"] == 0)
+
+	def test_check_latency(self):
+		assert(abs(self.metrics.check_latency(exchange = "OKX", symbol = "BTC-USDT", updated = 100, permissible_latency_s = 0.05, now = 100.01) - 0.01) < 1e-9)
+		with self.assertRaises(AssertionError):
+			self.metrics.check_latency(exchange = "OKX", symbol = "BTC-USDT", updated = 100, permissible_latency_s = 0.05, now = 100.1)
\ No newline at end of file
@@ -0,0 +1,48 @@
+from feeds.LocalOrderBook import LocalOrderBook
+from unittest import TestCase
+
+class TestLocalOrderBook(TestCase):
+	def setUp(self):
+		self.local_book = LocalOrderBook(entry_sizes = [15])
+		self.local_book.apply_snapshot(bids = [(20, 10), (30, 10), (10, 10)], asks = [(50, 10), (40, 10), (60, 10)], timestamp = 1647489600)
+		return
+
+	def test_snapshot_is_sorted(self):
+		order_book = self.local_book.to_order_book()
+		assert(	order_book["bids"] == [(30, 10), (20, 10), (10, 10)] and 
+				order_book["asks"] == [(40, 10), (50, 10), (60, 10)] and 
+				order_book["updated"] == 1647489600)
+
+	def test_delta_inserts_updates_and_removes_levels(self):
+		self.local_book.apply_delta(bids = [(25, 5), (30, 0)], asks = [(40, 3)], timestamp = 1647489601)
+		order_book = self.local_book.to_order_book()
+		assert(	order_book["bids"] == [(25, 5), (20, 10), (10, 10)] and 
+				order_book["asks"] == [(40, 3), (50, 10), (60, 10)] and 
+				order_book["updated"] == 1647489601)
+
+	def test_entry_size_average_prices(self):
+		order_book = self.local_book.to_order_book()
+		assert(order_book.cached_average_prices == {("bids", 15) : (30 * 10 + 20 * 5) / 15, ("asks", 15) : (40 * 10 + 50 * 5) / 15})
+		assert(order_book.average_bid_price(size = 15) == (30 * 10 + 20 * 5) / 15)
+
+	def test_entry_size_average_prices_follow_deltas(self):
+		self.local_book.apply_delta(bids = [(30, 0)], asks = [(45, 10)], timestamp = 1647489601)
+		order_book = self.local_book.to_order_book()
+		assert(	order_book.average_bid_price(size = 15) == (20 * 10 + 10 * 5) / 15 and 
+				order_book.average_ask_price(size = 15) == (40 * 10 + 45 * 5) / 15)
+
+	def test_delta_beyond_consumed_depth_skips_recompute(self):
+		self.local_book.asks.average_prices[15] = -1
+		self.local_book.apply_delta(bids = [], asks = [(60, 1), (70, 5)], timestamp = 1647489601)
+		assert(self.local_book.asks.average_prices[15] == -1)
+
+	def test_entry_size_beyond_book_uses_all_levels(self):
+		local_book = LocalOrderBook(entry_sizes = [100]).apply_snapshot(bids = [(30, 10), (20, 10)], asks = [], timestamp = 1647489600)
+		order_book = local_book.to_order_book()
+		assert(order_book.cached_average_prices == {("bids", 100) : 25})
+
+	def test_order_book_cached_until_update(self):
+		order_book = self.local_book.to_order_book()
+		assert(self.local_book.to_order_book() is order_book)
+		self.local_book.apply_delta(bids = [(5, 1)], asks = [], timestamp = 1647489601)
+		assert(self.local_book.to_order_book() is not order_book)
\ No newline at end of file
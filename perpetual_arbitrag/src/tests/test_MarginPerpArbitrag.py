@@ -1,4 +1,5 @@
 import copy
+import numpy as np
 from strategies.MarginPerpArbitrag import MarginPerpArbitrag, MarginPerpExecutionDecision, MarginPerpTradePosition
 from strategies.SingleTradeArbitragV2 import ExecutionDecision, TradePosition
 from unittest import TestCase
@@ -105,4 +106,46 @@ class TestMarginPerpArbitrag(TestCase):
 												perp_funding_rate = 0,
 												perp_estimated_funding_rate = 0,
 												entry_threshold = 0,
-												take_profit_threshold = 0) == MarginPerpExecutionDecision.TAKE_PROFIT_LONG_PERP_SHORT_MARGIN)
\ No newline at end of file
+												take_profit_threshold = 0) == MarginPerpExecutionDecision.TAKE_PROFIT_LONG_PERP_SHORT_MARGIN)
+
+	def test_batch_trade_decision_matches_trade_decision(self):
+		cases 	= [	# margin_bid, margin_ask, interest, perp_bid, perp_ask, funding, margin_position, perp_position
+					(100, 101, 0.001, 110, 111, 0.001, 0, 0),
+					(100, 101, 0.001, 110, 111, 0.001, 10, -10),
+					(110, 111, 0.001, 100, 101, -0.001, 1, -1),
+					(110, 111, 0.001, 100, 101, -0.001, 0, 0),
+					(100, 101, 0.001, 100, 101, 0, -1, 1),
+				]
+		(margin_bid, margin_ask, interest, perp_bid, perp_ask, funding, margin_position, perp_position) = [np.array(each) for each in zip(*cases)]
+		codes 	= MarginPerpArbitrag.batch_trade_decision(	margin_bid_price 			= margin_bid,
+															margin_ask_price 			= margin_ask,
+															margin_quote_interest_rate 	= interest,
+															margin_base_interest_rate 	= interest,
+															perp_bid_price 				= perp_bid,
+															perp_ask_price 				= perp_ask,
+															perp_funding_rate 			= funding,
+															perp_estimated_funding_rate = funding,
+															current_margin_position 	= margin_position,
+															max_margin_position 		= 10,
+															current_perp_position 		= perp_position,
+															max_perp_position 			= 10,
+															entry_threshold 			= 0.01,
+															take_profit_threshold 		= 0.01,
+														)
+		for (i, each) in enumerate(cases):
+			_strategy 	= copy.deepcopy(self.strategy)
+			_strategy.change_asset_holdings(delta_margin = each[6], delta_perp = each[7])
+			decision 	= _strategy.trade_decision(	margin_bid_price 			= each[0],
+													margin_ask_price 			= each[1],
+													margin_quote_interest_rate 	= each[2],
+													margin_base_interest_rate 	= each[2],
+													perp_bid_price 				= each[3],
+													perp_ask_price 				= each[4],
+													perp_funding_rate 			= each[5],
+													perp_estimated_funding_rate = each[5],
+													entry_threshold 			= 0.01,
+													take_profit_threshold 		= 0.01,
+												)
+			assert(MarginPerpExecutionDecision(codes[i]) == decision)
+		assert(MarginPerpExecutionDecision(codes[0]) == MarginPerpExecutionDecision.GO_LONG_MARGIN_SHORT_PERP)
+		assert(MarginPerpExecutionDecision(codes[2]) == MarginPerpExecutionDecision.TAKE_PROFIT_LONG_MARGIN_SHORT_PERP)
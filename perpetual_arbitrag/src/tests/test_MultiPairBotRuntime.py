@@ -0,0 +1,128 @@
+import asyncio
+import time
+from execution.FailSafeTrigger import FailSafeException
+from execution.MultiPairBotRuntime import MultiPairBotRuntime
+from unittest import TestCase
+from unittest.mock import MagicMock
+from CoroutineMock import coroutine_mock
+
+class TestMultiPairBotRuntime(TestCase):
+	def setUp(self):
+		self.loop 			= asyncio.new_event_loop()
+		self.api_client 	= MagicMock()
+		self.api_client.maintain_connection_async = coroutine_mock(return_value = None)
+		self.feed_client 	= MagicMock()
+		self.evaluations 	= {"BTC" : 0, "ETH" : 0}
+		return
+
+	def tearDown(self):
+		self.loop.close()
+		return
+
+	def _runtime(self, feed_push = True, poll_interval_s = 0.01):
+		return MultiPairBotRuntime(	api_client 				= self.api_client,
+									feed_client 			= self.feed_client,
+									poll_interval_s 		= poll_interval_s,
+									heartbeat_interval_s 	= 0.01,
+									retry_timeout_s 		= 0.01,
+									feed_push 				= feed_push,
+									stop_exceptions 		= (FailSafeException, )
+								)
+
+	def _evaluate_fn(self, name: str, stop_after: int):
+		async def _evaluate():
+			self.evaluations[name] += 1
+			if self.evaluations[name] >= stop_after:
+				raise FailSafeException(trigger = self.evaluations[name])
+		return _evaluate
+
+	def _pushed_updates(self, updates: list):
+		def _wait_for_update(timeout_s):
+			time.sleep(0.001)
+			return True
+		self.feed_client.wait_for_update.side_effect 		= _wait_for_update
+		self.feed_client.pop_updated_symbols.side_effect 	= updates + [set()] * 1000
+		return
+
+	async def _run_until(self, runtime, evaluations: dict):
+		run_task = asyncio.ensure_future(runtime.run())
+		while any(self.evaluations[each_name] < each_count for (each_name, each_count) in evaluations.items()):
+			await asyncio.sleep(0.001)
+		run_task.cancel()
+		return
+
+	def test_only_pairs_with_updated_books_are_evaluated(self):
+		self._pushed_updates(updates = [{"BTC-USDT"}, {"BTC-USDT-SWAP"}, {"BTC-USDT"}])
+		# ETH is not idle for poll_interval_s within the test
+		runtime = self._runtime(poll_interval_s = 10)
+		runtime.add_pair(name = "BTC", symbols = ["BTC-USDT", "BTC-USDT-SWAP"], evaluate_fn = self._evaluate_fn(name = "BTC", stop_after = 4))
+		runtime.add_pair(name = "ETH", symbols = ["ETH-USDT", "ETH-USDT-SWAP"], evaluate_fn = self._evaluate_fn(name = "ETH", stop_after = 2))
+		self.loop.run_until_complete(asyncio.wait_for(self._run_until(runtime = runtime, evaluations = {"BTC" : 4}), timeout = 2))
+		# Both pairs are evaluated once on start, after which ETH books never change
+		assert(self.evaluations == {"BTC" : 4, "ETH" : 1})
+
+	def test_idle_pair_is_woken_while_other_books_change(self):
+		self._pushed_updates(updates = [{"BTC-USDT"}] * 5000)
+		runtime = self._runtime(poll_interval_s = 0.02)
+		runtime.add_pair(name = "BTC", symbols = ["BTC-USDT", "BTC-USDT-SWAP"], evaluate_fn = self._evaluate_fn(name = "BTC", stop_after = 10000))
+		runtime.add_pair(name = "ETH", symbols = ["ETH-USDT", "ETH-USDT-SWAP"], evaluate_fn = self._evaluate_fn(name = "ETH", stop_after = 10000))
+		self.loop.run_until_complete(asyncio.wait_for(self._run_until(runtime = runtime, evaluations = {"ETH" : 3}), timeout = 2))
+		# Every wait_for_update returns an update of BTC books before poll_interval_s, but ETH is still evaluated every poll_interval_s
+		assert(self.evaluations["BTC"] > self.evaluations["ETH"])
+
+	def test_stopped_pair_does_not_stop_other_pairs(self):
+		self._pushed_updates(updates = [{"BTC-USDT", "ETH-USDT"}] * 10)
+		runtime = self._runtime()
+		runtime.add_pair(name = "BTC", symbols = ["BTC-USDT", "BTC-USDT-SWAP"], evaluate_fn = self._evaluate_fn(name = "BTC", stop_after = 1))
+		runtime.add_pair(name = "ETH", symbols = ["ETH-USDT", "ETH-USDT-SWAP"], evaluate_fn = self._evaluate_fn(name = "ETH", stop_after = 5))
+		self.loop.run_until_complete(asyncio.wait_for(runtime.run(), timeout = 2))
+		assert(self.evaluations == {"BTC" : 1, "ETH" : 5})
+		self.feed_client.wake_waiters.assert_called_once_with()
+
+	def test_shared_symbol_wakes_every_pair_trading_it(self):
+		self._pushed_updates(updates = [{"BTC-USDT-SWAP"}] * 10)
+		runtime = self._runtime()
+		runtime.add_pair(name = "BTC", symbols = ["BTC-USDT", "BTC-USDT-SWAP"], evaluate_fn = self._evaluate_fn(name = "BTC", stop_after = 3))
+		runtime.add_pair(name = "ETH", symbols = ["BTC-USDT-MARGIN", "BTC-USDT-SWAP"], evaluate_fn = self._evaluate_fn(name = "ETH", stop_after = 3))
+		self.loop.run_until_complete(asyncio.wait_for(runtime.run(), timeout = 2))
+		assert(self.evaluations == {"BTC" : 3, "ETH" : 3})
+
+	def test_polled_feed_evaluates_every_pair(self):
+		runtime = self._runtime(feed_push = False)
+		runtime.add_pair(name = "BTC", symbols = ["BTC-USDT"], evaluate_fn = self._evaluate_fn(name = "BTC", stop_after = 3))
+		runtime.add_pair(name = "ETH", symbols = ["ETH-USDT"], evaluate_fn = self._evaluate_fn(name = "ETH", stop_after = 3))
+		self.loop.run_until_complete(asyncio.wait_for(runtime.run(), timeout = 2))
+		assert(self.evaluations == {"BTC" : 3, "ETH" : 3})
+		self.feed_client.pop_updated_symbols.assert_not_called()
+
+	def test_failed_evaluation_is_retried(self):
+		self._pushed_updates(updates = [])
+		async def _evaluate():
+			self.evaluations["BTC"] += 1
+			if self.evaluations["BTC"] < 3:
+				raise Exception("order failed")
+			raise FailSafeException(trigger = 1)
+
+		runtime = self._runtime()
+		# Without book updates, the pair is re-evaluated when wait_for_update times out
+		self.feed_client.wait_for_update.side_effect = lambda timeout_s: time.sleep(timeout_s) or False
+		runtime.add_pair(name = "BTC", symbols = ["BTC-USDT"], evaluate_fn = _evaluate)
+		self.loop.run_until_complete(asyncio.wait_for(runtime.run(), timeout = 2))
+		assert(self.evaluations["BTC"] == 3)
+
+	def test_only_pairs_with_changed_inputs_are_woken(self):
+		# No book arrives within the test, so every pair is only woken on start and by its inputs
+		self.feed_client.wait_for_update.side_effect = lambda timeout_s: time.sleep(timeout_s) or False
+		runtime = MultiPairBotRuntime(	api_client 				= self.api_client,
+										feed_client 			= self.feed_client,
+										poll_interval_s 		= 1,
+										heartbeat_interval_s 	= 10,
+										retry_timeout_s 		= 0.01,
+										feed_push 				= True,
+										stop_exceptions 		= (FailSafeException, ),
+										refresh_interval_s 		= 0.005
+									)
+		runtime.add_pair(name = "BTC", symbols = ["BTC-USDT"], evaluate_fn = self._evaluate_fn(name = "BTC", stop_after = 3), refresh_fn = lambda: True)
+		runtime.add_pair(name = "ETH", symbols = ["ETH-USDT"], evaluate_fn = self._evaluate_fn(name = "ETH", stop_after = 3), refresh_fn = lambda: False)
+		self.loop.run_until_complete(asyncio.wait_for(self._run_until(runtime = runtime, evaluations = {"BTC" : 3}), timeout = 2))
+		assert(self.evaluations == {"BTC" : 3, "ETH" : 1})
@@ -1,3 +1,5 @@
+import asyncio
+import json
 import copy
 import sys
 import pytest
@@ -5,6 +7,7 @@ from clients.OkxApiClientWS import OkxApiClientWS
 from feeds.CryptoStoreRedisFeeds import CryptoStoreRedisFeeds
 from unittest import TestCase
 from unittest.mock import patch, MagicMock
+from CoroutineMock import coroutine_mock
 
 class TestOkxApiClientWS(TestCase):
 
@@ -32,6 +35,17 @@ class TestOkxApiClientWS(TestCase):
 		(avg_bids, avg_asks, ts) = self.okx_api_client.get_margin_average_bid_ask_price(symbol = "None", size = 30)
 		assert(avg_bids == 20 and avg_asks == 50 and ts == 1647489600)
 
+	def test_get_spot_perpetual_average_bid_ask_price(self):
+		self.okx_api_client.feed_client.sorted_order_books.return_value = [
+			{"bids" : [(30, 10), (20, 10), (10, 10)], "asks" : [(40, 10), (50, 10), (60, 10)], "updated" : 1647489600},
+			{"bids" : [(31, 10), (21, 10), (11, 10)], "asks" : [(41, 10), (51, 10), (61, 10)], "updated" : 1647489601}
+		]
+		((spot_bid, spot_ask, spot_ts), (perp_bid, perp_ask, perp_ts)) = self.okx_api_client.get_spot_perpetual_average_bid_ask_price(spot_symbol = "None", spot_size = 20, 
+																																	 perpetual_symbol = "None", perpetual_size = 30)
+		assert(spot_bid == 25 and spot_ask == 45 and spot_ts == 1647489600)
+		assert(perp_bid == 21 and perp_ask == 51 and perp_ts == 1647489601)
+		self.okx_api_client.feed_client.sorted_order_books.assert_called_once_with(exchange = "OKX", symbols = ["None", "None"], max_sizes = [20, 30])
+
 	def test_assert_spot_resp_no_error(self):
 		order_resp = {"code" : "0"}
 		self.okx_api_client.assert_spot_resp_error(order_resp = order_resp)
@@ -63,4 +77,222 @@ class TestOkxApiClientWS(TestCase):
 		order_resp = {"code" : "1"}
 		with self.assertRaises(Exception):
 			self.okx_api_client.assert_margin_resp_error(order_resp = order_resp)
-		return
\ No newline at end of file
+		return
+
+	def test_frame_batch_orders(self):
+		spot_params = {"symbol" : "BTC-USDT", "order_type" : "market", "order_side" : "buy", "price" : 1, "size" : 0.1, "target_currency" : "base_ccy"}
+		perp_params = {"symbol" : "BTC-USDT-SWAP", "position_side" : "short", "order_type" : "market", "order_side" : "sell", "price" : 1, "size" : 10}
+		(request_id, frame) = self.okx_api_client._frame_batch_orders(legs = [("perpetual", perp_params), ("spot", spot_params)])
+		order 		= json.loads(frame)
+		assert(order["id"] == request_id and order["op"] == "batch-orders" and len(order["args"]) == 2)
+		assert(order["args"][0]["instId"] == "BTC-USDT-SWAP" and order["args"][0]["posSide"] == "short")
+		assert(order["args"][1]["instId"] == "BTC-USDT" and order["args"][1]["tdMode"] == "cash")
+
+	def test_frame_orders_match_fields(self):
+		spot_params 	= {"symbol" : "BTC-USDT", "order_type" : "market", "order_side" : "buy", "price" : 1, "size" : 0.1, "target_currency" : "base_ccy"}
+		perp_params 	= {"symbol" : "BTC-USDT-SWAP", "position_side" : "short", "order_type" : "limit", "order_side" : "sell", "price" : 30000.5, "size" : 10}
+		margin_params 	= {"symbol" : "BTC-USDT", "ccy" : "USDT", "trade_mode" : "cross", "order_type" : "market", "order_side" : "sell", "price" : 1, "size" : 0.25}
+		(_, spot_frame) 	= self.okx_api_client._frame_spot_order(**spot_params)
+		(_, perp_frame) 	= self.okx_api_client._frame_perpetual_order(**perp_params)
+		(_, margin_frame) 	= self.okx_api_client._frame_margin_order(**margin_params)
+		assert(json.loads(spot_frame)["args"] == [{"instId" : "BTC-USDT", "tdMode" : "cash", "side" : "buy", "ordType" : "market", "sz" : 0.1, "tgtCcy" : "base_ccy", "px" : None}])
+		assert(json.loads(perp_frame)["args"] == [{"instId" : "BTC-USDT-SWAP", "tdMode" : "cross", "posSide" : "short", "side" : "sell", "ordType" : "limit", "sz" : 10, "px" : "30000.5", "reduceOnly" : True}])
+		assert(json.loads(margin_frame)["args"] == [{"instId" : "BTC-USDT", "ccy" : "USDT", "tdMode" : "cross", "side" : "sell", "ordType" : "market", "sz" : 0.25, "px" : "1", "reduceOnly" : False}])
+
+	def test_frame_order_with_client_order_id(self):
+		perp_params = {"symbol" : "BTC-USDT-SWAP", "position_side" : "short", "order_type" : "market", "order_side" : "buy", "price" : 1, "size" : 10}
+		(_, frame) 	= self.okx_api_client._frame_perpetual_order(**perp_params, client_order_id = "UNWIND1A0")
+		(_, plain) 	= self.okx_api_client._frame_perpetual_order(**perp_params)
+		assert(json.loads(frame)["args"][0]["clOrdId"] == "UNWIND1A0" and "clOrdId" not in json.loads(plain)["args"][0])
+
+	def test_order_templates_reused(self):
+		perp_params = {"symbol" : "BTC-USDT-SWAP", "position_side" : "short", "order_type" : "market", "order_side" : "sell", "price" : 1, "size" : 10}
+		self.okx_api_client.prepare_order_templates(legs = [("perpetual", perp_params)])
+		template = self.okx_api_client._perpetual_order_template(symbol = "BTC-USDT-SWAP", position_side = "short", order_type = "market", order_side = "sell")
+		(_, frame) = self.okx_api_client._frame_perpetual_order(**{**perp_params, "size" : 20})
+		assert(len(self.okx_api_client.order_templates) == 1 and template is self.okx_api_client._perpetual_order_template(symbol = "BTC-USDT-SWAP", position_side = "short", order_type = "market", order_side = "sell"))
+		assert(json.loads(frame)["args"][0]["sz"] == 20)
+
+	def test_split_batch_order_resp(self):
+		order_resp 	= {"id" : "BATCH0", "op" : "batch-orders", "code" : "2", "msg" : "", "data" : [
+						{"clOrdId" : "", "ordId" : "1", "tag" : "", "sCode" : "0", "sMsg" : ""},
+						{"clOrdId" : "", "ordId" : "", "tag" : "", "sCode" : "51008", "sMsg" : "Insufficient balance"},
+					]}
+		[perp_resp, spot_resp] = self.okx_api_client.split_batch_order_resp(order_resp = order_resp, legs = 2)
+		self.okx_api_client.assert_perpetual_resp_error(order_resp = perp_resp)
+		with self.assertRaises(Exception):
+			self.okx_api_client.assert_spot_resp_error(order_resp = spot_resp)
+		assert(perp_resp["data"][0]["ordId"] == "1")
+
+	def test_split_batch_order_resp_rejected_as_whole(self):
+		order_resp 	= {"id" : "BATCH0", "op" : "batch-orders", "code" : "60012", "msg" : "Invalid request", "data" : []}
+		leg_resps 	= self.okx_api_client.split_batch_order_resp(order_resp = order_resp, legs = 2)
+		assert(len(leg_resps) == 2 and all([each_resp["code"] == "60012" for each_resp in leg_resps]))
+
+class _FakeSocket(object):
+	def __init__(self):
+		self.sent 		= []
+		self.closed 	= False
+		self.incoming 	= asyncio.Queue()
+
+	async def send(self, message):
+		self.sent.append(message)
+
+	async def recv(self):
+		return await self.incoming.get()
+
+	async def close(self):
+		self.closed = True
+		await self.incoming.put(None)
+
+	def __aiter__(self):
+		return self
+
+	async def __anext__(self):
+		message = await self.incoming.get()
+		if message is None:
+			raise StopAsyncIteration
+		return message
+
+class TestOkxApiClientWSReplies(TestCase):
+	ws_standby = False
+
+	def setUp(self):
+		self.okx_api_client = OkxApiClientWS(api_key 			 = "123", 
+											 api_secret_key 	 = "123", 
+											 passphrase 		 = "fake_spot_passphrase",
+											 feed_client 		 = MagicMock(),
+											 funding_rate_enable = True,
+											 ws_standby 		 = self.ws_standby,
+											)
+		self.sockets = []
+		self.okx_api_client._login = coroutine_mock(side_effect = self._login)
+		self.loop 	= asyncio.new_event_loop()
+		asyncio.set_event_loop(self.loop)
+		self.loop.run_until_complete(self.okx_api_client._connect())
+		self.socket = self.sockets[0]
+		return
+
+	def _login(self, *args, **kwargs):
+		self.sockets.append(_FakeSocket())
+		return self.sockets[-1]
+
+	def _settle(self):
+		self.loop.run_until_complete(asyncio.sleep(0.01))
+		return
+
+	def tearDown(self):
+		self.loop.run_until_complete(self.okx_api_client.close_async())
+		self.loop.close()
+		return
+
+	def test_order_ids_are_unique(self):
+		ids = [self.okx_api_client._next_order_id(prefix = "SPOTbuy") for _ in range(100)]
+		assert(len(set(ids)) == 100 and all([len(each_id) <= 32 for each_id in ids]))
+
+	def test_replies_resolved_out_of_order(self):
+		async def _run():
+			first 	= await self.okx_api_client._send_request(request = {"id" : "A0", "op" : "order"})
+			second 	= await self.okx_api_client._send_request(request = {"id" : "B1", "op" : "order"})
+			await self.socket.incoming.put(json.dumps({"id" : "B1", "code" : "1"}))
+			await self.socket.incoming.put(json.dumps({"id" : "A0", "code" : "0"}))
+			return (json.loads(await first), json.loads(await second))
+		(first_resp, second_resp) = self.loop.run_until_complete(_run())
+		assert(first_resp == {"id" : "A0", "code" : "0"} and second_resp == {"id" : "B1", "code" : "1"})
+		assert(len(self.okx_api_client.pending_replies) == 0)
+
+	def test_unsolicited_messages_ignored(self):
+		async def _run():
+			reply = await self.okx_api_client._send_request(request = {"id" : "A0", "op" : "order"})
+			await self.socket.incoming.put(json.dumps({"event" : "notice", "msg" : "maintenance"}))
+			await self.socket.incoming.put(json.dumps({"id" : "C9", "code" : "0"}))
+			await self.socket.incoming.put(json.dumps({"id" : "A0", "code" : "0"}))
+			return json.loads(await reply)
+		assert(self.loop.run_until_complete(_run()) == {"id" : "A0", "code" : "0"})
+
+	def test_pong_resolved_between_replies(self):
+		async def _run():
+			reply = await self.okx_api_client._send_request(request = {"id" : "A0", "op" : "order"})
+			maintain = asyncio.ensure_future(self.okx_api_client._maintain())
+			await self.socket.incoming.put("pong")
+			await self.socket.incoming.put(json.dumps({"id" : "A0", "code" : "0"}))
+			await maintain
+			return json.loads(await reply)
+		assert(self.loop.run_until_complete(_run()) == {"id" : "A0", "code" : "0"})
+		assert(self.socket.sent[-1] == "ping")
+
+	def test_pending_replies_failed_on_drop(self):
+		async def _run():
+			reply = await self.okx_api_client._send_request(request = {"id" : "A0", "op" : "order"})
+			await self.socket.incoming.put(None)
+			with self.assertRaises(ConnectionError):
+				await reply
+		self.loop.run_until_complete(_run())
+		return
+
+	def test_reconnects_when_primary_drops(self):
+		self.loop.run_until_complete(self.socket.incoming.put(None))
+		self._settle()
+		assert(self.okx_api_client.ws_private_client is self.sockets[1] and not self.okx_api_client.reader_task.done())
+
+	def test_send_fails_once_closed(self):
+		self.loop.run_until_complete(self.okx_api_client.close_async())
+		assert(self.socket.closed and len(self.sockets) == 1)
+		with self.assertRaises(ConnectionError):
+			self.loop.run_until_complete(self.okx_api_client._send_request(request = {"id" : "A1", "op" : "order"}))
+
+	def test_failed_write_fails_reply(self):
+		async def _run():
+			self.socket.send = coroutine_mock(side_effect = ConnectionResetError("reset mid frame"))
+			reply = await self.okx_api_client._send_request(request = {"id" : "A2", "op" : "order"})
+			with self.assertRaises(ConnectionError):
+				await reply
+		self.loop.run_until_complete(_run())
+		assert("A2" not in self.okx_api_client.pending_replies)
+
+	def test_ws_lock_created_in_running_loop(self):
+		assert(self.okx_api_client.ws_lock is None)
+		self.loop.run_until_complete(self.okx_api_client.make_connection_async())
+		assert(isinstance(self.okx_api_client.ws_lock, asyncio.Lock) and not self.okx_api_client.ws_lock.locked())
+
+class TestOkxApiClientWSStandby(TestOkxApiClientWSReplies):
+	ws_standby = True
+
+	def test_standby_logged_in_after_connect(self):
+		self._settle()
+		assert(len(self.sockets) == 2 and self.okx_api_client.ws_private_client is self.sockets[0])
+		assert(self.okx_api_client.standby_task.result() is self.sockets[1])
+
+	def test_standby_swapped_in_when_primary_drops(self):
+		self._settle()
+		self.loop.run_until_complete(self.socket.incoming.put(None))
+		self._settle()
+		# The standby becomes the primary and a fresh standby is logged in behind it
+		assert(self.okx_api_client.ws_private_client is self.sockets[1])
+		assert(self.okx_api_client.standby_task.result() is self.sockets[2])
+
+	def test_standby_kept_alive_with_primary(self):
+		self._settle()
+		async def _run():
+			maintain = asyncio.ensure_future(self.okx_api_client.maintain_connection_async())
+			await self.socket.incoming.put("pong")
+			await asyncio.sleep(0.01)
+			await self.sockets[1].incoming.put("pong")
+			await maintain
+		self.loop.run_until_complete(_run())
+		assert(self.socket.sent == ["ping"] and self.sockets[1].sent == ["ping"])
+		assert(self.okx_api_client.standby_task.result() is self.sockets[1])
+
+	def test_silent_standby_replaced(self):
+		self._settle()
+		self.okx_api_client.ping_timeout_s = 0.01
+		self.loop.run_until_complete(self.okx_api_client._maintain_standby())
+		self._settle()
+		assert(self.sockets[1].closed and self.okx_api_client.standby_task.result() is self.sockets[2])
+
+	def test_send_fails_once_closed(self):
+		self._settle()
+		self.loop.run_until_complete(self.okx_api_client.close_async())
+		assert(self.socket.closed and self.sockets[1].closed and len(self.sockets) == 2)
+		with self.assertRaises(ConnectionError):
+			self.loop.run_until_complete(self.okx_api_client._send_request(request = {"id" : "A1", "op" : "order"}))
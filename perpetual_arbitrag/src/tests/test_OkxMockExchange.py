@@ -0,0 +1,111 @@
+import asyncio
+import json
+import urllib.request
+import websockets
+from clients.OkxMockExchange import OkxMockExchange
+from unittest import TestCase
+
+class TestOkxMockExchange(TestCase):
+	def setUp(self):
+		self.exchange = OkxMockExchange(ws_port = 0, rest_port = 0, book_interval_s = 0.01)
+		return
+
+	def tearDown(self):
+		self.exchange.stop()
+		return
+
+	def _order(self, side: str = "buy", inst_id: str = "BTC-USDT-SWAP", pos_side: str = "long"):
+		return {"instId" : inst_id, "tdMode" : "cross", "posSide" : pos_side, "side" : side, "ordType" : "market", "sz" : 2}
+
+	def test_order_fills_and_updates_position(self):
+		resp = self.exchange.handle_order_request(request = {"id" : "PERP1", "op" : "order", "args" : [self._order()]})
+		assert(resp["id"] == "PERP1" and resp["code"] == "0" and resp["data"][0]["sCode"] == "0")
+		assert(self.exchange.orders[resp["data"][0]["ordId"]]["state"] == "filled")
+		assert(self.exchange._positions(inst_type = "SWAP", inst_id = None)[0]["pos"] == "2.0")
+
+	def test_short_position_is_reduced_by_buys(self):
+		self.exchange.handle_order_request(request = {"id" : "1", "op" : "order", "args" : [self._order(side = "sell", pos_side = "short")]})
+		self.exchange.handle_order_request(request = {"id" : "2", "op" : "order", "args" : [self._order(side = "buy", pos_side = "short")]})
+		assert(self.exchange._positions(inst_type = "SWAP", inst_id = "BTC-USDT-SWAP")[0]["pos"] == "0.0")
+
+	def test_limit_orders_rest_and_partial_fills(self):
+		exchange 	= OkxMockExchange(rest_rate = 1)
+		limit_order = {**self._order(), "ordType" : "limit", "px" : "30000"}
+		order_id 	= exchange.handle_order_request(request = {"id" : "1", "op" : "order", "args" : [limit_order]})["data"][0]["ordId"]
+		assert(exchange.orders[order_id]["state"] == "live" and exchange.orders[order_id]["accFillSz"] == "0.0")
+		resp 		= exchange.handle_order_request(request = {"id" : "2", "op" : "cancel-order", "args" : [{"instId" : "BTC-USDT-SWAP", "ordId" : order_id}]})
+		assert(resp["code"] == "0" and exchange.orders[order_id]["state"] == "canceled")
+
+		exchange 	= OkxMockExchange(partial_fill_rate = 1)
+		order_id 	= exchange.handle_order_request(request = {"id" : "1", "op" : "order", "args" : [self._order()]})["data"][0]["ordId"]
+		filled 		= float(exchange.orders[order_id]["accFillSz"])
+		assert(exchange.orders[order_id]["state"] == "canceled" and 0 < filled < 2)
+		assert(exchange._positions(inst_type = "SWAP", inst_id = None)[0]["pos"] == f"{filled}")
+
+	def test_order_found_by_client_order_id(self):
+		self.exchange.handle_order_request(request = {"id" : "1", "op" : "order", "args" : [{**self._order(inst_id = "BTC-USDT", pos_side = "net"), "tdMode" : "cash", "clOrdId" : "UNWIND1A0"}]})
+		assert(self.exchange._order(client_order_id = "UNWIND1A0")["accFillSz"] == "2.0" and self.exchange._order(client_order_id = "UNWIND1A1") is None)
+		assert(self.exchange._balance(ccy = "BTC") == 1000002)
+
+	def test_batch_with_partial_failure(self):
+		resp = self.exchange.handle_order_request(request = {"id" : "B1", "op" : "batch-orders", "args" : [self._order(), self._order(inst_id = "XYZ-USDT")]})
+		assert(resp["code"] == "2" and [each["sCode"] for each in resp["data"]] == ["0", "51001"])
+
+	def test_rejects_are_seeded(self):
+		def _codes():
+			exchange = OkxMockExchange(reject_rate = 0.5, seed = 1)
+			return [exchange.handle_order_request(request = {"id" : f"{idx}", "op" : "order", "args" : [self._order()]})["code"] for idx in range(20)]
+		codes = _codes()
+		assert(codes == _codes() and {"0", "1"} == set(codes))
+
+	def test_filled_orders_cannot_be_cancelled(self):
+		order_id 	= self.exchange.handle_order_request(request = {"id" : "1", "op" : "order", "args" : [self._order()]})["data"][0]["ordId"]
+		resp 		= self.exchange.handle_order_request(request = {"id" : "2", "op" : "cancel-order", "args" : [{"instId" : "BTC-USDT-SWAP", "ordId" : order_id}]})
+		assert(resp["code"] == "1" and resp["data"][0]["sCode"] == "51400")
+
+	def test_private_websocket(self):
+		self.exchange.start()
+		async def _session():
+			async with websockets.connect(self.exchange.ws_private_url) as ws_client:
+				await ws_client.send(json.dumps({"id" : "1", "op" : "order", "args" : [self._order()]}))
+				not_logged_in = json.loads(await ws_client.recv())
+				await ws_client.send(json.dumps({"op" : "login", "args" : [{"apiKey" : "a", "passphrase" : "b", "timestamp" : 1, "sign" : "c"}]}))
+				login = json.loads(await ws_client.recv())
+				await ws_client.send("ping")
+				pong = await ws_client.recv()
+				await ws_client.send(json.dumps({"id" : "2", "op" : "order", "args" : [self._order()]}))
+				order = json.loads(await ws_client.recv())
+				return (not_logged_in, login, pong, order)
+
+		(not_logged_in, login, pong, order) = asyncio.new_event_loop().run_until_complete(_session())
+		assert(not_logged_in["code"] == "60011" and login["event"] == "login" and pong == "pong")
+		assert(order["id"] == "2" and order["code"] == "0")
+
+	def test_login_verified_when_keys_given(self):
+		exchange = OkxMockExchange(api_key = "key", api_secret_key = "secret")
+		assert(not exchange._verify_login(args = {"apiKey" : "key", "timestamp" : 1, "sign" : "wrong"}))
+
+	def test_public_books5(self):
+		self.exchange.start()
+		async def _session():
+			async with websockets.connect(self.exchange.ws_public_url) as ws_client:
+				await ws_client.send(json.dumps({"op" : "subscribe", "args" : [{"channel" : "books5", "instId" : "BTC-USDT"}]}))
+				return [json.loads(await ws_client.recv()) for _ in range(3)]
+
+		[subscribed, snapshot, push] = asyncio.new_event_loop().run_until_complete(_session())
+		assert(subscribed["event"] == "subscribe" and len(snapshot["data"][0]["bids"]) == 5 and push["arg"]["instId"] == "BTC-USDT")
+		assert(float(snapshot["data"][0]["bids"][0][0]) < float(snapshot["data"][0]["asks"][0][0]))
+
+	def test_rest(self):
+		self.exchange.start()
+		def _request(path: str, body: dict = None):
+			data = json.dumps(body).encode("utf-8") if body is not None else None
+			with urllib.request.urlopen(urllib.request.Request(f"{self.exchange.rest_url}{path}", data = data)) as resp:
+				return json.loads(resp.read())
+
+		instruments = _request("/api/v5/public/instruments?instType=SWAP&instId=BTC-USDT-SWAP")["data"]
+		order_id 	= _request("/api/v5/trade/order", body = self._order())["data"][0]["ordId"]
+		assert(instruments[0]["minSz"] == "1" and instruments[0]["uly"] == "BTC-USDT")
+		assert(_request(f"/api/v5/trade/order?instId=BTC-USDT-SWAP&ordId={order_id}")["data"][0]["state"] == "filled")
+		assert(_request("/api/v5/account/positions?instType=SWAP")["data"][0]["availPos"] == "2.0")
+		assert(float(_request("/api/v5/market/ticker?instId=BTC-USDT")["data"][0]["last"]) > 0)
@@ -0,0 +1,146 @@
+import asyncio
+import threading
+from execution.FailSafeTrigger import FailSafeException
+from execution.OkxPairBots import OkxMarginPerpPairBot, OkxSpotPerpPairBot
+from feeds.TickTracer import TickTracer
+from strategies.MarginPerpArbitrag import MarginPerpExecutionDecision
+from strategies.SpotPerpArbitrag import SpotPerpExecutionDecision
+from unittest import TestCase
+from unittest.mock import MagicMock
+from CoroutineMock import coroutine_mock
+
+class TestOkxPairBots(TestCase):
+	def setUp(self):
+		self.loop 			= asyncio.new_event_loop()
+		self.client 		= MagicMock()
+		self.client.get_spot_min_volume.return_value 			= 0.001
+		self.client.get_margin_min_volume.return_value 			= 0.001
+		self.client.get_perpetual_min_lot_size.return_value 	= 1
+		self.client.get_perpetual_effective_funding_rate.return_value 	= (0, 0)
+		self.client.get_margin_effective_funding_rate.return_value 		= 0
+		# Perpetual trades well above spot / margin, which is an entry for both kinds of pairs
+		self.client.get_spot_perpetual_average_bid_ask_price.return_value 	= ((99, 100, 0), (110, 111, 0))
+		self.client.get_margin_perpetual_average_bid_ask_price.return_value = ((99, 100, 0), (110, 111, 0))
+		self.bot_executor 	= MagicMock()
+		return
+
+	def tearDown(self):
+		self.loop.close()
+		return
+
+	def _shared_params(self):
+		return 	{
+					"client" 						: self.client,
+					"feed_client" 					: MagicMock(),
+					"bot_executor" 					: self.bot_executor,
+					"order_type" 					: "market",
+					"entry_gap_frac" 				: 0.01,
+					"profit_taking_frac" 			: 0.005,
+					"feed_latency_s" 				: 1,
+					"fails_to_exit" 				: 2,
+					"current_funding_interval_s" 	: 1800,
+					"estimated_funding_interval_s" 	: 1800,
+				}
+
+	def _spot_perp_bot(self):
+		return OkxSpotPerpPairBot(	spot_trading_pair 			= "BTC-USDT",
+									perpetual_trading_pair 		= "BTC-USDT-SWAP",
+									spot_entry_vol 				= 0.01,
+									max_spot_vol 				= 0.1,
+									perpetual_entry_lot_size 	= 1,
+									max_perpetual_lot_size 		= 10,
+									perpetual_leverage 			= 1,
+									**self._shared_params()
+								).setup()
+
+	def _margin_perp_bot(self):
+		return OkxMarginPerpPairBot(margin_trading_pair 		= "ETH-USDT",
+									perpetual_trading_pair 		= "ETH-USDT-SWAP",
+									margin_entry_vol 			= 0.1,
+									max_margin_vol 				= 1,
+									margin_leverage 			= 1,
+									margin_tax_rate 			= 0.001,
+									margin_loan_period_hr 		= 24,
+									perpetual_entry_lot_size 	= 1,
+									max_perpetual_lot_size 		= 10,
+									perpetual_leverage 			= 1,
+									**self._shared_params()
+								).setup()
+
+	def test_spot_perp_entry_executed(self):
+		self.bot_executor.long_spot_short_perpetual_async = coroutine_mock(return_value = True)
+		bot = self._spot_perp_bot()
+		assert(bot.name == "BTC-USDT/BTC-USDT-SWAP" and bot.symbols == ["BTC-USDT", "BTC-USDT-SWAP"])
+		assert(self.loop.run_until_complete(bot.evaluate()) == SpotPerpExecutionDecision.GO_LONG_SPOT_SHORT_PERP)
+		assert(bot.trade_strategy.get_asset_holdings() == (0.01, -1))
+		spot_params = self.bot_executor.long_spot_short_perpetual_async.call_args[1]["spot_params"]
+		assert(spot_params["symbol"] == "BTC-USDT" and spot_params["order_side"] == "buy" and spot_params["size"] == 0.01)
+
+	def test_margin_perp_entry_sizes_margin_buy_in_quote(self):
+		self.bot_executor.long_margin_short_perpetual_async = coroutine_mock(return_value = True)
+		bot = self._margin_perp_bot()
+		assert(self.loop.run_until_complete(bot.evaluate()) == MarginPerpExecutionDecision.GO_LONG_MARGIN_SHORT_PERP)
+		margin_params = self.bot_executor.long_margin_short_perpetual_async.call_args[1]["margin_params"]
+		assert(margin_params["order_side"] == "buy" and abs(margin_params["size"] - 10) < 1e-9)
+		assert(bot.trade_strategy.get_asset_holdings() == (0.1, -1))
+
+	def test_pairs_keep_their_own_fail_safe(self):
+		self.bot_executor.long_spot_short_perpetual_async 	= coroutine_mock(return_value = False)
+		self.bot_executor.long_margin_short_perpetual_async = coroutine_mock(return_value = True)
+		(spot_bot, margin_bot) = (self._spot_perp_bot(), self._margin_perp_bot())
+
+		with self.assertRaises(Exception):
+			self.loop.run_until_complete(spot_bot.evaluate())
+		with self.assertRaises(FailSafeException):
+			self.loop.run_until_complete(spot_bot.evaluate())
+		assert(self.loop.run_until_complete(margin_bot.evaluate()) == MarginPerpExecutionDecision.GO_LONG_MARGIN_SHORT_PERP)
+		assert(spot_bot.trade_strategy.get_asset_holdings() == (0, 0))
+
+	def test_positions_saved_to_db_after_execution(self):
+		self.bot_executor.long_spot_short_perpetual_async = coroutine_mock(return_value = True)
+		bot 			= self._spot_perp_bot()
+		bot.db_clients 	= [MagicMock(), MagicMock()]
+		self.loop.run_until_complete(bot.evaluate())
+		bot.db_clients[0].set_position.assert_called_once_with(size = 0.01)
+		bot.db_clients[1].set_position.assert_called_once_with(size = -1)
+
+	def test_refresh_inputs_reports_changed_funding_rates(self):
+		self.bot_executor.long_spot_short_perpetual_async = coroutine_mock(return_value = True)
+		bot = self._spot_perp_bot()
+		assert(bot.refresh_inputs() is False)
+		self.client.get_perpetual_effective_funding_rate.return_value = (0.001, 0)
+		assert(bot.refresh_inputs() is True and bot.perpetual_funding_rate == 0.001)
+		self.loop.run_until_complete(bot.evaluate())
+		# Evaluations use the refreshed rates without reading them again
+		assert(self.client.get_perpetual_effective_funding_rate.call_count == 3)
+
+	def test_refresh_inputs_reports_changed_interest_rates(self):
+		bot = self._margin_perp_bot()
+		assert(bot.refresh_inputs() is False)
+		self.client.get_margin_effective_funding_rate.return_value = 0.0001
+		assert(bot.refresh_inputs() is True and bot.margin_base_funding_rate == 0.0001)
+
+	def test_blocking_calls_run_off_the_loop(self):
+		self.bot_executor.long_spot_short_perpetual_async = coroutine_mock(return_value = True)
+		bot 			= self._spot_perp_bot()
+		bot.db_clients 	= [MagicMock(), MagicMock()]
+		threads 		= []
+		self.client.get_spot_perpetual_average_bid_ask_price.side_effect = lambda **kwargs: threads.append(threading.get_ident()) or ((99, 100, 0), (110, 111, 0))
+		bot.db_clients[0].set_position.side_effect = lambda **kwargs: threads.append(threading.get_ident())
+		self.loop.run_until_complete(bot.evaluate())
+		assert(len(threads) == 2 and threading.get_ident() not in threads)
+
+	def test_stages_of_blocking_reads_are_traced(self):
+		self.bot_executor.long_spot_short_perpetual_async = coroutine_mock(return_value = True)
+		bot 		= self._spot_perp_bot()
+		bot.tracer 	= TickTracer(symbol = bot.name)
+		def _average_prices(**kwargs):
+			# The feed and client record these spans in the executor thread
+			for each_stage in ["feed_read", "book_parse", "vwap"]:
+				with bot.tracer.span(each_stage):
+					pass
+			return ((99, 100, 0), (110, 111, 0))
+		self.client.get_spot_perpetual_average_bid_ask_price.side_effect = _average_prices
+		bot.tracer.start_tick()
+		self.loop.run_until_complete(bot.evaluate())
+		assert(set(bot.tracer.spans) == {"feed_read", "book_parse", "vwap", "trade_decision"})
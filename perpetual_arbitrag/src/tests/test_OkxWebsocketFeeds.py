@@ -0,0 +1,131 @@
+import asyncio
+import json
+import threading
+import websockets
+import zlib
+from feeds.OkxWebsocketFeeds import OkxWebsocketFeeds, okx_checksum
+from unittest import TestCase
+
+class ReplayServer(object):
+	"""
+	Local stand in for the OKX public websocket. Replays the recorded frames once a client subscribes.
+	"""
+	def __init__(self, frames: [str]):
+		self.frames 	= frames
+		self.received 	= []
+		self.loop 		= asyncio.new_event_loop()
+		self.started 	= threading.Event()
+		return
+
+	async def _handler(self, ws, *args):
+		async for message in ws:
+			self.received.append(message)
+			if json.loads(message)["op"] == "subscribe":
+				for frame in self.frames:
+					await ws.send(frame)
+
+	async def _serve(self):
+		self.server = await websockets.serve(self._handler, "localhost", 0)
+		self.port 	= self.server.sockets[0].getsockname()[1]
+		self.started.set()
+		await self.server.wait_closed()
+
+	def start(self):
+		threading.Thread(target = self.loop.run_until_complete, args = (self._serve(),), daemon = True).start()
+		self.started.wait(timeout = 5)
+		return f"ws://localhost:{self.port}"
+
+	def stop(self):
+		self.loop.call_soon_threadsafe(self.server.close)
+		return
+
+def _books_frame(action: str, bids: [[str]], asks: [[str]], ts: str, checksum: int = None):
+	data = {"bids" : [level + ["0", "1"] for level in bids], "asks" : [level + ["0", "1"] for level in asks], "ts" : ts}
+	if checksum is not None:
+		data["checksum"] = checksum
+	return json.dumps({"arg" : {"channel" : "books", "instId" : "BTC-USDT"}, "action" : action, "data" : [data]})
+
+class TestOkxWebsocketFeeds(TestCase):
+	def setUp(self):
+		(self.feed, self.server) = (None, None)
+		return
+
+	def tearDown(self):
+		self.feed.close() if self.feed is not None else None
+		self.server.stop() if self.server is not None else None
+		return
+
+	def _start(self, frames: [str], channel: str):
+		self.server = ReplayServer(frames = frames)
+		self.feed 	= OkxWebsocketFeeds(permissible_latency_s = 5, feed_url = self.server.start(), channel = channel).connect()
+		return
+
+	def _wait_for(self, predicate):
+		for _ in range(100):
+			if predicate():
+				return
+			self.feed.wait_for_update(timeout_s = 0.05)
+		return
+
+	def test_checksum_interleaves_levels(self):
+		bids = [["3366.1", "7", "0", "1"], ["3366", "6", "0", "1"], ["3365", "1", "0", "1"]]
+		asks = [["3366.8", "9", "0", "1"], ["3368", "8", "0", "1"]]
+		expected = zlib.crc32(b"3366.1:7:3366.8:9:3366:6:3368:8:3365:1")
+		assert(okx_checksum(bids = bids, asks = asks) == (expected - (1 << 32) if expected >= (1 << 31) else expected))
+
+	def test_books5_snapshots_served_from_memory(self):
+		frame = json.dumps({"arg" : {"channel" : "books5", "instId" : "BTC-USDT"}, "data" : [{"bids" : [["100", "2", "0", "1"], ["99", "1", "0", "1"]], "asks" : [["101", "3", "0", "1"]], "ts" : "1647401540000"}]})
+		self._start(frames = [frame], channel = "books5")
+		order_book = self.feed.sorted_order_book(symbol = "BTC-USDT", exchange = "OKX")
+		assert(	order_book["bids"] == [(100, 2), (99, 1)] and 
+				order_book["asks"] == [(101, 3)] and 
+				order_book["updated"] == 1647401540)
+		assert(json.loads(self.server.received[0]) == {"op" : "subscribe", "args" : [{"channel" : "books5", "instId" : "BTC-USDT"}]})
+
+	def test_updated_symbols_popped_once(self):
+		frame = json.dumps({"arg" : {"channel" : "books5", "instId" : "BTC-USDT"}, "data" : [{"bids" : [["100", "2", "0", "1"]], "asks" : [["101", "3", "0", "1"]], "ts" : "1647401540000"}]})
+		self._start(frames = [frame], channel = "books5")
+		self.feed.sorted_order_book(symbol = "BTC-USDT", exchange = "OKX")
+		assert(self.feed.pop_updated_symbols() == {"BTC-USDT"})
+		assert(self.feed.pop_updated_symbols() == set())
+
+	def test_books_updates_validated_by_checksum(self):
+		snapshot_bids 	= [["100", "2"], ["99", "1"]]
+		snapshot_asks 	= [["101", "3"]]
+		updated_bids 	= [["100.5", "1"], ["99", "1"]]
+		frames = [
+			_books_frame(action = "snapshot", bids = snapshot_bids, asks = snapshot_asks, ts = "1647401540000", checksum = okx_checksum(bids = snapshot_bids, asks = snapshot_asks)),
+			_books_frame(action = "update", bids = [["100.5", "1"], ["100", "0"]], asks = [], ts = "1647401541000", checksum = okx_checksum(bids = updated_bids, asks = snapshot_asks)),
+		]
+		self._start(frames = frames, channel = "books")
+		self.feed.subscribe(exchange = "OKX", symbols = ["BTC-USDT"])
+		self._wait_for(lambda: self.feed.order_books.get("BTC-USDT", {}).get("updated") == 1647401541)
+
+		order_book = self.feed.sorted_order_book(symbol = "BTC-USDT", exchange = "OKX")
+		assert(order_book["bids"] == [(100.5, 1), (99, 1)] and order_book["asks"] == [(101, 3)])
+
+	def test_checksum_mismatch_resubscribes(self):
+		snapshot_bids 	= [["100", "2"]]
+		snapshot_asks 	= [["101", "3"]]
+		frames = [
+			_books_frame(action = "snapshot", bids = snapshot_bids, asks = snapshot_asks, ts = "1647401540000", checksum = okx_checksum(bids = snapshot_bids, asks = snapshot_asks)),
+			_books_frame(action = "update", bids = [["100.5", "1"]], asks = [], ts = "1647401541000", checksum = 123),
+		]
+		self._start(frames = frames, channel = "books")
+		self.feed.subscribe(exchange = "OKX", symbols = ["BTC-USDT"])
+		self._wait_for(lambda: sum(json.loads(each)["op"] == "subscribe" for each in self.server.received) > 1)
+
+		ops = [json.loads(each)["op"] for each in self.server.received]
+		assert(ops[:3] == ["subscribe", "unsubscribe", "subscribe"])
+
+	def test_update_without_snapshot_dropped(self):
+		self.feed 	= OkxWebsocketFeeds(permissible_latency_s = 0, channel = "books")
+		update 		= {"bids" : [["100.5", "1", "0", "1"]], "asks" : [], "ts" : "1647401541000"}
+		snapshot 	= {"bids" : [["100", "2", "0", "1"]], "asks" : [["101", "3", "0", "1"]], "ts" : "1647401542000"}
+		assert(self.feed._on_book(symbol = "BTC-USDT", action = "update", data = update, received = 1647401541.1))
+		assert("BTC-USDT" not in self.feed.order_books and not self.feed.wait_for_update(timeout_s = 0))
+
+		self.feed._on_book(symbol = "BTC-USDT", action = "snapshot", data = snapshot, received = 1647401542.1)
+		self.feed._on_book(symbol = "BTC-USDT", action = "update", data = update, received = 1647401542.2)
+		assert(self.feed.order_books["BTC-USDT"]["bids"] == [(100.5, 1), (100, 2)])
+		assert(self.feed.wait_for_update(timeout_s = 0) and not self.feed.wait_for_update(timeout_s = 0))
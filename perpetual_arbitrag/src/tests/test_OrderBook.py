@@ -0,0 +1,39 @@
+import sys
+from feeds.OrderBook import OrderBook
+from unittest import TestCase
+
+class TestOrderBook(TestCase):
+	def setUp(self):
+		self.order_book = OrderBook(bids = [(30, 10), (20, 10), (10, 10)], asks = [(40, 10), (50, 10), (60, 10)], updated = 1647489600)
+		return
+
+	def test_order_book_is_dict(self):
+		assert(self.order_book["updated"] == 1647489600 and self.order_book == {"bids" : [(30, 10), (20, 10), (10, 10)], "asks" : [(40, 10), (50, 10), (60, 10)], "updated" : 1647489600})
+
+	def test_depth_index_built_once(self):
+		bid_depth = self.order_book.bid_depth()
+		self.order_book.average_bid_price(size = 20)
+		assert(self.order_book.bid_depth() is bid_depth)
+
+	def test_average_bid_ask_price(self):
+		assert(self.order_book.average_bid_price(size = 20) == 25 and self.order_book.average_ask_price(size = 20) == 45)
+
+	def test_average_price_defaults_for_empty_book(self):
+		order_book = OrderBook(bids = [], asks = [], updated = 1647489600)
+		assert(order_book.average_bid_price(size = 20) == 0 and order_book.average_ask_price(size = 20) == sys.maxsize)
+
+	def test_bid_size_within_bps(self):
+		# 30 -> 20 is a 3333 bps move
+		assert(self.order_book.bid_size_within_bps(bps = 0) == 10)
+		assert(self.order_book.bid_size_within_bps(bps = 3333.4) == 20)
+		assert(self.order_book.bid_size_within_bps(bps = 10000) == 30)
+
+	def test_ask_size_within_bps(self):
+		# 40 -> 50 is a 2500 bps move
+		assert(self.order_book.ask_size_within_bps(bps = 2499) == 10)
+		assert(self.order_book.ask_size_within_bps(bps = 2500) == 20)
+		assert(self.order_book.ask_size_within_bps(bps = [0, 2500, 5000]).tolist() == [10, 20, 30])
+
+	def test_cached_prices_are_not_shared(self):
+		self.order_book.cached_average_prices[("bids", 20)] = 1
+		assert(OrderBook(bids = [], asks = [], updated = 1647489600).cached_average_prices == {})
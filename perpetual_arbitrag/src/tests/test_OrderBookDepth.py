@@ -0,0 +1,67 @@
+import numpy as np
+from feeds.OrderBookDepth import DepthIndex, fixed_depth_average_prices
+from unittest import TestCase
+
+class TestOrderBookDepth(TestCase):
+	def _walk_book(self, levels, size):
+		(remaining, trade_amt, filled) = (size, 0, 0)
+		for (price, qty) in levels:
+			trade_qty 	= min(remaining, qty)
+			trade_amt 	+= price * trade_qty
+			remaining 	-= trade_qty
+			filled 		+= trade_qty
+		return trade_amt / filled
+
+	def test_unsorted_bids_are_sorted(self):
+		depth_index = DepthIndex(levels = [[300, 100], [200, 50], [100, 150], [500, 50]], descending = True)
+		assert(depth_index.prices.tolist() == [500, 300, 200, 100])
+
+	def test_unsorted_asks_are_sorted(self):
+		depth_index = DepthIndex(levels = [[300, 100], [200, 50], [100, 150], [500, 50]], descending = False)
+		assert(depth_index.prices.tolist() == [100, 200, 300, 500])
+
+	def test_average_price_exact_level(self):
+		depth_index = DepthIndex(levels = [[100, 100], [200, 100], [300, 50]], descending = False)
+		assert(depth_index.average_price(size = 200) == 150)
+
+	def test_average_price_beyond_book(self):
+		depth_index = DepthIndex(levels = [[100, 100], [200, 100], [300, 50]], descending = False)
+		assert(depth_index.average_price(size = 1000) == 180)
+
+	def test_average_price_zero_size_is_best_price(self):
+		depth_index = DepthIndex(levels = [[100, 100], [200, 100], [300, 50]], descending = False)
+		assert(depth_index.average_price(size = 0) == 100)
+
+	def test_average_price_many_sizes(self):
+		depth_index = DepthIndex(levels = [[100, 100], [200, 100], [300, 50]], descending = False)
+		assert(depth_index.average_price(size = [1, 150, 250, 1000]).tolist() == [100, 400 / 3, 180, 180])
+
+	def test_average_price_matches_level_walk(self):
+		rng = np.random.default_rng(0)
+		for _ in range(20):
+			prices 	= np.sort(rng.uniform(10, 20, 50))[::-1]
+			qtys 	= rng.uniform(0, 5, 50)
+			levels 	= np.stack([prices, qtys], axis = 1)
+			size 	= rng.uniform(0.1, 200)
+			assert(np.isclose(DepthIndex(levels = levels, descending = True).average_price(size = size), self._walk_book(levels, size)))
+
+	def test_fixed_depth_average_prices_match_depth_index(self):
+		rng 	= np.random.default_rng(1)
+		prices 	= np.sort(rng.uniform(10, 20, (30, 10)), axis = 1)
+		qtys 	= rng.uniform(0, 5, (30, 10))
+		levels 	= np.stack([prices, qtys], axis = 2)
+		for size in [0.1, 5, 20, 100]:
+			expected = [DepthIndex(levels = each_levels, descending = False).average_price(size = size) for each_levels in levels]
+			assert(np.allclose(fixed_depth_average_prices(levels = levels, size = size), expected))
+
+	def test_fixed_depth_average_prices_ignore_padding(self):
+		levels = np.array([	[[100, 100], [200, 100], [200, 0]],
+							[[np.nan, 0], [np.nan, 0], [np.nan, 0]]])
+		average_prices = fixed_depth_average_prices(levels = levels, size = 1000)
+		assert(average_prices[0] == 150 and np.isnan(average_prices[1]))
+
+	def test_fixed_depth_average_prices_without_partial_fills(self):
+		levels = np.array([	[[100, 1], [200, 1]],
+							[[100, 1], [200, 0.5]]])
+		average_prices = fixed_depth_average_prices(levels = levels, size = 2, partial_fills = False)
+		assert(average_prices[0] == 150 and np.isnan(average_prices[1]))
@@ -0,0 +1,53 @@
+import json
+import numpy as np
+from feeds.OrderBookEncoding import encode_order_book, decode_order_book, BOOK_HEADER_SIZE
+from unittest import TestCase
+
+class TestOrderBookEncoding(TestCase):
+	def setUp(self):
+		self.bids = [[18.077, 58], [18.081, 1], [18.08, 95]]
+		self.asks = [[18.083, 49], [18.082, 36]]
+		return
+
+	def test_encoded_size(self):
+		payload = encode_order_book(bids = self.bids, asks = self.asks, timestamp = 1647401540.262)
+		assert(len(payload) == BOOK_HEADER_SIZE + 8 * (len(self.bids) + len(self.asks)))
+
+	def test_decoded_book_is_sorted(self):
+		payload 	= encode_order_book(bids = self.bids, asks = self.asks, timestamp = 1647401540.262)
+		order_book 	= decode_order_book(payload = payload)
+		assert(order_book["bids"].tolist() == [[18.081, 1], [18.08, 95], [18.077, 58]])
+		assert(order_book["asks"].tolist() == [[18.082, 36], [18.083, 49]])
+		assert(order_book["updated"] == 1647401540.262)
+
+	def test_smaller_than_cryptostore_json(self):
+		rng 	= np.random.default_rng(0)
+		prices 	= np.round(29876.5 - 0.1 * np.arange(400), 1)
+		qtys 	= np.round(rng.uniform(0, 2, 400), 5)
+		book 	= {"bid" : {str(each_price) : str(each_qty) for (each_price, each_qty) in zip(prices, qtys)}, "ask" : {}}
+		payload = encode_order_book(bids = np.stack([prices, qtys], axis = 1), asks = [], timestamp = 1647401540.262)
+		assert(len(payload) * 2 < len(json.dumps({"book" : book})))
+
+	def test_decoded_values_match_decimal_strings(self):
+		bids 		= [[float(each_price), float(each_qty)] for (each_price, each_qty) in [("0.000012345", "1234567.89"), ("0.000012344", "0.01")]]
+		order_book 	= decode_order_book(payload = encode_order_book(bids = bids, asks = [], timestamp = 1647401540.262))
+		assert(order_book["bids"].tolist() == bids)
+
+	def test_large_values_use_wide_levels(self):
+		bids 		= [[65432.1, 123456789.123]]
+		payload 	= encode_order_book(bids = bids, asks = [], timestamp = 1647401540.262)
+		assert(len(payload) == BOOK_HEADER_SIZE + 16 and decode_order_book(payload = payload)["bids"].tolist() == bids)
+
+	def test_given_decimals_round_levels(self):
+		payload = encode_order_book(bids = [[18.0814, 1.26]], asks = [], timestamp = 1647401540.262, price_decimals = 3, qty_decimals = 1)
+		assert(decode_order_book(payload = payload)["bids"].tolist() == [[18.081, 1.3]])
+
+	def test_empty_book(self):
+		payload 	= encode_order_book(bids = [], asks = [], timestamp = 1647401540.262)
+		order_book 	= decode_order_book(payload = payload)
+		assert(order_book["bids"].shape == (0, 2) and order_book["asks"].shape == (0, 2))
+
+	def test_receipt_timestamp_decoded(self):
+		payload 	= encode_order_book(bids = self.bids, asks = self.asks, timestamp = 1647401540.262, receipt_timestamp = 1647401540.288)
+		assert(decode_order_book(payload = payload)["received"] == 1647401540.288)
+		assert(decode_order_book(payload = encode_order_book(bids = self.bids, asks = self.asks, timestamp = 1647401540.262))["received"] is None)
\ No newline at end of file
@@ -0,0 +1,66 @@
+import numpy as np
+import os
+import tempfile
+from feeds.BookRecording import BookRecorder, BookRecording
+from feeds.PairBookReplay import PairBookReplay
+from unittest import TestCase
+
+class TestPairBookReplay(TestCase):
+	def setUp(self):
+		self.dir = tempfile.TemporaryDirectory()
+		return
+
+	def tearDown(self):
+		self.dir.cleanup()
+		return
+
+	def _recording(self, name: str, books: list):
+		path 		= os.path.join(self.dir.name, f"{name}.bin")
+		recorder 	= BookRecorder(path = path, depth = 2)
+		for (each_ts, each_bid, each_ask) in books:
+			recorder.append(bids = [[each_bid, 1], [each_bid - 1, 1]], asks = [[each_ask, 1], [each_ask + 1, 1]], timestamp = each_ts)
+		recorder.close()
+		return BookRecording(path = path)
+
+	def _replay(self, A_books: list, B_books: list, **kwargs):
+		return PairBookReplay(	A_recording 	= self._recording(name = "A", books = A_books),
+								B_recording 	= self._recording(name = "B", books = B_books),
+								A_size 			= 1,
+								B_size 			= 2,
+								**kwargs)
+
+	def test_ticks_use_latest_book_of_each_leg(self):
+		replay 	= self._replay(A_books = [(0, 100, 101), (2, 102, 103)], B_books = [(1, 200, 201), (3, 202, 203)], max_staleness_s = 10)
+		ticks 	= replay.align(chunk_start = 0, chunk_end = 4)
+		# No tick before both legs have a book
+		assert(ticks["timestamp"].tolist() == [1, 2, 3])
+		assert(ticks["A_bid"].tolist() == [100, 102, 102] and ticks["A_ask"].tolist() == [101, 103, 103])
+		# Perpetual leg fills its size of 2 over both levels
+		assert(ticks["B_bid"].tolist() == [199.5, 199.5, 201.5] and ticks["B_ask"].tolist() == [201.5, 201.5, 203.5])
+
+	def test_stale_ticks_are_dropped(self):
+		replay 	= self._replay(A_books = [(0, 100, 101), (10, 100, 101)], B_books = [(0, 200, 201), (5, 200, 201), (10, 200, 201)], max_staleness_s = 2)
+		ticks 	= replay.align(chunk_start = 0, chunk_end = 11)
+		assert(ticks["timestamp"].tolist() == [0, 10])
+
+	def test_books_without_quantity_are_dropped(self):
+		replay 	= self._replay(A_books = [(0, 100, 101), (1, np.nan, 101)], B_books = [(0, 200, 201)], max_staleness_s = 10)
+		assert(replay.align(chunk_start = 0, chunk_end = 2)["timestamp"].tolist() == [0])
+
+	def test_books_thinner_than_entry_size_are_dropped(self):
+		path 		= os.path.join(self.dir.name, "B.bin")
+		recorder 	= BookRecorder(path = path, depth = 2)
+		recorder.append(bids = [[200, 1], [199, 1]], asks = [[201, 1], [202, 1]], timestamp = 0)
+		# Only one ask level, which cannot fill the perpetual size of 2
+		recorder.append(bids = [[200, 1], [199, 1]], asks = [[201, 1]], timestamp = 1)
+		recorder.append(bids = [[200, 1], [199, 1]], asks = [[201, 1], [202, 1]], timestamp = 2)
+		recorder.close()
+		replay 		= PairBookReplay(A_recording = self._recording(name = "A", books = [(0, 100, 101)]), B_recording = BookRecording(path = path),
+									 A_size = 1, B_size = 2, max_staleness_s = 10)
+		assert(replay.align(chunk_start = 0, chunk_end = 3)["timestamp"].tolist() == [0, 2])
+
+	def test_chunks_cover_recordings_once(self):
+		books 	= [(each_ts, 100, 101) for each_ts in range(100)]
+		replay 	= self._replay(A_books = books, B_books = books, max_staleness_s = 1, chunk_s = 7)
+		timestamps = np.concatenate([each_chunk["timestamp"] for each_chunk in replay.chunks()])
+		assert(timestamps.tolist() == list(range(100)))
@@ -0,0 +1,78 @@
+import asyncio
+from execution.MarginPerpetualBotExecution import MarginPerpetualSimulatedBotExecution
+from execution.PaperFillEngine import PaperFillEngine
+from execution.SpotFutureBotExecution import SpotFutureSimulatedBotExecution
+from unittest import TestCase
+from unittest.mock import MagicMock
+
+class TestPaperFillEngine(TestCase):
+	def setUp(self):
+		self.books 			= 	{
+									"BTC-USDT" 		: {"bids" : [[99, 1], [98, 2]], "asks" : [[101, 1], [102, 2]]},
+									"BTC-USDT-SWAP" : {"bids" : [[100, 10], [99, 10]], "asks" : [[102, 10], [103, 10]]},
+								}
+		self.fill_engine 	= PaperFillEngine(book_fn = lambda symbol, size: self.books[symbol])
+		self.loop 			= asyncio.new_event_loop()
+		return
+
+	def tearDown(self):
+		self.loop.close()
+		return
+
+	def test_market_buy_walks_asks(self):
+		fill = self.fill_engine.fill(symbol = "BTC-USDT", order_side = "buy", size = 2)
+		assert(fill["filled"] == 2 and fill["avg_price"] == 101.5 and fill["partial"] == False)
+		assert(abs(fill["slippage"] - 0.5 / 101) < 1e-12)
+		assert(self.fill_engine.positions["BTC-USDT"] == 2)
+
+	def test_market_sell_walks_bids(self):
+		fill = self.fill_engine.fill(symbol = "BTC-USDT", order_side = "sell", size = 2)
+		assert(fill["filled"] == 2 and fill["avg_price"] == 98.5)
+		assert(self.fill_engine.positions["BTC-USDT"] == -2)
+
+	def test_partial_fill_when_book_exhausted(self):
+		fill = self.fill_engine.fill(symbol = "BTC-USDT", order_side = "buy", size = 5)
+		assert(fill["filled"] == 3 and fill["partial"] == True)
+		assert(self.fill_engine.summary()["BTC-USDT"]["partial_fills"] == 1)
+
+	def test_limit_order_stops_at_price(self):
+		fill = self.fill_engine.fill(symbol = "BTC-USDT", order_side = "sell", size = 2, limit_price = 99)
+		assert(fill["filled"] == 1 and fill["avg_price"] == 99 and fill["partial"] == True)
+
+	def test_quote_sized_buy(self):
+		fill = self.fill_engine.fill(symbol = "BTC-USDT", order_side = "buy", size = 203, quote_size = True)
+		assert(abs(fill["filled"] - 2) < 1e-12 and fill["partial"] == False)
+
+	def test_fill_uses_book_after_latency(self):
+		book_fn 			= MagicMock(side_effect = [self.books["BTC-USDT"], {"bids" : [[97, 5]], "asks" : [[105, 5]]}])
+		self.fill_engine 	= PaperFillEngine(book_fn = book_fn, latency_s = 0.001)
+		fill 				= self.fill_engine.fill(symbol = "BTC-USDT", order_side = "buy", size = 1)
+		assert(book_fn.call_count == 2 and fill["avg_price"] == 105)
+		assert(abs(fill["slippage"] - 4 / 101) < 1e-12)
+
+	def test_pair_filled(self):
+		legs = [{"symbol" : "BTC-USDT", "order_side" : "buy", "size" : 1}, {"symbol" : "BTC-USDT-SWAP", "order_side" : "sell", "size" : 10}]
+		assert(self.fill_engine.execute_pair(legs = legs) == True)
+		assert(self.fill_engine.positions == {"BTC-USDT" : 1, "BTC-USDT-SWAP" : -10})
+
+	def test_partially_filled_pair_flattened(self):
+		legs = [{"symbol" : "BTC-USDT", "order_side" : "buy", "size" : 1}, {"symbol" : "BTC-USDT-SWAP", "order_side" : "sell", "size" : 30}]
+		assert(self.fill_engine.execute_pair(legs = legs) == False)
+		assert(self.fill_engine.positions == {"BTC-USDT" : 0, "BTC-USDT-SWAP" : 0})
+
+	def test_partially_filled_pair_flattened_async(self):
+		legs = [{"symbol" : "BTC-USDT", "order_side" : "buy", "size" : 1}, {"symbol" : "BTC-USDT-SWAP", "order_side" : "sell", "size" : 30}]
+		assert(self.loop.run_until_complete(self.fill_engine.execute_pair_async(legs = legs)) == False)
+		assert(self.fill_engine.positions == {"BTC-USDT" : 0, "BTC-USDT-SWAP" : 0})
+
+	def test_simulated_margin_execution_fills_quote_sized_buy(self):
+		bot_executor 		= MarginPerpetualSimulatedBotExecution(api_client = MagicMock(), fill_engine = self.fill_engine)
+		margin_params 		= {"symbol" : "BTC-USDT", "ccy" : "USDT", "trade_mode" : "cross", "order_type" : "market", "price" : 1, "order_side" : "buy", "size" : 101}
+		perpetual_params 	= {"symbol" : "BTC-USDT-SWAP", "position_side" : "short", "order_type" : "market", "price" : 1, "order_side" : "sell", "size" : 10}
+		assert(self.loop.run_until_complete(bot_executor.long_margin_short_perpetual_async(	margin_params = margin_params, perpetual_params = perpetual_params,
+																							margin_revert_params = None, perpetual_revert_params = None)) == True)
+		assert(self.fill_engine.positions == {"BTC-USDT" : 1, "BTC-USDT-SWAP" : -10})
+
+	def test_simulated_execution_without_fill_engine(self):
+		bot_executor = SpotFutureSimulatedBotExecution(api_client = MagicMock())
+		assert(bot_executor.long_spot_short_futures(spot_params = None, future_params = None, spot_revert_params = None, future_revert_params = None) == True)
@@ -0,0 +1,98 @@
+import json
+import numpy as np
+import os
+import tempfile
+from execution.BacktestEngine import BacktestEngine
+from execution.ParameterSweep import BayesianSearch, ParameterSweep, grid_params, random_params
+from feeds.BookRecording import BookRecorder, BookRecording
+from feeds.PairBookReplay import PairBookReplay
+from strategies.SpotPerpArbitrag import SpotPerpArbitrag
+from unittest import TestCase
+
+class TestParameterSweep(TestCase):
+	def setUp(self):
+		self.dir 	= tempfile.TemporaryDirectory()
+		self.space 	= 	{
+							"entry_gap_frac" 			: [0.001, 0.005],
+							"profit_taking_frac" 		: [-0.001, 0.001],
+							"asset_entry_vol" 			: [0.1, 0.2],
+							"perpetual_entry_lot_size" 	: [10],
+						}
+		return
+
+	def tearDown(self):
+		self.dir.cleanup()
+		return
+
+	def _record(self):
+		rng 	= np.random.default_rng(0)
+		paths 	= [os.path.join(self.dir.name, f"{each}.bin") for each in ["A", "B"]]
+		(A, B) 	= [BookRecorder(path = each_path, depth = 3) for each_path in paths]
+		mid 	= 100 + np.cumsum(rng.normal(0, 0.05, 3000))
+		gap 	= 2 * np.sin(np.arange(3000) / 100)
+		for idx in range(3000):
+			A.append(bids = [[mid[idx] - 0.05 - level * 0.01, 0.1] for level in range(3)], asks = [[mid[idx] + 0.05 + level * 0.01, 0.1] for level in range(3)], timestamp = idx)
+			B.append(bids = [[mid[idx] + gap[idx] - 0.05 - level * 0.01, 10] for level in range(3)], asks = [[mid[idx] + gap[idx] + 0.05 + level * 0.01, 10] for level in range(3)], timestamp = idx + 0.5)
+		A.close()
+		B.close()
+		return paths
+
+	def _sweep(self, paths: list):
+		return ParameterSweep(	asset_type 				= "spot_perp",
+								asset_recording 		= paths[0],
+								perpetual_recording 	= paths[1],
+								max_asset_vol 			= 0.4,
+								max_perpetual_lot_size 	= 40,
+								engine_params 			= {"perpetual_contract_size" : 0.01, "fee_rate" : 0.0005},
+								replay_params 			= {"max_staleness_s" : 2},
+								processors 				= 2)
+
+	def test_grid_covers_every_combination(self):
+		params = grid_params(space = self.space)
+		assert(len(params) == 8 and len({tuple(each.values()) for each in params}) == 8)
+
+	def test_random_params_within_space(self):
+		params = random_params(space = self.space, samples = 50, seed = 1)
+		assert(all(0.001 <= each["entry_gap_frac"] <= 0.005 and -0.001 <= each["profit_taking_frac"] <= 0.001 for each in params))
+		assert({each["asset_entry_vol"] for each in params} == {0.1, 0.2} and {each["perpetual_entry_lot_size"] for each in params} == {10})
+		assert(params == random_params(space = self.space, samples = 50, seed = 1))
+
+	def test_bayesian_search_finds_peak(self):
+		search 	= BayesianSearch(space = {"entry_gap_frac" : [0, 1], "profit_taking_frac" : [0, 1]}, seed = 0)
+		score 	= lambda params: -1 * ((params["entry_gap_frac"] - 0.7) ** 2 + (params["profit_taking_frac"] - 0.2) ** 2)
+		for _ in range(8):
+			for each_params in search.propose(batch = 4):
+				search.observe(params = each_params, score = score(params = each_params))
+		assert(max(each_score for (_, each_score) in search.observed) > -0.005)
+
+	def test_sweep_matches_single_backtests(self):
+		paths 	= self._record()
+		sweep 	= self._sweep(paths = paths)
+		try:
+			results = sweep.grid(space = self.space)
+		finally:
+			sweep.close()
+
+		for each_params in [results[0], results[-1]]:
+			strategy 	= SpotPerpArbitrag(spot_symbol = "A", current_spot_vol = 0, max_spot_vol = 0.4, perp_symbol = "B", current_perp_lot_size = 0, max_perp_lot_size = 40)
+			replay 		= PairBookReplay(	A_recording = BookRecording(path = paths[0]), B_recording = BookRecording(path = paths[1]),
+											A_size = each_params["asset_entry_vol"], B_size = each_params["perpetual_entry_lot_size"], max_staleness_s = 2)
+			engine 		= BacktestEngine(	strategy = strategy, perpetual_contract_size = 0.01, fee_rate = 0.0005,
+											**{each_name : each_params[each_name] for each_name in self.space.keys()})
+			summary 	= engine.run(replay = replay)
+			assert(summary["trades"] > 0 and np.isclose(summary["pnl"], each_params["pnl"]))
+
+	def test_ranked_rows_load_into_job_config(self):
+		paths 	= self._record()
+		sweep 	= self._sweep(paths = paths)
+		try:
+			sweep.random(space = self.space, samples = 6, seed = 0)
+		finally:
+			sweep.close()
+
+		rows = sweep.ranked(exchange = "okx", user_id = 1, first_asset = "BTC-USDT", second_asset = "BTC-USDT-SWAP", base_default_args = {"MAX_SPOT_VOL" : "0.4"})
+		assert([each["rank"] for each in rows] == list(range(6)))
+		assert(all(rows[idx]["score"] >= rows[idx + 1]["score"] for idx in range(5)))
+		default_args = json.loads(rows[0]["default_args"])
+		assert(rows[0]["asset_type"] == "spot-perp" and default_args["MAX_SPOT_VOL"] == "0.4")
+		assert(float(default_args["ENTRY_GAP_FRAC"]) == rows[0]["entry_gap_frac"] and default_args["SPOT_ENTRY_VOL"] == str(rows[0]["asset_entry_vol"]))
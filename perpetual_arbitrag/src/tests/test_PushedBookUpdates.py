@@ -0,0 +1,30 @@
+import threading
+import time
+from feeds.PushedBookUpdates import PushedBookUpdates
+from unittest import TestCase
+
+class TestPushedBookUpdates(TestCase):
+	def setUp(self):
+		self.updates = PushedBookUpdates()
+		return
+
+	def test_update_before_wait_is_not_lost(self):
+		self.updates._mark_updated(symbol = "BTC-USDT")
+		assert(self.updates.wait_for_update(timeout_s = 0))
+		assert(not self.updates.wait_for_update(timeout_s = 0))
+
+	def test_updated_symbols_are_popped_once(self):
+		for each_symbol in ["BTC-USDT", "BTC-USDT-SWAP", "BTC-USDT"]:
+			self.updates._mark_updated(symbol = each_symbol)
+		assert(self.updates.pop_updated_symbols() == {"BTC-USDT", "BTC-USDT-SWAP"})
+		assert(self.updates.pop_updated_symbols() == set())
+
+	def test_wake_waiters_returns_pending_wait(self):
+		waiter 	= threading.Thread(target = self.updates.wait_for_update, kwargs = {"timeout_s" : 10})
+		started = time.perf_counter()
+		waiter.start()
+		time.sleep(0.01)
+		self.updates.wake_waiters()
+		waiter.join(timeout = 1)
+		assert(not waiter.is_alive() and time.perf_counter() - started < 1)
+		assert(self.updates.pop_updated_symbols() == set())
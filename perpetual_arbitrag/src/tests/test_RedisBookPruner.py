@@ -0,0 +1,39 @@
+from feeds.RedisBookPruner import RedisBookPruner
+from unittest import TestCase
+from unittest.mock import MagicMock, patch
+
+class TestRedisBookPruner(TestCase):
+	@patch("redis.Redis")
+	def test_lua_prune_is_one_script_call(self, mock_redis):
+		pruner = RedisBookPruner(redis_url = None, redis_port = None, key_pattern = "book-OKX-*", retention_s = 5, mode = "lua")
+		pruner.redis_cli = mock_redis
+		pruner.prune_cmd = MagicMock(return_value = 12)
+
+		assert(pruner.prune(now = 100) == 12)
+		pruner.prune_cmd.assert_called_once_with(args = ["book-OKX-*", 95])
+		mock_redis.pipeline.assert_not_called()
+
+	@patch("redis.Redis")
+	def test_pipeline_prune_is_one_batch(self, mock_redis):
+		pruner = RedisBookPruner(redis_url = None, redis_port = None, key_pattern = "book-OKX-*", retention_s = 5, mode = "pipeline")
+		mock_redis.scan_iter.return_value = iter([b"book-OKX-BTC-USDT", b"book-OKX-BTC-USDT-PERP"])
+		pipe = mock_redis.pipeline.return_value
+		pipe.execute.return_value = [3, 4]
+		pruner.redis_cli = mock_redis
+
+		assert(pruner.prune(now = 100) == 7)
+		assert(pipe.zremrangebyscore.call_count == 2 and pipe.execute.call_count == 1)
+		pipe.zremrangebyscore.assert_any_call(b"book-OKX-BTC-USDT", "-inf", 95)
+
+	@patch("redis.Redis")
+	def test_pipeline_prune_without_keys(self, mock_redis):
+		pruner = RedisBookPruner(redis_url = None, redis_port = None, mode = "pipeline")
+		mock_redis.scan_iter.return_value = iter([])
+		pruner.redis_cli = mock_redis
+
+		assert(pruner.prune(now = 100) == 0)
+		mock_redis.pipeline.assert_not_called()
+
+	def test_unsupported_mode(self):
+		with self.assertRaises(AssertionError):
+			RedisBookPruner(redis_url = None, redis_port = None, mode = "fork")
\ No newline at end of file
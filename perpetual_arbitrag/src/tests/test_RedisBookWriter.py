@@ -0,0 +1,21 @@
+from feeds.CryptoStoreRedisFeeds import CryptoStoreRedisFeeds
+from feeds.RedisBookWriter import RedisBookWriter
+from unittest import TestCase
+from unittest.mock import patch
+
+class TestRedisBookWriter(TestCase):
+	@patch("redis.Redis")
+	def test_written_books_are_read_by_binary_feeds(self, mock_redis):
+		writer 				= RedisBookWriter(redis_url = None, redis_port = None)
+		writer.redis_cli 	= mock_redis
+		pipe 				= mock_redis.pipeline.return_value
+		writer.write(exchange = "OKX", order_books = {"DOT-USDT-SWAP" : {"bids" : [[18.081, 1], [18.08, 95]], "asks" : [[18.082, 36]], "updated" : 1647401540.262}})
+
+		(redis_key, mapping) = pipe.zadd.call_args[0]
+		assert(redis_key == "book-OKX-DOT-USDT-PERP" and list(mapping.values()) == [1647401540.262] and pipe.execute.call_count == 1)
+
+		feeds 				= CryptoStoreRedisFeeds(redis_url = None, redis_port = None, permissible_latency_s = 1e9, encoding = "binary")
+		feeds.redis_cli 	= mock_redis
+		mock_redis.zrange.return_value = list(mapping.keys())
+		order_book 			= feeds.sorted_order_book(symbol = "DOT-USDT-SWAP", exchange = "OKX")
+		assert(order_book["bids"].tolist() == [[18.081, 1], [18.08, 95]] and order_book["asks"].tolist() == [[18.082, 36]])
@@ -1,4 +1,5 @@
 import copy
+import numpy as np
 from strategies.SingleTradeArbitragV2 import SingleTradeArbitragV2, ExecutionDecision, TradePosition
 from unittest import TestCase
 from unittest.mock import patch
@@ -324,4 +325,71 @@ class TestSingleTradeArbitrag(TestCase):
 													entry_threshold 			= 0.1,
 													take_profit_threshold 		= 1,
 												)
-			assert(decision == ExecutionDecision.NO_DECISION)
\ No newline at end of file
+			assert(decision == ExecutionDecision.NO_DECISION)
+
+	def test_batch_trade_decision_matches_scalar_decision(self):
+		rng 		= np.random.default_rng(0)
+		size 		= 2000
+		A_bid 		= rng.uniform(90, 110, size)
+		A_ask 		= A_bid + rng.uniform(0, 2, size)
+		B_bid 		= rng.uniform(90, 110, size)
+		B_ask 		= B_bid + rng.uniform(0, 2, size)
+		A_effective = rng.uniform(0.99, 1.01, size)
+		B_effective = rng.uniform(0.99, 1.01, size)
+		current_A 	= rng.choice([-11, -1, 0, 1, 11], size)
+		current_B 	= rng.choice([-11, -1, 0, 1, 11], size)
+		entry 		= rng.uniform(0, 0.05, size)
+		take_profit = rng.uniform(0, 0.05, size)
+
+		codes 		= SingleTradeArbitragV2._batch_trade_decision(	asset_A_bid_price 			= A_bid,
+																	asset_A_effective_bid_price = A_bid * A_effective,
+																	asset_A_ask_price 			= A_ask,
+																	asset_A_effective_ask_price = A_ask * A_effective,
+																	asset_B_bid_price 			= B_bid,
+																	asset_B_effective_bid_price = B_bid * B_effective,
+																	asset_B_ask_price 			= B_ask,
+																	asset_B_effective_ask_price = B_ask * B_effective,
+																	current_A_position 			= current_A,
+																	max_A_position 				= 10,
+																	current_B_position 			= current_B,
+																	max_B_position 				= 10,
+																	entry_threshold 			= entry,
+																	take_profit_threshold 		= take_profit,
+																)
+		for i in range(size):
+			_strategy 						= copy.deepcopy(self.strategy)
+			_strategy.current_A_position 	= current_A[i]
+			_strategy.current_B_position 	= current_B[i]
+			decision 	= _strategy._trade_decision(asset_A_bid_price 			= A_bid[i],
+													asset_A_effective_bid_price = A_bid[i] * A_effective[i],
+													asset_A_ask_price 			= A_ask[i],
+													asset_A_effective_ask_price = A_ask[i] * A_effective[i],
+													asset_B_bid_price 			= B_bid[i],
+													asset_B_effective_bid_price = B_bid[i] * B_effective[i],
+													asset_B_ask_price 			= B_ask[i],
+													asset_B_effective_ask_price = B_ask[i] * B_effective[i],
+													entry_threshold 			= entry[i],
+													take_profit_threshold 		= take_profit[i],
+												)
+			assert(ExecutionDecision(codes[i]) == decision)
+		# Every decision is exercised by the random cases
+		assert(set(codes) == {each.value for each in ExecutionDecision})
+
+	def test_batch_trade_decision_nan_price_is_no_decision(self):
+		codes 		= SingleTradeArbitragV2._batch_trade_decision(	asset_A_bid_price 			= np.array([np.nan, 200]),
+																	asset_A_effective_bid_price = np.array([np.nan, 200]),
+																	asset_A_ask_price 			= np.array([np.nan, 201]),
+																	asset_A_effective_ask_price = np.array([np.nan, 201]),
+																	asset_B_bid_price 			= 100,
+																	asset_B_effective_bid_price = 100,
+																	asset_B_ask_price 			= 101,
+																	asset_B_effective_ask_price = 101,
+																	current_A_position 			= 0,
+																	max_A_position 				= 10,
+																	current_B_position 			= 0,
+																	max_B_position 				= 10,
+																	entry_threshold 			= 0.1,
+																	take_profit_threshold 		= 0.1,
+																)
+		assert(list(codes) == [ExecutionDecision.NO_DECISION.value, ExecutionDecision.GO_LONG_B_SHORT_A.value])
+
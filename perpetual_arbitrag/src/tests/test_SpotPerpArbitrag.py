@@ -1,4 +1,5 @@
 import copy
+import numpy as np
 from strategies.SpotPerpArbitrag import SpotPerpArbitrag, SpotPerpExecutionDecision, SpotPerpTradePosition
 from strategies.SingleTradeArbitragV2 import ExecutionDecision, TradePosition
 from unittest import TestCase
@@ -95,4 +96,42 @@ class TestSpotPerpArbitrag(TestCase):
 												perp_funding_rate = 0,
 												perp_estimated_funding_rate = 0,
 												entry_threshold = 0,
-												take_profit_threshold = 0) == SpotPerpExecutionDecision.TAKE_PROFIT_LONG_PERP_SHORT_SPOT)
\ No newline at end of file
+												take_profit_threshold = 0) == SpotPerpExecutionDecision.TAKE_PROFIT_LONG_PERP_SHORT_SPOT)
+
+	def test_batch_trade_decision_matches_trade_decision(self):
+		cases 	= [	# spot_bid, spot_ask, perp_bid, perp_ask, funding, spot_vol, perp_lot_size
+					(100, 101, 110, 111, 0.001, 0, 0),
+					(100, 101, 110, 111, 0.001, 10, -10),
+					(110, 111, 100, 101, -0.001, 1, -1),
+					(110, 111, 100, 101, -0.001, 0, 0),
+					(100, 101, 100, 101, 0, -1, 1),
+				]
+		(spot_bid, spot_ask, perp_bid, perp_ask, funding, spot_vol, perp_lot_size) = [np.array(each) for each in zip(*cases)]
+		codes 	= SpotPerpArbitrag.batch_trade_decision(spot_bid_price 				= spot_bid,
+														spot_ask_price 				= spot_ask,
+														perp_bid_price 				= perp_bid,
+														perp_ask_price 				= perp_ask,
+														perp_funding_rate 			= funding,
+														perp_estimated_funding_rate = funding,
+														current_spot_vol 			= spot_vol,
+														max_spot_vol 				= 10,
+														current_perp_lot_size 		= perp_lot_size,
+														max_perp_lot_size 			= 10,
+														entry_threshold 			= 0.01,
+														take_profit_threshold 		= 0.01,
+													)
+		for (i, each) in enumerate(cases):
+			_strategy 	= copy.deepcopy(self.strategy)
+			_strategy.change_asset_holdings(delta_spot = each[5], delta_perp = each[6])
+			decision 	= _strategy.trade_decision(	spot_bid_price 				= each[0],
+													spot_ask_price 				= each[1],
+													perp_bid_price 				= each[2],
+													perp_ask_price 				= each[3],
+													perp_funding_rate 			= each[4],
+													perp_estimated_funding_rate = each[4],
+													entry_threshold 			= 0.01,
+													take_profit_threshold 		= 0.01,
+												)
+			assert(SpotPerpExecutionDecision(codes[i]) == decision)
+		assert(SpotPerpExecutionDecision(codes[0]) == SpotPerpExecutionDecision.GO_LONG_SPOT_SHORT_PERP)
+		assert(SpotPerpExecutionDecision(codes[2]) == SpotPerpExecutionDecision.TAKE_PROFIT_LONG_SPOT_SHORT_PERP)
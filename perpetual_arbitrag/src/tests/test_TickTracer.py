@@ -0,0 +1,83 @@
+import json
+import os
+import tempfile
+import threading
+import time
+from feeds.TickTracer import NULL_TRACER, TickTracer, summarize_trace_records
+from unittest import TestCase
+
+class TestTickTracer(TestCase):
+	def setUp(self):
+		(fd, self.trace_path) 	= tempfile.mkstemp(suffix = ".jsonl")
+		os.close(fd)
+		self.tracer 			= TickTracer(symbol = "BTC-USDT/BTC-USDT-SWAP", trace_path = self.trace_path)
+		return
+
+	def tearDown(self):
+		self.tracer.close()
+		os.remove(self.trace_path)
+		return
+
+	def _records(self):
+		self.tracer.trace_file.flush()
+		with open(self.trace_path) as trace_file:
+			return [json.loads(each_line) for each_line in trace_file]
+
+	def test_spans_are_summed_per_stage(self):
+		self.tracer.start_tick(woken = time.perf_counter() - 0.002)
+		for _ in range(2):
+			with self.tracer.span("order_framing"):
+				time.sleep(0.001)
+		self.tracer.end_tick(decision = "GO_LONG_SPOT_SHORT_PERP")
+		[record] = self._records()
+		assert(record["symbol"] == "BTC-USDT/BTC-USDT-SWAP" and record["decision"] == "GO_LONG_SPOT_SHORT_PERP")
+		assert(record["us"]["order_framing"] >= 2000 and record["us"]["wake"] >= 2000)
+		assert(record["us"]["tick"] >= record["us"]["order_framing"] + record["us"]["wake"])
+
+	def test_spans_outside_a_tick_are_ignored(self):
+		with self.tracer.span("send"):
+			pass
+		self.tracer.end_tick()
+		assert(self._records() == [] and self.tracer.summary() == {})
+
+	def test_spans_from_other_threads_are_ignored(self):
+		self.tracer.start_tick()
+		feed_thread = threading.Thread(target = lambda: self.tracer.add_span(stage = "book_parse", started = time.perf_counter()))
+		feed_thread.start()
+		feed_thread.join()
+		self.tracer.end_tick()
+		assert("book_parse" not in self._records()[0]["us"])
+
+	def test_spans_from_bound_calls_count(self):
+		def _read_book():
+			with self.tracer.span("feed_read"):
+				pass
+		self.tracer.start_tick()
+		feed_thread = threading.Thread(target = self.tracer.bind(_read_book))
+		feed_thread.start()
+		feed_thread.join()
+		self.tracer.end_tick()
+		assert("feed_read" in self._records()[0]["us"])
+		# The thread no longer counts once the bound call returns
+		assert(self.tracer.tick_threads == {threading.get_ident()})
+
+	def test_summary_per_symbol_and_stage(self):
+		for _ in range(10):
+			self.tracer.start_tick()
+			with self.tracer.span("vwap"):
+				pass
+			self.tracer.end_tick()
+		summary = self.tracer.summary()
+		assert(summary["BTC-USDT/BTC-USDT-SWAP:vwap"]["count"] == 10 and summary["BTC-USDT/BTC-USDT-SWAP:tick"]["count"] == 10)
+		assert("p999_ms" in summary["BTC-USDT/BTC-USDT-SWAP:vwap"])
+
+	def test_summarize_trace_records(self):
+		lines = [json.dumps({"ts" : 0, "symbol" : "A", "decision" : "None", "us" : {"ack" : each}}) for each in range(1, 1001)]
+		summary = summarize_trace_records(lines + [""])
+		assert(summary["A"]["ack"] == {"count" : 1000, "p50_us" : 501, "p99_us" : 991, "p999_us" : 1000, "max_us" : 1000})
+
+	def test_null_tracer(self):
+		NULL_TRACER.start_tick(woken = 0)
+		with NULL_TRACER.span("send"):
+			pass
+		assert(NULL_TRACER.end_tick(decision = None) is None)
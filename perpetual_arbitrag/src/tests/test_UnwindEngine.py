@@ -0,0 +1,93 @@
+import asyncio
+from execution.UnwindEngine import UnwindEngine
+from unittest import TestCase
+from CoroutineMock import coroutine_mock
+
+class TestUnwindEngine(TestCase):
+	def setUp(self):
+		self.unwind_engine 	= UnwindEngine(max_attempts = 3, reply_timeout_s = 0.05, fill_timeout_s = 0.02, fill_poll_interval_s = 0.005, retry_interval_s = 0)
+		self.loop 			= asyncio.new_event_loop()
+		return
+
+	def tearDown(self):
+		self.loop.close()
+		return
+
+	def _assert_resp_error(self, order_resp):
+		if order_resp["code"] != "0":
+			raise Exception(f"Order failed: {order_resp}")
+
+	def _unwind(self, revert_fn, **kwargs):
+		return self.loop.run_until_complete(self.unwind_engine.unwind_async(revert_fn = revert_fn,
+																			revert_params = {"symbol" : "BTC-USDT-SWAP", "order_type" : "limit", "order_side" : "buy", "size" : 1.0},
+																			order_resp = {"code" : "0"},
+																			assert_resp_error_fn = self._assert_resp_error,
+																			**kwargs))
+
+	def test_flat_on_first_attempt(self):
+		revert_fn = coroutine_mock(return_value = {"code" : "0"})
+		assert(self._unwind(revert_fn = revert_fn) == True)
+		assert(revert_fn.call_count == 1 and revert_fn.call_args[1]["revert_params"]["order_type"] == "limit")
+		assert(self.unwind_engine.summary()["time_to_flat"]["count"] == 1)
+
+	def test_rejected_revert_retried_at_market(self):
+		revert_fn = coroutine_mock(side_effect = [{"code" : "51008"}, {"code" : "0"}])
+		assert(self._unwind(revert_fn = revert_fn) == True)
+		assert([each_call[1]["revert_params"]["order_type"] for each_call in revert_fn.call_args_list] == ["limit", "market"])
+
+	def _lost_reply_revert_fn(self):
+		async def _revert_fn(order_resp, revert_params):
+			if revert_fn.call_count == 1:
+				await asyncio.sleep(1)
+			return {"code" : "0"}
+		revert_fn = coroutine_mock(side_effect = _revert_fn)
+		return revert_fn
+
+	def test_revert_without_reply_resolved_by_client_order_id(self):
+		# The revert was filled on the exchange, only its reply was lost
+		revert_fn 		= self._lost_reply_revert_fn()
+		order_state_fn 	= coroutine_mock(return_value = {"state" : "filled", "accFillSz" : "1"})
+		assert(self._unwind(revert_fn = revert_fn, order_state_fn = order_state_fn) == True and revert_fn.call_count == 1)
+		assert(order_state_fn.call_args[1]["order_params"]["client_order_id"] == revert_fn.call_args[1]["revert_params"]["client_order_id"])
+
+	def test_revert_never_received_retried(self):
+		revert_fn 		= self._lost_reply_revert_fn()
+		order_state_fn 	= coroutine_mock(side_effect = [None, {"state" : "filled", "accFillSz" : "1"}])
+		assert(self._unwind(revert_fn = revert_fn, order_state_fn = order_state_fn) == True and revert_fn.call_count == 2)
+		assert(len({each_call[1]["revert_params"]["client_order_id"] for each_call in revert_fn.call_args_list}) == 2)
+
+	def test_partial_fill_cancelled_and_remaining_size_retried(self):
+		revert_fn 		= coroutine_mock(return_value = {"code" : "0"})
+		cancel_fn 		= coroutine_mock(return_value = {"code" : "0"})
+		order_state_fn 	= coroutine_mock(side_effect = [	{"state" : "partially_filled", "accFillSz" : "0.4", "ordId" : "7"}, {"state" : "canceled", "accFillSz" : "0.4", "ordId" : "7"},
+													{"state" : "filled", "accFillSz" : "0.6", "ordId" : "8"}])
+		assert(self._unwind(revert_fn = revert_fn, order_state_fn = order_state_fn, cancel_fn = cancel_fn) == True)
+		assert([each_call[1]["revert_params"]["size"] for each_call in revert_fn.call_args_list] == [1.0, 0.6])
+		assert(cancel_fn.call_args[1]["order_resp"]["data"][0]["ordId"] == "7")
+
+	def test_flat_confirmed_against_position(self):
+		# The first revert reports a fill that the position does not show
+		revert_fn 	= coroutine_mock(return_value = {"code" : "0"})
+		position_fn = coroutine_mock(side_effect = [-1.0, -1.0, 0.0])
+		assert(self._unwind(revert_fn = revert_fn, position_fn = position_fn) == True)
+		assert(revert_fn.call_count == 2 and revert_fn.call_args[1]["revert_params"]["size"] == 1.0)
+
+	def test_unresolved_revert_not_resent(self):
+		revert_fn 		= self._lost_reply_revert_fn()
+		order_state_fn 	= coroutine_mock(side_effect = Exception("REST timeout"))
+		assert(self._unwind(revert_fn = revert_fn, order_state_fn = order_state_fn) == False and revert_fn.call_count == 1)
+
+	def test_unfilled_revert_cancelled_and_retried(self):
+		async def _fill_state(order_resp, order_params):
+			# Resting limit reverts never fill, market reverts fill at once
+			return True if order_params["order_type"] == "market" else None
+		revert_fn 		= coroutine_mock(return_value = {"code" : "0"})
+		cancel_fn 		= coroutine_mock(return_value = {"code" : "0"})
+		assert(self._unwind(revert_fn = revert_fn, confirm_fill_fn = coroutine_mock(side_effect = _fill_state), cancel_fn = cancel_fn) == True)
+		assert(revert_fn.call_count == 2 and cancel_fn.call_count == 1)
+
+	def test_failed_unwind_reported(self):
+		revert_fn = coroutine_mock(return_value = {"code" : "51008"})
+		assert(self._unwind(revert_fn = revert_fn) == False)
+		assert(revert_fn.call_count == 3 and self.unwind_engine.summary()["failed_unwinds"] == 1)
+		assert(self.unwind_engine.summary()["time_to_flat"]["count"] == 0)